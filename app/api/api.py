@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 
 from app.api.naming import path_prefix, tag
-from app.api.routes import edge_config, edge_detector_readiness, health, image_queries, ping
+from app.api.routes import edge_config, edge_detector_readiness, edge_inference_stats, health, image_queries, ping
 
 IMAGE_QUERIES = "image-queries"
 IMAGE_QUERIES_PREFIX = path_prefix(IMAGE_QUERIES)
@@ -39,3 +39,12 @@ edge_detector_readiness_router = APIRouter()
 edge_detector_readiness_router.include_router(
     edge_detector_readiness.router, prefix=EDGE_DETECTOR_READINESS_PREFIX, tags=[EDGE_DETECTOR_READINESS_TAG]
 )
+
+EDGE_INFERENCE_STATS = "edge-inference-stats"
+EDGE_INFERENCE_STATS_PREFIX = path_prefix(EDGE_INFERENCE_STATS)
+EDGE_INFERENCE_STATS_TAG = tag(EDGE_INFERENCE_STATS)
+
+edge_inference_stats_router = APIRouter()
+edge_inference_stats_router.include_router(
+    edge_inference_stats.router, prefix=EDGE_INFERENCE_STATS_PREFIX, tags=[EDGE_INFERENCE_STATS_TAG]
+)
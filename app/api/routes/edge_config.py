@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Body, Depends, HTTPException, status
-from groundlight.edge import EdgeEndpointConfig
 from pydantic import ValidationError
 
 from app.core.app_state import AppState, get_app_state
 from app.core.edge_config_manager import EdgeConfigManager, reconcile_config
+from app.core.edge_config_schema import ExtendedEdgeEndpointConfig
 
 router = APIRouter()
 
@@ -21,7 +21,7 @@ async def set_edge_config(
 ):
     """Replaces the active edge endpoint configuration with the provided configuration."""
     try:
-        new_config = EdgeEndpointConfig.from_payload(body)
+        new_config = ExtendedEdgeEndpointConfig.from_payload(body)
     except ValidationError as e:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors()) from e
     reconcile_config(new_config, app_state.db_manager)
@@ -10,8 +10,9 @@ router = APIRouter()
 async def get_edge_detector_readiness(app_state: AppState = Depends(get_app_state)):
     """Return readiness status for each configured detector.
 
-    Checks whether the primary inference pod (and OODD pod, if applicable) for each
-    detector is responding to health checks.
+    Reports whether the primary inference pod (and OODD pod, if applicable) for each
+    detector passed its last background health check. Readiness transitions and probe
+    timings are available from the edge inference stats endpoint.
     """
     config = EdgeConfigManager.active()
     detector_ids = [d.detector_id for d in config.detectors]
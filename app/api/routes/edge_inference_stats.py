@@ -0,0 +1,25 @@
+import os
+
+from fastapi import APIRouter, Depends
+
+from app.core.app_state import AppState, get_app_state
+
+router = APIRouter()
+
+
+@router.get("")
+async def get_edge_inference_stats(app_state: AppState = Depends(get_app_state)):
+    """Return edge inference stats for the worker process that handles this request.
+
+    The edge endpoint runs several uvicorn workers, each with its own dispatcher, so the response includes the
+    worker's pid. Poll repeatedly to sample all workers.
+    """
+    return {
+        "pid": os.getpid(),
+        "dispatch": app_state.edge_inference_manager.dispatcher.stats(),
+        "admission": app_state.admission_controller.stats(),
+        "batching": app_state.edge_inference_manager.batcher.stats(),
+        "result_cache": app_state.edge_inference_manager.result_cache.stats(),
+        "change_gate": app_state.edge_inference_manager.change_gate.stats(),
+        "readiness": app_state.edge_inference_manager.readiness.stats(),
+    }
@@ -4,9 +4,11 @@ from typing import Literal, Optional
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
 from groundlight import Groundlight
+from groundlight.edge import InferenceConfig
 from model import ImageQuery
 from starlette.concurrency import run_in_threadpool
 
+from app.core.admission import AdmissionController, AdmissionLimits, AdmissionRejectedError
 from app.core.app_state import (
     AppState,
     get_app_state,
@@ -14,8 +16,11 @@ from app.core.app_state import (
     get_groundlight_sdk_instance,
     refresh_detector_metadata_if_needed,
 )
+from app.core.change_gate import ChangeGateSettings, make_thumbnail
 from app.core.edge_config_manager import EdgeConfigManager
 from app.core.naming import get_edge_inference_model_name
+from app.core.result_cache import result_cache_ttl
+from app.core.serialization import image_query_response
 from app.core.utils import create_iq, generate_iq_id, generate_metadata_dict, generate_request_id
 from app.escalation_queue.models import SubmitImageQueryParams
 from app.escalation_queue.queue_utils import safe_escalate_with_queue_write, write_escalation_to_queue
@@ -58,6 +63,34 @@ async def validate_query_params_for_edge(request: Request):
         )
 
 
+@trace_span
+async def admit_edge_inference(
+    admission_controller: AdmissionController,
+    detector_id: str,
+    inference_config: InferenceConfig | None,
+    cloud_fallback_allowed: bool,
+) -> bool:
+    """
+    Take an edge inference slot for the detector. The caller must release the slot when inference finishes.
+
+    Returns False if the detector is saturated and the request should be sent to the cloud instead. If cloud
+    escalation isn't allowed for the detector, a saturated detector is reported to the client with a 429 or 503 and a
+    Retry-After header.
+    """
+    try:
+        await admission_controller.acquire(detector_id, AdmissionLimits.from_inference_config(inference_config))
+        return True
+    except AdmissionRejectedError as e:
+        if cloud_fallback_allowed:
+            logger.info(f"Edge inference is saturated for {detector_id=} ({e.reason}). Sending to the cloud instead.")
+            return False
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Edge inference is saturated for {detector_id=} ({e.reason}). Retry later.",
+            headers={"Retry-After": str(e.retry_after_s)},
+        ) from e
+
+
 @router.post("", response_model=ImageQuery)
 @trace_span
 async def post_image_query(  # noqa: PLR0913, PLR0915, PLR0912
@@ -123,8 +156,9 @@ async def post_image_query(  # noqa: PLR0913, PLR0915, PLR0912
     detector_id = detector_metadata.id
 
     require_human_review = human_review == "ALWAYS"
-    edge_config = EdgeConfigManager.active()
-    detector_inference_config = EdgeConfigManager.detector_config(edge_config, detector_id)
+    edge_config_snapshot = EdgeConfigManager.snapshot()
+    edge_config = edge_config_snapshot.config
+    detector_inference_config = edge_config_snapshot.detector_config(detector_id)
     return_edge_prediction = (
         detector_inference_config.always_return_edge_prediction if detector_inference_config is not None else False
     )
@@ -172,20 +206,68 @@ async def post_image_query(  # noqa: PLR0913, PLR0915, PLR0912
     # For holding edge results if and when available
     results = None
 
+    edge_inference_available = False
+    edge_inference_admitted = False
+    if not require_human_review:
+        # Reads the background readiness tracker's table, so this never blocks
+        edge_inference_available = app_state.edge_inference_manager.inference_is_available(detector_id=detector_id)
+    result_cache_key = None
+    if edge_inference_available:
+        result_cache_key = app_state.edge_inference_manager.result_cache_key(
+            detector_id, image_bytes, detector_inference_config
+        )
+        if result_cache_key is not None:
+            # A byte-identical image was already answered by the same models, so reuse that result.
+            results = app_state.edge_inference_manager.result_cache.get(result_cache_key)
+    change_gate_settings = ChangeGateSettings.from_inference_config(detector_inference_config)
+    change_gate_thumbnail = None
+    if edge_inference_available and results is None and change_gate_settings is not None:
+        # Decoding the thumbnail is CPU work, so keep it off the event loop
+        change_gate_thumbnail = await run_in_threadpool(make_thumbnail, image_bytes)
+        results = app_state.edge_inference_manager.change_gate.reusable_result(
+            detector_id,
+            change_gate_thumbnail,
+            app_state.edge_inference_manager.serving_model_keys(detector_id),
+            change_gate_settings,
+        )
+    if edge_inference_available and results is None:
+        edge_inference_admitted = await admit_edge_inference(
+            app_state.admission_controller,
+            detector_id=detector_id,
+            inference_config=detector_inference_config,
+            cloud_fallback_allowed=not (return_edge_prediction or disable_cloud_escalation),
+        )
+
     if require_human_review:
         # If human review is required, we should skip edge inference completely
         logger.debug("Received human_review=ALWAYS. Skipping edge inference.")
         record_activity_for_metrics(detector_id, activity_type="escalations")
-    elif await run_in_threadpool(app_state.edge_inference_manager.inference_is_available, detector_id=detector_id):
+    elif edge_inference_admitted or results is not None:
         # -- Edge-model Inference --
-        logger.debug(f"Local inference is available for {detector_id=}. Running inference...")
-        results = await run_in_threadpool(
-            app_state.edge_inference_manager.run_inference,
-            detector_id=detector_id,
-            image_bytes=image_bytes,
-            content_type=content_type,
-            mode=detector_metadata.mode,
-        )
+        if results is None:
+            logger.debug(f"Local inference is available for {detector_id=}. Running inference...")
+            try:
+                results = await app_state.edge_inference_manager.run_inference(
+                    detector_id=detector_id,
+                    image_bytes=image_bytes,
+                    content_type=content_type,
+                    mode=detector_metadata.mode,
+                )
+            finally:
+                app_state.admission_controller.release(detector_id)
+            if result_cache_key is not None:
+                app_state.edge_inference_manager.result_cache.put(
+                    result_cache_key, results, ttl_s=result_cache_ttl(detector_inference_config)
+                )
+            if change_gate_thumbnail is not None:
+                app_state.edge_inference_manager.change_gate.record_inference(
+                    detector_id,
+                    change_gate_thumbnail,
+                    app_state.edge_inference_manager.serving_model_keys(detector_id),
+                    results,
+                )
+        else:
+            logger.debug(f"Reusing a previous edge inference result for an unchanged image. {detector_id=}")
         ml_confidence = results["confidence"]
         class_index = results["label"]
         record_confidence_for_metrics(detector_id, ml_confidence, class_index=class_index)
@@ -218,7 +300,7 @@ async def post_image_query(  # noqa: PLR0913, PLR0915, PLR0912
 
             # Skip cloud operations if escalation is disabled
             if disable_cloud_escalation:
-                return image_query
+                return image_query_response(image_query)
 
             if is_confident_enough:  # Audit confident edge predictions at the specified rate
                 if random.random() < edge_config.global_config.confident_audit_rate:
@@ -233,21 +315,21 @@ async def post_image_query(  # noqa: PLR0913, PLR0915, PLR0912
                         metadata=generate_metadata_dict(results=results, is_edge_audit=True),
                         image_query_id=image_query.id,  # We give the cloud IQ the same ID as the returned edge IQ
                     )
-                    # We write to the queue synchronously because it should be fast. But this could be done as a
-                    # background task if it becomes slow.
+                    # Returns right away, the escalation is written to the queue in the background.
                     write_escalation_to_queue(
                         writer=app_state.queue_writer,
                         detector_id=detector_id,
                         image_bytes=image_bytes,
                         submit_iq_params=submit_iq_params,
                         request_id=request_id,
+                        priority="audit",
                     )
 
                     # We keep done_processing=True here for `image_query` because although we escalated the query for
                     # an audit, this is invisible to the user. From their perspective, this is the final answer.
 
                     # Don't want to escalate to cloud again if we're already auditing the query
-                    return image_query
+                    return image_query_response(image_query)
 
             # Escalate after returning edge prediction if escalation is enabled and we have low confidence.
             if not is_confident_enough:
@@ -264,8 +346,7 @@ async def post_image_query(  # noqa: PLR0913, PLR0915, PLR0912
                         metadata=generate_metadata_dict(results=results, is_edge_audit=False),
                         image_query_id=image_query.id,  # We give the cloud IQ the same ID as the returned edge IQ
                     )
-                    # We write to the queue synchronously because it should be fast. But this could be done as a
-                    # background task if it becomes slow.
+                    # Returns right away, the escalation is written to the queue in the background.
                     write_escalation_to_queue(
                         writer=app_state.queue_writer,
                         detector_id=detector_id,
@@ -280,33 +361,29 @@ async def post_image_query(  # noqa: PLR0913, PLR0915, PLR0912
                         f"Not escalating to cloud due to rate limit on background cloud escalations: {detector_id=}"
                     )
 
-            return image_query
-    else:
+            return image_query_response(image_query)
+    elif not edge_inference_available:
         # -- Edge-inference is not available --
         # Create an edge-inference deployment record, which may be used to spin up an edge-inference server.
         logger.debug(f"Local inference not available for {detector_id=}. Creating inference deployment record.")
         api_token = gl.api_client.configuration.api_key["ApiToken"]
 
-        primary_model_name = get_edge_inference_model_name(detector_id=detector_id, is_oodd=False)
-        app_state.db_manager.create_or_update_inference_deployment_record(
-            deployment={
-                "model_name": primary_model_name,
-                "detector_id": detector_id,
-                "api_token": api_token,
-                "deployment_created": False,
-            }
-        )
-
+        model_names = [get_edge_inference_model_name(detector_id=detector_id, is_oodd=False)]
         if app_state.separate_oodd_inference:
-            oodd_model_name = get_edge_inference_model_name(detector_id=detector_id, is_oodd=True)
-            app_state.db_manager.create_or_update_inference_deployment_record(
-                deployment={
-                    "model_name": oodd_model_name,
+            model_names.append(get_edge_inference_model_name(detector_id=detector_id, is_oodd=True))
+        # Skipped if this worker already registered the records with this token recently, so requests for a detector
+        # without inference don't each write to the database.
+        app_state.db_manager.ensure_inference_deployment_records(
+            [
+                {
+                    "model_name": model_name,
                     "detector_id": detector_id,
                     "api_token": api_token,
                     "deployment_created": False,
                 }
-            )
+                for model_name in model_names
+            ]
+        )
 
         if return_edge_prediction:
             raise HTTPException(
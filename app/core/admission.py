@@ -0,0 +1,215 @@
+"""Per-detector admission control for edge inference.
+
+At most `max_concurrent_inferences` image queries per detector are admitted into edge inference at once, across all
+edge endpoint workers. Further requests wait, first come first served within their worker, in a bounded per-worker
+queue for at most `max_inference_queue_wait` seconds. A request that finds the queue full, or that waits too long, is
+rejected with `AdmissionRejectedError`, so the caller can answer quickly (or fall back to the cloud) instead of letting
+latency grow without bound.
+
+The inference slots are shared by the workers as byte-range locks on a per-detector file in a shared directory (in
+/dev/shm when available): holding slot `i` means holding the lock on byte `i`. The kernel releases a worker's locks
+when it exits, so a crashed worker can't leak slots. A slot released by a worker goes straight to the next request
+waiting in that worker. Requests waiting in other workers find it on their next poll.
+
+Limits come from the detector's `ExtendedInferenceConfig` and are read on every request, so config changes apply
+without a restart. Detectors without a `max_concurrent_inferences` setting are never limited, but their in-flight
+counts are still reported.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import status
+from groundlight.edge import InferenceConfig
+
+from app.core.file_paths import SHARED_STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Used when a detector sets `max_concurrent_inferences` but not `max_inference_queue_wait`.
+DEFAULT_MAX_INFERENCE_QUEUE_WAIT_S = float(os.environ.get("DEFAULT_MAX_INFERENCE_QUEUE_WAIT_S", 1.0))
+ADMISSION_SLOTS_DIR = os.environ.get("ADMISSION_SLOTS_DIR", os.path.join(SHARED_STATE_DIR, "edge-endpoint-admission"))
+# How often the first request waiting in a worker checks for slots released by other workers.
+ADMISSION_POLL_INTERVAL_S = float(os.environ.get("ADMISSION_POLL_INTERVAL_S", 0.005))
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a detector is saturated and a request can't be admitted to edge inference."""
+
+    def __init__(self, detector_id: str, reason: str, status_code: int, retry_after_s: int) -> None:
+        super().__init__(f"Edge inference for {detector_id} is saturated ({reason}).")
+        self.detector_id = detector_id
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionLimits:
+    """The admission limits for a single detector."""
+
+    def __init__(self, max_in_flight: int | None, max_queue_depth: int, max_queue_wait_s: float) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_wait_s = max_queue_wait_s
+
+    @classmethod
+    def from_inference_config(cls, config: InferenceConfig | None) -> "AdmissionLimits":
+        """Read the limits from a detector's inference config. Plain SDK configs have no limits."""
+        max_in_flight = getattr(config, "max_concurrent_inferences", None)
+        max_queue_depth = getattr(config, "max_inference_queue_depth", None)
+        max_queue_wait_s = getattr(config, "max_inference_queue_wait", None)
+        return cls(
+            max_in_flight=max_in_flight,
+            max_queue_depth=max_queue_depth if max_queue_depth is not None else (max_in_flight or 0),
+            max_queue_wait_s=max_queue_wait_s if max_queue_wait_s is not None else DEFAULT_MAX_INFERENCE_QUEUE_WAIT_S,
+        )
+
+
+class _DetectorAdmissionState:
+    def __init__(self, slots_fd: int | None) -> None:
+        # The detector's slot file, or None if slots can't be shared and are only counted in this worker.
+        self.slots_fd = slots_fd
+        # The slots held by this worker. Record locks belong to the process, so locking a slot this worker already
+        # holds would succeed again; this set is what keeps the worker from taking the same slot twice.
+        self.held_slots: set[int] = set()
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_queue_timeout = 0
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_queue_timeout": self.rejected_queue_timeout,
+        }
+
+
+class AdmissionController:
+    """Tracks in-flight and waiting edge inference requests per detector, sharing the inference slots across workers."""
+
+    def __init__(self, directory: str = ADMISSION_SLOTS_DIR) -> None:
+        self.directory = directory
+        self._detectors: dict[str, _DetectorAdmissionState] = {}
+
+    def _state_for(self, detector_id: str) -> _DetectorAdmissionState:
+        state = self._detectors.get(detector_id)
+        if state is None:
+            state = _DetectorAdmissionState(self._open_slots(detector_id))
+            self._detectors[detector_id] = state
+        return state
+
+    def _open_slots(self, detector_id: str) -> int | None:
+        # Detector IDs come from request URLs, so they are never used as file names directly.
+        name = hashlib.blake2b(detector_id.encode(), digest_size=16).hexdigest()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Never closed: closing any fd of a file releases all of this process's locks on it.
+            return os.open(os.path.join(self.directory, f"{name}.slots"), os.O_RDWR | os.O_CREAT, 0o666)
+        except OSError as e:
+            logger.warning(
+                f"Could not open the shared admission slots for {detector_id=} in {self.directory}: {e}. "
+                "Its concurrency limit will be enforced per worker process."
+            )
+            return None
+
+    def _try_take_slot(self, state: _DetectorAdmissionState, max_in_flight: int) -> bool:
+        """Take a free slot below `max_in_flight`, if any worker has one to spare. Never blocks."""
+        for slot in range(max_in_flight):
+            if slot in state.held_slots:
+                continue
+            if state.slots_fd is not None:
+                try:
+                    fcntl.lockf(state.slots_fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                except OSError:
+                    continue  # Held by another worker
+            state.held_slots.add(slot)
+            state.in_flight += 1
+            return True
+        return False
+
+    async def acquire(self, detector_id: str, limits: AdmissionLimits) -> None:
+        """Take an inference slot for the detector, waiting in its queue if needed.
+
+        Raises:
+            AdmissionRejectedError: If the wait queue is full (429) or no slot freed up in time (503).
+        """
+        state = self._state_for(detector_id)
+        if limits.max_in_flight is None:
+            state.in_flight += 1
+            state.admitted += 1
+            return
+        if not state.waiters and self._try_take_slot(state, limits.max_in_flight):
+            state.admitted += 1
+            return
+
+        retry_after_s = max(1, math.ceil(limits.max_queue_wait_s))
+        if len(state.waiters) >= limits.max_queue_depth:
+            state.rejected_queue_full += 1
+            raise AdmissionRejectedError(detector_id, "queue full", status.HTTP_429_TOO_MANY_REQUESTS, retry_after_s)
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        state.waiters.append(waiter)
+        deadline = loop.time() + limits.max_queue_wait_s
+        try:
+            # release() hands its slot directly to the waiter, so in_flight is already accounted for on wake-up.
+            while not waiter.done() and (remaining := deadline - loop.time()) > 0:
+                await asyncio.wait([waiter], timeout=min(ADMISSION_POLL_INTERVAL_S, remaining))
+                # Slots released by other workers aren't handed over, so the first request in line looks for one.
+                if not waiter.done() and state.waiters[0] is waiter:
+                    if self._try_take_slot(state, limits.max_in_flight):
+                        waiter.set_result(None)
+        except asyncio.CancelledError:
+            if waiter.done():
+                # The slot was handed over just as we gave up on it; pass it on rather than leaking it.
+                self.release(detector_id)
+            raise
+        finally:
+            if waiter in state.waiters:
+                state.waiters.remove(waiter)
+        if not waiter.done():
+            waiter.cancel()
+            state.rejected_queue_timeout += 1
+            raise AdmissionRejectedError(
+                detector_id, "queue wait timeout", status.HTTP_503_SERVICE_UNAVAILABLE, retry_after_s
+            )
+        state.admitted += 1
+
+    def release(self, detector_id: str) -> None:
+        """Return an inference slot, handing it to the next request waiting in this worker if there is one."""
+        state = self._state_for(detector_id)
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        state.in_flight -= 1
+        # Requests admitted while the detector was unlimited hold no slot.
+        if len(state.held_slots) > state.in_flight:
+            slot = state.held_slots.pop()
+            if state.slots_fd is not None:
+                fcntl.lockf(state.slots_fd, fcntl.LOCK_UN, 1, slot)
+
+    @asynccontextmanager
+    async def admit(self, detector_id: str, limits: AdmissionLimits) -> AsyncIterator[None]:
+        """Hold an inference slot for the detector for the duration of the context."""
+        await self.acquire(detector_id, limits)
+        try:
+            yield
+        finally:
+            self.release(detector_id)
+
+    def stats(self) -> dict:
+        """Per-detector admission counters for this worker process. `in_flight` counts this worker's requests only."""
+        return {detector_id: state.stats() for detector_id, state in self._detectors.items()}
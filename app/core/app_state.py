@@ -3,16 +3,17 @@ import os
 import time
 from functools import lru_cache
 
-import cachetools
 from fastapi import Request
 from groundlight import Groundlight
 from model import Detector
 from urllib3.util.retry import Retry
 
-from app.escalation_queue.queue_writer import QueueWriter
+from app.escalation_queue.queue_writer import BackgroundQueueWriter
 from app.profiling.context import trace_span
 
+from .admission import AdmissionController
 from .database import DatabaseManager
+from .detector_metadata_cache import SharedDetectorMetadataCache
 from .edge_inference import EdgeInferenceManager
 from .utils import TimestampedCache, safe_call_sdk
 
@@ -21,9 +22,16 @@ logger = logging.getLogger(__name__)
 MAX_SDK_INSTANCES_CACHE_SIZE = 1000
 MAX_DETECTOR_IDS_CACHE_SIZE = 1000
 STALE_METADATA_THRESHOLD_SEC = 60  # 60 seconds
+# How much newer the shared copy of detector metadata must be before a worker replaces its own cached copy with it
+SHARED_METADATA_ADOPTION_MARGIN_SEC = 1
 
 USE_MINIMAL_IMAGE = os.environ.get("USE_MINIMAL_IMAGE", "false") == "true"
 
+# Detector metadata shared by all edge-endpoint workers, underneath each worker's own get_detector_metadata cache.
+shared_detector_metadata_cache = SharedDetectorMetadataCache()
+# This worker's own cache of detector metadata, see get_detector_metadata.
+_detector_metadata_cache = TimestampedCache(maxsize=MAX_DETECTOR_IDS_CACHE_SIZE)
+
 
 @lru_cache(maxsize=MAX_SDK_INSTANCES_CACHE_SIZE)
 @trace_span
@@ -52,53 +60,98 @@ def refresh_detector_metadata_if_needed(detector_id: str, gl: Groundlight) -> No
     """
     Check if detector metadata needs refreshing based on age of cached value and refresh it if it's too old.
     If the refresh fails, the stale cached metadata is restored.
+
+    The age is taken from the metadata shared by all workers when there is a shared copy. Only one worker refreshes a
+    stale detector, the others keep using their stale copy until they see the refreshed shared copy and adopt it.
     """
-    metadata_cache: TimestampedCache = get_detector_metadata.cache
+    metadata_cache: TimestampedCache = _detector_metadata_cache
     cached_value_timestamp = metadata_cache.get_timestamp(detector_id)
-    if cached_value_timestamp is not None:
-        cached_value_age = time.monotonic() - cached_value_timestamp
-        if cached_value_age > STALE_METADATA_THRESHOLD_SEC:
-            logger.info(f"Detector metadata for {detector_id=} is stale. Attempting to refresh...")
-            metadata_cache.suspend_cached_value(detector_id)
-
-            try:
-                # Repopulate the cache with fresh metadata
-                get_detector_metadata(detector_id=detector_id, gl=gl)
-                metadata_cache.delete_suspended_value(detector_id)
-                logger.info(f"Detector metadata for {detector_id=} refreshed successfully.")
-            except KeyError:
-                # This shouldn't happen, but if we fail to delete the suspended value we don't want to try to restore it
-                logger.warning(
-                    f"After fetching new metadata, did not successfully delete suspended value for {detector_id=}. "
-                    "This is unexpected."
-                )
-            except Exception as e:
-                logger.error(
-                    f"Failed to refresh detector metadata for {detector_id=}: {e}. Restoring stale cached metadata."
-                )
-                # The timestamp of the restored value will be updated to the time of restoration. This avoids trying to
-                # refresh the metadata again right away, in case the failure was due to a temporary network outage.
-                metadata_cache.restore_suspended_value(detector_id)
+    if cached_value_timestamp is None:
+        return
+
+    cached_value_age = time.monotonic() - cached_value_timestamp
+    shared_value_age = shared_detector_metadata_cache.age(detector_id)
+    if shared_value_age is not None and shared_value_age < cached_value_age - SHARED_METADATA_ADOPTION_MARGIN_SEC:
+        # Another worker refreshed this detector since we cached it.
+        _adopt_shared_detector_metadata(detector_id, shared_value_age)
+        cached_value_age = shared_value_age
+    if cached_value_age <= STALE_METADATA_THRESHOLD_SEC:
+        return
+
+    with shared_detector_metadata_cache.lock(detector_id, blocking=False) as acquired:
+        if not acquired:
+            logger.debug(f"Detector metadata for {detector_id=} is being refreshed by another worker.")
+            return
+        shared_value_age = shared_detector_metadata_cache.age(detector_id)
+        if shared_value_age is not None and shared_value_age <= STALE_METADATA_THRESHOLD_SEC:
+            # Another worker finished refreshing between our check and getting the lock.
+            _adopt_shared_detector_metadata(detector_id, shared_value_age)
+            return
+
+        logger.info(f"Detector metadata for {detector_id=} is stale. Attempting to refresh...")
+        metadata_cache.suspend_cached_value(detector_id)
+
+        try:
+            # Repopulate the cache with fresh metadata, and share it with the other workers
+            detector = _fetch_detector_metadata(detector_id=detector_id, gl=gl)
+            metadata_cache[detector_id] = detector
+            shared_detector_metadata_cache.put(detector_id, detector)
+            metadata_cache.delete_suspended_value(detector_id)
+            logger.info(f"Detector metadata for {detector_id=} refreshed successfully.")
+        except KeyError:
+            # This shouldn't happen, but if we fail to delete the suspended value we don't want to try to restore it
+            logger.warning(
+                f"After fetching new metadata, did not successfully delete suspended value for {detector_id=}. "
+                "This is unexpected."
+            )
+        except Exception as e:
+            logger.error(
+                f"Failed to refresh detector metadata for {detector_id=}: {e}. Restoring stale cached metadata."
+            )
+            # The timestamp of the restored value will be updated to the time of restoration. This avoids trying to
+            # refresh the metadata again right away, in case the failure was due to a temporary network outage.
+            metadata_cache.restore_suspended_value(detector_id)
+
+
+def _adopt_shared_detector_metadata(detector_id: str, shared_value_age: float) -> None:
+    """Replace this worker's cached metadata with the shared copy, keeping the shared copy's age."""
+    detector = shared_detector_metadata_cache.get(detector_id)
+    if detector is not None:
+        metadata_cache: TimestampedCache = _detector_metadata_cache
+        metadata_cache.__setitem__(detector_id, detector, timestamp=time.monotonic() - shared_value_age)
+
+
+def _fetch_detector_metadata(detector_id: str, gl: Groundlight) -> Detector:
+    """Fetch detector metadata from the Groundlight API."""
+    # We set a lower connect and read timeout to avoid stalling too long when experiencing network connectivity issues.
+    # These values are somewhat arbitrarily set and can be adjusted in conjunction with the http_transport_retries
+    # parameter for the Groundlight instance to achieve a different balance of robustness vs speed.
+    connect_timeout, read_timeout = 2, 3
+    detector = safe_call_sdk(gl.get_detector, id=detector_id, request_timeout=(connect_timeout, read_timeout))
+    return detector
 
 
 @trace_span
-@cachetools.cached(
-    cache=TimestampedCache(maxsize=MAX_DETECTOR_IDS_CACHE_SIZE),
-    key=lambda detector_id, gl: detector_id,
-)
 def get_detector_metadata(detector_id: str, gl: Groundlight) -> Detector:
     """
     Returns detector metadata from the Groundlight API.
-    Caches the result so that we don't have to make an expensive API call every time.
+    Caches the result so that we don't have to make an expensive API call every time. The first time a worker sees a
+    detector, it uses the metadata already fetched by another worker if there is any, cached with that copy's age so
+    that it is refreshed on the same schedule as in the other workers.
     """
-    # We set a lower connect and read timeout to avoid stalling too long when experiencing network connectivity issues.
-    # These values are somewhat arbitrarily set and can be adjusted in conjunction with the http_transport_retries
-    # parameter for the Groundlight instance to achieve a different balance of robustness vs speed.
-    connect_timeout, read_timeout = 2, 3
-    detector = safe_call_sdk(gl.get_detector, id=detector_id, request_timeout=(connect_timeout, read_timeout))
+    detector = _detector_metadata_cache.get(detector_id)
+    if detector is not None:
+        return detector
+    detector, shared_value_age = shared_detector_metadata_cache.get_or_fetch(
+        detector_id, lambda: _fetch_detector_metadata(detector_id=detector_id, gl=gl)
+    )
+    _detector_metadata_cache.__setitem__(detector_id, detector, timestamp=time.monotonic() - shared_value_age)
     return detector
 
 
+get_detector_metadata.cache = _detector_metadata_cache
+
+
 class AppState:
     def __init__(self):
         # We only launch a separate OODD inference pod if we are not using the minimal image.
@@ -108,7 +161,8 @@ class AppState:
         self.edge_inference_manager = EdgeInferenceManager(separate_oodd_inference=self.separate_oodd_inference)
         self.db_manager = DatabaseManager()
         self.is_ready = False
-        self.queue_writer = QueueWriter()
+        self.queue_writer = BackgroundQueueWriter()
+        self.admission_controller = AdmissionController()
 
 
 @trace_span
@@ -0,0 +1,122 @@
+"""Opt-in "change gate" that skips edge inference for frames of a scene that hasn't changed.
+
+Many cameras watch a scene that stays the same for minutes at a time while still producing slightly different JPEG
+bytes (sensor noise, compression), so the exact-duplicate result cache never hits. For detectors that set
+`change_gate_threshold`, each frame is decoded to a small grayscale thumbnail and compared with the thumbnail of the
+last frame that actually went through inference. If the mean absolute pixel difference is below the threshold, that
+frame's result is reused, but only while the reference result is younger than the max reuse age and was produced by
+the models that the inference pods currently serve.
+
+Thumbnails are decoded with JPEG draft mode (DCT scaling), so only a fraction of the full image is decompressed. The
+difference is computed by Pillow in C.
+"""
+
+import io
+import logging
+import os
+import time
+
+from groundlight.edge import InferenceConfig
+from PIL import Image, ImageChops, ImageStat
+
+logger = logging.getLogger(__name__)
+
+# Used when a detector sets `change_gate_threshold` but not `change_gate_max_reuse_age`.
+DEFAULT_CHANGE_GATE_MAX_REUSE_AGE_S = float(os.environ.get("DEFAULT_CHANGE_GATE_MAX_REUSE_AGE_S", 10))
+CHANGE_GATE_THUMBNAIL_SIZE = (64, 64)
+
+
+class ChangeGateSettings:
+    """Change gate settings for a single detector."""
+
+    def __init__(self, threshold: float, max_reuse_age_s: float) -> None:
+        self.threshold = threshold
+        self.max_reuse_age_s = max_reuse_age_s
+
+    @classmethod
+    def from_inference_config(cls, config: InferenceConfig | None) -> "ChangeGateSettings | None":
+        """Read the change gate settings from a detector's inference config. Returns None if the gate is disabled."""
+        threshold = getattr(config, "change_gate_threshold", None)
+        if threshold is None:
+            return None
+        max_reuse_age_s = getattr(config, "change_gate_max_reuse_age", None)
+        return cls(
+            threshold=threshold,
+            max_reuse_age_s=max_reuse_age_s if max_reuse_age_s is not None else DEFAULT_CHANGE_GATE_MAX_REUSE_AGE_S,
+        )
+
+
+def make_thumbnail(image_bytes: bytes) -> Image.Image | None:
+    """Decode an image to a small grayscale thumbnail for change detection. Returns None if it can't be decoded."""
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # For JPEGs this picks a reduced DCT scale, so only a fraction of the pixels are ever decompressed.
+        image.draft("L", (CHANGE_GATE_THUMBNAIL_SIZE[0] * 2, CHANGE_GATE_THUMBNAIL_SIZE[1] * 2))
+        return image.convert("L").resize(CHANGE_GATE_THUMBNAIL_SIZE, Image.Resampling.BILINEAR)
+    except Exception as e:
+        logger.debug(f"Could not decode image for the change gate: {e}")
+        return None
+
+
+def thumbnail_difference(a: Image.Image, b: Image.Image) -> float:
+    """Mean absolute pixel difference between two thumbnails, as a fraction of full scale (0 to 1)."""
+    return ImageStat.Stat(ImageChops.difference(a, b)).mean[0] / 255
+
+
+class _Reference:
+    def __init__(self, thumbnail: Image.Image, result: dict, model_keys: tuple, inferred_at: float) -> None:
+        self.thumbnail = thumbnail
+        self.result = result
+        self.model_keys = model_keys
+        self.inferred_at = inferred_at
+
+
+class _DetectorGateStats:
+    def __init__(self) -> None:
+        self.checked = 0
+        self.skipped = 0
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / self.checked if self.checked else 0.0,
+        }
+
+
+class ChangeGate:
+    """Tracks the last inferred frame per detector and decides when its result can be reused."""
+
+    def __init__(self) -> None:
+        self._references: dict[str, _Reference] = {}
+        self._stats: dict[str, _DetectorGateStats] = {}
+
+    def reusable_result(
+        self, detector_id: str, thumbnail: Image.Image | None, model_keys: tuple, settings: ChangeGateSettings
+    ) -> dict | None:
+        """Return a copy of the last inferred result if this frame hasn't changed enough to need inference."""
+        stats = self._stats.setdefault(detector_id, _DetectorGateStats())
+        stats.checked += 1
+        reference = self._references.get(detector_id)
+        if (
+            thumbnail is None
+            or reference is None
+            or reference.model_keys != model_keys
+            or time.monotonic() - reference.inferred_at > settings.max_reuse_age_s
+            or reference.thumbnail.size != thumbnail.size
+        ):
+            return None
+        if thumbnail_difference(reference.thumbnail, thumbnail) >= settings.threshold:
+            return None
+        stats.skipped += 1
+        return dict(reference.result)
+
+    def record_inference(self, detector_id: str, thumbnail: Image.Image | None, model_keys: tuple, result: dict):
+        """Make a freshly inferred frame the reference that later frames are compared with."""
+        if thumbnail is None:
+            return
+        self._references[detector_id] = _Reference(thumbnail, dict(result), model_keys, time.monotonic())
+
+    def stats(self) -> dict:
+        """Per-detector skip counters for this worker process."""
+        return {detector_id: stats.stats() for detector_id, stats in self._stats.items()}
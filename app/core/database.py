@@ -1,10 +1,15 @@
+import datetime
+import fcntl
 import logging
+import os
+import threading
 from logging.handlers import RotatingFileHandler
-from typing import Any, Dict, Sequence
+from typing import Any, Dict, Iterable, Sequence
 
-from sqlalchemy import create_engine, select
+from cachetools import TTLCache
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.engine.base import Engine
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
 from app.core.file_paths import DATABASE_FILEPATH, DATABASE_ORM_LOG_FILE, DATABASE_ORM_LOG_FILE_SIZE
@@ -12,6 +17,26 @@ from app.core.models import Base, InferenceDeployment
 
 logger = logging.getLogger(__name__)
 
+# How long a connection waits for another process (edge-endpoint workers, the model updater) to finish writing
+DATABASE_BUSY_TIMEOUT_S = float(os.environ.get("DATABASE_BUSY_TIMEOUT_S", 10))
+# How long a process skips re-writing a deployment record it has already written with the same fields
+DEPLOYMENT_RECORD_MEMO_TTL_S = float(os.environ.get("DEPLOYMENT_RECORD_MEMO_TTL_S", 60))
+# Holds a generation number, incremented whenever detectors are added to the database or marked for deletion. It sits
+# next to the database, so the model updater, which shares the database volume, can notice changes without querying
+# the database.
+DETECTOR_CHANGES_FILEPATH = os.environ.get(
+    "DETECTOR_CHANGES_FILEPATH", os.path.join(os.path.dirname(DATABASE_FILEPATH), "detector-changes")
+)
+
+
+# The size of the generation number in the detector changes file
+_GENERATION_SIZE = 8
+
+
+def _decode_generation(data: bytes) -> int:
+    """The generation number in the detector changes file, 0 if it hasn't been written yet."""
+    return int.from_bytes(data, "little") if len(data) == _GENERATION_SIZE else 0
+
 
 def get_database_url() -> str:
     """convenient function to mock for testing"""
@@ -32,12 +57,21 @@ class DatabaseManager:
         self._setup_logging(level=log_level)
 
         db_url = get_database_url()
-        self._engine: Engine = create_engine(db_url, echo=verbose)
+        self._engine: Engine = create_engine(db_url, echo=verbose, connect_args={"timeout": DATABASE_BUSY_TIMEOUT_S})
+        # With write-ahead logging, readers don't block the writer and the writer doesn't block readers, so the
+        # edge-endpoint workers and the model updater only wait for each other when writing at the same time.
+        event.listen(self._engine, "connect", _enable_write_ahead_logging)
 
         # Factory for creating new Session objects.
         # A session is a mutable, stateful object that represents a single database transaction in progress.
         self.session_maker = sessionmaker(bind=self._engine)
 
+        # Deployment records this process has recently written, so repeated registrations don't write again
+        self._recently_written_records: TTLCache = TTLCache(maxsize=4096, ttl=DEPLOYMENT_RECORD_MEMO_TTL_S)
+        self._recently_written_records_lock = threading.Lock()
+
+        self.detector_changes_path = DETECTOR_CHANGES_FILEPATH
+
     def _setup_logging(self, level: str | int) -> None:
         """
         Configures logging for SQLAlchemy. This is just so we can declutter the logs.
@@ -58,30 +92,51 @@ class DatabaseManager:
 
     def create_or_update_inference_deployment_record(self, deployment: Dict[str, str]) -> None:
         """
-        Creates a new record in the `inference_deployments` table. If the record exists, but the API token has
-        changed, we will update the record with the new API token.
+        Creates a new record in the `inference_deployments` table. If the record exists, it is updated with the given
+        fields, so that e.g. a changed API token or a reset deployment_created flag is applied.
         :param deployment: A dictionary containing the deployment details.
 
         TODO: Use a pydantic model for the record - see sqlmodels library
         """
-        try:
-            with self.session_maker() as session:
-                session.add(InferenceDeployment(**deployment))
-                session.commit()
-        except IntegrityError as e:
-            if "model_name" not in str(e.orig):
-                raise e
-            self._handle_existing_detector(deployment)
-
-    def _handle_existing_detector(self, deployment: Dict[str, str]) -> None:
-        """
-        Handles the case where a detector with the same model_name already exists in the database.
-        Always applies the incoming fields so that flags like pending_deletion and deployment_created
-        are reset when a detector is re-added.
-        :param deployment: A dictionary containing the deployment details.
+        self.create_or_update_inference_deployment_records([deployment])
+
+    def create_or_update_inference_deployment_records(self, deployments: Sequence[Dict[str, Any]]) -> None:
+        """
+        Creates or updates several records in the `inference_deployments` table, in a single transaction. Each record
+        is written with a single `INSERT ... ON CONFLICT DO UPDATE` statement.
+        :param deployments: Dictionaries containing the deployment details.
+        """
+        if not deployments:
+            return
+        detector_ids = {deployment["detector_id"] for deployment in deployments}
+        with self.session_maker() as session:
+            query = select(InferenceDeployment.detector_id).where(
+                InferenceDeployment.detector_id.in_(detector_ids), InferenceDeployment.pending_deletion.is_(False)
+            )
+            already_active = set(session.execute(query).scalars().all())
+            for deployment in deployments:
+                session.execute(_upsert_statement(deployment))
+            session.commit()
+        # Only adding detectors is a change for the model updater, not registering detectors it already knows about
+        if detector_ids - already_active:
+            self._notify_detector_changes()
+
+    def ensure_inference_deployment_records(self, deployments: Sequence[Dict[str, Any]]) -> None:
         """
-        logger.debug(f"Model name {deployment['model_name']} already exists in the database.")
-        self.update_inference_deployment_record(model_name=deployment["model_name"], fields_to_update=deployment)
+        Like `create_or_update_inference_deployment_records`, but skips records that this process has already written
+        with the same fields (e.g. the same API token) in the last DEPLOYMENT_RECORD_MEMO_TTL_S seconds. Meant for the
+        request path, where every request for a detector without inference would otherwise write its records again.
+        :param deployments: Dictionaries containing the deployment details.
+        """
+        keys = [tuple(sorted(deployment.items())) for deployment in deployments]
+        with self._recently_written_records_lock:
+            to_write = [d for d, key in zip(deployments, keys) if key not in self._recently_written_records]
+        if not to_write:
+            return
+        self.create_or_update_inference_deployment_records(to_write)
+        with self._recently_written_records_lock:
+            for key in keys:
+                self._recently_written_records[key] = True
 
     def update_inference_deployment_record(self, model_name: str, fields_to_update: Dict[str, Any]):
         """
@@ -114,15 +169,27 @@ class DatabaseManager:
 
     def mark_detector_pending_deletion(self, detector_id: str) -> None:
         """Mark all records for a detector as pending deletion."""
+        self.mark_detectors_pending_deletion([detector_id])
+
+    def mark_detectors_pending_deletion(self, detector_ids: Iterable[str]) -> None:
+        """Mark all records for several detectors as pending deletion, in a single transaction."""
+        detector_ids = set(detector_ids)
+        if not detector_ids:
+            return
         with self.session_maker() as session:
-            query = select(InferenceDeployment).filter_by(detector_id=detector_id)
-            existing = session.execute(query).scalars().all()
-            if existing:
-                for record in existing:
-                    record.pending_deletion = True
-                session.commit()
-            else:
+            query = select(InferenceDeployment.detector_id).where(InferenceDeployment.detector_id.in_(detector_ids))
+            existing = set(session.execute(query).scalars().all())
+            for detector_id in detector_ids - existing:
                 logger.error(f"No DB records found for detector {detector_id} when marking for deletion.")
+            session.execute(
+                update(InferenceDeployment)
+                .where(InferenceDeployment.detector_id.in_(existing))
+                .values(pending_deletion=True, updated_at=datetime.datetime.utcnow())
+            )
+            session.commit()
+        self._forget_recently_written_records()
+        if existing:
+            self._notify_detector_changes()
 
     def get_pending_deletions(self) -> list[str]:
         """Return distinct detector_ids that are pending deletion."""
@@ -132,7 +199,9 @@ class DatabaseManager:
 
     def get_active_detector_ids(self) -> set[str]:
         """Return detector IDs that are not pending deletion."""
-        return {r.detector_id for r in self.get_inference_deployment_records() if not r.pending_deletion}
+        with self.session_maker() as session:
+            query = select(InferenceDeployment.detector_id).filter_by(pending_deletion=False).distinct()
+            return set(session.execute(query).scalars().all())
 
     def delete_inference_deployment_records(self, detector_id: str) -> None:
         """Delete all records for a given detector_id."""
@@ -141,6 +210,46 @@ class DatabaseManager:
             for record in session.execute(query).scalars().all():
                 session.delete(record)
             session.commit()
+        self._forget_recently_written_records()
+
+    def detector_changes_version(self) -> int:
+        """
+        A counter that any process adding detectors to the database or marking them for deletion increments. Compare
+        it to a previous value to find out whether detectors changed since then, without querying the database.
+        """
+        try:
+            fd = os.open(self.detector_changes_path, os.O_RDONLY)
+        except OSError:
+            return 0
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            return _decode_generation(os.pread(fd, _GENERATION_SIZE, 0))
+        finally:
+            os.close(fd)
+
+    def _notify_detector_changes(self) -> None:
+        # The generation number is rewritten in place under an exclusive lock, so that increments from different
+        # processes are never lost and the file never grows
+        try:
+            fd = os.open(self.detector_changes_path, os.O_RDWR | os.O_CREAT, 0o666)
+        except OSError as e:
+            logger.warning(f"Could not record detector changes at {self.detector_changes_path}: {e}")
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            generation = _decode_generation(os.pread(fd, _GENERATION_SIZE, 0))
+            os.pwrite(fd, ((generation + 1) % 2 ** (8 * _GENERATION_SIZE)).to_bytes(_GENERATION_SIZE, "little"), 0)
+            # Drop anything after the generation number, e.g. a file written by an older version
+            os.ftruncate(fd, _GENERATION_SIZE)
+        except OSError as e:
+            logger.warning(f"Could not record detector changes at {self.detector_changes_path}: {e}")
+        finally:
+            os.close(fd)
+
+    def _forget_recently_written_records(self) -> None:
+        """Records were changed in a way that registering them again should undo, so don't skip the next writes."""
+        with self._recently_written_records_lock:
+            self._recently_written_records.clear()
 
     def create_tables(self) -> None:
         """Create the database tables, if they don't already exist."""
@@ -156,6 +265,27 @@ class DatabaseManager:
         """Reset the database by deleting all tables and then recreating them."""
         self.drop_tables()
         self.create_tables()
+        self._forget_recently_written_records()
+        self._notify_detector_changes()
 
     def shutdown(self) -> None:
         self._engine.dispose()
+
+
+def _upsert_statement(deployment: Dict[str, Any]):
+    """An `INSERT ... ON CONFLICT (model_name) DO UPDATE` that sets the given fields of the deployment record."""
+    statement = insert(InferenceDeployment).values(**deployment)
+    fields_to_update = {field: statement.excluded[field] for field in deployment if field != "model_name"}
+    # onupdate defaults don't apply to the update part of an upsert
+    fields_to_update["updated_at"] = datetime.datetime.utcnow()
+    return statement.on_conflict_do_update(index_elements=[InferenceDeployment.model_name], set_=fields_to_update)
+
+
+def _enable_write_ahead_logging(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # WAL stays consistent with synchronous=NORMAL, only the last commits can be lost on a power failure
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
@@ -0,0 +1,124 @@
+"""Detector metadata shared by all edge-endpoint worker processes.
+
+Each worker keeps its own in-memory cache of `Detector` objects, but on its own that means every worker fetches every
+detector from the cloud when it first sees it, and refreshes it once per refresh interval. This module adds a layer
+underneath that all workers share: one JSON file per detector in a shared directory (in /dev/shm when available), whose
+mtime is the time the metadata was fetched.
+
+- A worker that has never seen a detector uses the shared copy if there is one, whatever its age. Only if there is
+  none does it fetch from the cloud, holding the detector's lock so that the other workers wait for it and then read
+  the result instead of fetching too.
+- Refreshing stale metadata is done by whichever worker gets the detector's lock without waiting. The others keep
+  serving their stale copy (stale-while-revalidate) and adopt the shared copy once it has been refreshed.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, Iterator
+
+from model import Detector
+
+from app.core.file_paths import SHARED_STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_METADATA_CACHE_DIR = os.environ.get(
+    "DETECTOR_METADATA_CACHE_DIR", os.path.join(SHARED_STATE_DIR, "edge-endpoint-detector-metadata")
+)
+
+
+class SharedDetectorMetadataCache:
+    """A file-backed cache of detector metadata, shared by every process that uses the same directory."""
+
+    def __init__(self, directory: str = DETECTOR_METADATA_CACHE_DIR) -> None:
+        self.directory = directory
+
+    def _path(self, detector_id: str, suffix: str) -> str:
+        # Detector IDs come from request URLs, so they are never used as file names directly.
+        name = hashlib.blake2b(detector_id.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{name}{suffix}")
+
+    def get(self, detector_id: str) -> Detector | None:
+        """Return the shared metadata for a detector, or None if no worker has fetched it yet."""
+        try:
+            with open(self._path(detector_id, ".json"), "rb") as f:
+                return Detector.model_validate_json(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read shared detector metadata for {detector_id=}: {e}")
+            return None
+
+    def age(self, detector_id: str) -> float | None:
+        """Seconds since the shared metadata for a detector was fetched, or None if there is none."""
+        try:
+            return time.time() - os.stat(self._path(detector_id, ".json")).st_mtime
+        except OSError:
+            return None
+
+    def put(self, detector_id: str, detector: Detector) -> None:
+        """Share freshly fetched metadata with the other workers."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file and rename it into place, so readers never see a partially written file.
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(detector.model_dump_json())
+                os.replace(temp_path, self._path(detector_id, ".json"))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"Could not share detector metadata for {detector_id=}: {e}")
+
+    @contextlib.contextmanager
+    def lock(self, detector_id: str, blocking: bool = True) -> Iterator[bool]:
+        """
+        Hold the detector's fetch lock for the duration of the context. Yields whether the lock was acquired, which is
+        always True when blocking. If the shared directory is unusable, yields True without any locking.
+        """
+        fd = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(self._path(detector_id, ".lock"), os.O_RDWR | os.O_CREAT, 0o666)
+        except OSError as e:
+            logger.warning(f"Could not open the shared detector metadata lock for {detector_id=}: {e}")
+        if fd is None:
+            yield True
+            return
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+            except BlockingIOError:
+                acquired = False
+            yield acquired
+        finally:
+            # Closing the file releases the lock
+            os.close(fd)
+
+    def get_or_fetch(self, detector_id: str, fetch: Callable[[], Detector]) -> tuple[Detector, float]:
+        """
+        Return the shared metadata for a detector, whatever its age, along with its age in seconds. If there is none,
+        fetch it while holding the detector's lock, so that workers asking for the same detector at the same time make
+        only one cloud call.
+        """
+        # The age is read before the metadata, so a refresh in between can only make the result look older than it is.
+        age = self.age(detector_id)
+        detector = self.get(detector_id)
+        if detector is not None:
+            return detector, age or 0.0
+        with self.lock(detector_id):
+            age = self.age(detector_id)
+            detector = self.get(detector_id)
+            if detector is not None:
+                return detector, age or 0.0
+            detector = fetch()
+            self.put(detector_id, detector)
+            return detector, 0.0
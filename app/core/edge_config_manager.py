@@ -1,26 +1,53 @@
 import logging
 import os
+import threading
+from pathlib import Path
 
 import yaml
 from groundlight.edge import EdgeEndpointConfig, InferenceConfig
 
+from app.escalation_queue.dir_watcher import IN_ADDED_OR_REMOVED, IN_CLOSE_WRITE, DirectoryWatcher
 from app.profiling.context import trace_span
 
 from .database import DatabaseManager
+from .edge_config_schema import ExtendedEdgeEndpointConfig
 from .file_paths import ACTIVE_EDGE_CONFIG_PATH
 from .naming import get_edge_inference_model_name
 
 logger = logging.getLogger(__name__)
 
 GROUNDLIGHT_API_TOKEN = os.environ.get("GROUNDLIGHT_API_TOKEN", "")
+EDGE_CONFIG_WATCH_INTERVAL_S = float(os.environ.get("EDGE_CONFIG_WATCH_INTERVAL_S", 1))
+
+
+class EdgeConfigSnapshot:
+    """An active config as read from disk, along with each detector's resolved InferenceConfig. Never modified, a
+    changed config file produces a new snapshot."""
+
+    def __init__(self, config: EdgeEndpointConfig, mtime: float = 0.0) -> None:
+        self.config = config
+        self.mtime = mtime
+        self.detector_configs = EdgeConfigManager.detector_configs(config)
+
+    def detector_config(self, detector_id: str) -> InferenceConfig | None:
+        """Return the InferenceConfig for a single detector, or None."""
+        return self.detector_configs.get(detector_id)
 
 
 class EdgeConfigManager:
     """Manages the lifecycle of the edge endpoint configuration: saving and
-    mtime-cached reading of the active config file on PVC."""
+    mtime-cached reading of the active config file on PVC.
 
-    _cached_config: EdgeEndpointConfig = EdgeEndpointConfig()
-    _cached_mtime: float = 0.0
+    By default, every read checks the file's mtime. Processes that read the config on their request path call
+    `start_watching`, after which a background thread checks the file for changes instead and reads only return the
+    current snapshot. The thread is woken up by inotify when the config's directory changes, and checks the file every
+    EDGE_CONFIG_WATCH_INTERVAL_S regardless, for changes inotify doesn't report (e.g. from another node) or where it
+    isn't available.
+    """
+
+    _snapshot: EdgeConfigSnapshot | None = None
+    _watcher: threading.Thread | None = None
+    _stop_watching: threading.Event = threading.Event()
 
     @classmethod
     def save(cls, config: EdgeEndpointConfig) -> None:
@@ -28,27 +55,94 @@ class EdgeConfigManager:
         os.makedirs(os.path.dirname(ACTIVE_EDGE_CONFIG_PATH), exist_ok=True)
         with open(ACTIVE_EDGE_CONFIG_PATH, "w") as f:
             yaml.dump(config.to_payload(), f, default_flow_style=False)
+        # Don't make this process wait for its watcher to see its own change
+        cls._reload_if_changed()
 
     @classmethod
     @trace_span
     def active(cls) -> EdgeEndpointConfig:
         """Return the current active config, re-reading from disk only when the file changes."""
+        return cls.snapshot().config
+
+    @classmethod
+    def snapshot(cls) -> EdgeConfigSnapshot:
+        """Return the snapshot of the current active config. Checks the file for changes unless it is being watched."""
+        if cls._watcher is not None and cls._watcher.is_alive():
+            return cls._snapshot
+        return cls._reload_if_changed()
+
+    @classmethod
+    def _reload_if_changed(cls) -> EdgeConfigSnapshot:
+        snapshot = cls._snapshot
+        if snapshot is None:
+            snapshot = cls._snapshot = EdgeConfigSnapshot(ExtendedEdgeEndpointConfig())
         try:
             mtime = os.path.getmtime(ACTIVE_EDGE_CONFIG_PATH)
         except FileNotFoundError:
             logger.debug("Active config file not yet available at %s, using defaults", ACTIVE_EDGE_CONFIG_PATH)
-            return cls._cached_config
-        if mtime != cls._cached_mtime:
+            return snapshot
+        if mtime != snapshot.mtime:
             try:
-                cls._cached_config = EdgeEndpointConfig.from_yaml(filename=ACTIVE_EDGE_CONFIG_PATH)
-                cls._cached_mtime = mtime
+                config = ExtendedEdgeEndpointConfig.from_yaml(filename=ACTIVE_EDGE_CONFIG_PATH)
+                # Replaced in a single assignment, so readers on other threads see either the old or the new snapshot
+                snapshot = cls._snapshot = EdgeConfigSnapshot(config, mtime)
             except Exception:
                 logger.error(
                     "Failed to parse active config at %s, using cached/default config",
                     ACTIVE_EDGE_CONFIG_PATH,
                     exc_info=True,
                 )
-        return cls._cached_config
+        return snapshot
+
+    @classmethod
+    def start_watching(cls, interval_s: float = EDGE_CONFIG_WATCH_INTERVAL_S) -> None:
+        """Check the active config file for changes in a background thread, instead of on every read: when inotify
+        reports a change to its directory, and at least every `interval_s`."""
+        if cls._watcher is not None and cls._watcher.is_alive():
+            return
+        # Watched before the first check, so that no change is missed
+        directory_watcher = DirectoryWatcher.create(
+            Path(os.path.dirname(ACTIVE_EDGE_CONFIG_PATH)), IN_ADDED_OR_REMOVED | IN_CLOSE_WRITE
+        )
+        cls._reload_if_changed()
+        cls._stop_watching = threading.Event()
+        cls._watcher = threading.Thread(
+            target=cls._watch,
+            args=(cls._stop_watching, directory_watcher, interval_s),
+            name="edge-config-watcher",
+            daemon=True,
+        )
+        cls._watcher.start()
+
+    @classmethod
+    def stop_watching(cls) -> None:
+        """Stop the background thread started by `start_watching`. Reads check the file for changes again."""
+        watcher = cls._watcher
+        if watcher is None:
+            return
+        cls._stop_watching.set()
+        watcher.join()
+        cls._watcher = None
+
+    @classmethod
+    def _watch(cls, stop: threading.Event, directory_watcher: DirectoryWatcher | None, interval_s: float) -> None:
+        try:
+            while True:
+                if directory_watcher is None:
+                    if stop.wait(interval_s):
+                        return
+                else:
+                    if directory_watcher.wait(interval_s):
+                        directory_watcher.read_events()
+                    if stop.is_set():
+                        return
+                try:
+                    cls._reload_if_changed()
+                except Exception as e:
+                    logger.error(f"Failed to check the active config for changes: {e}", exc_info=True)
+        finally:
+            if directory_watcher is not None:
+                directory_watcher.close()
 
     @staticmethod
     def detector_configs(config: EdgeEndpointConfig) -> dict[str, InferenceConfig]:
@@ -57,10 +151,13 @@ class EdgeConfigManager:
             return {}
         return {d.detector_id: config.edge_inference_configs[d.edge_inference_config] for d in config.detectors}
 
-    @staticmethod
+    @classmethod
     @trace_span
-    def detector_config(config: EdgeEndpointConfig, detector_id: str) -> InferenceConfig | None:
+    def detector_config(cls, config: EdgeEndpointConfig, detector_id: str) -> InferenceConfig | None:
         """Return the InferenceConfig for a single detector, or None."""
+        snapshot = cls._snapshot
+        if snapshot is not None and config is snapshot.config:
+            return snapshot.detector_config(detector_id)
         for d in config.detectors:
             if d.detector_id == detector_id:
                 return config.edge_inference_configs[d.edge_inference_config]
@@ -73,24 +170,25 @@ def get_active_detector_ids(db_manager: DatabaseManager) -> set[str]:
 
 
 def apply_detector_changes(removed: set[str], added: set[str], db_manager: DatabaseManager) -> None:
-    """Mark removed detectors for deletion and create DB records for added ones."""
-    for detector_id in removed:
-        logger.info(f"Marking detector {detector_id} for deletion")
-        db_manager.mark_detector_pending_deletion(detector_id)
+    """Mark removed detectors for deletion and create DB records for added ones, in one transaction each."""
+    if removed:
+        logger.info(f"Marking detectors for deletion: {removed}")
+        db_manager.mark_detectors_pending_deletion(removed)
 
+    deployments = []
     for detector_id in added:
         logger.info(f"Creating deployment record for new detector {detector_id}")
         for is_oodd in [False, True]:
-            model_name = get_edge_inference_model_name(detector_id, is_oodd=is_oodd)
-            db_manager.create_or_update_inference_deployment_record(
-                deployment={
-                    "model_name": model_name,
+            deployments.append(
+                {
+                    "model_name": get_edge_inference_model_name(detector_id, is_oodd=is_oodd),
                     "detector_id": detector_id,
                     "api_token": GROUNDLIGHT_API_TOKEN,
                     "deployment_created": False,
                     "pending_deletion": False,
                 }
             )
+    db_manager.create_or_update_inference_deployment_records(deployments)
 
 
 def compute_detector_diff(current_detector_ids: set[str], new_config: EdgeEndpointConfig) -> tuple[set[str], set[str]]:
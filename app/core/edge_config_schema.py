@@ -0,0 +1,134 @@
+"""Edge-endpoint extensions to the SDK's edge configuration schema.
+
+The SDK's `InferenceConfig` ignores unknown keys, so settings that only the edge endpoint understands (e.g. admission
+limits) would be silently dropped when a config is parsed. `ExtendedInferenceConfig` adds those settings as optional
+fields, and `ExtendedEdgeEndpointConfig` is an `EdgeEndpointConfig` whose inference configs use it.
+
+Every edge-only field defaults to None, meaning "feature off", and is omitted from payloads while unset. A config
+that doesn't use any of them round-trips to exactly the payload the SDK would produce.
+"""
+
+from typing import Any, Optional, Union
+
+from groundlight.edge import EdgeEndpointConfig, InferenceConfig
+from model import Detector
+from pydantic import Field, field_validator, model_serializer
+
+
+class ExtendedInferenceConfig(InferenceConfig):
+    """An `InferenceConfig` with additional, edge-only tuning settings."""
+
+    max_concurrent_inferences: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "Maximum number of image queries for this detector that may run edge inference at once, across all edge "
+            "endpoint workers. Unset means unlimited."
+        ),
+    )
+    max_inference_queue_depth: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description=(
+            "Maximum number of image queries that may wait for an inference slot when `max_concurrent_inferences` "
+            "is reached, per edge endpoint worker. Unset means the same as `max_concurrent_inferences`."
+        ),
+    )
+    max_inference_queue_wait: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description=(
+            "Maximum time (in seconds) an image query may wait for an inference slot before it is rejected or sent "
+            "to the cloud. Unset means the edge endpoint default."
+        ),
+    )
+    max_inference_batch_size: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "Maximum number of concurrent image queries for this detector that are sent to the inference server as "
+            "one batched call, if the inference server supports batched inference. Unset or 1 disables batching."
+        ),
+    )
+    inference_batch_window_ms: Optional[float] = Field(
+        default=None,
+        ge=0,
+        description=(
+            "How long (in milliseconds) to wait for more image queries to join a batch before sending it. Only "
+            "applies when `max_inference_batch_size` is greater than 1. Unset means the edge endpoint default."
+        ),
+    )
+    duplicate_result_cache_ttl: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description=(
+            "How long (in seconds) the edge inference result for an image is reused when the exact same image bytes "
+            "are submitted again for this detector with the same models loaded. Unset disables result caching."
+        ),
+    )
+    change_gate_threshold: Optional[float] = Field(
+        default=None,
+        ge=0,
+        le=1,
+        description=(
+            "Reuse the previous edge inference result when a frame differs from the last inferred frame by less than "
+            "this mean absolute pixel difference (as a fraction of full scale, e.g. 0.01). Unset disables the gate."
+        ),
+    )
+    change_gate_max_reuse_age: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description=(
+            "Maximum age (in seconds) of an edge inference result that the change gate may reuse. Unset means the "
+            "edge endpoint default."
+        ),
+    )
+
+    @model_serializer(mode="wrap")
+    def _omit_unset_edge_fields(self, handler) -> dict[str, Any]:
+        data = handler(self)
+        for field_name in EDGE_ONLY_FIELDS:
+            if data.get(field_name) is None:
+                data.pop(field_name, None)
+        return data
+
+
+EDGE_ONLY_FIELDS = tuple(set(ExtendedInferenceConfig.model_fields) - set(InferenceConfig.model_fields))
+
+
+def to_extended_inference_config(config: InferenceConfig) -> ExtendedInferenceConfig:
+    """Convert an SDK `InferenceConfig` (e.g. one of the SDK presets) to an `ExtendedInferenceConfig`."""
+    if isinstance(config, ExtendedInferenceConfig):
+        return config
+    return ExtendedInferenceConfig(name=config.name, **config.model_dump())
+
+
+class ExtendedEdgeEndpointConfig(EdgeEndpointConfig):
+    """An `EdgeEndpointConfig` whose inference configs keep the edge-only settings."""
+
+    edge_inference_configs: dict[str, ExtendedInferenceConfig] = Field(default_factory=dict)
+
+    @field_validator("edge_inference_configs", mode="before")
+    @classmethod
+    def hydrate_inference_config_names(
+        cls, value: Optional[dict[str, Union[InferenceConfig, dict[str, Any]]]]
+    ) -> dict[str, Union[InferenceConfig, dict[str, Any]]]:
+        """Hydrate InferenceConfig.name from payload mapping keys, upgrading SDK InferenceConfig instances."""
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            return value
+
+        hydrated_configs: dict[str, Union[InferenceConfig, dict[str, Any]]] = {}
+        for name, config in value.items():
+            if isinstance(config, InferenceConfig):
+                hydrated_configs[name] = to_extended_inference_config(config)
+                continue
+            if not isinstance(config, dict):
+                raise TypeError("Each edge inference config must be an object.")
+            hydrated_configs[name] = {"name": name, **config}
+        return hydrated_configs
+
+    def add_detector(self, detector: Union[str, Detector], edge_inference_config: InferenceConfig) -> None:
+        """Add a detector with the given inference config. Accepts detector ID or Detector object."""
+        super().add_detector(detector, to_extended_inference_config(edge_inference_config))
@@ -1,52 +1,60 @@
-import contextvars
 import json
 import logging
 import os
+import re
 import shutil
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
+import httpx
 import requests
 import yaml
-from cachetools import TTLCache, cached
+from cachetools import TTLCache
 from fastapi import HTTPException, status
 from groundlight.edge import EdgeEndpointConfig, InferenceConfig
 from jinja2 import Template
 from model import ModeEnum
 
+from app.core import serialization
+from app.core.change_gate import ChangeGate
 from app.core.edge_config_manager import EdgeConfigManager
+from app.core.escalation_cooldown import EscalationCooldownTable
 from app.core.file_paths import MODEL_REPOSITORY_PATH
+from app.core.inference_batching import BatchSettings, InferenceBatcher
+from app.core.inference_client import InferenceClientPool
+from app.core.inference_dispatch import InferenceDispatcher
+from app.core.model_download import download_to_file
 from app.core.naming import (
     get_detector_models_dir,
     get_edge_inference_service_name,
+    get_model_blob_dir,
     get_oodd_model_dir,
     get_primary_edge_model_dir,
 )
+from app.core.readiness import InferenceReadinessTracker
+from app.core.result_cache import InferenceResultCache, ResultCacheKey, image_digest, result_cache_ttl
 from app.core.speedmon import SpeedMonitor
 from app.core.utils import ModelInfoBase, ModelInfoWithBinary, parse_model_info
 from app.profiling.context import get_current_span, get_current_tracer, trace_span
 
 logger = logging.getLogger(__name__)
 
-# Simple TTL cache for is_edge_inference_ready checks to avoid having to re-check every time a request is processed.
-# This will be process-specific, so each edge-endpoint worker will have its own cache instance.
-ttl_cache = TTLCache(maxsize=128, ttl=5)
+# Where the model updater records which model versions a detector's inference pods serve, in its model directory.
+SERVING_MODELS_FILE = "serving_models.json"
+# The record of the download of a model version's binary, in its version directory (see `download_to_file`).
+MODEL_DOWNLOAD_RECORD_FILE = "download.json"
+# Model binaries that no model version links to anymore, and abandoned partial downloads, are kept for this long. This
+# also keeps a binary that was just downloaded or reused around until it is linked into its new model version.
+MODEL_BLOB_GC_GRACE_S = float(os.environ.get("MODEL_BLOB_GC_GRACE_S", 60 * 60))
+# How long the current model KSUIDs read from the model repository are reused before being read again.
+MODEL_KEYS_CACHE_TTL_S = float(os.environ.get("MODEL_KEYS_CACHE_TTL_S", 5))
 
 
-@cached(ttl_cache)
-def is_edge_inference_ready(inference_client_url: str) -> bool:
-    model_ready_url = f"http://{inference_client_url}/health/ready"
-    try:
-        response = requests.get(model_ready_url, timeout=2)
-        return response.status_code == status.HTTP_200_OK
-    except requests.exceptions.RequestException as e:
-        logger.warning(f"Failed to connect to {model_ready_url}: {e}")
-        return False
-
-
-def submit_image_for_inference(inference_client_url: str, image_bytes: bytes, content_type: str) -> dict:
-    inference_url = f"http://{inference_client_url}/infer"
+async def submit_image_for_inference(
+    clients: InferenceClientPool, inference_client_url: str, image_bytes: bytes, content_type: str
+) -> dict:
+    """Submit an image to an inference service over its pooled keep-alive connection and return the JSON response."""
     headers = {"Content-Type": content_type}
     tracer = get_current_tracer()
     span = get_current_span()
@@ -55,27 +63,31 @@ def submit_image_for_inference(inference_client_url: str, image_bytes: bytes, co
         headers["X-GL-Trace-Id"] = tracer.trace_id
         headers["X-GL-Parent-Span-Id"] = span.span_id
     try:
-        logger.debug(f"Submitting image for inference to {inference_url}")
-        response = requests.post(inference_url, data=image_bytes, headers=headers)
+        logger.debug(f"Submitting image for inference to {inference_client_url}")
+        response = await clients.post(inference_client_url, "/infer", content=image_bytes, headers=headers)
         if response.status_code != status.HTTP_200_OK:
             logger.error(f"Inference server returned an error: {response.status_code} - {response.text}")
             raise RuntimeError(f"Inference server error: {response.status_code} - {response.text}")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to connect to {inference_url}: {e}")
+        return serialization.loads(response.content)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to connect to http://{inference_client_url}/infer: {e}")
         raise RuntimeError("Failed to submit image for inference") from e
 
 
 @trace_span
-def _submit_primary_inference(inference_client_url: str, image_bytes: bytes, content_type: str) -> dict:
+async def _submit_primary_inference(
+    clients: InferenceClientPool, inference_client_url: str, image_bytes: bytes, content_type: str
+) -> dict:
     """Wrapper around submit_image_for_inference for separate tracing of primary inference."""
-    return submit_image_for_inference(inference_client_url, image_bytes, content_type)
+    return await submit_image_for_inference(clients, inference_client_url, image_bytes, content_type)
 
 
 @trace_span
-def _submit_oodd_inference(inference_client_url: str, image_bytes: bytes, content_type: str) -> dict:
+async def _submit_oodd_inference(
+    clients: InferenceClientPool, inference_client_url: str, image_bytes: bytes, content_type: str
+) -> dict:
     """Wrapper around submit_image_for_inference for separate tracing of OODD inference."""
-    return submit_image_for_inference(inference_client_url, image_bytes, content_type)
+    return await submit_image_for_inference(clients, inference_client_url, image_bytes, content_type)
 
 
 @trace_span
@@ -264,30 +276,57 @@ class EdgeInferenceManager:
         self.verbose = verbose
         self.speedmon = SpeedMonitor()
         self.separate_oodd_inference = separate_oodd_inference
-        self.last_escalation_times: dict[str, float | None] = {}
+        # Last escalation time per detector, shared with the other edge-endpoint workers.
+        self.escalation_cooldowns = EscalationCooldownTable()
+        # Keep-alive connection pools to the inference services, shared by all requests handled by this worker.
+        self.inference_clients = InferenceClientPool()
+        # Bounds and measures concurrent requests to each inference service, and fans out primary + OODD calls.
+        self.dispatcher = InferenceDispatcher()
+        # Results for byte-identical images, for detectors that opt in to result caching.
+        self.result_cache = InferenceResultCache()
+        # Reuses the last result for frames of an unchanged scene, for detectors that opt in to the change gate.
+        self.change_gate = ChangeGate()
+        self._model_keys_cache: TTLCache = TTLCache(maxsize=1024, ttl=MODEL_KEYS_CACHE_TTL_S)
+        self._serving_model_keys_cache: TTLCache = TTLCache(maxsize=1024, ttl=MODEL_KEYS_CACHE_TTL_S)
+        # The serving model keys last seen per detector, to notice when a new model version has been rolled out.
+        self._last_serving_model_keys: dict[str, tuple[str | None, str | None]] = {}
+        # Probes the inference services in the background, so checking readiness never blocks a request.
+        self.readiness = InferenceReadinessTracker(self.inference_clients, self._configured_inference_services)
+        # Collects concurrent requests into batched calls for detectors that opt in to batching, to the inference
+        # services that advertise batched inference in their health probes.
+        self.batcher = InferenceBatcher(
+            self.inference_clients, self.dispatcher, submit_image_for_inference, self.readiness.max_batch_size
+        )
+
+    def _inference_service_urls(self, detector_id: str) -> list[str]:
+        """The `<host>:<port>` of the primary (and, if separate, OODD) inference service for a detector."""
+        urls = [get_edge_inference_service_name(detector_id) + ":8000"]
+        if self.separate_oodd_inference:
+            urls.append(get_edge_inference_service_name(detector_id, is_oodd=True) + ":8000")
+        return urls
+
+    def _configured_inference_services(self) -> list[str]:
+        """The inference services of every detector in the active edge config."""
+        return [
+            url
+            for detector in EdgeConfigManager.active().detectors
+            for url in self._inference_service_urls(detector.detector_id)
+        ]
 
     @trace_span
     def inference_is_available(self, detector_id: str) -> bool:
-        """Check whether inference pods for this detector are ready to serve."""
-        primary_url = get_edge_inference_service_name(detector_id) + ":8000"
-        oodd_url = (
-            get_edge_inference_service_name(detector_id, is_oodd=True) + ":8000"
-            if self.separate_oodd_inference
-            else None
-        )
-
-        ready = is_edge_inference_ready(primary_url) and (
-            not self.separate_oodd_inference or is_edge_inference_ready(oodd_url)
-        )
-        if not ready:
-            logger.debug(
-                f"Edge inference server and/or OODD inference server is not ready. {primary_url=}, {oodd_url=}"
-            )
+        """
+        Check whether inference pods for this detector are ready to serve, according to the background readiness
+        tracker. Never blocks. A detector checked for the first time is reported as not ready until it's been probed.
+        """
+        not_ready = [url for url in self._inference_service_urls(detector_id) if not self.readiness.is_ready(url)]
+        if not_ready:
+            logger.debug(f"Edge inference server and/or OODD inference server is not ready. {not_ready=}")
             return False
         return True
 
     @trace_span
-    def run_inference(self, detector_id: str, image_bytes: bytes, content_type: str, mode: ModeEnum) -> dict:
+    async def run_inference(self, detector_id: str, image_bytes: bytes, content_type: str, mode: ModeEnum) -> dict:
         """
         Submit an image to the inference server, route to a specific model, and return the results.
         Args:
@@ -308,24 +347,20 @@ class EdgeInferenceManager:
         logger.info(f"Submitting image to edge inference service. {detector_id=}")
         start_time = time.perf_counter()
 
+        batch_settings = BatchSettings.from_inference_config(
+            EdgeConfigManager.detector_config(EdgeConfigManager.active(), detector_id)
+        )
         primary_url = get_edge_inference_service_name(detector_id) + ":8000"
         if self.separate_oodd_inference:
             oodd_url = get_edge_inference_service_name(detector_id, is_oodd=True) + ":8000"
-            with ThreadPoolExecutor(max_workers=2) as executor:
-                if get_current_tracer() is not None:
-                    ctx_primary = contextvars.copy_context()
-                    ctx_oodd = contextvars.copy_context()
-                    f_primary = executor.submit(
-                        ctx_primary.run, _submit_primary_inference, primary_url, image_bytes, content_type
-                    )
-                    f_oodd = executor.submit(ctx_oodd.run, _submit_oodd_inference, oodd_url, image_bytes, content_type)
-                else:
-                    f_primary = executor.submit(submit_image_for_inference, primary_url, image_bytes, content_type)
-                    f_oodd = executor.submit(submit_image_for_inference, oodd_url, image_bytes, content_type)
-                response = f_primary.result()
-                oodd_response = f_oodd.result()
+            response, oodd_response = await self.dispatcher.fan_out(
+                self._submit(_submit_primary_inference, primary_url, image_bytes, content_type, batch_settings),
+                self._submit(_submit_oodd_inference, oodd_url, image_bytes, content_type, batch_settings),
+            )
         else:
-            response = _submit_primary_inference(primary_url, image_bytes, content_type)
+            response = await self._submit(
+                _submit_primary_inference, primary_url, image_bytes, content_type, batch_settings
+            )
             oodd_response = None
 
         output_dict = get_inference_result(response, oodd_response, mode)
@@ -333,28 +368,107 @@ class EdgeInferenceManager:
         # Stamp the currently-loaded MLB KSUIDs into the result so that
         # edge_result.mlb_key (and oodd_mlb_key when applicable) is persisted
         # on Posicheck.metadata.edge_result for cloud-vs-edge debugging.
-        # Wrapped in try/except: stamping is purely diagnostic and must never
+        mlb_key, oodd_mlb_key = self.loaded_model_keys(detector_id)
+        if mlb_key:
+            output_dict["mlb_key"] = mlb_key
+        if oodd_mlb_key and oodd_response is not None:
+            output_dict["oodd_mlb_key"] = oodd_mlb_key
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.speedmon.update(detector_id, elapsed_ms)
+        fps = self.speedmon.average_fps(detector_id)
+
+        logger.debug(f"Inference server response for request {detector_id=}: {output_dict}.")
+        logger.info(f"Recent-average FPS for {detector_id=}: {fps:.2f}")
+        return output_dict
+
+    def loaded_model_keys(self, detector_id: str) -> tuple[str | None, str | None]:
+        """
+        Return the MLB KSUIDs of the current primary and OODD models in the model repository for a detector. The OODD
+        key is None when OODD inference isn't separate. Lookups are memoized for a few seconds to keep file reads off
+        the request path.
+        """
+        keys = self._model_keys_cache.get(detector_id)
+        if keys is not None:
+            return keys
+
+        # Wrapped in try/except: the keys are used for diagnostics and cache keys, and must never
         # take down inference if the model_id.txt is missing or unreadable.
+        mlb_key = oodd_mlb_key = None
         try:
             primary_version = get_current_model_version(self.MODEL_REPOSITORY, detector_id)
             primary_dir = get_primary_edge_model_dir(self.MODEL_REPOSITORY, detector_id)
-            if mlb_key := get_current_model_ksuid(primary_dir, primary_version):
-                output_dict["mlb_key"] = mlb_key
-            if self.separate_oodd_inference and oodd_response is not None:
+            mlb_key = get_current_model_ksuid(primary_dir, primary_version)
+            if self.separate_oodd_inference:
                 oodd_version = get_current_model_version(self.MODEL_REPOSITORY, detector_id, is_oodd=True)
                 oodd_dir = get_oodd_model_dir(self.MODEL_REPOSITORY, detector_id)
-                if oodd_mlb_key := get_current_model_ksuid(oodd_dir, oodd_version):
-                    output_dict["oodd_mlb_key"] = oodd_mlb_key
+                oodd_mlb_key = get_current_model_ksuid(oodd_dir, oodd_version)
         except Exception as e:
-            logger.warning(f"Could not stamp MLB key into edge_result: {e}")
+            logger.warning(f"Could not read the current MLB keys for {detector_id}: {e}")
 
-        elapsed_ms = (time.perf_counter() - start_time) * 1000
-        self.speedmon.update(detector_id, elapsed_ms)
-        fps = self.speedmon.average_fps(detector_id)
+        keys = (mlb_key, oodd_mlb_key)
+        self._model_keys_cache[detector_id] = keys
+        return keys
 
-        logger.debug(f"Inference server response for request {detector_id=}: {output_dict}.")
-        logger.info(f"Recent-average FPS for {detector_id=}: {fps:.2f}")
-        return output_dict
+    def serving_model_keys(self, detector_id: str) -> tuple[str | None, str | None]:
+        """
+        Return the MLB KSUIDs of the primary and OODD models that the detector's inference pods are serving, as
+        recorded by the model updater once a rollout has completed (see `record_serving_models`). Unlike
+        `loaded_model_keys`, these don't switch to a new model version until every pod serves it. Both are None if no
+        rollout has been recorded yet. Lookups are memoized for a few seconds to keep file reads off the request path.
+
+        When the keys change, the detector's cached results are dropped, since they can't be served anymore.
+        """
+        keys = self._serving_model_keys_cache.get(detector_id)
+        if keys is not None:
+            return keys
+
+        keys = get_serving_model_keys(self.MODEL_REPOSITORY, detector_id)
+        self._serving_model_keys_cache[detector_id] = keys
+        previous_keys = self._last_serving_model_keys.get(detector_id)
+        self._last_serving_model_keys[detector_id] = keys
+        if previous_keys is not None and previous_keys != keys:
+            logger.info(f"New models rolled out for {detector_id}: {keys}. Dropping cached results.")
+            self.result_cache.invalidate_detector(detector_id)
+        return keys
+
+    def result_cache_key(
+        self, detector_id: str, image_bytes: bytes, inference_config: InferenceConfig | None
+    ) -> ResultCacheKey | None:
+        """
+        Return the result cache key for an image, or None if result caching is disabled for the detector or the
+        model version its inference pods serve can't be determined.
+        """
+        if result_cache_ttl(inference_config) is None:
+            return None
+        mlb_key, oodd_mlb_key = self.serving_model_keys(detector_id)
+        if mlb_key is None:
+            return None
+        return (detector_id, image_digest(image_bytes), mlb_key, oodd_mlb_key)
+
+    async def _submit(
+        self,
+        submit_fn: Callable[..., Awaitable[dict]],
+        inference_client_url: str,
+        image_bytes: bytes,
+        content_type: str,
+        batch_settings: BatchSettings | None,
+    ) -> dict:
+        """Send one image to an inference service, through the batcher when batching is enabled for the detector."""
+        if batch_settings is not None:
+            return await self.batcher.submit(inference_client_url, image_bytes, content_type, batch_settings)
+        return await self.dispatcher.dispatch(
+            inference_client_url, submit_fn, self.inference_clients, inference_client_url, image_bytes, content_type
+        )
+
+    async def aclose(self) -> None:
+        """
+        Stop the readiness probes, and close the pooled connections to the inference services and the shared escalation
+        cooldown table.
+        """
+        await self.readiness.stop()
+        await self.inference_clients.aclose()
+        self.escalation_cooldowns.close()
 
     def update_models_if_available(self, detector_id: str) -> bool:
         """
@@ -389,13 +503,21 @@ class EdgeInferenceManager:
             return False
 
         logger.info(f"At least one new model is available for {detector_id}, saving models to repository.")
+        edge_model_file, edge_model_download = (
+            get_model_file(edge_model_info, self.MODEL_REPOSITORY) if update_primary_model else (None, None)
+        )
+        oodd_model_file, oodd_model_download = (
+            get_model_file(oodd_model_info, self.MODEL_REPOSITORY) if update_oodd_model else (None, None)
+        )
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=get_model_buffer(edge_model_info) if update_primary_model else None,
+            edge_model_file=edge_model_file,
             edge_model_info=edge_model_info if update_primary_model else None,
-            oodd_model_buffer=get_model_buffer(oodd_model_info) if update_oodd_model else None,
+            oodd_model_file=oodd_model_file,
             oodd_model_info=oodd_model_info if update_oodd_model else None,
             repository_root=self.MODEL_REPOSITORY,
+            edge_model_download=edge_model_download,
+            oodd_model_download=oodd_model_download,
         )
         return True
 
@@ -403,6 +525,7 @@ class EdgeInferenceManager:
     def escalation_cooldown_complete(self, detector_id: str, edge_config: EdgeEndpointConfig) -> bool:
         """
         Check if the time since the last escalation is long enough ago that we should escalate again.
+        Escalation times are shared by all edge-endpoint workers, so only one of them escalates per cooldown window.
         The minimum time between escalations for a detector is set by the `min_time_between_escalations` field in the
         detector's config. If the field is not set, we use the default defined in EdgeEndpointConfig.
 
@@ -417,13 +540,7 @@ class EdgeInferenceManager:
         min_time_between_escalations = (
             det_config.min_time_between_escalations if det_config else InferenceConfig().min_time_between_escalations
         )
-        last_escalation_time = self.last_escalation_times.get(detector_id)
-
-        if last_escalation_time is None or (time.time() - last_escalation_time) > min_time_between_escalations:
-            self.last_escalation_times[detector_id] = time.time()
-            return True
-
-        return False
+        return self.escalation_cooldowns.try_start_cooldown(detector_id, min_time_between_escalations)
 
 
 def fetch_model_info(detector_id: str, api_token: Optional[str] = None) -> tuple[ModelInfoBase, ModelInfoBase]:
@@ -457,35 +574,95 @@ def fetch_model_info(detector_id: str, api_token: Optional[str] = None) -> tuple
     raise HTTPException(status_code=response.status_code, detail=exception_string)
 
 
-def get_model_buffer(model_info: ModelInfoBase) -> bytes | None:
-    if isinstance(model_info, ModelInfoWithBinary):
-        logger.info(f"New model binary available ({model_info.model_binary_id}), attempting to update model.")
-        model_buffer = get_object_using_presigned_url(model_info.model_binary_url)
-    else:
+# Held while a model binary is downloaded or garbage-collected, so that concurrent model checks for detectors that share
+# a binary download it only once, and a binary is never deleted while it is being fetched.
+_model_blob_locks: dict[str, threading.Lock] = {}
+_model_blob_locks_lock = threading.Lock()
+
+
+def _model_blob_lock(blob_name: str) -> threading.Lock:
+    with _model_blob_locks_lock:
+        return _model_blob_locks.setdefault(blob_name, threading.Lock())
+
+
+def get_model_blob_path(repository_root: str, model_binary_id: str) -> str:
+    """The path of a model binary in the blob store, which is keyed by the binary's ID."""
+    return os.path.join(get_model_blob_dir(repository_root), f"{re.sub(r'[^A-Za-z0-9_-]', '_', model_binary_id)}.buf")
+
+
+def get_model_file(model_info: ModelInfoBase, repository_root: str) -> tuple[str | None, dict | None]:
+    """
+    Get the model binary, if there is one, into the blob store and return its path, to be linked into a new model
+    version by `save_model_to_repository`, and the record of its download (see `download_to_file`). The binary is only
+    downloaded if no detector has fetched it before, e.g. for copies of a detector or an OODD model shared across
+    detectors, in which case there is no download record.
+    """
+    if not isinstance(model_info, ModelInfoWithBinary):
         logger.info("Got a pipeline config but no model binary, attempting to update model.")
-        model_buffer = None
+        return None, None
 
-    return model_buffer
+    blob_path = get_model_blob_path(repository_root, model_info.model_binary_id)
+    with _model_blob_lock(os.path.basename(blob_path)):
+        if os.path.exists(blob_path):
+            logger.info(f"Model binary {model_info.model_binary_id} is already in the blob store, skipping download.")
+            # Restart the grace period, so that the binary isn't garbage-collected before it is linked
+            os.utime(blob_path)
+            return blob_path, None
 
+        logger.info(f"New model binary available ({model_info.model_binary_id}), attempting to update model.")
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # An interrupted download is resumed by the next attempt for the same binary
+        download = download_to_file(model_info.model_binary_url, blob_path)
+    return blob_path, download
 
-def get_object_using_presigned_url(presigned_url: str) -> bytes:
-    response = requests.get(presigned_url, timeout=10)
-    if response.status_code == status.HTTP_200_OK:
-        return response.content
-    else:
-        raise HTTPException(status_code=response.status_code, detail=f"Failed to retrieve data from {presigned_url}.")
+
+def collect_unused_model_blobs(repository_root: str) -> None:
+    """
+    Delete the model binaries that no model version links to anymore, and partial downloads that haven't made progress,
+    once they are older than MODEL_BLOB_GC_GRACE_S. A binary's hard-link count tells how many versions use it.
+    """
+    blob_dir = get_model_blob_dir(repository_root)
+    if not os.path.isdir(blob_dir):
+        return
+
+    num_deleted, bytes_deleted = 0, 0
+    cutoff = time.time() - MODEL_BLOB_GC_GRACE_S
+    for file_name in os.listdir(blob_dir):
+        path = os.path.join(blob_dir, file_name)
+        lock = _model_blob_lock(file_name.removesuffix(".part"))
+        if not lock.acquire(blocking=False):
+            continue  # Being downloaded
+        try:
+            stat = os.stat(path)
+            is_unused = file_name.endswith(".part") or stat.st_nlink == 1
+            if not is_unused or stat.st_mtime > cutoff:
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        finally:
+            lock.release()
+        num_deleted += 1
+        bytes_deleted += stat.st_size
+
+    if num_deleted:
+        logger.info(f"Deleted {num_deleted} unused model binaries ({bytes_deleted / 1e6:.1f} MB) from the blob store")
 
 
 def save_models_to_repository(
     detector_id: str,
-    edge_model_buffer: Optional[bytes],
+    edge_model_file: Optional[str],
     edge_model_info: Optional[ModelInfoBase],
-    oodd_model_buffer: Optional[bytes],
+    oodd_model_file: Optional[str],
     oodd_model_info: Optional[ModelInfoBase],
     repository_root: str,
+    edge_model_download: Optional[dict] = None,
+    oodd_model_download: Optional[dict] = None,
 ) -> None:
     """
-    Make new version-directory for the model and save the new version of the model and pipeline config to it.
+    Make new version-directory for the model and save the new version of the model and pipeline config to it. The
+    model binaries (see `get_model_file`) are hard-linked into it from the blob store, and the records of their
+    downloads are saved with them.
     Old model repository directory structure:
     ```
     <model-repository-path>/
@@ -504,6 +681,8 @@ def save_models_to_repository(
             <oodd>/
                 <version>/
                     <model-definition-files (e.g. model.buf, pipeline_config.yaml, etc)>
+        .blobs/
+            <model-binary-id>.buf
     ```
     """
     if edge_model_info:
@@ -511,39 +690,61 @@ def save_models_to_repository(
         os.makedirs(edge_model_dir, exist_ok=True)
         old_primary_model_version = get_current_model_version(repository_root, detector_id)
         new_primary_model_version = 1 if old_primary_model_version is None else old_primary_model_version + 1
-        save_model_to_repository(edge_model_buffer, edge_model_info, edge_model_dir, new_primary_model_version)
+        save_model_to_repository(
+            edge_model_file, edge_model_info, edge_model_dir, new_primary_model_version, edge_model_download
+        )
 
     if oodd_model_info:
         oodd_model_dir = get_oodd_model_dir(repository_root, detector_id)
         os.makedirs(oodd_model_dir, exist_ok=True)
         old_oodd_model_version = get_current_model_version(repository_root, detector_id, is_oodd=True)
         new_oodd_model_version = 1 if old_oodd_model_version is None else old_oodd_model_version + 1
-        save_model_to_repository(oodd_model_buffer, oodd_model_info, oodd_model_dir, new_oodd_model_version)
+        save_model_to_repository(
+            oodd_model_file, oodd_model_info, oodd_model_dir, new_oodd_model_version, oodd_model_download
+        )
 
 
 def save_model_to_repository(
-    model_buffer: bytes, model_info: ModelInfoBase, model_dir: str, model_version: int
+    model_file: Optional[str],
+    model_info: ModelInfoBase,
+    model_dir: str,
+    model_version: int,
+    download: Optional[dict] = None,
 ) -> None:
+    """
+    Save a new model version. Its files are written to a staging directory, which is renamed to the version directory
+    once complete, so the inference server never loads a partially written version.
+    """
     model_version_dir = os.path.join(model_dir, str(model_version))
-    os.makedirs(model_version_dir, exist_ok=True)
+    staging_dir = os.path.join(model_dir, f".{model_version}.staging")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
 
-    if model_buffer:
-        with open(os.path.join(model_version_dir, "model.buf"), "wb") as f:
-            f.write(model_buffer)
+    if model_file:
+        try:
+            os.link(model_file, os.path.join(staging_dir, "model.buf"))
+        except OSError as e:
+            # E.g. a filesystem without hard links. The binary then takes up space twice.
+            logger.warning(f"Could not hard-link {model_file} into model version {model_version}, copying it: {e}")
+            shutil.copyfile(model_file, os.path.join(staging_dir, "model.buf"))
 
     safe_loaded = yaml.safe_load(model_info.pipeline_config)
-    with open(os.path.join(model_version_dir, "pipeline_config.yaml"), "w") as f:
+    with open(os.path.join(staging_dir, "pipeline_config.yaml"), "w") as f:
         if isinstance(safe_loaded, (dict, list)):
             yaml.safe_dump(safe_loaded, f, sort_keys=False, allow_unicode=True)
         else:
             f.write(model_info.pipeline_config)  # avoids the YAML document end marker for strings (...)
-    with open(os.path.join(model_version_dir, "predictor_metadata.json"), "w") as f:
+    with open(os.path.join(staging_dir, "predictor_metadata.json"), "w") as f:
         f.write(model_info.predictor_metadata)
 
     if isinstance(model_info, ModelInfoWithBinary):
-        with open(os.path.join(model_version_dir, "model_id.txt"), "w") as f:
+        with open(os.path.join(staging_dir, "model_id.txt"), "w") as f:
             f.write(model_info.model_binary_id)
+    if download is not None:
+        with open(os.path.join(staging_dir, MODEL_DOWNLOAD_RECORD_FILE), "w") as f:
+            json.dump(download, f)
 
+    os.rename(staging_dir, model_version_dir)
     logger.info(
         f"Wrote new model version {model_version} to {model_dir}"
         + (f" with model binary id {model_info.model_binary_id}" if isinstance(model_info, ModelInfoWithBinary) else "")
@@ -605,12 +806,10 @@ def get_all_model_versions(model_dir: str) -> list:
     """
     if not os.path.exists(model_dir):
         return []
-    # explicitly exclude primary and oodd directories so we can search for the latest version in the old or new model
-    # repository format
+    # only numbered directories are versions, which excludes the primary and oodd directories (so we can search for the
+    # latest version in the old or new model repository format) and versions still being written
     model_versions = [
-        int(d)
-        for d in os.listdir(model_dir)
-        if os.path.isdir(os.path.join(model_dir, d)) and not d.startswith("primary") and not d.startswith("oodd")
+        int(d) for d in os.listdir(model_dir) if d.isdigit() and os.path.isdir(os.path.join(model_dir, d))
     ]
     return model_versions
 
@@ -628,6 +827,58 @@ def get_current_model_ksuid(model_dir: str, model_version: int) -> Optional[str]
         return None
 
 
+def record_serving_models(
+    repository_root: str, detector_id: str, primary_version: Optional[int], oodd_version: Optional[int]
+) -> None:
+    """
+    Record the MLB KSUIDs of the model versions that a detector's inference deployments serve, once their rollout has
+    completed. Saving a new model version to the repository doesn't change what the running pods serve, so the edge
+    endpoint workers key cached results by this record (see `get_serving_model_keys`) rather than by the newest
+    model_id.txt.
+    """
+    keys = {
+        "mlb_key": (
+            get_current_model_ksuid(get_primary_edge_model_dir(repository_root, detector_id), primary_version)
+            if primary_version is not None
+            else None
+        ),
+        "oodd_mlb_key": (
+            get_current_model_ksuid(get_oodd_model_dir(repository_root, detector_id), oodd_version)
+            if oodd_version is not None
+            else None
+        ),
+    }
+    if get_serving_model_keys(repository_root, detector_id) == (keys["mlb_key"], keys["oodd_mlb_key"]):
+        return
+
+    detector_models_dir = get_detector_models_dir(repository_root, detector_id)
+    os.makedirs(detector_models_dir, exist_ok=True)
+    # Write to a temporary file and rename it into place, so readers never see a partially written file.
+    temp_path = os.path.join(detector_models_dir, f"{SERVING_MODELS_FILE}.tmp")
+    with open(temp_path, "w") as f:
+        json.dump(keys, f)
+    os.replace(temp_path, os.path.join(detector_models_dir, SERVING_MODELS_FILE))
+    logger.info(f"Recorded the models served for {detector_id}: {keys}")
+
+
+def get_serving_model_keys(repository_root: str, detector_id: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Return the MLB KSUIDs of the primary and OODD models that a detector's inference pods serve, as recorded by
+    `record_serving_models`, or (None, None) if nothing has been recorded.
+    """
+    path = os.path.join(get_detector_models_dir(repository_root, detector_id), SERVING_MODELS_FILE)
+    try:
+        with open(path, "r") as f:
+            keys = json.load(f)
+        return keys.get("mlb_key"), keys.get("oodd_mlb_key")
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        # The keys are only used for cache keys, so a bad record must never take down inference.
+        logger.warning(f"Could not read the served model keys for {detector_id}: {e}")
+        return None, None
+
+
 def get_current_pipeline_config(model_dir: str, model_version: int) -> dict | None:
     """Read the pipeline_config.yaml file in the current model version directory."""
     config_file = os.path.join(model_dir, str(model_version), "pipeline_config.yaml")
@@ -639,6 +890,16 @@ def get_current_pipeline_config(model_dir: str, model_version: int) -> dict | No
         return None
 
 
+def get_model_download_record(model_dir: str, model_version: int) -> dict | None:
+    """Return the record of the download of the model version's binary, or None if it wasn't downloaded for this
+    version (e.g. it was already in the blob store)."""
+    try:
+        with open(os.path.join(model_dir, str(model_version), MODEL_DOWNLOAD_RECORD_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
 def get_predictor_metadata(model_dir: str, model_version: int) -> dict | None:
     """Read the predictor_metadata.json file in the current model version directory and return the result as a dictionary."""
     metadata_file = os.path.join(model_dir, str(model_version), "predictor_metadata.json")
@@ -711,6 +972,8 @@ def delete_old_model_versions(detector_id: str, repository_root: str, num_to_kee
     for v in oodd_versions_to_delete:
         delete_model_version(oodd_model_dir, v)
 
+    collect_unused_model_blobs(repository_root)
+
 
 def delete_model_version(model_dir: str, model_version: int) -> None:
     """Recursively delete directory model_dir/model_version"""
@@ -0,0 +1,192 @@
+"""Escalation cooldown state shared by all edge-endpoint worker processes.
+
+The edge logic server runs several uvicorn workers, and each request for a detector can land on any of them. If every
+worker kept its own "last escalation" timestamps, a detector could be escalated once per worker within a single
+`min_time_between_escalations` window. Instead, the timestamps live in a small fixed-size table in a memory-mapped file
+(in /dev/shm when available) that every worker maps.
+
+Each slot holds a detector ID and the time of its last escalation. Slots are found by hashing the detector ID with
+linear probing, and a slot is never reassigned once claimed, so each worker caches the slot index per detector.
+
+The hot path, a detector still cooling down, is a lock-free read of one aligned 8-byte timestamp. Only when the
+cooldown may have elapsed (or the detector has no slot yet) is an exclusive `flock` taken, so that exactly one worker
+wins the check-and-set and escalates.
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from app.core.file_paths import SHARED_STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+ESCALATION_COOLDOWN_TABLE_PATH = os.environ.get(
+    "ESCALATION_COOLDOWN_TABLE_PATH", os.path.join(SHARED_STATE_DIR, "edge-endpoint-escalation-cooldowns")
+)
+ESCALATION_COOLDOWN_TABLE_SLOTS = int(os.environ.get("ESCALATION_COOLDOWN_TABLE_SLOTS", 1024))
+
+_MAGIC = b"GLEC"
+_HEADER = struct.Struct("<4sI")  # magic, number of slots
+_HEADER_SIZE = 64
+_KEY_SIZE = 56  # Detector IDs are ~31 bytes
+_TIMESTAMP = struct.Struct("<d")
+_SLOT_SIZE = _KEY_SIZE + _TIMESTAMP.size  # 64 bytes, so every timestamp is 8-byte aligned
+_NEVER = 0.0
+
+
+class EscalationCooldownTable:
+    """A table of last escalation times per detector, shared by every process that opens the same path."""
+
+    def __init__(
+        self, path: str = ESCALATION_COOLDOWN_TABLE_PATH, slots: int = ESCALATION_COOLDOWN_TABLE_SLOTS
+    ) -> None:
+        self.path = path
+        self._fd: int | None = None
+        try:
+            self._fd, self._slots = self._open_shared(path, slots)
+            self._mmap = mmap.mmap(self._fd, _HEADER_SIZE + self._slots * _SLOT_SIZE)
+        except OSError as e:
+            logger.warning(
+                f"Could not open the shared escalation cooldown table at {path}: {e}. "
+                "Escalation cooldowns will be tracked per worker process."
+            )
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._slots = slots
+            self._mmap = mmap.mmap(-1, _HEADER_SIZE + slots * _SLOT_SIZE)
+        # Slot index per detector ID. Claimed slots are never reassigned, so this never goes stale.
+        self._slot_index: dict[str, int] = {}
+        # flock only excludes other processes, so threads of this process also take a regular lock.
+        self._thread_lock = threading.Lock()
+        # Detectors that didn't fit into a full table fall back to per-process tracking.
+        self._overflow: dict[str, float] = {}
+
+    @staticmethod
+    def _open_shared(path: str, slots: int) -> tuple[int, int]:
+        """Open (and if needed create and initialize) the table file. Returns the fd and the table's slot count."""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                header = os.pread(fd, _HEADER.size, 0)
+                if len(header) == _HEADER.size:
+                    magic, existing_slots = _HEADER.unpack(header)
+                    expected_size = _HEADER_SIZE + existing_slots * _SLOT_SIZE
+                    if magic == _MAGIC and existing_slots > 0 and os.fstat(fd).st_size >= expected_size:
+                        # Another worker already created the table. Its size wins over our own setting.
+                        return fd, existing_slots
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, _HEADER_SIZE + slots * _SLOT_SIZE)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, slots), 0)
+                return fd, slots
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except OSError:
+            os.close(fd)
+            raise
+
+    def _encode_key(self, detector_id: str) -> bytes:
+        key = detector_id.encode()
+        if len(key) > _KEY_SIZE:
+            # Keep keys fixed-size. A digest of an oversized ID is just as unique for our purposes.
+            key = b"#" + hashlib.blake2b(key, digest_size=24).hexdigest().encode()
+        return key.ljust(_KEY_SIZE, b"\0")
+
+    def _find_slot(self, detector_id: str, claim: bool) -> int | None:
+        """Find the detector's slot, optionally claiming an empty one. Claiming must happen under the lock."""
+        index = self._slot_index.get(detector_id)
+        if index is not None:
+            return index
+        key = self._encode_key(detector_id)
+        start = zlib.crc32(key) % self._slots
+        for probe in range(self._slots):
+            index = (start + probe) % self._slots
+            offset = _HEADER_SIZE + index * _SLOT_SIZE
+            slot_key = self._mmap[offset : offset + _KEY_SIZE]
+            if slot_key == key:
+                self._slot_index[detector_id] = index
+                return index
+            if slot_key[0] == 0:
+                if not claim:
+                    return None
+                # Write the timestamp before the key, so a lock-free reader never sees a key with a stale timestamp.
+                _TIMESTAMP.pack_into(self._mmap, offset + _KEY_SIZE, _NEVER)
+                self._mmap[offset : offset + _KEY_SIZE] = key
+                self._slot_index[detector_id] = index
+                return index
+        return None
+
+    def _timestamp_offset(self, index: int) -> int:
+        return _HEADER_SIZE + index * _SLOT_SIZE + _KEY_SIZE
+
+    def last_escalation_time(self, detector_id: str) -> float | None:
+        """The time of the detector's last escalation according to any worker, or None if it was never escalated."""
+        index = self._find_slot(detector_id, claim=False)
+        if index is None:
+            return self._overflow.get(detector_id)
+        last = _TIMESTAMP.unpack_from(self._mmap, self._timestamp_offset(index))[0]
+        return None if last == _NEVER else last
+
+    def try_start_cooldown(self, detector_id: str, min_time_between_escalations: float) -> bool:
+        """
+        Atomically check whether the detector's cooldown has elapsed and, if so, start a new one.
+
+        Returns True (and records the current time as the last escalation) if the detector hasn't been escalated by
+        any worker in the last `min_time_between_escalations` seconds, False otherwise. When several workers race,
+        exactly one of them gets True.
+        """
+        last = self.last_escalation_time(detector_id)
+        if last is not None and (time.time() - last) <= min_time_between_escalations:
+            return False
+
+        self._lock()
+        try:
+            index = self._find_slot(detector_id, claim=True)
+            if index is None:
+                return self._try_start_overflow_cooldown(detector_id, min_time_between_escalations)
+            offset = self._timestamp_offset(index)
+            # Re-check under the lock, another worker may have escalated since the lock-free read.
+            last = _TIMESTAMP.unpack_from(self._mmap, offset)[0]
+            now = time.time()
+            if last != _NEVER and (now - last) <= min_time_between_escalations:
+                return False
+            _TIMESTAMP.pack_into(self._mmap, offset, now)
+            return True
+        finally:
+            self._unlock()
+
+    def _try_start_overflow_cooldown(self, detector_id: str, min_time_between_escalations: float) -> bool:
+        if not self._overflow:
+            logger.warning(
+                f"The shared escalation cooldown table at {self.path} is full ({self._slots} slots). "
+                "Additional detectors will have their escalation cooldowns tracked per worker process."
+            )
+        last = self._overflow.get(detector_id)
+        if last is None or (time.time() - last) > min_time_between_escalations:
+            self._overflow[detector_id] = time.time()
+            return True
+        return False
+
+    def _lock(self) -> None:
+        self._thread_lock.acquire()
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def _unlock(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def close(self) -> None:
+        self._mmap.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 ACTIVE_EDGE_CONFIG_PATH = "/opt/groundlight/edge/config/active-edge-config.yaml"
 HELM_CONFIGMAP_PATH = "/etc/groundlight/edge-config/edge-config.yaml"
 INFERENCE_DEPLOYMENT_TEMPLATE_PATH = "/etc/groundlight/inference-deployment/inference_deployment_template.yaml"
@@ -16,3 +19,7 @@ MODEL_REPOSITORY_PATH = "/opt/groundlight/edge/serving/model-repo"
 # Path to the database log file. This will contain all SQL queries executed by the ORM.
 DATABASE_ORM_LOG_FILE = "sqlalchemy.log"
 DATABASE_ORM_LOG_FILE_SIZE = 10_000_000  # 10 MB
+
+# Directory for state shared by the edge-endpoint worker processes. /dev/shm is memory-backed, so nothing written there
+# touches the disk.
+SHARED_STATE_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
@@ -0,0 +1,211 @@
+"""Opt-in micro-batching of concurrent inference requests to the same inference service.
+
+When several cameras submit frames for the same detector at once, sending each frame as its own `/infer` call leaves
+the inference pod running single-image forward passes back to back. With batching enabled for a detector, requests
+that arrive within a short window are collected per inference service and sent as one multi-image `/infer-batch`
+call, and each waiting request gets its own image's response.
+
+Only inference servers that advertise batched inference are sent batches. A server advertises it in the JSON body of
+its `/health/ready` response as `max_batch_size`, the most images it takes in one call (see
+`app.core.readiness`). Requests to servers that don't, or that haven't been probed yet, are sent as single-image
+`/infer` calls right away, without waiting for a batch window.
+
+The `/infer-batch` contract:
+
+- Request: a multipart/form-data POST with one `images` part per image, in order, at most `max_batch_size` of them.
+- Response: a JSON object `{"responses": [...]}` with one entry per image, in the same order. Each entry is exactly
+  the body `/infer` returns for that image on its own.
+
+Batching happens within a single edge endpoint worker process.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable
+
+import httpx
+from fastapi import status
+from groundlight.edge import InferenceConfig
+
+from app.core import serialization
+from app.core.inference_client import InferenceClientPool
+from app.core.inference_dispatch import InferenceDispatcher
+from app.profiling.context import get_current_span, get_current_tracer, trace_span
+
+logger = logging.getLogger(__name__)
+
+# Used when a detector enables batching but doesn't set `inference_batch_window_ms`.
+DEFAULT_INFERENCE_BATCH_WINDOW_MS = float(os.environ.get("DEFAULT_INFERENCE_BATCH_WINDOW_MS", 5))
+
+SingleImageSubmitFn = Callable[[InferenceClientPool, str, bytes, str], Awaitable[dict]]
+
+
+class BatchSettings:
+    """Batching settings for a single detector."""
+
+    def __init__(self, max_batch_size: int, window_ms: float) -> None:
+        self.max_batch_size = max_batch_size
+        self.window_ms = window_ms
+
+    @classmethod
+    def from_inference_config(cls, config: InferenceConfig | None) -> "BatchSettings | None":
+        """Read the batching settings from a detector's inference config. Returns None if batching is disabled."""
+        max_batch_size = getattr(config, "max_inference_batch_size", None)
+        if max_batch_size is None or max_batch_size <= 1:
+            return None
+        window_ms = getattr(config, "inference_batch_window_ms", None)
+        return cls(
+            max_batch_size=max_batch_size,
+            window_ms=window_ms if window_ms is not None else DEFAULT_INFERENCE_BATCH_WINDOW_MS,
+        )
+
+
+@trace_span
+async def submit_images_for_batch_inference(
+    clients: InferenceClientPool, inference_client_url: str, images: list[tuple[bytes, str]]
+) -> list[dict]:
+    """Submit several images to an inference service in one `/infer-batch` call and return one response per image.
+
+    Raises:
+        RuntimeError: If the request failed, or the response doesn't hold one response per image.
+    """
+    headers = {}
+    tracer = get_current_tracer()
+    span = get_current_span()
+    if tracer is not None and span is not None:
+        headers["X-GL-Trace-Id"] = tracer.trace_id
+        headers["X-GL-Parent-Span-Id"] = span.span_id
+    files = [
+        ("images", (f"image_{i}", image_bytes, content_type)) for i, (image_bytes, content_type) in enumerate(images)
+    ]
+    try:
+        logger.debug(f"Submitting a batch of {len(images)} images for inference to {inference_client_url}")
+        response = await clients.request("POST", inference_client_url, "/infer-batch", files=files, headers=headers)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to connect to http://{inference_client_url}/infer-batch: {e}")
+        raise RuntimeError("Failed to submit images for batch inference") from e
+
+    if response.status_code != status.HTTP_200_OK:
+        logger.error(f"Inference server returned an error: {response.status_code} - {response.text}")
+        raise RuntimeError(f"Inference server error: {response.status_code} - {response.text}")
+    batch_response = serialization.loads(response.content)
+    responses = batch_response.get("responses") if isinstance(batch_response, dict) else None
+    if not isinstance(responses, list) or len(responses) != len(images):
+        raise RuntimeError(f"Inference server returned a batch response that doesn't match the {len(images)} images")
+    return responses
+
+
+class _PendingBatch:
+    def __init__(self, timer: asyncio.TimerHandle) -> None:
+        self.timer = timer
+        self.items: list[tuple[bytes, str, asyncio.Future]] = []
+
+
+class _ServiceBatchStats:
+    def __init__(self) -> None:
+        self.batches = 0
+        self.images = 0
+        self.max_batch_size = 0
+        # Images sent one at a time because the service doesn't advertise batched inference
+        self.unbatched_images = 0
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": self.images / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "unbatched_images": self.unbatched_images,
+        }
+
+
+class InferenceBatcher:
+    """Collects concurrent single-image inference requests per inference service into batched calls."""
+
+    def __init__(
+        self,
+        clients: InferenceClientPool,
+        dispatcher: InferenceDispatcher,
+        single_image_submit: SingleImageSubmitFn,
+        service_max_batch_size: Callable[[str], int],
+    ) -> None:
+        """
+        Args:
+            clients: The pooled clients used to reach the inference services.
+            dispatcher: Bounds concurrent calls to each inference service. A batch counts as one call.
+            single_image_submit: Used for batches of one and for services that don't advertise batched inference.
+            service_max_batch_size: Returns the most images a service advertises it takes in one `/infer-batch`
+                call, 1 if it doesn't support batched inference (see `InferenceReadinessTracker.max_batch_size`).
+        """
+        self._clients = clients
+        self._dispatcher = dispatcher
+        self._single_image_submit = single_image_submit
+        self._service_max_batch_size = service_max_batch_size
+        self._pending: dict[str, _PendingBatch] = {}
+        self._in_flight_batches: set[asyncio.Task] = set()
+        self._stats: dict[str, _ServiceBatchStats] = {}
+
+    async def submit(self, service_url: str, image_bytes: bytes, content_type: str, settings: BatchSettings) -> dict:
+        """Queue an image for the next batch to `service_url` and wait for its single-image response."""
+        max_batch_size = min(settings.max_batch_size, self._service_max_batch_size(service_url))
+        if max_batch_size <= 1:
+            self._stats.setdefault(service_url, _ServiceBatchStats()).unbatched_images += 1
+            return await self._dispatcher.dispatch(
+                service_url, self._single_image_submit, self._clients, service_url, image_bytes, content_type
+            )
+
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(service_url)
+        if batch is None:
+            batch = _PendingBatch(loop.call_later(settings.window_ms / 1000, self._flush, service_url))
+            self._pending[service_url] = batch
+        result: asyncio.Future = loop.create_future()
+        batch.items.append((image_bytes, content_type, result))
+        if len(batch.items) >= max_batch_size:
+            self._flush(service_url)
+        return await result
+
+    def _flush(self, service_url: str) -> None:
+        batch = self._pending.pop(service_url, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._send(service_url, batch.items))
+        self._in_flight_batches.add(task)
+        task.add_done_callback(self._in_flight_batches.discard)
+
+    async def _send(self, service_url: str, items: list[tuple[bytes, str, asyncio.Future]]) -> None:
+        stats = self._stats.setdefault(service_url, _ServiceBatchStats())
+        try:
+            if len(items) == 1:
+                image_bytes, content_type, _ = items[0]
+                responses = [
+                    await self._dispatcher.dispatch(
+                        service_url, self._single_image_submit, self._clients, service_url, image_bytes, content_type
+                    )
+                ]
+            else:
+                responses = await self._dispatcher.dispatch(
+                    service_url,
+                    submit_images_for_batch_inference,
+                    self._clients,
+                    service_url,
+                    [(image_bytes, content_type) for image_bytes, content_type, _ in items],
+                )
+        except Exception as e:
+            for _, _, result in items:
+                if not result.done():
+                    result.set_exception(e)
+            return
+
+        stats.batches += 1
+        stats.images += len(items)
+        stats.max_batch_size = max(stats.max_batch_size, len(items))
+        for (_, _, result), response in zip(items, responses):
+            if not result.done():  # The waiting request may have been cancelled
+                result.set_result(response)
+
+    def stats(self) -> dict:
+        """Per-service batching stats for this worker process."""
+        return {"services": {service_url: stats.stats() for service_url, stats in self._stats.items()}}
@@ -0,0 +1,154 @@
+"""Long-lived, pooled HTTP clients for talking to the inference pods.
+
+Every inference service (one per detector model) gets its own keep-alive connection pool, owned by the
+EdgeInferenceManager for the lifetime of the worker process. Steady-state requests reuse an already-open TCP
+connection instead of paying for a handshake and a cluster-DNS lookup of `inference-service-*-<det>` on every frame.
+
+Service names are additionally resolved through a small TTL cache. Requests are sent to the resolved address with
+the original `Host` header, so a new connection (after a keep-alive expiry or a pod restart) still doesn't need a DNS
+round trip. A connection failure evicts the cached address, so a recreated Service with a new ClusterIP is picked up
+on the next request.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_CLIENT_MAX_CONNECTIONS = int(os.environ.get("INFERENCE_CLIENT_MAX_CONNECTIONS", 32))
+INFERENCE_CLIENT_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("INFERENCE_CLIENT_MAX_KEEPALIVE_CONNECTIONS", 16))
+INFERENCE_CLIENT_KEEPALIVE_EXPIRY_S = float(os.environ.get("INFERENCE_CLIENT_KEEPALIVE_EXPIRY_S", 60))
+INFERENCE_CLIENT_CONNECT_TIMEOUT_S = float(os.environ.get("INFERENCE_CLIENT_CONNECT_TIMEOUT_S", 2))
+# Generous on purpose: the first request after a rollout can include lazy model initialization on the server.
+INFERENCE_CLIENT_READ_TIMEOUT_S = float(os.environ.get("INFERENCE_CLIENT_READ_TIMEOUT_S", 30))
+INFERENCE_CLIENT_DNS_TTL_S = float(os.environ.get("INFERENCE_CLIENT_DNS_TTL_S", 30))
+
+
+class InferenceClientPool:
+    """A set of per-service `httpx.AsyncClient`s with keep-alive and cached name resolution.
+
+    Clients are created lazily on first use, so constructing a pool is free for processes (like the model updater)
+    that never send inference requests. A pool must only be used from a single event loop.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        max_connections: int = INFERENCE_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = INFERENCE_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry_s: float = INFERENCE_CLIENT_KEEPALIVE_EXPIRY_S,
+        connect_timeout_s: float = INFERENCE_CLIENT_CONNECT_TIMEOUT_S,
+        read_timeout_s: float = INFERENCE_CLIENT_READ_TIMEOUT_S,
+        dns_ttl_s: float = INFERENCE_CLIENT_DNS_TTL_S,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        """
+        Args:
+            max_connections: Maximum number of concurrent connections to a single inference service.
+            max_keepalive_connections: Maximum number of idle connections kept open per inference service.
+            keepalive_expiry_s: How long an idle connection is kept open before it is closed.
+            connect_timeout_s: Timeout for establishing a new connection.
+            read_timeout_s: Timeout for receiving the inference response.
+            dns_ttl_s: How long a resolved service address is reused. 0 disables the name cache.
+            transport: Optional transport override, used to point the pool at an in-process server in tests.
+        """
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_s,
+        )
+        self._timeout = httpx.Timeout(read_timeout_s, connect=connect_timeout_s)
+        self._dns_ttl_s = dns_ttl_s
+        self._transport = transport
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._resolved: dict[str, tuple[str, float]] = {}  # host -> (address, expiry on the monotonic clock)
+
+    def _client_for(self, service_url: str) -> httpx.AsyncClient:
+        client = self._clients.get(service_url)
+        if client is None:
+            client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout, transport=self._transport)
+            self._clients[service_url] = client
+        return client
+
+    async def _resolve(self, host: str, port: int) -> str:
+        """Return a cached address for `host`, resolving it without blocking the event loop when needed."""
+        if self._dns_ttl_s <= 0:
+            return host
+        cached = self._resolved.get(host)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._resolved[host] = (address, now + self._dns_ttl_s)
+        return address
+
+    def forget_address(self, service_url: str) -> None:
+        """Drop the cached address for a service, forcing the next request to resolve it again."""
+        self._resolved.pop(service_url.rsplit(":", 1)[0], None)
+
+    async def request(  # noqa: PLR0913
+        self,
+        method: str,
+        service_url: str,
+        path: str,
+        content: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: float | None = None,
+        files: list[tuple[str, tuple[str, bytes, str]]] | None = None,
+    ) -> httpx.Response:
+        """Send a request to `http://<service_url><path>` over the service's pooled client.
+
+        Args:
+            method: HTTP method, e.g. "POST".
+            service_url: The `<host>:<port>` of the inference service.
+            path: The request path, e.g. "/infer".
+            content: Optional request body.
+            headers: Optional request headers.
+            timeout: Optional per-request timeout overriding the pool's read timeout.
+            files: Optional multipart parts as `(field_name, (filename, data, content_type))`, sent instead of
+                `content`.
+        Raises:
+            httpx.HTTPError: If the request could not be completed.
+        """
+        host, _, port_str = service_url.partition(":")
+        port = int(port_str) if port_str else 80
+        try:
+            address = await self._resolve(host, port)
+        except socket.gaierror as e:
+            raise httpx.ConnectError(f"Could not resolve {host}: {e}") from e
+
+        # getaddrinfo can return an IPv6 address, which must be bracketed in a URL
+        url_host = f"[{address}]" if ":" in address else address
+        request_headers = dict(headers) if headers else {}
+        request_headers["Host"] = service_url
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        try:
+            return await self._client_for(service_url).request(
+                method,
+                f"http://{url_host}:{port}{path}",
+                content=content,
+                files=files,
+                headers=request_headers,
+                **kwargs,
+            )
+        except httpx.ConnectError:
+            self.forget_address(service_url)
+            raise
+
+    async def post(
+        self, service_url: str, path: str, content: bytes, headers: dict[str, str] | None = None
+    ) -> httpx.Response:
+        """POST `content` to the given path on an inference service."""
+        return await self.request("POST", service_url, path, content=content, headers=headers)
+
+    async def aclose(self) -> None:
+        """Close every pooled connection. The pool can still be used afterwards; clients are recreated lazily."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
@@ -0,0 +1,110 @@
+"""Persistent dispatch layer for requests to the inference services.
+
+The dispatcher lives as long as the EdgeInferenceManager and bounds how many requests each worker process sends to a
+single inference service at once. Requests beyond the bound wait on an asyncio semaphore rather than opening more
+connections, and the time spent waiting is recorded so queueing in front of the inference pods is observable.
+
+Fan-out (e.g. primary + OODD for the same image) runs the calls as concurrent tasks on the event loop. Tasks copy the
+caller's context, so tracing spans created inside the dispatched calls are parented to the caller's span.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_DISPATCH_MAX_CONCURRENCY_PER_SERVICE = int(
+    os.environ.get("INFERENCE_DISPATCH_MAX_CONCURRENCY_PER_SERVICE", 8)
+)
+# Number of recent queue-wait samples kept per service for the average / p95 reported in stats.
+QUEUE_WAIT_WINDOW_SIZE = 200
+
+
+class _ServiceDispatchState:
+    """Concurrency bound and counters for a single inference service."""
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_wait_ms = 0.0
+        self.recent_queue_waits_ms: deque[float] = deque(maxlen=QUEUE_WAIT_WINDOW_SIZE)
+
+    def stats(self) -> dict:
+        waits = sorted(self.recent_queue_waits_ms)
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_queue_wait_ms": sum(waits) / len(waits) if waits else 0.0,
+            "p95_queue_wait_ms": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait_ms,
+        }
+
+
+class InferenceDispatcher:
+    """Bounds and measures concurrent calls to each inference service from this worker process."""
+
+    def __init__(self, max_concurrency_per_service: int = INFERENCE_DISPATCH_MAX_CONCURRENCY_PER_SERVICE) -> None:
+        self.max_concurrency_per_service = max_concurrency_per_service
+        self._services: dict[str, _ServiceDispatchState] = {}
+
+    def _state_for(self, service_url: str) -> _ServiceDispatchState:
+        state = self._services.get(service_url)
+        if state is None:
+            state = _ServiceDispatchState(self.max_concurrency_per_service)
+            self._services[service_url] = state
+        return state
+
+    async def dispatch(self, service_url: str, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """Await `fn(*args)` once a slot for `service_url` is free, recording queue wait and outcome."""
+        state = self._state_for(service_url)
+        state.queued += 1
+        enqueued_at = time.perf_counter()
+        try:
+            await state.semaphore.acquire()
+        finally:
+            state.queued -= 1
+
+        wait_ms = (time.perf_counter() - enqueued_at) * 1000
+        state.recent_queue_waits_ms.append(wait_ms)
+        state.max_queue_wait_ms = max(state.max_queue_wait_ms, wait_ms)
+        state.in_flight += 1
+        try:
+            result = await fn(*args)
+        except Exception:
+            state.failed += 1
+            raise
+        else:
+            state.completed += 1
+            return result
+        finally:
+            state.in_flight -= 1
+            state.semaphore.release()
+
+    @staticmethod
+    async def fan_out(*calls: Awaitable[Any]) -> list[Any]:
+        """Run several calls (e.g. `dispatch(...)` coroutines) concurrently and return their results in order.
+
+        If any call fails, the first exception is raised after all calls have finished, so no request is left
+        running in the background holding a connection slot.
+        """
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def stats(self) -> dict:
+        """Per-service queueing stats for this worker process."""
+        return {
+            "max_concurrency_per_service": self.max_concurrency_per_service,
+            "services": {service_url: state.stats() for service_url, state in self._services.items()},
+        }
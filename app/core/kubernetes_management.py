@@ -1,12 +1,12 @@
 import logging
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 
 import yaml
 from fastapi import status
 from kubernetes import client as kube_client
 from kubernetes import config
-from kubernetes.client import V1Deployment
+from kubernetes.client import V1Deployment, V1Pod
 
 from .edge_inference import get_current_model_version
 from .file_paths import INFERENCE_DEPLOYMENT_TEMPLATE_PATH, KUBERNETES_NAMESPACE_PATH, MODEL_REPOSITORY_PATH
@@ -14,6 +14,10 @@ from .naming import get_edge_inference_deployment_name, get_edge_inference_model
 
 logger = logging.getLogger(__name__)
 
+# The pod condition that inference pods are gated on (see `readinessGates` in the inference deployment template). The
+# model updater sets it once it has warmed up a pod, see `app.model_updater.warmup`.
+INFERENCE_POD_WARMED_UP_CONDITION = "groundlight.dev/warmed-up"
+
 
 class InferenceDeploymentManager:
     def __init__(self) -> None:
@@ -145,6 +149,20 @@ class InferenceDeploymentManager:
                 return None
             raise e
 
+    def get_deployed_model_version(self, deployment_name: str) -> int | None:
+        """
+        Returns the model version in the deployment's pod template, i.e. the version its pods serve once its rollout
+        is complete. Returns None if the deployment doesn't exist or has no model version annotation.
+        """
+        deployment = self.get_inference_deployment(deployment_name)
+        if deployment is None:
+            return None
+        annotations = deployment.spec.template.metadata.annotations or {}
+        try:
+            return int(annotations.get("groundlight.dev/model-version"))
+        except (TypeError, ValueError):
+            return None
+
     def get_or_create_inference_deployment(self, detector_id: str, is_oodd: bool = False) -> V1Deployment | None:
         """
         Retrieves an existing inference deployment for the specified detector ID, or creates a new
@@ -250,6 +268,41 @@ class InferenceDeploymentManager:
             return False
         return True
 
+    def get_pods_to_warm_up(self, detector_id: str, is_oodd: bool = False) -> list[V1Pod]:
+        """
+        Return the pods of the inference deployment whose containers are ready but that haven't been marked as warmed
+        up, so they don't receive traffic yet.
+        """
+        instance_label = f"instance-{get_edge_inference_model_name(detector_id, is_oodd).replace('/', '-')}"
+        label_str = f"app=inference-server,instance={instance_label}"
+        pod_list = self._core_kube_client.list_namespaced_pod(
+            namespace=self._target_namespace, label_selector=label_str
+        )
+        pods = []
+        for pod in pod_list.items:
+            if pod.metadata.deletion_timestamp is not None or not pod.status or not pod.status.pod_ip:
+                continue
+            conditions = {c.type: c.status for c in pod.status.conditions or []}
+            if (
+                conditions.get("ContainersReady") == "True"
+                and conditions.get(INFERENCE_POD_WARMED_UP_CONDITION) != "True"
+            ):
+                pods.append(pod)
+        return pods
+
+    def mark_pod_warmed_up(self, pod_name: str) -> None:
+        """Set the pod's warmed-up condition, which lets it pass its readiness gate and receive traffic."""
+        condition = {
+            "type": INFERENCE_POD_WARMED_UP_CONDITION,
+            "status": "True",
+            "lastTransitionTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        # A strategic merge patch, which merges the condition into the pod's conditions by type
+        self._core_kube_client.patch_namespaced_pod_status(
+            name=pod_name, namespace=self._target_namespace, body={"status": {"conditions": [condition]}}
+        )
+        logger.info(f"Marked inference pod {pod_name} as warmed up")
+
     def is_inference_deployment_rollout_complete(self, deployment_name: str) -> bool:
         """
         Checks if the rollout of the inference deployment for a given deployment name is complete.
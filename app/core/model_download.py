@@ -0,0 +1,215 @@
+"""Streaming, resumable downloads of model binaries.
+
+Model binaries can be hundreds of MB, and edge devices are often on slow or flaky links. Downloads are streamed to a
+partial file in chunks, so memory use doesn't grow with the model size. If the connection drops, the download resumes
+where it stopped with an HTTP Range request, both within a call and in a later call for the same partial file (e.g. on
+the model updater's next check, with a fresh presigned URL).
+
+A finished download is verified against the object's size and, when the object store provides one, its MD5 checksum
+(the ETag of S3 objects uploaded in a single part and not encrypted with KMS or customer keys), before being renamed
+into place. Its size, throughput and number of resumes are returned as a record, which is kept with the model version
+(see `app.core.edge_inference.get_model_download_record`).
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+import requests
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+MODEL_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Seconds to wait for the connection, and for each chunk of the response
+MODEL_DOWNLOAD_TIMEOUT_S = 10
+MODEL_DOWNLOAD_MAX_ATTEMPTS = int(os.environ.get("MODEL_DOWNLOAD_MAX_ATTEMPTS", 5))
+MODEL_DOWNLOAD_RETRY_DELAY_S = 1.0
+MODEL_DOWNLOAD_PROGRESS_INTERVAL_S = 10.0
+
+_CONTENT_RANGE_RE = re.compile(r"bytes (?:\d+-\d+|\*)/(\d+)")
+_MD5_ETAG_RE = re.compile(r'^"?([0-9a-f]{32})"?$')
+
+
+class DownloadVerificationError(Exception):
+    """The downloaded file doesn't match the object's checksum."""
+
+
+class _IncompleteDownloadError(Exception):
+    """The download stopped before the end of the object, or the partial file doesn't belong to the object."""
+
+
+# Failures after which the download is resumed
+_RESUMABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+    _IncompleteDownloadError,
+)
+
+
+class _Progress:
+    """Logs the progress and throughput of a download, across the attempts of a `download_to_file` call."""
+
+    def __init__(self, url_for_logs: str) -> None:
+        self.url_for_logs = url_for_logs
+        # Bytes received by this call, and bytes in the partial file
+        self.downloaded = 0
+        self.have = 0
+        self.total: int | None = None
+        # How many times the download continued from a partial file
+        self.resumes = 0
+        self.started = time.monotonic()
+        self._last_logged = self.started
+
+    def start_attempt(self, offset: int) -> None:
+        self.have = offset
+        if offset:
+            self.resumes += 1
+
+    def add(self, num_bytes: int) -> None:
+        self.downloaded += num_bytes
+        self.have += num_bytes
+        now = time.monotonic()
+        if now - self._last_logged >= MODEL_DOWNLOAD_PROGRESS_INTERVAL_S:
+            self._last_logged = now
+            logger.info(f"Downloading {self.url_for_logs}: {self}")
+
+    def throughput_bytes_per_s(self) -> float:
+        return self.downloaded / max(time.monotonic() - self.started, 1e-6)
+
+    def record(self) -> dict:
+        return {
+            "size_bytes": self.have,
+            "downloaded_bytes": self.downloaded,
+            "download_s": time.monotonic() - self.started,
+            "throughput_bytes_per_s": self.throughput_bytes_per_s(),
+            "resumes": self.resumes,
+            "downloaded_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def __str__(self) -> str:
+        of_total = f" of {self.total / 1e6:.1f} MB ({100 * self.have / self.total:.0f}%)" if self.total else ""
+        return f"{self.have / 1e6:.1f} MB{of_total} at {self.throughput_bytes_per_s() / 1e6:.2f} MB/s"
+
+
+def download_to_file(url: str, path: str) -> dict:
+    """
+    Download the object at `url` to `path`, streaming it through `<path>.part`. Resumes from an existing partial file,
+    retrying up to MODEL_DOWNLOAD_MAX_ATTEMPTS times when the connection fails. The partial file is kept when giving up,
+    so that the next call for the same path resumes it. Only use the same path for the same object.
+
+    Returns a record of the download: the object's size, the bytes received by this call, how long it took, the average
+    throughput (including the time spent waiting to retry) and how many times it resumed from a partial file.
+
+    Raises HTTPException if the object store refuses the request, and DownloadVerificationError if the download doesn't
+    match the object's checksum, in which case it starts over on the next call.
+    """
+    partial_path = f"{path}.part"
+    # Presigned URLs carry credentials in the query string
+    url_for_logs = url.split("?", 1)[0]
+    progress = _Progress(url_for_logs)
+    for attempt in range(1, MODEL_DOWNLOAD_MAX_ATTEMPTS + 1):
+        try:
+            headers = _download_to_partial_file(url, partial_path, progress)
+            break
+        except _RESUMABLE_ERRORS as e:
+            if attempt == MODEL_DOWNLOAD_MAX_ATTEMPTS:
+                raise
+            delay_s = MODEL_DOWNLOAD_RETRY_DELAY_S * 2 ** (attempt - 1)
+            logger.warning(
+                f"Download of {url_for_logs} interrupted at {_size(partial_path) / 1e6:.1f} MB "
+                f"(attempt {attempt}/{MODEL_DOWNLOAD_MAX_ATTEMPTS}): {e}. Resuming in {delay_s:.0f}s."
+            )
+            time.sleep(delay_s)
+
+    _verify_checksum(partial_path, headers)
+    os.replace(partial_path, path)
+    return progress.record()
+
+
+def _download_to_partial_file(
+    url: str, partial_path: str, progress: _Progress
+) -> requests.structures.CaseInsensitiveDict:
+    """Download the rest of the object into the partial file. Returns the response headers."""
+    url_for_logs = progress.url_for_logs
+    offset = _size(partial_path)
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, timeout=MODEL_DOWNLOAD_TIMEOUT_S) as response:
+        if response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+            total = _total_size(response)
+            if total == offset:
+                logger.info(f"Download of {url_for_logs} was already complete.")
+                progress.start_attempt(offset)
+                return _object_headers(url)
+            # The partial file doesn't belong to this object, start over
+            os.remove(partial_path)
+            raise _IncompleteDownloadError(
+                f"Partial download of {offset} bytes doesn't match the object of {total} bytes"
+            )
+        if response.status_code == status.HTTP_200_OK:
+            # The server sent the whole object, e.g. because it doesn't support ranges
+            offset = 0
+        elif response.status_code != status.HTTP_206_PARTIAL_CONTENT:
+            raise HTTPException(
+                status_code=response.status_code, detail=f"Failed to retrieve data from {url_for_logs}."
+            )
+
+        progress.start_attempt(offset)
+        progress.total = _total_size(response)
+        if offset:
+            logger.info(f"Resuming download of {url_for_logs} at {offset / 1e6:.1f} MB")
+        with open(partial_path, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            f.truncate()
+            for chunk in response.iter_content(chunk_size=MODEL_DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                progress.add(len(chunk))
+
+    size = _size(partial_path)
+    if progress.total is not None and size != progress.total:
+        raise _IncompleteDownloadError(f"Got {size} of {progress.total} bytes")
+    logger.info(f"Downloaded {url_for_logs}: {progress}")
+    return response.headers
+
+
+def _object_headers(url: str) -> requests.structures.CaseInsensitiveDict:
+    """The headers describing the object, which a 416 response doesn't include."""
+    with requests.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=MODEL_DOWNLOAD_TIMEOUT_S) as response:
+        return response.headers
+
+
+def _total_size(response: requests.Response) -> int | None:
+    """The size of the whole object, from a partial response's Content-Range or a full response's Content-Length."""
+    content_range = response.headers.get("Content-Range")
+    if content_range:
+        match = _CONTENT_RANGE_RE.fullmatch(content_range.strip())
+        return int(match.group(1)) if match else None
+    if response.status_code == status.HTTP_200_OK and "Content-Length" in response.headers:
+        return int(response.headers["Content-Length"])
+    return None
+
+
+def _verify_checksum(path: str, headers: requests.structures.CaseInsensitiveDict) -> None:
+    """Compare the file's MD5 to the object's ETag, if the ETag is known to be the MD5 of the object."""
+    match = _MD5_ETAG_RE.match(headers.get("ETag", ""))
+    encryption = headers.get("x-amz-server-side-encryption")
+    if not match or encryption not in (None, "AES256") or "x-amz-server-side-encryption-customer-algorithm" in headers:
+        return
+    md5 = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as f:
+        while chunk := f.read(MODEL_DOWNLOAD_CHUNK_SIZE):
+            md5.update(chunk)
+    if md5.hexdigest() != match.group(1):
+        os.remove(path)
+        raise DownloadVerificationError(f"Downloaded file has MD5 {md5.hexdigest()}, expected {match.group(1)}")
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
@@ -26,3 +26,8 @@ def get_primary_edge_model_dir(repository_root: str, detector_id: str) -> str:
 
 def get_oodd_model_dir(repository_root: str, detector_id: str) -> str:
     return os.path.join(get_detector_models_dir(repository_root, detector_id), "oodd")
+
+
+def get_model_blob_dir(repository_root: str) -> str:
+    """The store of model binaries that model versions hard-link to, shared by all detectors."""
+    return os.path.join(repository_root, ".blobs")
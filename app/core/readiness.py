@@ -0,0 +1,238 @@
+"""Background readiness tracking for the inference services.
+
+Whether a detector's inference pods are ready used to be checked on the request path with a blocking health probe
+whenever a short per-process cache entry expired, so every few seconds one request per detector (in every worker)
+paid for a health check round trip, or up to the probe timeout when a pod was down.
+
+Instead, each worker runs a background task that probes `/health/ready` on every known inference service
+concurrently, over the same pooled connections used for inference, and keeps the results in a table. Request paths
+only read that table, which never blocks. Services are known from the active edge config, and a service asked about
+for the first time is reported as not ready and probed right away.
+
+The tracker also records readiness transitions (with how long the previous state lasted) and, per service, how long
+it took from first being tracked to first becoming ready.
+
+An inference server that accepts batched inference advertises it in the JSON body of its ready response, as
+`max_batch_size` (the most images it takes in one `/infer-batch` call, see `app.core.inference_batching`). The tracker
+keeps the value from each service's last successful probe.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, Iterable
+
+import httpx
+from fastapi import status
+
+from app.core.inference_client import InferenceClientPool
+
+logger = logging.getLogger(__name__)
+
+READINESS_PROBE_INTERVAL_S = float(os.environ.get("READINESS_PROBE_INTERVAL_S", 5))
+READINESS_PROBE_TIMEOUT_S = float(os.environ.get("READINESS_PROBE_TIMEOUT_S", 2))
+READINESS_MAX_TRANSITION_EVENTS = 100
+
+
+class _ServiceReadiness:
+    def __init__(self, tracked_at: float) -> None:
+        self.ready = False
+        self.tracked_at = tracked_at
+        self.changed_at = tracked_at
+        self.last_probe_at: float | None = None
+        self.last_probe_latency_s: float | None = None
+        self.last_error: str | None = None
+        self.transitions = 0
+        self.time_to_first_ready_s: float | None = None
+        self.max_batch_size = 1
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "changed_at": self.changed_at,
+            "last_probe_at": self.last_probe_at,
+            "last_probe_latency_ms": (
+                self.last_probe_latency_s * 1000 if self.last_probe_latency_s is not None else None
+            ),
+            "last_error": self.last_error,
+            "transitions": self.transitions,
+            "time_to_first_ready_s": self.time_to_first_ready_s,
+            "max_batch_size": self.max_batch_size,
+        }
+
+
+class InferenceReadinessTracker:
+    """Keeps a table of inference service readiness, refreshed by a background task on the worker's event loop."""
+
+    def __init__(
+        self,
+        clients: InferenceClientPool,
+        discover_services: Callable[[], Iterable[str]],
+        probe_interval_s: float = READINESS_PROBE_INTERVAL_S,
+        probe_timeout_s: float = READINESS_PROBE_TIMEOUT_S,
+    ) -> None:
+        """
+        Args:
+            clients: The pool used to send the health probes.
+            discover_services: Returns the `<host>:<port>` of every inference service that should be tracked, e.g.
+                the services of the detectors in the active edge config. Called before each round of probes.
+            probe_interval_s: Time between rounds of probes.
+            probe_timeout_s: Timeout for a single health probe.
+        """
+        self._clients = clients
+        self._discover_services = discover_services
+        self._probe_interval_s = probe_interval_s
+        self._probe_timeout_s = probe_timeout_s
+        self._services: dict[str, _ServiceReadiness] = {}
+        self._transitions: deque[dict] = deque(maxlen=READINESS_MAX_TRANSITION_EVENTS)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        # Set when a new service is asked about, so the background task probes it without waiting for the next round.
+        self._wakeup_requested = False
+        self._sleeper: asyncio.Future | None = None
+        self._next_full_round = 0.0
+
+    def is_ready(self, service_url: str) -> bool:
+        """Whether the service passed its last health probe. Never blocks. Unknown services start being tracked."""
+        state = self._services.get(service_url)
+        if state is None:
+            self._track(service_url)
+            if self._loop is not None:
+                # May be called from a threadpool thread
+                self._loop.call_soon_threadsafe(self._wake_up)
+            return False
+        return state.ready
+
+    def max_batch_size(self, service_url: str) -> int:
+        """The most images the service takes in one `/infer-batch` call, as advertised in its last successful health
+        probe. 1 if it doesn't support batched inference or hasn't been probed yet."""
+        state = self._services.get(service_url)
+        return state.max_batch_size if state is not None else 1
+
+    def _track(self, service_url: str) -> None:
+        if service_url not in self._services:
+            self._services[service_url] = _ServiceReadiness(time.time())
+
+    def _wake_up(self) -> None:
+        self._wakeup_requested = True
+        if self._sleeper is not None and not self._sleeper.done():
+            self._sleeper.set_result(None)
+
+    def start(self) -> None:
+        """Start probing in the background on the running event loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background probing. Returns once the background task has finished."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake_up()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        self._loop = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup_requested = False
+            try:
+                if time.monotonic() >= self._next_full_round:
+                    await self.probe_all()
+                else:
+                    # Woken up early because a new service was asked about, so only probe services never probed.
+                    await self._probe(
+                        [url for url, state in list(self._services.items()) if state.last_probe_at is None]
+                    )
+            except Exception as e:
+                logger.error(f"Inference readiness probes failed: {e}", exc_info=True)
+            if not self._wakeup_requested and not self._stopping:
+                await self._sleep_until_woken(self._next_full_round - time.monotonic())
+
+    async def _sleep_until_woken(self, timeout_s: float) -> None:
+        """Sleep for up to `timeout_s`, returning early when a new service needs probing."""
+        sleeper = self._loop.create_future()
+        timer = self._loop.call_later(max(0.0, timeout_s), lambda: sleeper.done() or sleeper.set_result(None))
+        self._sleeper = sleeper
+        try:
+            await sleeper
+        finally:
+            timer.cancel()
+            self._sleeper = None
+
+    async def probe_all(self) -> None:
+        """Probe every known service once, concurrently."""
+        try:
+            for service_url in self._discover_services():
+                self._track(service_url)
+        except Exception as e:
+            logger.error(f"Could not determine which inference services to probe: {e}", exc_info=True)
+        self._next_full_round = time.monotonic() + self._probe_interval_s
+        await self._probe(list(self._services))
+
+    async def _probe(self, service_urls: list[str]) -> None:
+        await asyncio.gather(*(self._probe_service(service_url) for service_url in service_urls))
+
+    async def _probe_service(self, service_url: str) -> None:
+        started = time.monotonic()
+        try:
+            response = await self._clients.request("GET", service_url, "/health/ready", timeout=self._probe_timeout_s)
+            ready = response.status_code == status.HTTP_200_OK
+            error = None if ready else f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            ready, error = False, f"{type(e).__name__}: {e}"
+        state = self._services[service_url]
+        if ready:
+            state.max_batch_size = _advertised_max_batch_size(response)
+        state.last_probe_latency_s = time.monotonic() - started
+        state.last_probe_at = time.time()
+        state.last_error = error
+        if ready != state.ready:
+            self._record_transition(service_url, state, ready)
+
+    def _record_transition(self, service_url: str, state: _ServiceReadiness, ready: bool) -> None:
+        now = time.time()
+        event = {
+            "service": service_url,
+            "ready": ready,
+            "at": now,
+            "previous_state_duration_s": now - state.changed_at,
+        }
+        if ready and state.time_to_first_ready_s is None:
+            state.time_to_first_ready_s = now - state.tracked_at
+        state.ready = ready
+        state.changed_at = now
+        state.transitions += 1
+        self._transitions.append(event)
+        logger.info(
+            f"Inference service {service_url} is now {'ready' if ready else 'not ready'} "
+            f"(was {'not ready' if ready else 'ready'} for {event['previous_state_duration_s']:.1f}s)"
+            + (f": {state.last_error}" if state.last_error else "")
+        )
+
+    def stats(self) -> dict:
+        """Readiness per service and the most recent readiness transitions, as seen by this worker process."""
+        return {
+            "probe_interval_s": self._probe_interval_s,
+            "services": {service_url: state.stats() for service_url, state in list(self._services.items())},
+            "recent_transitions": list(self._transitions),
+        }
+
+
+def _advertised_max_batch_size(response: httpx.Response) -> int:
+    """The `max_batch_size` in a ready response's JSON body, or 1 if it isn't there."""
+    try:
+        body = response.json()
+    except ValueError:
+        return 1
+    max_batch_size = body.get("max_batch_size") if isinstance(body, dict) else None
+    return max_batch_size if isinstance(max_batch_size, int) and max_batch_size > 1 else 1
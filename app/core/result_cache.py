@@ -0,0 +1,77 @@
+"""Opt-in cache of edge inference results for byte-identical images.
+
+Fixed cameras watching a static scene, and SDK retries, often send exactly the same JPEG bytes again. For detectors
+that set `duplicate_result_cache_ttl`, the edge inference result for an image is cached under a hash of the image
+bytes plus the KSUIDs of the primary and OODD models that the detector's inference pods serve. Those are recorded by
+the model updater once a rollout has completed, not when a new model version is downloaded, so results from old pods
+still serving during a rollout are never cached under the new model's key. Once a rollout is recorded, the key
+changes and each worker drops the detector's old entries.
+
+The cache is per worker process, bounded in size, and evicts the least recently used entry when full. Entries also
+expire after the detector's TTL.
+"""
+
+import hashlib
+import logging
+import os
+from collections import defaultdict
+
+from cachetools import TLRUCache
+from groundlight.edge import InferenceConfig
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("INFERENCE_RESULT_CACHE_MAX_ENTRIES", 1024))
+
+# (detector_id, image digest, primary model KSUID, OODD model KSUID)
+ResultCacheKey = tuple[str, bytes, str | None, str | None]
+
+
+def image_digest(image_bytes: bytes) -> bytes:
+    """A fast, collision-resistant fingerprint of the raw image bytes."""
+    return hashlib.blake2b(image_bytes, digest_size=16).digest()
+
+
+def result_cache_ttl(config: InferenceConfig | None) -> float | None:
+    """The detector's result cache TTL in seconds, or None if result caching is disabled for it."""
+    return getattr(config, "duplicate_result_cache_ttl", None)
+
+
+class InferenceResultCache:
+    """An LRU + TTL cache of edge inference results, keyed by image content and model versions."""
+
+    def __init__(self, max_entries: int = INFERENCE_RESULT_CACHE_MAX_ENTRIES) -> None:
+        # Values are (result, ttl_s) so that each entry can expire according to its own detector's TTL.
+        self._cache: TLRUCache = TLRUCache(maxsize=max_entries, ttu=lambda _key, value, now: now + value[1])
+        self._hits: defaultdict[str, int] = defaultdict(int)
+        self._misses: defaultdict[str, int] = defaultdict(int)
+
+    def get(self, key: ResultCacheKey) -> dict | None:
+        """Return a copy of the cached result for `key`, or None."""
+        detector_id = key[0]
+        entry = self._cache.get(key)
+        if entry is None:
+            self._misses[detector_id] += 1
+            return None
+        self._hits[detector_id] += 1
+        return dict(entry[0])
+
+    def put(self, key: ResultCacheKey, result: dict, ttl_s: float) -> None:
+        self._cache[key] = (dict(result), ttl_s)
+
+    def invalidate_detector(self, detector_id: str) -> None:
+        """Drop every cached result for a detector, e.g. after a new model version was saved for it."""
+        for key in [key for key in list(self._cache.keys()) if key[0] == detector_id]:
+            self._cache.pop(key, None)
+
+    def stats(self) -> dict:
+        """Hit/miss counters per detector and the current cache size for this worker process."""
+        detector_ids = set(self._hits) | set(self._misses)
+        return {
+            "entries": self._cache.currsize,
+            "max_entries": self._cache.maxsize,
+            "detectors": {
+                detector_id: {"hits": self._hits[detector_id], "misses": self._misses[detector_id]}
+                for detector_id in detector_ids
+            },
+        }
@@ -3,7 +3,7 @@ DEFAULT_REQUEST_CACHE_MAX_ENTRIES = 15
 DEFAULT_QUEUE_BASE_DIR = "/opt/groundlight/queue"  # Default base directory for escalation queue files.
 READING_DIR_SUFFIX = "reading"
 WRITING_DIR_SUFFIX = "writing"
-IMAGE_DIR_SUFFIX = "images"
+IMAGE_DIR_SUFFIX = "images"  # Images of escalations queued before segment files, see `segments`.
 TRACKING_FILE_NAME_PREFIX = "tracking-"  # Prefix for naming tracking files
-MAX_QUEUE_FILE_LINES = 200  # Maximum number of lines written to each escalation queue file.
+MAX_QUEUE_FILE_LINES = 200  # Maximum number of escalations written to each escalation queue file.
 QUEUE_RETENTION_DAYS = 7  # Escalation queue data (images, escalation records, failed records) is deleted after this.
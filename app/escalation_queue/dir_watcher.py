@@ -0,0 +1,125 @@
+"""Waits for files to appear in or change in a directory, with Linux's inotify.
+
+inotify is used through libc with ctypes, so that no dependency is needed. Where it isn't available (on other operating
+systems, or when the inotify limits are reached), `DirectoryWatcher.create` returns None and callers fall back to
+polling the directory.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+_READ_SIZE = 64 * 1024
+# The events watched by default
+IN_ADDED_OR_REMOVED = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM
+
+
+class DirectoryEvent(NamedTuple):
+    mask: int
+    name: str
+
+    @property
+    def added(self) -> bool:
+        """Whether the file was created in or moved into the directory."""
+        return bool(self.mask & (IN_CREATE | IN_MOVED_TO))
+
+    @property
+    def removed(self) -> bool:
+        """Whether the file was deleted from or moved out of the directory."""
+        return bool(self.mask & (IN_DELETE | IN_MOVED_FROM))
+
+    @property
+    def written(self) -> bool:
+        """Whether the file was closed after being opened for writing."""
+        return bool(self.mask & IN_CLOSE_WRITE)
+
+    @property
+    def overflowed(self) -> bool:
+        """Whether events were lost because too many were queued. The directory has to be listed again."""
+        return bool(self.mask & IN_Q_OVERFLOW)
+
+
+def _load_libc() -> ctypes.CDLL:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    # Raises AttributeError where inotify doesn't exist
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class DirectoryWatcher:
+    """Reports files that are added to or removed from a directory (not its subdirectories), and with `IN_CLOSE_WRITE`
+    in the mask, files that are written."""
+
+    def __init__(self, path: Path, mask: int = IN_ADDED_OR_REMOVED):
+        libc = _load_libc()
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"Can't watch {path}: {os.strerror(error)}")
+        self._poller = select.poll()
+        self._poller.register(self._fd, select.POLLIN)
+
+    @classmethod
+    def create(cls, path: Path, mask: int = IN_ADDED_OR_REMOVED) -> "DirectoryWatcher | None":
+        """Returns a watcher for the directory, or None if inotify isn't available."""
+        try:
+            return cls(path, mask)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Can't watch {path} with inotify, polling it instead: {e}")
+            return None
+
+    def wait(self, timeout_s: float) -> bool:
+        """Waits until there are events to read, for at most timeout_s. Returns whether there are."""
+        try:
+            return bool(self._poller.poll(timeout_s * 1000))
+        except InterruptedError:
+            return False
+
+    def read_events(self) -> list[DirectoryEvent]:
+        """Returns the events since the last call, without waiting."""
+        events = []
+        while True:
+            try:
+                buffer = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return events
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                _, mask, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+                name_start = offset + _EVENT_HEADER.size
+                # The name is padded with null bytes
+                name = buffer[name_start : name_start + name_length].rstrip(b"\0")
+                events.append(DirectoryEvent(mask, os.fsdecode(name)))
+                offset = name_start + name_length
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
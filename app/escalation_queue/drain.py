@@ -0,0 +1,304 @@
+"""Concurrent draining of the escalation queue.
+
+Escalating queued escalations one at a time caps the drain rate at one escalation per round trip to the cloud, however
+much bandwidth there is. `EscalationDrain` escalates several at once:
+
+- The number of escalations in flight is adapted to the cloud's response (AIMD, see `AdaptiveConcurrencyLimit`): it
+  grows by one per round of successful escalations and halves when escalations are throttled or time out.
+- Escalations of a detector (and priority class) are started in the order they were queued. Several escalations of a
+  detector may be in flight at once, so that a single detector's backlog drains as fast as one of several detectors',
+  but they may then reach the cloud slightly out of order. With ESCALATION_DRAIN_MAX_IN_FLIGHT_PER_DETECTOR set to 1,
+  they are escalated one at a time, strictly in order.
+- Escalations of the priority classes are started in proportion to the classes' weights (see
+  `app.escalation_queue.priorities`), and within a class the detectors take turns, so that a detector with a large
+  backlog doesn't hold up the others.
+- A detector's escalations take up at most half of the escalations the drain reads ahead, and the reader reads past
+  the escalations of a detector that has no room left (see `QueueReader.iter_with_acks`), so that the other detectors'
+  escalations reach the drain even when they were queued after a large backlog of one detector.
+- Two escalations of the same request (see `RequestCache`) are never in flight at once, so that the second is skipped
+  as a duplicate.
+
+How fast the queue drains, and how long the backlog will take to drain at that rate, is written to a status file that
+the edge endpoint reports with its metrics, see `read_drain_status`.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+from app.escalation_queue.constants import DEFAULT_QUEUE_BASE_DIR
+from app.escalation_queue.models import ESCALATION_PRIORITIES, EscalationInfo, EscalationPriority
+from app.escalation_queue.priorities import WeightedRoundRobin
+from app.escalation_queue.queue_reader import QueuedEscalation, QueueReader
+
+logger = logging.getLogger(__name__)
+
+# The most escalations in flight at once. The adaptive limit stays between 1 and this.
+ESCALATION_DRAIN_MAX_CONCURRENCY = int(os.environ.get("ESCALATION_DRAIN_MAX_CONCURRENCY", 16))
+ESCALATION_DRAIN_INITIAL_CONCURRENCY = 4
+# The most escalations of one detector in flight at once. With more than one, a detector's escalations may reach the
+# cloud out of order, 1 escalates them strictly in order.
+ESCALATION_DRAIN_MAX_IN_FLIGHT_PER_DETECTOR = int(
+    os.environ.get("ESCALATION_DRAIN_MAX_IN_FLIGHT_PER_DETECTOR", ESCALATION_DRAIN_MAX_CONCURRENCY)
+)
+# How many escalations, with their images, are held in memory waiting for their turn, per unit of max concurrency
+DRAIN_READ_AHEAD_FACTOR = 2
+DRAIN_STATUS_FILE_NAME = "drain-status.json"
+DRAIN_STATUS_INTERVAL_S = 30
+# Drain rates are averaged over this window
+DRAIN_RATE_WINDOW_S = 60
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    An AIMD (additive increase, multiplicative decrease) limit on the number of escalations in flight.
+
+    Each successful escalation raises the limit by 1/limit, so a full round of successes raises it by one. An escalation
+    that is throttled or times out halves it. Failures of escalations that were started before the last decrease were
+    caused by the same overload, so they don't decrease it again.
+    """
+
+    def __init__(self, max_limit: int, initial_limit: int = ESCALATION_DRAIN_INITIAL_CONCURRENCY):
+        self.max_limit = max(1, max_limit)
+        self._limit = float(min(max(1, initial_limit), self.max_limit))
+        self._last_decrease_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def on_overload(self, attempt_started_at: float) -> None:
+        """Records a throttled or timed out attempt, started at `attempt_started_at` (a `time.monotonic()` time)."""
+        with self._lock:
+            if attempt_started_at < self._last_decrease_at:
+                return
+            self._limit = max(1.0, self._limit / 2)
+            self._last_decrease_at = time.monotonic()
+        logger.info(
+            f"Escalations are being throttled or timing out, lowering the escalation concurrency to {self.limit}."
+        )
+
+
+class _DrainedEscalation(NamedTuple):
+    drained_at: float
+    num_bytes: int
+
+
+class DrainStats:
+    """Tracks how fast the escalation queue drains."""
+
+    def __init__(self, window_s: float = DRAIN_RATE_WINDOW_S):
+        self.window_s = window_s
+        self._started_at = time.monotonic()
+        self._drained: deque[_DrainedEscalation] = deque()
+        self._lock = threading.Lock()
+
+    def record(self, num_bytes: int) -> None:
+        """Records an escalation of `num_bytes` (its info and image) that was taken off the queue."""
+        with self._lock:
+            self._drained.append(_DrainedEscalation(time.monotonic(), num_bytes))
+
+    def rates(self) -> tuple[float, float]:
+        """Returns the drain rate over the last `window_s`, in escalations and bytes per second."""
+        now = time.monotonic()
+        with self._lock:
+            while self._drained and self._drained[0].drained_at < now - self.window_s:
+                self._drained.popleft()
+            num_escalations = len(self._drained)
+            num_bytes = sum(drained.num_bytes for drained in self._drained)
+        window_s = max(min(self.window_s, now - self._started_at), 1e-3)
+        return num_escalations / window_s, num_bytes / window_s
+
+    def status(self, backlog_bytes: int, in_flight: int, concurrency_limit: int) -> dict[str, Any]:
+        """Returns the drain rate, and how long a backlog of `backlog_bytes` takes to drain at that rate."""
+        escalations_per_s, bytes_per_s = self.rates()
+        if bytes_per_s > 0:
+            backlog_eta_s = round(backlog_bytes / bytes_per_s, 1)
+        else:
+            # Unknown while nothing drains, e.g. because the cloud is unreachable
+            backlog_eta_s = None if backlog_bytes else 0.0
+        return {
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "drain_rate_escalations_per_s": round(escalations_per_s, 3),
+            "drain_rate_bytes_per_s": round(bytes_per_s),
+            "backlog_bytes": backlog_bytes,
+            "backlog_eta_s": backlog_eta_s,
+            "in_flight": in_flight,
+            "concurrency_limit": concurrency_limit,
+        }
+
+
+class _Pending(NamedTuple):
+    escalation_info: EscalationInfo
+    escalation: QueuedEscalation
+    acknowledge: Callable[[], None]
+
+
+class EscalationDrain:
+    """
+    Escalates queued escalations on a pool of threads, as many at once as the adaptive concurrency limit allows, see
+    the module docstring.
+
+    Each escalation is acknowledged to the reader once `escalate` returns, so that the reader only records it as
+    consumed (and only deletes its queue file) after it was escalated.
+    """
+
+    def __init__(
+        self,
+        escalate: Callable[[EscalationInfo, QueuedEscalation], None],
+        concurrency_limit: AdaptiveConcurrencyLimit,
+        max_in_flight_per_detector: int = ESCALATION_DRAIN_MAX_IN_FLIGHT_PER_DETECTOR,
+        stats: DrainStats | None = None,
+    ):
+        self._escalate = escalate
+        self.concurrency_limit = concurrency_limit
+        self.max_in_flight_per_detector = max(1, max_in_flight_per_detector)
+        self.stats = stats or DrainStats()
+        self._read_ahead = DRAIN_READ_AHEAD_FACTOR * concurrency_limit.max_limit
+        self._read_ahead_per_detector = max(1, self._read_ahead // 2)
+        self._executor = ThreadPoolExecutor(concurrency_limit.max_limit, thread_name_prefix="escalation-drain")
+        self._condition = threading.Condition()
+        # The escalations waiting to start, by priority class and detector. The detectors of a class take turns in the
+        # order of the dict, see `_start_ready`.
+        self._waiting: dict[EscalationPriority, dict[str, deque[_Pending]]] = {
+            priority: {} for priority in ESCALATION_PRIORITIES
+        }
+        self._num_waiting = 0
+        self._scheduler = WeightedRoundRobin()
+        self.in_flight = 0
+        self._in_flight_by_detector: Counter[str] = Counter()
+        # The escalations held by detector, waiting or in flight
+        self._held_by_detector: Counter[str] = Counter()
+        self._in_flight_requests: set[str] = set()
+
+    def submit(
+        self, escalation_info: EscalationInfo, escalation: QueuedEscalation, acknowledge: Callable[[], None]
+    ) -> None:
+        """Hands an escalation to the drain. Blocks while the drain already holds as many as it reads ahead."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._num_waiting + self.in_flight < self._read_ahead)
+            detectors = self._waiting[escalation_info.priority]
+            detectors.setdefault(escalation_info.detector_id, deque()).append(
+                _Pending(escalation_info, escalation, acknowledge)
+            )
+            self._num_waiting += 1
+            self._held_by_detector[escalation_info.detector_id] += 1
+            self._start_ready()
+
+    def has_room(self, detector_id: str) -> bool:
+        """
+        Whether the drain holds fewer of the detector's escalations than its share of what it reads ahead. The reader
+        reads past the escalations of detectors without room, see `QueueReader.iter_with_acks`.
+        """
+        with self._condition:
+            return self._held_by_detector[detector_id] < self._read_ahead_per_detector
+
+    def wait_until_idle(self, timeout_s: float | None = None) -> bool:
+        """Waits until all submitted escalations are done. Returns False if it takes longer than timeout_s."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._num_waiting == 0 and self.in_flight == 0, timeout_s)
+
+    def close(self) -> None:
+        """Waits for the submitted escalations and stops the threads."""
+        self.wait_until_idle()
+        self._executor.shutdown()
+
+    def _start_ready(self) -> None:
+        """Starts the waiting escalations that may be started. Must hold the condition's lock."""
+        while self.in_flight < self.concurrency_limit.limit:
+            startable = {}
+            for priority in ESCALATION_PRIORITIES:
+                detector_id = self._next_startable_detector(priority)
+                if detector_id is not None:
+                    startable[priority] = detector_id
+            if not startable:
+                return
+            priority = self._scheduler.choose(list(startable))
+            detector_id = startable[priority]
+
+            # The detector goes to the back of the class's turn order
+            detector_queue = self._waiting[priority].pop(detector_id)
+            pending = detector_queue.popleft()
+            if detector_queue:
+                self._waiting[priority][detector_id] = detector_queue
+            self._num_waiting -= 1
+
+            self.in_flight += 1
+            self._in_flight_by_detector[detector_id] += 1
+            self._in_flight_requests.add(pending.escalation_info.request_id)
+            self._executor.submit(self._run, pending)
+
+    def _next_startable_detector(self, priority: EscalationPriority) -> str | None:
+        """Returns the first detector in the class's turn order whose oldest waiting escalation may be started."""
+        for detector_id, detector_queue in self._waiting[priority].items():
+            if (
+                self._in_flight_by_detector[detector_id] < self.max_in_flight_per_detector
+                and detector_queue[0].escalation_info.request_id not in self._in_flight_requests
+            ):
+                return detector_id
+        return None
+
+    def _run(self, pending: _Pending) -> None:
+        try:
+            self._escalate(pending.escalation_info, pending.escalation)
+        except Exception:
+            logger.error("Unexpected error while escalating a queued escalation.", exc_info=True)
+        finally:
+            pending.acknowledge()
+            escalation = pending.escalation
+            self.stats.record(len(escalation.line) + len(escalation.image_bytes or b""))
+            with self._condition:
+                self.in_flight -= 1
+                self._in_flight_by_detector[pending.escalation_info.detector_id] -= 1
+                self._held_by_detector[pending.escalation_info.detector_id] -= 1
+                self._in_flight_requests.discard(pending.escalation_info.request_id)
+                self._start_ready()
+                self._condition.notify_all()
+
+
+def report_drain_status(
+    drain: EscalationDrain, reader: QueueReader, stop: threading.Event, interval_s: float = DRAIN_STATUS_INTERVAL_S
+) -> None:
+    """Writes the drain status every interval_s until stop is set, and logs it while there is a backlog."""
+    while True:
+        try:
+            status = drain.stats.status(reader.backlog_bytes(), drain.in_flight, drain.concurrency_limit.limit)
+            write_drain_status(reader.base_dir, status)
+            if status["backlog_bytes"] > 0:
+                logger.info(
+                    f"Escalation queue backlog: {status['backlog_bytes'] / 1e6:.1f} MB, draining at "
+                    f"{status['drain_rate_escalations_per_s']:.1f} escalations/s with {status['in_flight']} in flight, "
+                    f"ETA {status['backlog_eta_s']}s."
+                )
+        except Exception:
+            logger.debug("Failed to report the escalation queue drain status", exc_info=True)
+        if stop.wait(interval_s):
+            return
+
+
+def write_drain_status(base_dir: Path, status: dict[str, Any]) -> None:
+    """Writes the drain status next to the queue, for the edge endpoint to report, see `read_drain_status`."""
+    # Write to a temporary file and rename it into place, so readers never see a partially written file.
+    temp_path = base_dir / f"{DRAIN_STATUS_FILE_NAME}.tmp"
+    temp_path.write_text(json.dumps(status), encoding="utf-8")
+    os.replace(temp_path, base_dir / DRAIN_STATUS_FILE_NAME)
+
+
+def read_drain_status(base_dir: str = DEFAULT_QUEUE_BASE_DIR) -> dict[str, Any] | None:
+    """Returns the last drain status written by the escalation queue reader, or None if there is none."""
+    try:
+        return json.loads(Path(base_dir, DRAIN_STATUS_FILE_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
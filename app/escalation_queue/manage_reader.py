@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+import threading
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -12,9 +13,16 @@ from urllib3.exceptions import MaxRetryError, ReadTimeoutError
 from app.core.groundlight_client import groundlight_client
 from app.core.utils import safe_call_sdk
 from app.escalation_queue.constants import QUEUE_RETENTION_DAYS
+from app.escalation_queue.drain import (
+    ESCALATION_DRAIN_MAX_CONCURRENCY,
+    ESCALATION_DRAIN_MAX_IN_FLIGHT_PER_DETECTOR,
+    AdaptiveConcurrencyLimit,
+    EscalationDrain,
+    report_drain_status,
+)
 from app.escalation_queue.failed_escalations import record_failed_escalation
 from app.escalation_queue.models import EscalationInfo
-from app.escalation_queue.queue_reader import QueueReader
+from app.escalation_queue.queue_reader import QueuedEscalation, QueueReader
 from app.escalation_queue.request_cache import RequestCache
 
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
@@ -48,7 +56,11 @@ def _escalation_is_expired(escalation_info: EscalationInfo) -> bool:
     return datetime.now() - queued_at >= timedelta(days=QUEUE_RETENTION_DAYS)
 
 
-def _escalate_once(escalation_info: EscalationInfo, submit_iq_request_timeout_s: int | tuple[int, int]) -> ImageQuery:
+def _escalate_once(
+    escalation_info: EscalationInfo,
+    submit_iq_request_timeout_s: int | tuple[int, int],
+    image_bytes: bytes | None = None,
+) -> ImageQuery:
     """
     Consumes escalation info for a query and attempts to complete the escalation.
 
@@ -57,6 +69,8 @@ def _escalate_once(escalation_info: EscalationInfo, submit_iq_request_timeout_s:
         submit_iq_request_timeout_s (int | tuple[int, int]): Request timeout for the image query submission request,
             passed to submit_image_query as request_timeout. If a tuple, the first element is the connect timeout
             and the second is the read timeout.
+        image_bytes (bytes | None): The image, as read from the queue. If None, the image is read from
+            `escalation_info.image_path_str`, as for escalations queued before segment files.
 
     Returns:
         ImageQuery: The escalated ImageQuery result.
@@ -67,8 +81,8 @@ def _escalate_once(escalation_info: EscalationInfo, submit_iq_request_timeout_s:
         f"{escalation_info.detector_id} with timestamp {escalation_info.timestamp}."
     )
     gl = groundlight_client()
-    image_path = Path(escalation_info.image_path_str)
-    image_bytes = image_path.read_bytes()
+    if image_bytes is None:
+        image_bytes = Path(escalation_info.image_path_str).read_bytes()
     submit_iq_params = escalation_info.submit_iq_params
     return safe_call_sdk(
         gl.submit_image_query,
@@ -99,9 +113,14 @@ def is_retryable_exception(exc: Exception) -> bool:
 
 def consume_queued_escalation(
     escalation_info: EscalationInfo,
+    image_bytes: bytes | None = None,
+    concurrency_limit: AdaptiveConcurrencyLimit | None = None,
 ) -> ImageQuery:
     """
     Attempts to escalate a queued escalation, retrying based on whether the escalation might succeed in the future.
+
+    If a concurrency limit is given, the outcome of each attempt adjusts it: retryable failures (throttling, timeouts
+    and connection errors) lower it and successes raise it.
     """
     submit_iq_request_timeout_s = (5, 15)  # How long the image query request should be allowed to try to complete.
     # The first element of the tuple is the connect timeout and the second is the read timeout.
@@ -109,12 +128,18 @@ def consume_queued_escalation(
     retry_count = 0
 
     while True:
+        attempt_started_at = time.monotonic()
         try:
-            return _escalate_once(escalation_info, submit_iq_request_timeout_s)
+            result = _escalate_once(escalation_info, submit_iq_request_timeout_s, image_bytes=image_bytes)
+            if concurrency_limit is not None:
+                concurrency_limit.on_success()
+            return result
         except Exception as exc:
             is_retryable = is_retryable_exception(exc)
             if not is_retryable:
                 raise
+            if concurrency_limit is not None:
+                concurrency_limit.on_overload(attempt_started_at)
 
         logger.info(f"Escalation attempt {retry_count + 1} failed.")
         # We'll use shorter connect timeout on retries since we expect we have bad network connectivity.
@@ -128,37 +153,84 @@ def consume_queued_escalation(
         retry_count += 1
 
 
-def read_from_escalation_queue(reader: QueueReader, request_cache: RequestCache) -> None:
-    """Reads escalations from the queue reader and attempts to escalates them."""
-    # Because the QueueReader will block until it has something to yield, this will loop forever
-    for escalation in reader:
-        logger.debug("Got queued escalation from reader.")
-        escalation_info: EscalationInfo | None = None
-        try:
-            escalation_info = EscalationInfo(**json.loads(escalation.strip()))
-            if not request_cache.contains(escalation_info.request_id):
-                result = consume_queued_escalation(escalation_info)
-                logger.info(f"Escalation succeeded for escalation with ID {result.id}.")
-            else:
-                logger.debug("Duplicate request ID received: %s. Skipping", escalation_info.request_id)
-        except Exception as e:
-            if escalation_info is not None and _escalation_is_expired(escalation_info):
-                # The escalation is already past the retention window, so its data is being purged
-                # regardless. Don't record the failure: the record isn't actionable (the escalation
-                # can't be retried) and would just re-add expired data with a fresh retention clock.
-                logger.warning("Escalation failed but is past the retention window; dropping without recording.")
-            else:
-                logger.error("Escalation failed, moving on.", exc_info=True)
-
-                # Save the failed escalation details to disk. Once we integrate with Splunk, we could consider
-                # removing this and just relying on the error log instead.
-                record_failed_escalation(escalation, e)
-        finally:
-            if escalation_info is not None:
-                # Cache the request ID so that we don't repeat duplicate requests
-                request_cache.add(escalation_info.request_id)
-                # Delete the image
-                Path(escalation_info.image_path_str).unlink(missing_ok=True)
+def _record_failure(escalation_info: EscalationInfo | None, escalation: QueuedEscalation, exc: Exception) -> None:
+    if escalation_info is not None and _escalation_is_expired(escalation_info):
+        # The escalation is already past the retention window, so its data is being purged
+        # regardless. Don't record the failure: the record isn't actionable (the escalation
+        # can't be retried) and would just re-add expired data with a fresh retention clock.
+        logger.warning("Escalation failed but is past the retention window; dropping without recording.")
+    else:
+        logger.error("Escalation failed, moving on.", exc_info=exc)
+
+        # Save the failed escalation details to disk. Once we integrate with Splunk, we could consider
+        # removing this and just relying on the error log instead.
+        record_failed_escalation(escalation.line, exc)
+
+
+def _escalate_queued_escalation(
+    escalation_info: EscalationInfo,
+    escalation: QueuedEscalation,
+    request_cache: RequestCache,
+    concurrency_limit: AdaptiveConcurrencyLimit,
+) -> None:
+    """Escalates an escalation read from the queue, unless it's a duplicate. Never raises."""
+    try:
+        if not request_cache.contains(escalation_info.request_id):
+            result = consume_queued_escalation(
+                escalation_info, image_bytes=escalation.image_bytes, concurrency_limit=concurrency_limit
+            )
+            logger.info(f"Escalation succeeded for escalation with ID {result.id}.")
+        else:
+            logger.debug("Duplicate request ID received: %s. Skipping", escalation_info.request_id)
+    except Exception as e:
+        _record_failure(escalation_info, escalation, e)
+    finally:
+        # Cache the request ID so that we don't repeat duplicate requests
+        request_cache.add(escalation_info.request_id)
+        if escalation.image_bytes is None and escalation_info.image_path_str is not None:
+            # Delete the image of an escalation queued before segment files
+            Path(escalation_info.image_path_str).unlink(missing_ok=True)
+
+
+def read_from_escalation_queue(
+    reader: QueueReader,
+    request_cache: RequestCache,
+    max_concurrency: int = ESCALATION_DRAIN_MAX_CONCURRENCY,
+    max_in_flight_per_detector: int = ESCALATION_DRAIN_MAX_IN_FLIGHT_PER_DETECTOR,
+) -> None:
+    """
+    Reads escalations from the queue reader and attempts to escalates them, several at once (see
+    `app.escalation_queue.drain`).
+    """
+    concurrency_limit = AdaptiveConcurrencyLimit(max_concurrency)
+    drain = EscalationDrain(
+        lambda escalation_info, escalation: _escalate_queued_escalation(
+            escalation_info, escalation, request_cache, concurrency_limit
+        ),
+        concurrency_limit,
+        max_in_flight_per_detector=max_in_flight_per_detector,
+    )
+    stop_reporting = threading.Event()
+    reporter = threading.Thread(
+        target=report_drain_status, args=(drain, reader, stop_reporting), name="drain-status", daemon=True
+    )
+    reporter.start()
+
+    try:
+        # Because the QueueReader will block until it has something to yield, this will loop forever
+        for escalation, acknowledge in reader.iter_with_acks(drain.has_room):
+            logger.debug("Got queued escalation from reader.")
+            try:
+                escalation_info = EscalationInfo(**json.loads(escalation.line.strip()))
+            except Exception as e:
+                _record_failure(None, escalation, e)
+                acknowledge()
+                continue
+            drain.submit(escalation_info, escalation, acknowledge)
+    finally:
+        drain.close()
+        stop_reporting.set()
+        reporter.join()
 
 
 if __name__ == "__main__":
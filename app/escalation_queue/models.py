@@ -1,7 +1,16 @@
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import BaseModel
 
+# The priority class of a queued escalation, which decides how soon it's escalated when the queue has a backlog (see
+# `app.escalation_queue.priorities`):
+# - "critical": the client has no answer other than the cloud's, i.e. `want_async` submissions and synchronous
+#   escalations that failed
+# - "normal": escalations of low-confidence edge answers, which the client already has
+# - "audit": audits of confident edge answers, which the client never sees
+EscalationPriority = Literal["critical", "normal", "audit"]
+ESCALATION_PRIORITIES: tuple[EscalationPriority, ...] = ("critical", "normal", "audit")
+
 
 class SubmitImageQueryParams(BaseModel):
     """The parameters of submitting an image query that need to be written to the escalation queue."""
@@ -18,6 +27,9 @@ class EscalationInfo(BaseModel):
 
     timestamp: str
     detector_id: str
-    image_path_str: str
+    # Only set for escalations queued before segment files, whose images were written to separate files
+    image_path_str: str | None = None
     submit_iq_params: SubmitImageQueryParams
     request_id: str
+    # Escalations queued before priority classes are "normal"
+    priority: EscalationPriority = "normal"
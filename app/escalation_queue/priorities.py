@@ -0,0 +1,46 @@
+"""Scheduling of the escalation queue across priority classes.
+
+Each queued escalation has a priority class (`EscalationPriority`). When the uplink can't keep up and a backlog builds,
+the classes share it by weight rather than first come, first served: the reader reads the queue files of each class
+side by side (see `QueueReader.iter_with_acks`), and the drain starts the escalations it holds (see `EscalationDrain`),
+in proportion to `ESCALATION_PRIORITY_WEIGHTS`. No class is starved while it has escalations waiting, but critical
+escalations reach the cloud first.
+
+Audits are the first to give way when the backlog grows:
+- Past `ESCALATION_QUEUE_AUDIT_DEFER_BYTES`, the reader only reads audits when no other escalations are waiting.
+- Past `ESCALATION_QUEUE_AUDIT_SHED_BYTES`, the edge endpoint stops queueing new audits (see
+  `BackgroundQueueWriter.submit`).
+"""
+
+import os
+
+from app.escalation_queue.models import EscalationPriority
+
+# The share of the uplink each priority class gets while escalations of several classes are waiting
+ESCALATION_PRIORITY_WEIGHTS: dict[EscalationPriority, int] = {"critical": 8, "normal": 4, "audit": 1}
+# The queue backlog (the size of the queue files waiting to be escalated) past which audits wait for all other
+# escalations
+ESCALATION_QUEUE_AUDIT_DEFER_BYTES = int(os.environ.get("ESCALATION_QUEUE_AUDIT_DEFER_BYTES", 100_000_000))
+# The queue backlog past which new audits aren't queued at all
+ESCALATION_QUEUE_AUDIT_SHED_BYTES = int(os.environ.get("ESCALATION_QUEUE_AUDIT_SHED_BYTES", 1_000_000_000))
+# How often the backlog is checked against the audit thresholds
+AUDIT_POLICY_CHECK_INTERVAL_S = 10
+
+
+class WeightedRoundRobin:
+    """
+    Chooses among the priority classes that have escalations waiting, each in proportion to its weight, spreading the
+    choices of each class evenly (smooth weighted round-robin, as in nginx).
+    """
+
+    def __init__(self, weights: dict[EscalationPriority, int] = ESCALATION_PRIORITY_WEIGHTS):
+        self.weights = weights
+        self._current = dict.fromkeys(weights, 0)
+
+    def choose(self, candidates: list[EscalationPriority]) -> EscalationPriority:
+        """Returns the class to serve next, out of the candidates. Must not be empty."""
+        for priority in candidates:
+            self._current[priority] += self.weights[priority]
+        chosen = max(candidates, key=self._current.__getitem__)
+        self._current[chosen] -= sum(self.weights[priority] for priority in candidates)
+        return chosen
@@ -1,10 +1,16 @@
+import bisect
+import fcntl
+import functools
+import json
 import logging
+import mmap
 import os
 import re
+import threading
 import time
 from itertools import islice
 from pathlib import Path
-from typing import Generator
+from typing import Callable, Generator, Iterable, Iterator, NamedTuple
 
 from app.escalation_queue.constants import (
     DEFAULT_QUEUE_BASE_DIR,
@@ -12,126 +18,499 @@ from app.escalation_queue.constants import (
     TRACKING_FILE_NAME_PREFIX,
     WRITING_DIR_SUFFIX,
 )
+from app.escalation_queue.dir_watcher import DirectoryWatcher
+from app.escalation_queue.models import ESCALATION_PRIORITIES, EscalationPriority
+from app.escalation_queue.priorities import (
+    AUDIT_POLICY_CHECK_INTERVAL_S,
+    ESCALATION_QUEUE_AUDIT_DEFER_BYTES,
+    WeightedRoundRobin,
+)
+from app.escalation_queue.segments import (
+    SEGMENT_FILE_SUFFIX,
+    encode_tracked_offset,
+    read_records,
+    read_tracked_offset,
+)
 
 logger = logging.getLogger(__name__)
 
+# Whether the reader watches the writing directory with inotify for new queue files, rather than polling it
+ESCALATION_QUEUE_USE_INOTIFY = os.environ.get("ESCALATION_QUEUE_USE_INOTIFY", "true") == "true"
+# How often the reader checks for new queue files while it polls the writing directory
+QUEUE_POLL_INTERVAL_S = 0.1
+# How often the reader lists the writing directory while it watches it, in case an event was missed
+QUEUE_WATCH_TIMEOUT_S = 60
+# The most files of a priority class that the reader reads at once, when it reads past the escalations of detectors
+# that the consumer holds enough of (see `QueueReader.iter_with_acks`)
+QUEUE_READ_AHEAD_FILES = 4
+
+
+class QueuedEscalation(NamedTuple):
+    """An escalation read from the queue."""
+
+    # The escalation info, as written by `convert_escalation_info_to_str`
+    line: str
+    # The image, or None for escalations queued before segment files, whose image is at `image_path_str`
+    image_bytes: bytes | None
+
+
+class _FileProgress:
+    """
+    Tracks which escalations read from a queue file have been consumed, in the file's tracking file, and deletes both
+    files once all of the escalations have been consumed.
+
+    Escalations may be acknowledged in any order, but the tracking file only ever records the escalations up to the
+    first one that hasn't been acknowledged. An escalation that was read but not acknowledged when the reader stopped is
+    read again when it restarts, so none are lost.
+    """
+
+    def __init__(self, data_path: Path, tracker_path: Path):
+        self.data_path = data_path
+        self.tracker_path = tracker_path
+        self._lock = threading.Lock()
+        self._tracker = tracker_path.open(mode="ab")
+        # What to append to the tracking file once each escalation read so far has been consumed, and whether it has
+        # been acknowledged
+        self._marks: list[bytes] = []
+        self._acknowledged: list[bool] = []
+        self._num_tracked = 0
+        self._done_reading = False
+
+    def add(self, mark: bytes) -> Callable[[], None]:
+        """Adds an escalation that was read. Returns the function that acknowledges that it was consumed."""
+        with self._lock:
+            index = len(self._marks)
+            self._marks.append(mark)
+            self._acknowledged.append(False)
+        return functools.partial(self._acknowledge, index)
+
+    def _acknowledge(self, index: int) -> None:
+        with self._lock:
+            self._acknowledged[index] = True
+            num_tracked = self._num_tracked
+            while num_tracked < len(self._marks) and self._acknowledged[num_tracked]:
+                num_tracked += 1
+            if num_tracked > self._num_tracked:
+                self._tracker.write(b"".join(self._marks[self._num_tracked : num_tracked]))
+                self._tracker.flush()  # Write the tracking changes immediately
+                self._num_tracked = num_tracked
+            self._delete_if_done()
+
+    def finish_reading(self) -> None:
+        """Records that all escalations in the file were read. The file is deleted once they are all consumed."""
+        with self._lock:
+            self._done_reading = True
+            self._delete_if_done()
+
+    def _delete_if_done(self) -> None:
+        if self._done_reading and self._num_tracked == len(self._marks) and not self._tracker.closed:
+            self._tracker.close()
+            self.data_path.unlink(missing_ok=True)
+            self.tracker_path.unlink(missing_ok=True)
+
+
+class _ReadEscalation(NamedTuple):
+    """An escalation read from a queue file."""
+
+    escalation: QueuedEscalation
+    # What to append to the tracking file once the escalation has been consumed
+    mark: bytes
+    # Where the escalation's record starts and ends in a segment file, to read it again. None in line files.
+    offsets: tuple[int, int] | None
+
+
+class _SkippedEscalation(NamedTuple):
+    """An escalation that the reader read past, because the consumer held enough escalations of its detector."""
+
+    detector_id: str
+    offsets: tuple[int, int]
+    acknowledge: Callable[[], None]
+
+
+class _OpenFile:
+    """A queue file that the reader is reading."""
+
+    def __init__(self, escalations: Iterator[_ReadEscalation], progress: _FileProgress):
+        self.escalations = escalations
+        self.progress = progress
+        # Whether all of the file's escalations have been read, though some may have been read past
+        self.read_to_end = False
+        # The escalations that were read past and are still to be returned, oldest first
+        self.skipped: list[_SkippedEscalation] = []
+
 
 class QueueReader:
     """Manages reading escalation data from a file-based queue system."""
 
-    def __init__(self, base_dir: str = DEFAULT_QUEUE_BASE_DIR):
+    def __init__(
+        self,
+        base_dir: str = DEFAULT_QUEUE_BASE_DIR,
+        use_inotify: bool = ESCALATION_QUEUE_USE_INOTIFY,
+        audit_defer_bytes: int = ESCALATION_QUEUE_AUDIT_DEFER_BYTES,
+    ):
+        self.base_dir = Path(base_dir)
         self.base_reading_dir = Path(base_dir, READING_DIR_SUFFIX)
         os.makedirs(self.base_reading_dir, exist_ok=True)  # Ensure base_reading_dir exists
         self.base_writing_dir = Path(base_dir, WRITING_DIR_SUFFIX)
         os.makedirs(self.base_writing_dir, exist_ok=True)  # Ensure base_writing_dir exists
 
-        # This matches a timestamp in %Y%m%d_%H%M%S_%f format followed by a 27-character KSUID
-        self.writing_file_regex = r"\d{8}_\d{6}_\d{6}-.{27}\.txt"
+        # This matches a timestamp in %Y%m%d_%H%M%S_%f format followed by a 27-character KSUID and the priority class of
+        # the file's escalations, for segment files and for the line files written before them (which have no class)
+        self.writing_file_regex = rf"\d{{8}}_\d{{6}}_\d{{6}}-.{{27}}(\.({'|'.join(ESCALATION_PRIORITIES)}))?\.(txt|seg)"
         # This matches the same as the above, with the addition of the tracking file name prefix
         self.tracking_file_regex = rf"{re.escape(TRACKING_FILE_NAME_PREFIX)}{self.writing_file_regex}"
+        self._writing_file_pattern = re.compile(self.writing_file_regex)
 
-    def __iter__(self) -> Generator[str, None, None]:
+        self.use_inotify = use_inotify
+        self._watcher: DirectoryWatcher | None = None
+        # The names of the queue files in the writing directory by priority class, oldest first, or None until the
+        # directory is first listed (see `_start_indexing`)
+        self._pending_files: dict[EscalationPriority, list[str]] | None = None
+        self._listed_at = float("-inf")
+        # Files that a reader was interrupted in the middle of, oldest first
+        self._interrupted_files: list[Path] = []
+
+        self._scheduler = WeightedRoundRobin()
+        self.audit_defer_bytes = audit_defer_bytes
+        self._deferring_audits = False
+        self._audit_policy_checked_at = float("-inf")
+
+    def __iter__(self) -> Generator[QueuedEscalation, None, None]:
         """
-        A generator for reading lines written to the escalation queue.
+        A generator for reading escalations written to the escalation queue.
 
-        Blocks until there is a file to read from. Then, each iteration will return the next line from that file until
-        all lines have been read, at which point the file being read from will be deleted.
+        Blocks until there is a file to read from. Then, each iteration will return the next escalation from that file
+        until all escalations have been read, at which point the file being read from will be deleted.
 
-        Tracks the number of lines that have been read from the current file to support recovering from a failure or
-        reboot.
+        Tracks how far the current file has been read to support recovering from a failure or reboot.
         """
-        for data_path, tracker_path in self._get_files():
-            if not data_path.exists():
-                # The data file is gone while its tracking file remains. Discard the orphaned tracker and move on;
-                # otherwise _choose_new_file would keep selecting the missing data file, and opening it below would
-                # raise FileNotFoundError out of this generator, crashing the reader loop on every restart.
-                logger.warning("Queue data file %s is missing; discarding orphaned tracking file.", data_path)
-                tracker_path.unlink(missing_ok=True)
-                continue
-            with data_path.open(mode="r") as escalations, tracker_path.open(mode="a") as tracker:
-                lines_to_skip = len(tracker_path.read_text()) if tracker_path.exists() else 0
-                for line in islice(escalations, lines_to_skip, None):
-                    yield line
-                    # NOTE that we write to the tracking file after we yield a line, meaning the below code won't be
-                    # executed until the next time the generator is called. This means that at any time, the tracking
-                    # file will have one less entry than has been read/returned from the reader. This is by design
-                    # because something might go wrong after the reader returns a line, causing it to not get escalated.
-                    # We don't want to lose that escalation, so we implement it this way. We allow the possibility of
-                    # reading the same line twice (and handle that case in the consumption code) while guaranteeing that
-                    # we don't miss any.
-                    tracker.write("1")  # Indicates the line that we just yielded has been consumed
-                    tracker.flush()  # Write the tracking changes immediately
-
-                # Wait briefly and attempt one final read in case a line was written during processing
-                time.sleep(0.1)
-                final_line = escalations.readline()
-                if final_line.strip():
-                    yield final_line
-                    tracker.write("1")
-                    tracker.flush()
-
-            # Delete files when done reading
-            data_path.unlink(missing_ok=True)
-            tracker_path.unlink(missing_ok=True)
+        for escalation, acknowledge in self.iter_with_acks():
+            yield escalation
+            # NOTE that we acknowledge an escalation after we yield it, meaning the below code won't be executed until
+            # the next time the generator is called. This means that at any time, the tracking file will have one less
+            # entry than has been read/returned from the reader. This is by design because something might go wrong
+            # after the reader returns an escalation, causing it to not get escalated. We don't want to lose that
+            # escalation, so we implement it this way. We allow the possibility of reading the same escalation twice
+            # (and handle that case in the consumption code) while guaranteeing that we don't miss any.
+            acknowledge()
 
-    def _get_files(self) -> Generator[tuple[Path, Path], None, None]:
+    def iter_with_acks(
+        self, has_room: Callable[[str], bool] | None = None
+    ) -> Generator[tuple[QueuedEscalation, Callable[[], None]], None, None]:
         """
-        A generator that yields files containing items in the escalation queue.
+        A generator for reading escalations written to the escalation queue, for consumers that consume several
+        escalations at once. Yields each escalation with a function to call (from any thread) once it has been
+        consumed.
 
-        Blocks until there is a file to return. Then, returns a tuple:
-        - The first item is a Path to the chosen next file to read from
-        - The second item is a Path to the associated tracking file
+        Unlike `__iter__`, this reads on without waiting for the escalations already returned to be consumed. A file is
+        deleted once all of its escalations have been acknowledged, and the tracking file only records escalations up
+        to the first one that hasn't been, so that none are lost if the reader stops.
+
+        The files of each priority class are read oldest first. The escalations of the classes are interleaved by the
+        classes' weights (see `app.escalation_queue.priorities`).
+
+        If `has_room` is given, it's called with the detector ID of each escalation, and the escalations of detectors
+        that it returns False for are read past, and returned once it returns True for their detector. This way a
+        consumer that holds as many escalations of a detector with a large backlog as it takes still gets the other
+        detectors' escalations further on in the queue. The reader reads past escalations in up to
+        QUEUE_READ_AHEAD_FILES files of a class at once, and once it can't read any further, it returns the oldest
+        escalation it read past anyway. The escalations of a detector are returned in the order they were queued.
+        Escalations in line files, as written before segment files, are never read past.
+        """
+        # The files being read of each priority class, oldest first. Only the last one may have escalations that
+        # haven't been read yet, the others have escalations that were read past.
+        open_files: dict[EscalationPriority, list[_OpenFile]] = {priority: [] for priority in ESCALATION_PRIORITIES}
+        while True:
+            self._update_pending_files()
+            ready = [priority for priority in ESCALATION_PRIORITIES if open_files[priority] or self._has_file(priority)]
+            if not ready:
+                self._wait_for_file_check(QUEUE_WATCH_TIMEOUT_S if self._watcher else QUEUE_POLL_INTERVAL_S)
+                continue
+            if "audit" in ready and len(ready) > 1 and self._audits_are_deferred():
+                ready.remove("audit")
+            priority = self._scheduler.choose(ready)
+
+            next_escalation = self._next_escalation(priority, open_files[priority], has_room)
+            if next_escalation is not None:
+                yield next_escalation
+
+    def _next_escalation(
+        self, priority: EscalationPriority, open_files: list[_OpenFile], has_room: Callable[[str], bool] | None
+    ) -> tuple[QueuedEscalation, Callable[[], None]] | None:
+        """
+        Returns the next escalation of the priority class, with the function that acknowledges it, or None if there is
+        none. See `iter_with_acks`.
         """
+        # Escalations that were read past come first once their detector has room, so that its escalations stay in
+        # order
+        skipped_detectors = set()
+        for open_file in open_files:
+            for index, skipped in enumerate(open_file.skipped):
+                if skipped.detector_id not in skipped_detectors and has_room(skipped.detector_id):
+                    return self._return_skipped(open_files, open_file, index)
+                skipped_detectors.add(skipped.detector_id)
+
         while True:
-            new_reading_path = self._choose_new_file()
-            if new_reading_path is not None:
-                new_tracking_path = new_reading_path.with_name(f"{TRACKING_FILE_NAME_PREFIX}{new_reading_path.name}")
-                yield new_reading_path, new_tracking_path
-            else:
-                self._wait_for_file_check(0.1)
+            if not open_files or open_files[-1].read_to_end:
+                if len(open_files) >= QUEUE_READ_AHEAD_FILES:
+                    break
+                open_file = self._open_next_file(priority)
+                if open_file is None:
+                    break
+                open_files.append(open_file)
+            open_file = open_files[-1]
+            read = next(open_file.escalations, None)
+            if read is None:
+                # Delete files when done reading and consuming
+                open_file.read_to_end = True
+                open_file.progress.finish_reading()
+                self._close_if_done(open_files, open_file)
+                continue
+
+            acknowledge = open_file.progress.add(read.mark)
+            detector_id = None
+            if has_room is not None and read.offsets is not None:
+                detector_id = _detector_id(read.escalation.line)
+            if detector_id is None or (detector_id not in skipped_detectors and has_room(detector_id)):
+                return read.escalation, acknowledge
+            open_file.skipped.append(_SkippedEscalation(detector_id, read.offsets, acknowledge))
+            skipped_detectors.add(detector_id)
+
+        # The reader can't read any further, so the oldest escalation that was read past is returned anyway
+        for open_file in open_files:
+            if open_file.skipped:
+                return self._return_skipped(open_files, open_file, 0)
+        return None
+
+    def _return_skipped(
+        self, open_files: list[_OpenFile], open_file: _OpenFile, index: int
+    ) -> tuple[QueuedEscalation, Callable[[], None]]:
+        """Reads an escalation that was read past from its file again, and returns it with its acknowledgement."""
+        skipped = open_file.skipped.pop(index)
+        start_offset, end_offset = skipped.offsets
+        with open_file.progress.data_path.open(mode="rb") as segment:
+            segment.seek(start_offset)
+            record = next(read_records(segment.read(end_offset - start_offset)))
+        self._close_if_done(open_files, open_file)
+        return QueuedEscalation(record.metadata.decode("utf-8"), record.image_bytes), skipped.acknowledge
+
+    @staticmethod
+    def _close_if_done(open_files: list[_OpenFile], open_file: _OpenFile) -> None:
+        """Stops reading a file once all of its escalations have been returned."""
+        if open_file.read_to_end and not open_file.skipped:
+            open_files.remove(open_file)
+
+    def backlog_bytes(self) -> int:
+        """
+        Returns the size of the queue files waiting to be read or being read, a measure of the escalation backlog. The
+        part of the files being read that has already been consumed is included.
+        """
+        num_bytes = 0
+        for directory in [self.base_writing_dir, self.base_reading_dir]:
+            for path in directory.iterdir():
+                if re.fullmatch(self.writing_file_regex, path.name):
+                    try:
+                        num_bytes += path.stat().st_size
+                    except FileNotFoundError:
+                        pass  # Finished or moved since it was listed
+        return num_bytes
+
+    def _read_segment_file(self, data_path: Path, tracker_path: Path) -> Generator[_ReadEscalation, None, None]:
+        """Yields the escalations in a segment file (see `app.escalation_queue.segments`) that haven't been consumed."""
+        offset = read_tracked_offset(tracker_path)
+        with data_path.open(mode="rb") as segment:
+            # A writer holds the file's lock from checking that the file is still in the writing directory until it's
+            # done writing (see `QueueWriter._lock_current_file`). Once we hold it, the file was moved out of the
+            # writing directory before any write that is still to come, so nothing more is written to it.
+            fcntl.flock(segment.fileno(), fcntl.LOCK_EX)
+            fcntl.flock(segment.fileno(), fcntl.LOCK_UN)
+            size = os.fstat(segment.fileno()).st_size
+            if size > offset:
+                with mmap.mmap(segment.fileno(), size, access=mmap.ACCESS_READ) as contents:
+                    for record in read_records(contents, offset):
+                        escalation = QueuedEscalation(record.metadata.decode("utf-8"), record.image_bytes)
+                        yield _ReadEscalation(
+                            escalation, encode_tracked_offset(record.end_offset), (offset, record.end_offset)
+                        )
+                        offset = record.end_offset
+
+            unreadable_bytes = os.fstat(segment.fileno()).st_size - offset
+            if unreadable_bytes > 0:
+                logger.warning(
+                    f"Discarding the last {unreadable_bytes} bytes of queue file {data_path}, which are not a complete "
+                    "escalation. The writer may have been interrupted while writing it."
+                )
+
+    def _read_line_file(self, data_path: Path, tracker_path: Path) -> Generator[_ReadEscalation, None, None]:
+        """Yields the escalations in a line file, as written before segment files, that haven't been consumed."""
+        # The tracking file has a "1" for each line that has been consumed
+        lines_to_skip = len(tracker_path.read_bytes()) if tracker_path.exists() else 0
+        with data_path.open(mode="r", encoding="utf-8") as escalations:
+            for line in islice(escalations, lines_to_skip, None):
+                yield _ReadEscalation(QueuedEscalation(line, None), b"1", None)
+
+            # Wait briefly and attempt one final read in case a line was written during processing. Writers of line
+            # files don't lock them, see `_read_segment_file`.
+            time.sleep(0.1)
+            final_line = escalations.readline()
+            if final_line.strip():
+                yield _ReadEscalation(QueuedEscalation(final_line, None), b"1", None)
+
+    def _open_next_file(self, priority: EscalationPriority) -> _OpenFile | None:
+        """Starts reading the next file of the priority class. Returns None if there is none."""
+        data_path = self._choose_new_file([priority])
+        if data_path is None:
+            return None
+        tracker_path = data_path.with_name(f"{TRACKING_FILE_NAME_PREFIX}{data_path.name}")
+        if not data_path.exists():
+            # The data file is gone while its tracking file remains. Discard the orphaned tracker and move on;
+            # otherwise opening it below would raise FileNotFoundError out of this generator, crashing the reader loop
+            # on every restart.
+            logger.warning("Queue data file %s is missing; discarding orphaned tracking file.", data_path)
+            tracker_path.unlink(missing_ok=True)
+            return None
+        if data_path.suffix == SEGMENT_FILE_SUFFIX:
+            escalations = self._read_segment_file(data_path, tracker_path)
+        else:
+            escalations = self._read_line_file(data_path, tracker_path)
+
+        return _OpenFile(escalations, _FileProgress(data_path, tracker_path))
 
-    def _choose_new_file(self) -> None | Path:
+    def _choose_new_file(self, priorities: Iterable[EscalationPriority] = ESCALATION_PRIORITIES) -> None | Path:
         """
-        Attempts to choose a new file to read from.
+        Attempts to choose a new file to read from, out of the files of the given priority classes.
 
         Returns the path to the chosen next file to read from, or None if there are no
         files available. If there are multiple files present, the next chosen file will be the
         oldest one as determined by filename.
         """
-        # First we look for tracking files, which will exist if the reader was interrupted while in the middle of
-        # processing a file. We finish processing the in-progress files before selecting newly written files.
-        tracking_files = [
-            path for path in self.base_reading_dir.iterdir() if re.fullmatch(self.tracking_file_regex, path.name)
-        ]
-        if len(tracking_files) > 0:
-            tracking_path = tracking_files[0]
-            new_reading_path = Path(tracking_path.parent, tracking_path.name.replace(TRACKING_FILE_NAME_PREFIX, ""))
+        self._update_pending_files()
+
+        # First we look for files that have tracking files, which will exist if the reader was interrupted while in the
+        # middle of processing a file. We finish processing the in-progress files before selecting newly written files.
+        for index, new_reading_path in enumerate(self._interrupted_files):
+            if self._file_priority(new_reading_path.name) in priorities:
+                del self._interrupted_files[index]
+                return new_reading_path
+
+        # If there were no tracking files, we select the oldest fresh file to process.
+        while pending_files := [
+            self._pending_files[priority] for priority in priorities if self._pending_files[priority]
+        ]:
+            oldest_writing_path = self.base_writing_dir / min(pending_files, key=lambda names: names[0]).pop(0)
+            new_reading_path = self.base_reading_dir / oldest_writing_path.name
+
+            # Move the file from writing directory to reading directory. Retention may delete a stale file before
+            # rename; treat FileNotFoundError as unavailable.
+            try:
+                oldest_writing_path.rename(new_reading_path)
+            except FileNotFoundError:
+                logger.warning("Queue file %s vanished before it could be selected; skipping.", oldest_writing_path)
+                continue
             return new_reading_path
 
-        # If there were no tracking files, we look for fresh files to process and select the oldest one.
-        queue_files = [
-            path for path in self.base_writing_dir.iterdir() if re.fullmatch(self.writing_file_regex, path.name)
-        ]
-        if len(queue_files) == 0:
-            return None
+        return None
 
-        oldest_writing_path = sorted(queue_files)[0]
-        new_reading_path = self.base_reading_dir / oldest_writing_path.name
+    def _has_file(self, priority: EscalationPriority) -> bool:
+        """Whether there is a file of the priority class to read, see `_choose_new_file`."""
+        return bool(self._pending_files[priority]) or any(
+            self._file_priority(path.name) == priority for path in self._interrupted_files
+        )
 
-        # Move the file from writing directory to reading directory. Retention may delete a stale file before rename;
-        # treat FileNotFoundError as unavailable.
-        try:
-            oldest_writing_path.rename(new_reading_path)
-        except FileNotFoundError:
-            logger.warning("Queue file %s vanished before it could be selected; skipping.", oldest_writing_path)
-            return None
+    def _audits_are_deferred(self) -> bool:
+        """
+        Whether audits wait for all other escalations, because the backlog is past `audit_defer_bytes`. Checked at most
+        every few seconds.
+        """
+        now = time.monotonic()
+        if now - self._audit_policy_checked_at >= AUDIT_POLICY_CHECK_INTERVAL_S:
+            self._audit_policy_checked_at = now
+            backlog_bytes = self.backlog_bytes()
+            deferring_audits = backlog_bytes > self.audit_defer_bytes
+            if deferring_audits != self._deferring_audits:
+                if deferring_audits:
+                    logger.info(
+                        f"The escalation queue's backlog is {backlog_bytes / 1e6:.0f} MB, escalating audits only when "
+                        "no other escalations are waiting."
+                    )
+                else:
+                    logger.info("Escalating audits alongside other escalations again.")
+            self._deferring_audits = deferring_audits
+        return self._deferring_audits
 
-        return new_reading_path
+    def _start_indexing(self) -> None:
+        """
+        Lists the reading and writing directories. From then on, the files in the writing directory are tracked from
+        inotify events if possible, rather than by listing the directory again, and the reading directory only changes
+        through this reader.
+        """
+        if self.use_inotify:
+            # Start watching before listing the directory, so that files written in between aren't missed
+            self._watcher = DirectoryWatcher.create(self.base_writing_dir)
+        self._interrupted_files = sorted(
+            path.with_name(path.name.removeprefix(TRACKING_FILE_NAME_PREFIX))
+            for path in self.base_reading_dir.iterdir()
+            if re.fullmatch(self.tracking_file_regex, path.name)
+        )
+        self._list_writing_dir()
+
+    def _list_writing_dir(self) -> None:
+        self._pending_files = {priority: [] for priority in ESCALATION_PRIORITIES}
+        for name in sorted(os.listdir(self.base_writing_dir)):
+            if self._is_queue_file(name):
+                self._pending_files[self._file_priority(name)].append(name)
+        self._listed_at = time.monotonic()
+
+    def _update_pending_files(self) -> None:
+        """Brings the index of files in the writing directory up to date."""
+        if self._pending_files is None:
+            self._start_indexing()
+        elif self._watcher is None:
+            # Polling, so the directory is listed at most every QUEUE_POLL_INTERVAL_S
+            if time.monotonic() - self._listed_at >= QUEUE_POLL_INTERVAL_S:
+                self._list_writing_dir()
+        else:
+            for event in self._watcher.read_events():
+                if event.overflowed:
+                    self._list_writing_dir()
+                elif self._is_queue_file(event.name):
+                    pending_files = self._pending_files[self._file_priority(event.name)]
+                    index = bisect.bisect_left(pending_files, event.name)
+                    is_indexed = index < len(pending_files) and pending_files[index] == event.name
+                    if event.added and not is_indexed:
+                        pending_files.insert(index, event.name)
+                    elif event.removed and is_indexed:
+                        del pending_files[index]
+
+    def _file_priority(self, name: str) -> EscalationPriority:
+        """The priority class of the escalations in a queue file. Files written before priority classes are "normal"."""
+        match = self._writing_file_pattern.fullmatch(name)
+        return match.group(2) if match and match.group(2) else "normal"
+
+    def _is_queue_file(self, name: str) -> bool:
+        return self._writing_file_pattern.fullmatch(name) is not None
 
     def _wait_for_file_check(self, duration: float) -> None:
         """
-        Waits for the specified duration.
+        Waits for the specified duration, or until a file is added to the writing directory if it's being watched.
 
         This method is defined like this to avoid patching `time.sleep` directly in testing.
         """
-        time.sleep(duration)
+        if self._watcher is not None:
+            self._watcher.wait(duration)
+        else:
+            time.sleep(duration)
+
+    def close(self) -> None:
+        """Stops watching the writing directory."""
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+
+def _detector_id(line: str) -> str | None:
+    """The detector ID of a queued escalation, or None if its escalation info can't be parsed."""
+    try:
+        return json.loads(line)["detector_id"]
+    except (ValueError, KeyError, TypeError):
+        return None
@@ -15,7 +15,8 @@ logger = logging.getLogger(__name__)
 
 # Every directory the escalation queue writes to disk. Anything older than the retention window is
 # deleted regardless of escalation status: stale pending escalations, their images, and failed-
-# escalation records alike.
+# escalation records alike. Escalations are stored with their images in segment files, which are
+# deleted whole; the images dir only holds images of escalations queued before segment files.
 RETENTION_DIRS = (
     Path(DEFAULT_QUEUE_BASE_DIR) / IMAGE_DIR_SUFFIX,
     Path(DEFAULT_QUEUE_BASE_DIR) / WRITING_DIR_SUFFIX,
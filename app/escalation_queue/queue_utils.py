@@ -4,8 +4,8 @@ from groundlight import Groundlight
 from model import ImageQuery
 
 from app.core.utils import get_formatted_timestamp_str, safe_call_sdk
-from app.escalation_queue.models import EscalationInfo, SubmitImageQueryParams
-from app.escalation_queue.queue_writer import QueueWriter
+from app.escalation_queue.models import EscalationInfo, EscalationPriority, SubmitImageQueryParams
+from app.escalation_queue.queue_writer import BackgroundQueueWriter
 from app.profiling.context import trace_span
 
 logger = logging.getLogger(__name__)
@@ -13,21 +13,29 @@ logger = logging.getLogger(__name__)
 
 @trace_span
 def write_escalation_to_queue(
-    writer: QueueWriter, detector_id: str, image_bytes: bytes, submit_iq_params: SubmitImageQueryParams, request_id: str
+    writer: BackgroundQueueWriter,
+    detector_id: str,
+    image_bytes: bytes,
+    submit_iq_params: SubmitImageQueryParams,
+    request_id: str,
+    priority: EscalationPriority = "normal",
 ) -> None:
-    """Writes an escalation to the queue. On failure, logs an error and does NOT raise an exception."""
-    try:  # We don't want this to ever raise an exception because it's called synchronously before we return an answer.
-        timestamp = get_formatted_timestamp_str()
-        image_path_str = writer.write_image_bytes(image_bytes, detector_id, timestamp)
+    """
+    Hands an escalation to the writer, which writes it to the queue in the background. On failure, logs an error and
+    does NOT raise an exception.
 
+    The priority class decides how soon the escalation is escalated when the queue has a backlog, see
+    `app.escalation_queue.priorities`.
+    """
+    try:  # We don't want this to ever raise an exception because it's called before we return an answer.
         escalation_info = EscalationInfo(
-            timestamp=timestamp,
+            timestamp=get_formatted_timestamp_str(),
             detector_id=detector_id,
-            image_path_str=image_path_str,
             submit_iq_params=submit_iq_params,
             request_id=request_id,
+            priority=priority,
         )
-        writer.write_escalation(escalation_info)
+        writer.submit(escalation_info, image_bytes)
     except Exception as e:
         logger.error(f"Failed to write escalation to queue for detector {detector_id} with error {e}.")
 
@@ -35,7 +43,7 @@ def write_escalation_to_queue(
 @trace_span
 def safe_escalate_with_queue_write(
     gl: Groundlight,
-    queue_writer: QueueWriter,
+    queue_writer: BackgroundQueueWriter,
     detector_id: str,
     image_bytes: bytes,
     want_async: bool,
@@ -63,7 +71,8 @@ def safe_escalate_with_queue_write(
         # the escalation failed because there was no internet connection. For other exceptions, the escalation might or
         # might not be successful upon retry (e.g., if the request is malformed, it will error again). But the
         # escalation queue process will handle these errors and skip the escalation if it can't succceed, so we can
-        # safely write it to the queue no matter what the exception here was.
+        # safely write it to the queue no matter what the exception here was. The client gets no answer but the cloud's,
+        # so the escalation is critical.
         logger.info(
             f"Writing an escalation for detector {detector_id} to the queue because there was an exception while "
             f"escalating: {ex=}."
@@ -74,5 +83,6 @@ def safe_escalate_with_queue_write(
             image_bytes=image_bytes,
             submit_iq_params=submit_iq_params,
             request_id=request_id,
+            priority="critical",
         )
         raise ex
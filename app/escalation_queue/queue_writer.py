@@ -1,108 +1,329 @@
-import json
+import fcntl
 import logging
 import os
+import queue
+import threading
+import time
 from pathlib import Path
+from typing import Literal
 
 import ksuid
 
 from app.core.utils import get_formatted_timestamp_str
 from app.escalation_queue.constants import (
     DEFAULT_QUEUE_BASE_DIR,
-    IMAGE_DIR_SUFFIX,
     MAX_QUEUE_FILE_LINES,
     WRITING_DIR_SUFFIX,
 )
-from app.escalation_queue.models import EscalationInfo
+from app.escalation_queue.drain import read_drain_status
+from app.escalation_queue.models import EscalationInfo, EscalationPriority
+from app.escalation_queue.priorities import AUDIT_POLICY_CHECK_INTERVAL_S, ESCALATION_QUEUE_AUDIT_SHED_BYTES
+from app.escalation_queue.segments import SEGMENT_FILE_SUFFIX, encode_record
 
 logger = logging.getLogger(__name__)
 
+Durability = Literal["none", "batch", "record"]
+DURABILITY_POLICIES: tuple[Durability, ...] = ("none", "batch", "record")
+
+# When escalations are fsynced to disk: "none" leaves it to the OS, "batch" syncs once per batch written by the
+# background writer, "record" syncs after each escalation.
+ESCALATION_QUEUE_DURABILITY: Durability = os.environ.get("ESCALATION_QUEUE_DURABILITY", "batch")
+# How many escalations may wait for the background writer. Each holds its image in memory. Escalations submitted while
+# the writer is this far behind are dropped, see `BackgroundQueueWriter.submit`.
+ESCALATION_QUEUE_MAX_PENDING = int(os.environ.get("ESCALATION_QUEUE_MAX_PENDING", 256))
+ESCALATION_QUEUE_CLOSE_TIMEOUT_S = 10
+
 
 def convert_escalation_info_to_str(escalation_info: EscalationInfo) -> str:
     """Converts an `EscalationInfo` object to string form, which can be written to and read from a file."""
-    return f"{json.dumps(escalation_info.model_dump())}\n"
+    return f"{escalation_info.model_dump_json()}\n"
+
+
+def convert_escalation_to_record(escalation_info: EscalationInfo, image_bytes: bytes) -> bytes:
+    """Converts an escalation and its image to a record of a segment file, see `app.escalation_queue.segments`."""
+    return encode_record(convert_escalation_info_to_str(escalation_info).encode("utf-8"), image_bytes)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+class _QueueFile:
+    """The segment file that a `QueueWriter` appends escalations of one priority class to."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.num_escalations = 0
+        # Kept open between writes
+        self.fd: int | None = None
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
 
 
 class QueueWriter:
-    """Handles writing escalation data and associated images to a file-based queue system."""
+    """
+    Handles writing escalations and their images to a file-based queue system. Each escalation is written together
+    with its image as one record of a segment file, see `app.escalation_queue.segments`.
+
+    Escalations of each priority class are written to segment files of their own, named after the class, so that the
+    reader can escalate the classes at different rates (see `app.escalation_queue.priorities`).
+    """
+
+    def __init__(self, base_dir: str = DEFAULT_QUEUE_BASE_DIR, durability: Durability = "none"):
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy {durability!r}, expected one of {DURABILITY_POLICIES}")
+        self.durability = durability
 
-    def __init__(self, base_dir: str = DEFAULT_QUEUE_BASE_DIR):
         self.base_writing_dir = Path(base_dir, WRITING_DIR_SUFFIX)
         os.makedirs(self.base_writing_dir, exist_ok=True)  # Ensure base_writing_dir exists
-        self.base_image_dir = Path(base_dir, IMAGE_DIR_SUFFIX)
-        os.makedirs(self.base_image_dir, exist_ok=True)  # Ensure base_image_dir exists
 
-        self.last_file_path: Path | None = None
-        self.num_lines_written_to_file: int = 0
+        # The current file of each priority class, and the class written to last
+        self._files: dict[EscalationPriority, _QueueFile] = {}
+        self._last_priority: EscalationPriority | None = None
+
+    @property
+    def last_file_path(self) -> Path | None:
+        """The path of the file written to last."""
+        return self._files[self._last_priority].path if self._last_priority in self._files else None
 
-    def write_image_bytes(self, image_bytes: bytes, detector_id: str, timestamp: str) -> str:
+    @property
+    def num_escalations_written_to_file(self) -> int:
+        """The number of escalations in the file written to last."""
+        return self._files[self._last_priority].num_escalations if self._last_priority in self._files else 0
+
+    def write_escalation(self, escalation_info: EscalationInfo, image_bytes: bytes) -> bool:
         """
-        Writes the provided image bytes to a unique path based on the detector ID and timestamp and returns the absolute
-        path as a string.
+        Writes the provided escalation info and image to the queue.
+
+        Will write to the last used file path of the escalation's priority class if it exists and has not exceeded the
+        maximum length. Otherwise will create a new file to write the escalation to.
+
+        Returns True if the write succeeds and False otherwise.
         """
-        image_file_name = f"{detector_id}-{timestamp}-{ksuid.KsuidMs()}"
-        image_path = Path.joinpath(self.base_image_dir, image_file_name)
-        image_path.parent.mkdir(parents=True, exist_ok=True)  # Ensure directory of target path exists.
-        image_path.write_bytes(image_bytes)
+        return self.write_escalations([(escalation_info, image_bytes)])
 
-        return str(image_path.resolve())
+    def write_escalations(self, escalations: list[tuple[EscalationInfo, bytes]]) -> bool:
+        """
+        Writes the provided escalations and their images to the queue, in as few writes as the file length limit
+        allows, and syncs them to disk according to the durability policy.
 
-    def write_escalation(self, escalation_info: EscalationInfo) -> bool:
+        Returns True if all writes succeed and False otherwise.
         """
-        Writes the provided escalation info to the queue.
+        records_by_priority: dict[EscalationPriority, list[bytes]] = {}
+        for info, image_bytes in escalations:
+            records_by_priority.setdefault(info.priority, []).append(convert_escalation_to_record(info, image_bytes))
 
-        Will write to the last used file path if it exists and has not exceeded the maximum length. Otherwise will
-        create a new file to write the escalation to.
+        succeeded = True
+        for priority, records in records_by_priority.items():
+            succeeded = self._write_records(priority, records) and succeeded
+        return succeeded
 
-        Returns True if the write succeeds and False otherwise.
+    def _write_records(self, priority: EscalationPriority, records: list[bytes]) -> bool:
+        self._last_priority = priority
+        while records:
+            queue_file = self._files.get(priority)
+            if queue_file is None or queue_file.num_escalations >= MAX_QUEUE_FILE_LINES:
+                queue_file = self._reset_to_new_file(priority)
+            num_records = min(len(records), MAX_QUEUE_FILE_LINES - queue_file.num_escalations)
+            if not self._write_to_current_file(priority, records[:num_records]):
+                return False
+            self._files[priority].num_escalations += num_records
+            records = records[num_records:]
+        return True
+
+    def _write_to_current_file(self, priority: EscalationPriority, records: list[bytes]) -> bool:
+        """
+        Writes the provided records to the current file of the priority class. Returns True if the write succeeds and
+        False otherwise.
         """
-        is_new_file = False
-        if self.last_file_path is None or self.num_lines_written_to_file >= MAX_QUEUE_FILE_LINES:
-            self._reset_to_new_file()
-            is_new_file = True
-
-        wrote_successfully = self._write_to_path(self.last_file_path, escalation_info, is_new_file)
-        if wrote_successfully:
-            self.num_lines_written_to_file += 1
-        return wrote_successfully
-
-    def _write_to_path(self, path_to_write_to: Path, data: EscalationInfo, is_new_file: bool) -> bool:
-        """Writes the provided data to the provided path. Returns True if the write succeeds and False otherwise."""
         try:
-            path_to_write_to.parent.mkdir(parents=True, exist_ok=True)  # Ensure directory of target path exists.
-
-            flags = os.O_WRONLY | os.O_APPEND
-            if is_new_file:
-                # If we know the file does not yet exist, we want to create it and open it.
-                flags |= os.O_CREAT
-                fd = os.open(path_to_write_to, flags)
-            else:
-                try:
-                    # If we think the file exists (because we wrote to it before) but aren't certain (because the reader
-                    # could have moved it), we assume it exists and try to open it for appending. If the file doesn't
-                    # exist, this will raise a FileNotFoundError.
-                    fd = os.open(path_to_write_to, flags)
-                except FileNotFoundError:
-                    # If the file doesn't exist (e.g., if the reader moved it) we reset to a new path.
-                    self._reset_to_new_file()
-                    flags |= os.O_CREAT
-                    fd = os.open(self.last_file_path, flags)
-
-            # TODO this could be optimized by opening each file only once, instead of on each write.
-            with os.fdopen(fd, "a") as f:
-                f.write(convert_escalation_info_to_str(data))
+            fd = self._lock_current_file(priority)
+            try:
+                if self.durability == "record":
+                    for record in records:
+                        _write_all(fd, record)
+                        os.fsync(fd)
+                else:
+                    _write_all(fd, b"".join(records))
+                    if self.durability == "batch":
+                        os.fsync(fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
             return True
         except OSError as e:
-            logger.error(f"Failed to write to {path_to_write_to} with error {e}.")
+            logger.error(f"Failed to write to {self._files[priority].path} with error {e}.")
+            # A partially written record is skipped by the reader, but nothing after it would be read, so further
+            # escalations go to a new file.
+            self._reset_to_new_file(priority)
             return False
 
-    def _generate_new_path(self) -> Path:
-        """Generates a new unique path in the writing directory."""
-        new_file_name = f"{get_formatted_timestamp_str()}-{ksuid.KsuidMs()}.txt"
+    def _lock_current_file(self, priority: EscalationPriority) -> int:
+        """
+        Returns the file descriptor of the current file of the priority class, opening it if needed, with an exclusive
+        lock on the file. If the file was moved or deleted since the last write (e.g., by the reader), switches to a
+        new file.
+
+        The reader moves files that it starts reading, and then waits for the lock, so that it reads everything written
+        by a write that started before the move. Anything written after the move could be written after the reader is
+        done with the file, so it is written to a new file instead.
+        """
+        while True:
+            queue_file = self._files[priority]
+            if queue_file.fd is None:
+                queue_file.path.parent.mkdir(parents=True, exist_ok=True)  # Ensure directory of target path exists.
+                queue_file.fd = os.open(queue_file.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            fcntl.flock(queue_file.fd, fcntl.LOCK_EX)
+            try:
+                if os.stat(queue_file.path).st_ino == os.fstat(queue_file.fd).st_ino:
+                    return queue_file.fd
+            except FileNotFoundError:
+                pass
+            fcntl.flock(queue_file.fd, fcntl.LOCK_UN)
+            self._reset_to_new_file(priority)
+
+    def close(self) -> None:
+        """Closes the current files. The next write opens them again."""
+        for queue_file in self._files.values():
+            queue_file.close()
+
+    def _generate_new_path(self, priority: EscalationPriority) -> Path:
+        """Generates a new unique path in the writing directory, for a file of the priority class."""
+        new_file_name = f"{get_formatted_timestamp_str()}-{ksuid.KsuidMs()}.{priority}{SEGMENT_FILE_SUFFIX}"
         new_file_path = Path.joinpath(self.base_writing_dir, new_file_name)
         return new_file_path
 
-    def _reset_to_new_file(self) -> None:
-        """Generates a new path, sets the `last_file_path` to the new path, and resets the line number counter to 0."""
-        new_path = self._generate_new_path()
-        self.last_file_path = new_path
-        self.num_lines_written_to_file = 0
+    def _reset_to_new_file(self, priority: EscalationPriority) -> _QueueFile:
+        """Closes the current file of the priority class and starts a new one, with a new path and no escalations."""
+        if priority in self._files:
+            self._files[priority].close()
+        queue_file = self._files[priority] = _QueueFile(self._generate_new_path(priority))
+        return queue_file
+
+
+class BackgroundQueueWriter:
+    """
+    Writes escalations and their images to the queue from a background thread, so that writing them adds no disk
+    latency to the requests that escalate.
+
+    Escalations are handed to the thread through a bounded in-memory queue. The thread writes whatever has accumulated
+    while it was writing the previous batch as one batch (a group commit): the escalations and their images in one write
+    to the current segment file of each priority class, synced to disk according to the durability policy.
+
+    Escalations that are still in memory are lost if the process dies, like escalations that were written but not yet
+    synced to disk.
+
+    Audits aren't queued while the queue's backlog is past `ESCALATION_QUEUE_AUDIT_SHED_BYTES`, as last reported by the
+    reader (see `app.escalation_queue.priorities`).
+    """
+
+    def __init__(
+        self,
+        base_dir: str = DEFAULT_QUEUE_BASE_DIR,
+        max_pending: int = ESCALATION_QUEUE_MAX_PENDING,
+        durability: Durability = ESCALATION_QUEUE_DURABILITY,
+        audit_shed_bytes: int = ESCALATION_QUEUE_AUDIT_SHED_BYTES,
+    ):
+        self.base_dir = base_dir
+        self.queue_writer = QueueWriter(base_dir, durability=durability)
+        # Escalations with their image bytes, events to set once everything before them is written (see `flush`), and
+        # None to stop the thread
+        self._pending: queue.Queue[tuple[EscalationInfo, bytes] | threading.Event | None] = queue.Queue(max_pending)
+        self.num_dropped = 0
+        self.audit_shed_bytes = audit_shed_bytes
+        self.num_audits_shed = 0
+        self._shedding_audits = False
+        self._audit_policy_checked_at = float("-inf")
+        self._thread = threading.Thread(target=self._run, name="escalation-queue-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, escalation_info: EscalationInfo, image_bytes: bytes) -> bool:
+        """
+        Hands an escalation and its image to the background thread, which writes them to the queue. Returns
+        immediately.
+
+        If `max_pending` escalations are already waiting to be written, the escalation is dropped rather than making
+        the caller wait for the disk, and False is returned. So is an audit while audits are being shed.
+        """
+        if escalation_info.priority == "audit" and self._audits_are_shed():
+            self.num_audits_shed += 1
+            logger.debug(f"Not queueing an audit for detector {escalation_info.detector_id}, audits are being shed.")
+            return False
+        try:
+            self._pending.put_nowait((escalation_info, image_bytes))
+            return True
+        except queue.Full:
+            self.num_dropped += 1
+            logger.error(
+                f"Dropped an escalation for detector {escalation_info.detector_id} because "
+                f"{self._pending.maxsize} escalations are already waiting to be written to the queue "
+                f"({self.num_dropped} dropped so far)."
+            )
+            return False
+
+    def _audits_are_shed(self) -> bool:
+        """Whether the queue's backlog is too large to queue audits. Checked at most every few seconds."""
+        now = time.monotonic()
+        if now - self._audit_policy_checked_at >= AUDIT_POLICY_CHECK_INTERVAL_S:
+            self._audit_policy_checked_at = now
+            status = read_drain_status(self.base_dir)
+            backlog_bytes = status.get("backlog_bytes", 0) if status else 0
+            shedding_audits = backlog_bytes > self.audit_shed_bytes
+            if shedding_audits != self._shedding_audits:
+                if shedding_audits:
+                    logger.warning(
+                        f"The escalation queue's backlog is {backlog_bytes / 1e6:.0f} MB, no longer queueing audits "
+                        "until it drains."
+                    )
+                else:
+                    logger.info(f"Queueing audits again ({self.num_audits_shed} were not queued).")
+            self._shedding_audits = shedding_audits
+        return self._shedding_audits
+
+    def flush(self, timeout_s: float | None = None) -> bool:
+        """Waits until the escalations submitted so far are written. Returns False if it takes longer than timeout_s."""
+        written = threading.Event()
+        try:
+            self._pending.put(written, timeout=timeout_s)
+        except queue.Full:
+            return False
+        return written.wait(timeout_s)
+
+    def close(self, timeout_s: float = ESCALATION_QUEUE_CLOSE_TIMEOUT_S) -> None:
+        """Writes the pending escalations and stops the background thread."""
+        try:
+            self._pending.put(None, timeout=timeout_s)
+        except queue.Full:
+            logger.error(f"Escalations are still waiting to be written to the queue after {timeout_s}s.")
+            return
+        self._thread.join(timeout_s)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            escalations = [item for item in batch if isinstance(item, tuple)]
+            if escalations:
+                self._write_batch(escalations)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in batch:
+                self.queue_writer.close()
+                return
+
+    def _write_batch(self, escalations: list[tuple[EscalationInfo, bytes]]) -> None:
+        """Writes the escalations and their images. Never raises."""
+        try:
+            self.queue_writer.write_escalations(escalations)
+        except Exception as e:
+            logger.error(f"Failed to write {len(escalations)} escalation(s) to the queue with error {e}.")
@@ -0,0 +1,83 @@
+"""The segment file format of the escalation queue.
+
+A segment file holds a sequence of records, each an escalation's metadata (`EscalationInfo` as JSON) together with its
+image, so that queueing an escalation creates no file of its own:
+
+    magic (4 bytes) | metadata length (u32) | image length (u32) | CRC32 of metadata and image (u32) | metadata | image
+
+with little-endian integers. Queue files written before segments (`.txt`) hold one JSON line per escalation, pointing
+at an image file in the queue's image directory. The reader still reads them, so that escalations queued before an
+upgrade aren't lost.
+
+A writer that crashes while appending a record leaves an incomplete record at the end of its segment. Each record is
+checked against its lengths and CRC, so such a tail is never read as an escalation (see `read_records`) and the rest of
+the segment is still read.
+
+The reader tracks its progress through a segment in a tracking file, to which it appends the offset after each record
+that it has consumed (see `read_tracked_offset`). Appending a fixed-size offset keeps the tracking file valid if the
+reader is interrupted part-way through writing it.
+"""
+
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+SEGMENT_FILE_SUFFIX = ".seg"
+RECORD_MAGIC = b"GLEQ"
+_RECORD_HEADER = struct.Struct("<4sIII")
+_TRACKED_OFFSET = struct.Struct("<Q")
+
+
+class SegmentRecord(NamedTuple):
+    metadata: bytes
+    image_bytes: bytes
+    # The offset in the segment right after the record, where the next record starts
+    end_offset: int
+
+
+def encode_record(metadata: bytes, image_bytes: bytes) -> bytes:
+    """Encodes an escalation's metadata and image as a segment record."""
+    checksum = zlib.crc32(image_bytes, zlib.crc32(metadata))
+    return _RECORD_HEADER.pack(RECORD_MAGIC, len(metadata), len(image_bytes), checksum) + metadata + image_bytes
+
+
+def read_records(buffer: bytes | memoryview, offset: int = 0) -> Iterator[SegmentRecord]:
+    """
+    Yields the records in a segment's contents, starting at offset. Stops at the end of the contents or at the first
+    record that is incomplete or corrupt, e.g. one that a writer was appending when it crashed.
+    """
+    while offset + _RECORD_HEADER.size <= len(buffer):
+        magic, metadata_length, image_length, checksum = _RECORD_HEADER.unpack_from(buffer, offset)
+        metadata_start = offset + _RECORD_HEADER.size
+        image_start = metadata_start + metadata_length
+        end_offset = image_start + image_length
+        if magic != RECORD_MAGIC or end_offset > len(buffer):
+            return
+        metadata = bytes(buffer[metadata_start:image_start])
+        image_bytes = bytes(buffer[image_start:end_offset])
+        if zlib.crc32(image_bytes, zlib.crc32(metadata)) != checksum:
+            return
+        yield SegmentRecord(metadata, image_bytes, end_offset)
+        offset = end_offset
+
+
+def encode_tracked_offset(offset: int) -> bytes:
+    """Encodes an offset to append to a segment's tracking file."""
+    return _TRACKED_OFFSET.pack(offset)
+
+
+def read_tracked_offset(tracking_path: Path) -> int:
+    """Returns the offset in a segment up to which its records have been consumed, according to its tracking file."""
+    try:
+        with tracking_path.open("rb") as tracker:
+            size = os.fstat(tracker.fileno()).st_size
+            # An offset that was cut off part-way through is ignored
+            last_offset_start = (size // _TRACKED_OFFSET.size - 1) * _TRACKED_OFFSET.size
+            if last_offset_start < 0:
+                return 0
+            tracker.seek(last_offset_start)
+            return _TRACKED_OFFSET.unpack(tracker.read(_TRACKED_OFFSET.size))[0]
+    except FileNotFoundError:
+        return 0
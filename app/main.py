@@ -10,13 +10,21 @@ import os
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi import FastAPI
-from groundlight.edge import EdgeEndpointConfig
 
-from app.api.api import api_router, edge_config_router, edge_detector_readiness_router, health_router, ping_router
+from app.api.api import (
+    api_router,
+    edge_config_router,
+    edge_detector_readiness_router,
+    edge_inference_stats_router,
+    health_router,
+    ping_router,
+)
 from app.api.naming import API_BASE_PATH
 from app.core.app_state import AppState
 from app.core.edge_config_manager import EdgeConfigManager, reconcile_config
+from app.core.edge_config_schema import ExtendedEdgeEndpointConfig
 from app.core.file_paths import ACTIVE_EDGE_CONFIG_PATH, HELM_CONFIGMAP_PATH
+from app.metrics.iq_activity import ACTIVITY_METRICS_FLUSH_INTERVAL_S, flush_activity_metrics
 from app.profiling import PROFILING_ENABLED
 from app.profiling.instrumentation import install_threadpool_tracing
 from app.profiling.middleware import ProfilingMiddleware
@@ -41,6 +49,7 @@ app.include_router(router=ping_router)
 app.include_router(router=health_router)
 app.include_router(router=edge_config_router)
 app.include_router(router=edge_detector_readiness_router)
+app.include_router(router=edge_inference_stats_router)
 
 
 @app.on_event("startup")
@@ -53,7 +62,7 @@ async def startup_event():
     env_config = os.environ.get("EDGE_CONFIG", "").strip()
     if env_config:
         logging.info("EDGE_CONFIG env var set, writing to active config file")
-        EdgeConfigManager.save(EdgeEndpointConfig.from_yaml(yaml_str=env_config))
+        EdgeConfigManager.save(ExtendedEdgeEndpointConfig.from_yaml(yaml_str=env_config))
     # Ensure backwards compatibility. When we are confident that all users have upgraded, we can deprecate this logic.
     elif not os.path.exists(ACTIVE_EDGE_CONFIG_PATH):
         if os.path.exists(HELM_CONFIGMAP_PATH):
@@ -64,10 +73,16 @@ async def startup_event():
                 ACTIVE_EDGE_CONFIG_PATH,
                 HELM_CONFIGMAP_PATH,
             )
-            EdgeConfigManager.save(EdgeEndpointConfig.from_yaml(filename=HELM_CONFIGMAP_PATH))
+            EdgeConfigManager.save(ExtendedEdgeEndpointConfig.from_yaml(filename=HELM_CONFIGMAP_PATH))
         else:
             logging.warning("No active config file or Helm ConfigMap found. Using Pydantic defaults.")
 
+    # Image-query activity is counted in memory on the request path and written to the metrics files in the background.
+    activity_metrics_scheduler = AsyncIOScheduler()
+    activity_metrics_scheduler.add_job(flush_activity_metrics, "interval", seconds=ACTIVITY_METRICS_FLUSH_INTERVAL_S)
+    activity_metrics_scheduler.start()
+    app.state.activity_metrics_scheduler = activity_metrics_scheduler
+
     if PROFILING_ENABLED:
         from app.profiling import get_profiling_manager
 
@@ -77,10 +92,19 @@ async def startup_event():
         scheduler.start()
         app.state.profiling_scheduler = scheduler
 
+    # The config is read several times per image query, so watch the file in the background instead of checking it on
+    # every read
+    EdgeConfigManager.start_watching()
     config = EdgeConfigManager.active()
     reconcile_config(config, app.state.app_state.db_manager)
     logging.info(f"edge_config={config}")
 
+    # Probe the inference services once before reporting ready, so the first requests after a restart already know
+    # which detectors can run on the edge. From then on, probes run in the background and never hold up a request.
+    readiness = app.state.app_state.edge_inference_manager.readiness
+    await readiness.probe_all()
+    readiness.start()
+
     app.state.app_state.is_ready = True
     logging.info("Application is ready to serve requests.")
 
@@ -90,5 +114,10 @@ async def shutdown_event():
     """Lifecycle event that is triggered when the application is shutting down."""
     app.state.app_state.is_ready = False
     app.state.app_state.db_manager.shutdown()
+    app.state.app_state.queue_writer.close()
+    await app.state.app_state.edge_inference_manager.aclose()
+    EdgeConfigManager.stop_watching()
+    app.state.activity_metrics_scheduler.shutdown()
+    flush_activity_metrics()
     if hasattr(app.state, "profiling_scheduler"):
         app.state.profiling_scheduler.shutdown()
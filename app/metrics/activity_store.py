@@ -0,0 +1,85 @@
+"""Compact storage for hourly image-query activity counts.
+
+Each hour's counts live in one small SQLite database (`activity_YYYY-MM-DD_HH.sqlite`), in a table keyed by detector
+and counter name. Counter names are the same as the prefixes of the old per-process counter files, e.g. `iqs`,
+`escalations_class_0` or `confidence_v2_70-75`. Every edge-endpoint process adds its counts to the same database, so
+reading a detector's activity for an hour is one indexed query, and expiring an hour is deleting one file.
+"""
+
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# How long a writer waits for another process to finish writing the same hour
+ACTIVITY_STORE_BUSY_TIMEOUT_S = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity (
+    detector_id TEXT NOT NULL,
+    counter TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (detector_id, counter)
+) WITHOUT ROWID
+"""
+# Edge-endpoint wide counters are stored under this detector ID
+EDGE_ENDPOINT_WIDE = ""
+
+
+class HourlyActivityStore:
+    """Activity counts per hour, detector and counter name, shared by all processes using the same directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, hour: str) -> Path:
+        """The database for an hour formatted as YYYY-MM-DD_HH."""
+        return Path(self.directory, f"activity_{hour}.sqlite")
+
+    def add(self, hour: str, counts: dict[tuple[str, str], int]):
+        """Add counts, keyed by (detector_id, counter name), to the hour's totals in a single transaction."""
+        connection = sqlite3.connect(self.path(hour), timeout=ACTIVITY_STORE_BUSY_TIMEOUT_S)
+        try:
+            with connection:
+                connection.execute(_SCHEMA)
+                connection.executemany(
+                    "INSERT INTO activity (detector_id, counter, count) VALUES (?, ?, ?) "
+                    "ON CONFLICT (detector_id, counter) DO UPDATE SET count = count + excluded.count",
+                    [(detector_id, counter, count) for (detector_id, counter), count in counts.items()],
+                )
+        finally:
+            connection.close()
+
+    def counts(self, hour: str, detector_id: str = EDGE_ENDPOINT_WIDE) -> dict[str, int]:
+        """The totals per counter name for a detector in an hour. Empty if nothing was recorded."""
+        path = self.path(hour)
+        if not path.exists():
+            return {}
+        # Read-only, so that reading never creates or locks out writers from an hour's database
+        connection = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True, timeout=ACTIVITY_STORE_BUSY_TIMEOUT_S)
+        try:
+            rows = connection.execute(
+                "SELECT counter, count FROM activity WHERE detector_id = ?", (detector_id,)
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            # e.g. the hour was just created and has no table yet
+            logger.debug(f"Could not read activity for hour {hour}: {e}")
+            return {}
+        finally:
+            connection.close()
+        return dict(rows)
+
+    def hours(self) -> list[str]:
+        """The hours that have a database, in no particular order."""
+        return [f.name[len("activity_") : -len(".sqlite")] for f in self.directory.glob("activity_*.sqlite")]
+
+    def delete_hours_except(self, hours_to_keep: list[str]):
+        """Delete the databases of every hour not in `hours_to_keep`."""
+        for hour in self.hours():
+            if hour not in hours_to_keep:
+                logger.info(f"Deleting activity counts for hour {hour}")
+                self.path(hour).unlink(missing_ok=True)
+                Path(f"{self.path(hour)}-journal").unlink(missing_ok=True)
@@ -4,41 +4,54 @@ edge-endpoint as a whole.
 
 Filesystem structure:
 /opt/groundlight/device/edge-metrics/
+    last_iqs, last_escalations, ...    <-- edge-endpoint wide last activity times (file modification times)
+    hourly/
+        activity_YYYY-MM-DD_HH.sqlite    <-- one database per hour, hourly databases cleared out regularly
     detectors/
         <detector_id1>/
             last_iqs
             last_escalations
             last_audits
             last_below_threshold_iqs
-            iqs_<pid1>_YYYY-MM-DD_HH    <-- arbitrary number of files, one per process. hourly files cleared out regularly
-            iqs_<pid1>_YYYY-MM-DD_HH
-            iqs_<pid2>_YYYY-MM-DD_HH
-            iqs_<pid2>_YYYY-MM-DD_HH
-            escalations_<pid1>_YYYY-MM-DD_HH
-            escalations_<pid2>_YYYY-MM-DD_HH
-            audits_<pid1>_YYYY-MM-DD_HH
-            below_threshold_iqs_<pid1>_YYYY-MM-DD_HH
-            confidence_v2_0-5_<pid1>_YYYY-MM-DD_HH    <-- confidence histogram buckets (5% intervals, version-prefixed)
-            confidence_v2_95-100_<pid1>_YYYY-MM-DD_HH
-            confidence_v2_class_0_70-75_<pid1>_YYYY-MM-DD_HH    <-- per-class confidence histograms
-            escalations_class_0_<pid1>_YYYY-MM-DD_HH          <-- per-class activity counters
-            below_threshold_iqs_class_0_<pid1>_YYYY-MM-DD_HH
         <detector_id2>/
             repeat of above detector
+
+Each hourly database holds the counts of all edge-endpoint processes for that hour, keyed by detector and counter
+name (see `app.metrics.activity_store`). Counter names are:
+    iqs, escalations, audits, below_threshold_iqs
+    escalations_class_0, below_threshold_iqs_class_0        <-- per-class activity counters
+    confidence_v2_0-5 ... confidence_v2_95-100             <-- confidence histogram buckets (5% intervals, versioned)
+    confidence_v2_class_0_70-75                            <-- per-class confidence histograms
+
+Earlier versions kept one file per counter, process and hour (`<counter>_<pid>_YYYY-MM-DD_HH`) in the detector
+folders. Until `migrate_legacy_activity_files` has moved them into the hourly databases, such files are still read.
+
+Activity is counted in memory on the request path, and each process adds its counts to the hourly databases (and
+updates the last_* files) when it flushes, every ACTIVITY_METRICS_FLUSH_INTERVAL_S seconds and on shutdown. Counts that
+haven't been flushed yet aren't visible to readers.
 """
 
 import json
 import logging
 import os
+import threading
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 from functools import lru_cache
 from pathlib import Path
 
+from app.metrics.activity_store import EDGE_ENDPOINT_WIDE, HourlyActivityStore
 from app.profiling.context import trace_span
 
 logger = logging.getLogger(__name__)
 
 PER_CLASS_ACTIVITY_TYPES = ["escalations", "below_threshold_iqs"]
+ACTIVITY_METRICS_FLUSH_INTERVAL_S = float(os.environ.get("ACTIVITY_METRICS_FLUSH_INTERVAL_S", 5))
+HOUR_FORMAT = "%Y-%m-%d_%H"
+# Files that match the pattern <record_name>_YYYY-MM-DD_HH
+LEGACY_HOURLY_FILE_PATTERN = "*_[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]_[0-9][0-9]"
+# Created once the old per-process hourly files have been moved into the hourly databases
+LEGACY_FILES_MIGRATED_MARKER = "legacy_hourly_files_migrated"
 
 
 class ConfidenceHistogramConfig:
@@ -123,6 +136,8 @@ class FilesystemActivityTrackingHelper:
         # Ensure the detectors directory exists
         os.makedirs(self.detectors_dir, exist_ok=True)
 
+        self.store = HourlyActivityStore(Path(self.base_dir, "hourly"))
+
     def file(self, name: str) -> Path:
         """Get the path to a file which is used to track something across the whole edge-endpoint (like number of
         active models, or the last image query)"""
@@ -149,32 +164,28 @@ class FilesystemActivityTrackingHelper:
 
         return self.file(name)
 
-    def hourly_activity_file(self, activity_type: str, time: datetime, detector_id: str | None = None) -> Path:
-        """Get the path to a file which is used to track the number of times an activity type
-        occurred in an hour on this process."""
-        hour = time.strftime("%Y-%m-%d_%H")
-        pid = os.getpid()
-
-        name = f"{activity_type}_{pid}_{hour}"
-
-        if detector_id:
-            return self.detector_file(detector_id, name)
-
-        return self.file(name)
-
-    def increment_counter_file(self, file: Path):
-        """Increment a counter file, or create it if it doesn't exist.
-
-        Args:
-            file (Path): The path to the counter file.
-        """
-        if not file.exists():
-            file.touch()
-            file.write_text("1")
-            return
-
-        read_total = int(file.read_text())
-        file.write_text(str(read_total + 1))
+    def legacy_files_may_exist(self) -> bool:
+        """Whether there may be hourly files in the old one-file-per-counter-and-process layout."""
+        return not self.file(LEGACY_FILES_MIGRATED_MARKER).exists()
+
+    def legacy_hourly_counts(self, hour: str, detector_id: str | None = None) -> dict[str, int]:
+        """Totals per counter name for an hour from files in the old layout, if any may still exist."""
+        if not self.legacy_files_may_exist():
+            return {}
+        folder = self.detector_folder(detector_id) if detector_id else self.base_dir
+        counts: dict[str, int] = {}
+        for f in folder.glob(f"*_{hour}"):
+            # "<counter name>_<pid>_YYYY-MM-DD_HH"
+            name = f.name.rsplit("_", 3)[0]
+            counts[name] = counts.get(name, 0) + self.get_activity_from_file(f)
+        return counts
+
+    def hourly_counts(self, hour: str, detector_id: str | None = None) -> dict[str, int]:
+        """Totals per counter name for an hour (formatted as YYYY-MM-DD_HH), across all processes."""
+        counts = self.store.counts(hour, detector_id or EDGE_ENDPOINT_WIDE)
+        for name, count in self.legacy_hourly_counts(hour, detector_id).items():
+            counts[name] = counts.get(name, 0) + count
+        return counts
 
     def get_last_file_modification_time(self, file: Path) -> datetime | None:
         """Get the last time a file was modified."""
@@ -193,13 +204,61 @@ class FilesystemActivityTrackingHelper:
         return int(text)
 
 
+class ActivityBuffer:
+    """Counts image-query activity in memory until it is flushed to the hourly databases."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Flushes of this process don't overlap, so last activity files are updated in order
+        self._flush_lock = threading.Lock()
+        # hour -> (detector_id, counter name) -> count
+        self._counts: defaultdict[str, defaultdict[tuple[str, str], int]] = defaultdict(lambda: defaultdict(int))
+        # (activity_type, detector_id or None) -> time of the last activity, as a POSIX timestamp
+        self._last_activity: dict[tuple[str, str | None], float] = {}
+
+    def increment(self, name: str, time: datetime, detector_id: str | None = None):
+        """Count one occurrence of `name` in the hour of `time`."""
+        hour = time.strftime(HOUR_FORMAT)
+        with self._lock:
+            self._counts[hour][(detector_id or EDGE_ENDPOINT_WIDE, name)] += 1
+
+    def mark_activity(self, activity_type: str, time: datetime, detector_id: str | None = None):
+        """Remember when "activity_type" last occurred."""
+        with self._lock:
+            self._last_activity[(activity_type, detector_id)] = time.timestamp()
+
+    def flush(self, tracker: FilesystemActivityTrackingHelper):
+        """Add the buffered counts to the hourly databases and update the last activity files."""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, defaultdict(lambda: defaultdict(int))
+                last_activity, self._last_activity = self._last_activity, {}
+
+            for hour, hour_counts in counts.items():
+                try:
+                    tracker.store.add(hour, hour_counts)
+                except Exception as e:
+                    logger.error(f"Failed to record activity for hour {hour}: {e}", exc_info=True)
+
+            for (activity_type, detector_id), timestamp in last_activity.items():
+                try:
+                    f = tracker.last_activity_file(activity_type, detector_id)
+                    f.touch()
+                    # Readers use the modification time, which should be when the activity happened, not the flush
+                    os.utime(f, (timestamp, timestamp))
+                except Exception as e:
+                    logger.error(
+                        f"Failed to record last {activity_type} for detector {detector_id}: {e}", exc_info=True
+                    )
+
+
 class ActivityRetriever:
     """Retrieve IQ activity metrics from the filesystem to report them."""
 
     @staticmethod
     def _previous_hour_local() -> str:
-        """Get the previous hour as a local-time string matching hourly activity filenames."""
-        return (datetime.now() - timedelta(hours=1)).strftime("%Y-%m-%d_%H")
+        """Get the previous hour as a local-time string matching the hourly activity databases."""
+        return (datetime.now() - timedelta(hours=1)).strftime(HOUR_FORMAT)
 
     def last_activity_time(self) -> str | None:
         """Get the last time an image was processed by the edge-endpoint as an ISO 8601 timestamp."""
@@ -244,38 +303,42 @@ class ActivityRetriever:
         """Get the last hour in UTC."""
         return (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%Y-%m-%d_%H")
 
-    def get_per_class_activity(self, detector_id: str, activity_type: str, hourly_files: list[Path]) -> dict[str, int]:
+    def get_per_class_activity(
+        self, detector_id: str, activity_type: str, hourly_counts: dict[str, int]
+    ) -> dict[str, int]:
         """Get per-class counts for an activity type for the previous hour.
 
         Args:
             detector_id: The detector ID.
             activity_type: "below_threshold_iqs" or "escalations".
-            hourly_files: Pre-fetched list of hourly files to filter from.
+            hourly_counts: Pre-fetched totals per counter name to pick from.
 
         Returns:
             Dict mapping class index strings to counts.
         """
         prefix = f"{activity_type}_class_"
-        activity_files = [f for f in hourly_files if f.name.startswith(prefix)]
 
         by_class: dict[str, int] = {}
 
-        for f in activity_files:
-            # Remainder is "<index>_<pid>_YYYY-MM-DD_HH"
-            remainder = f.name[len(prefix) :]
-            class_index = remainder.split("_")[0]
-            count = _tracker().get_activity_from_file(f)
+        for name, count in hourly_counts.items():
+            if not name.startswith(prefix):
+                continue
+            # Remainder is "<index>"
+            class_index = name[len(prefix) :]
             by_class[class_index] = by_class.get(class_index, 0) + count
 
         return by_class
 
-    def get_detector_confidence_histogram(self, detector_id: str) -> dict:
+    def get_detector_confidence_histogram(self, detector_id: str, hourly_counts: dict[str, int] | None = None) -> dict:
         """Get the confidence histogram for a detector for the previous hour.
 
-        Globs for all versioned confidence files (``confidence_v*_…``).
-        Files from any version are accepted; bucket_name_to_index validates
-        the bucket width matches, so files from a version with a different
-        bucket width are safely skipped.
+        Accepts confidence counters of any version (``confidence_v*_…``).
+        bucket_name_to_index validates the bucket width matches, so counters
+        from a version with a different bucket width are safely skipped.
+
+        Args:
+            detector_id: The detector ID.
+            hourly_counts: Pre-fetched totals per counter name for the previous hour. Read if not provided.
 
         Returns:
             A versioned, self-describing envelope with aggregate and per-class data:
@@ -291,47 +354,46 @@ class ActivityRetriever:
             The i-th element of counts is the count for [i*bucket_width, (i+1)*bucket_width).
         """
         cfg = ConfidenceHistogramConfig
-        time = self._previous_hour_local()
-        detector_folder = _tracker().detector_folder(detector_id)
-        activity_files = list(detector_folder.glob(f"confidence_v*_*_{time}"))
+        if hourly_counts is None:
+            hourly_counts = _tracker().hourly_counts(self._previous_hour_local(), detector_id)
 
         aggregate_counts = cfg.empty_counts()
         by_class_counts: dict[str, list[int]] = {}
 
-        for f in activity_files:
-            # Filename formats:
-            # - Aggregate: "confidence_v<version>_<bucket>_<pid>_YYYY-MM-DD_HH"
-            # - Per-class: "confidence_v<version>_class_<index>_<bucket>_<pid>_YYYY-MM-DD_HH"
-            parts = f.name.split("_")
+        for name, count in hourly_counts.items():
+            if not name.startswith("confidence_v"):
+                continue
+            # Counter name formats:
+            # - Aggregate: "confidence_v<version>_<bucket>"
+            # - Per-class: "confidence_v<version>_class_<index>_<bucket>"
+            parts = name.split("_")
 
-            # Check if this is a per-class file
+            # Check if this is a per-class counter
             if parts[2] == "class":
-                # Per-class file: confidence_v2_class_<index>_<bucket>_<pid>_YYYY-MM-DD_HH
+                # Per-class counter: confidence_v2_class_<index>_<bucket>
                 class_index = parts[3]
                 bucket = parts[4]
 
                 try:
                     index = cfg.bucket_name_to_index(bucket)
                 except ValueError:
-                    logger.error(f"Skipping confidence file with invalid bucket: {f.name}")
+                    logger.error(f"Skipping confidence counter with invalid bucket: {name}")
                     continue
 
                 if class_index not in by_class_counts:
                     by_class_counts[class_index] = cfg.empty_counts()
 
-                count = _tracker().get_activity_from_file(f)
                 by_class_counts[class_index][index] += count
             else:
-                # Aggregate file: confidence_v2_<bucket>_<pid>_YYYY-MM-DD_HH
+                # Aggregate counter: confidence_v2_<bucket>
                 bucket = parts[2]
 
                 try:
                     index = cfg.bucket_name_to_index(bucket)
                 except ValueError:
-                    logger.error(f"Skipping confidence file with invalid bucket: {f.name}")
+                    logger.error(f"Skipping confidence counter with invalid bucket: {name}")
                     continue
 
-                count = _tracker().get_activity_from_file(f)
                 aggregate_counts[index] += count
 
         return cfg.to_envelope(aggregate_counts, by_class_counts)
@@ -341,15 +403,13 @@ class ActivityRetriever:
         time = self._previous_hour_local()
         logger.info(f"Getting activity for detector {detector_id} at {time}")
 
-        detector_folder = _tracker().detector_folder(detector_id)
-        activity_files = list(detector_folder.glob(f"*_{time}"))
+        hourly_counts = _tracker().hourly_counts(time, detector_id)
 
         detector_metrics = {}
 
         for activity_type in ["iqs", "escalations", "audits", "below_threshold_iqs"]:
-            # Get aggregate files (exclude per-class files which contain "_class_")
-            files = [f for f in activity_files if f.name.startswith(activity_type) and "_class_" not in f.name]
-            total_activity = sum([_tracker().get_activity_from_file(f) for f in files])
+            # Aggregate counters only (per-class counters are named "<activity_type>_class_<index>")
+            total_activity = hourly_counts.get(activity_type, 0)
             f = _tracker().last_activity_file(activity_type, detector_id)
             last_activity = _tracker().get_last_file_modification_time(f)
             last_activity = last_activity.isoformat() if last_activity else None
@@ -359,12 +419,14 @@ class ActivityRetriever:
 
             # Add per-class breakdown for supported activity types
             if activity_type in PER_CLASS_ACTIVITY_TYPES:
-                by_class = self.get_per_class_activity(detector_id, activity_type, hourly_files=activity_files)
+                by_class = self.get_per_class_activity(detector_id, activity_type, hourly_counts=hourly_counts)
                 if by_class:
                     detector_metrics[f"{activity_type}_by_class"] = by_class
 
         # Add confidence histogram
-        detector_metrics["confidence_histogram"] = self.get_detector_confidence_histogram(detector_id)
+        detector_metrics["confidence_histogram"] = self.get_detector_confidence_histogram(
+            detector_id, hourly_counts=hourly_counts
+        )
 
         return detector_metrics
 
@@ -375,6 +437,14 @@ def _tracker() -> FilesystemActivityTrackingHelper:
     return FilesystemActivityTrackingHelper(base_dir="/opt/groundlight/device/edge-metrics")
 
 
+_activity_buffer = ActivityBuffer()
+
+
+def flush_activity_metrics():
+    """Write the activity recorded by this process since the last flush to the activity files."""
+    _activity_buffer.flush(_tracker())
+
+
 @trace_span
 def record_activity_for_metrics(detector_id: str, activity_type: str, class_index: int | None = None):
     """Records an activity from a detector.
@@ -399,26 +469,22 @@ def record_activity_for_metrics(detector_id: str, activity_type: str, class_inde
 
     logger.debug(f"Recording activity {activity_type} on detector {detector_id}")
 
-    current_hour = datetime.now()
+    now = datetime.now()
 
     # Record aggregate (always)
-    f = _tracker().hourly_activity_file(activity_type, current_hour, detector_id)
-    _tracker().increment_counter_file(f)
+    _activity_buffer.increment(activity_type, now, detector_id)
 
     # Record per-class for supported activity types
     if class_index is not None and activity_type in PER_CLASS_ACTIVITY_TYPES:
         per_class_prefix = f"{activity_type}_class_{class_index}"
-        f = _tracker().hourly_activity_file(per_class_prefix, current_hour, detector_id)
-        _tracker().increment_counter_file(f)
+        _activity_buffer.increment(per_class_prefix, now, detector_id)
         logger.debug(f"Recording per-class {activity_type} for class {class_index} on detector {detector_id}")
 
     # per detector activity tracking
-    f = _tracker().last_activity_file(activity_type, detector_id)
-    f.touch()
+    _activity_buffer.mark_activity(activity_type, now, detector_id)
 
     # edge endpoint wide activity tracking
-    f = _tracker().last_activity_file(activity_type)
-    f.touch()
+    _activity_buffer.mark_activity(activity_type, now)
 
 
 @trace_span
@@ -432,18 +498,16 @@ def record_confidence_for_metrics(detector_id: str, confidence: float, class_ind
                     If provided, records both aggregate and per-class histograms.
     """
     bucket = ConfidenceHistogramConfig.confidence_to_bucket(confidence)
-    current_hour = datetime.now()
+    now = datetime.now()
 
     # Record aggregate
     aggregate_prefix = f"{ConfidenceHistogramConfig.filename_prefix()}_{bucket}"
-    f = _tracker().hourly_activity_file(aggregate_prefix, current_hour, detector_id)
-    _tracker().increment_counter_file(f)
+    _activity_buffer.increment(aggregate_prefix, now, detector_id)
 
     # Record per-class (if class_index provided)
     if class_index is not None:
         per_class_prefix = f"{ConfidenceHistogramConfig.filename_prefix(class_index)}_{bucket}"
-        f = _tracker().hourly_activity_file(per_class_prefix, current_hour, detector_id)
-        _tracker().increment_counter_file(f)
+        _activity_buffer.increment(per_class_prefix, now, detector_id)
         logger.debug(
             f"Recording confidence {confidence} (bucket {bucket}, class {class_index}) on detector {detector_id}"
         )
@@ -453,25 +517,59 @@ def record_confidence_for_metrics(detector_id: str, confidence: float, class_ind
         )
 
 
-def clear_old_activity_files():
-    """Clear all activity files that are older than 2 hours."""
-    current_hour = datetime.now().strftime("%Y-%m-%d_%H")
-    last_hour = (datetime.now() - timedelta(hours=1)).strftime("%Y-%m-%d_%H")
-    two_hours_ago = (datetime.now() - timedelta(hours=2)).strftime("%Y-%m-%d_%H")
-    valid_hours = [current_hour, last_hour, two_hours_ago]
+def _valid_hours() -> list[str]:
+    """The hours whose activity is kept: the current hour and the two before it."""
+    now = datetime.now()
+    return [(now - timedelta(hours=hours_ago)).strftime(HOUR_FORMAT) for hours_ago in range(3)]
 
-    # Looking for files that match the pattern <record_name>_YYYY-MM-DD_HH
-    time_pattern = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]_[0-9][0-9]"
 
+def _legacy_hourly_files() -> list[Path]:
+    """All hourly files in the old one-file-per-counter-and-process layout."""
     folders = list(_tracker().detectors_dir.iterdir())
     folders.append(_tracker().base_dir)
 
-    old_files = []
+    files = []
     for folder in folders:
-        files = folder.glob(f"*_{time_pattern}")
-        old_files.extend([f for f in files if f.name[-len("YYYY-MM-DD_HH") :] not in valid_hours])
+        files.extend(folder.glob(LEGACY_HOURLY_FILE_PATTERN))
+    return files
+
+
+def clear_old_activity_files():
+    """Clear all activity that is older than 2 hours."""
+    valid_hours = _valid_hours()
+    _tracker().store.delete_hours_except(valid_hours)
 
+    if not _tracker().legacy_files_may_exist():
+        return
+    old_files = [f for f in _legacy_hourly_files() if f.name[-len("YYYY-MM-DD_HH") :] not in valid_hours]
     if old_files:
         logger.info(f"Clearing {len(old_files)} old activity files: {old_files}")
         for f in old_files:
             f.unlink()
+
+
+def migrate_legacy_activity_files():
+    """Move the counts in hourly files of the old layout into the hourly databases, and delete the files.
+
+    Files are deleted before their counts are added, so that an interrupted migration can lose counts but never
+    count them twice. Only needs to do work once.
+    """
+    if not _tracker().legacy_files_may_exist():
+        return
+
+    valid_hours = _valid_hours()
+    counts: defaultdict[str, defaultdict[tuple[str, str], int]] = defaultdict(lambda: defaultdict(int))
+    legacy_files = _legacy_hourly_files()
+    for f in legacy_files:
+        # "<counter name>_<pid>_YYYY-MM-DD_HH"
+        name, _pid, day, hour_of_day = f.name.rsplit("_", 3)
+        hour = f"{day}_{hour_of_day}"
+        if hour in valid_hours:
+            detector_id = f.parent.name if f.parent != _tracker().base_dir else EDGE_ENDPOINT_WIDE
+            counts[hour][(detector_id, name)] += _tracker().get_activity_from_file(f)
+        f.unlink()
+
+    for hour, hour_counts in counts.items():
+        _tracker().store.add(hour, hour_counts)
+    _tracker().file(LEGACY_FILES_MIGRATED_MARKER).touch()
+    logger.info(f"Moved the activity in {len(legacy_files)} hourly files into the hourly activity databases")
@@ -11,7 +11,7 @@ from typing import Any, Callable
 
 from app.core import deviceid
 from app.core.groundlight_client import groundlight_client
-from app.escalation_queue import failed_escalations
+from app.escalation_queue import drain, failed_escalations
 from app.metrics import iq_activity, system_metrics
 
 logger = logging.getLogger(__name__)
@@ -76,11 +76,14 @@ class MetricsReporter:
 
         failed_escalation_metrics = SafeMetricsDict()
         failed_escalation_metrics.add("failed_escalations", lambda: failed_escalations.metrics_summary())
+        failed_escalation_metrics.add("escalation_queue_drain", drain.read_drain_status)
+        escalation_queue_metrics = failed_escalation_metrics.as_dict()
 
         return {
             "device_info": device_info.as_dict(),
             "activity_metrics": activity_metrics.as_dict(),
-            "failed_escalations": failed_escalation_metrics.as_dict().get("failed_escalations"),
+            "failed_escalations": escalation_queue_metrics.get("failed_escalations"),
+            "escalation_queue_drain": escalation_queue_metrics.get("escalation_queue_drain"),
             "detector_details": detector_details.as_dict().get("detector_details"),
             "k3s_stats": k3s_stats.as_dict(),
         }
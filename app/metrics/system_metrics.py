@@ -10,9 +10,11 @@ from groundlight.edge import InferenceConfig
 from kubernetes import client, config
 
 from app.core.edge_config_manager import EdgeConfigManager
-from app.core.edge_inference import get_current_pipeline_config, get_predictor_metadata
+from app.core.edge_inference import get_current_pipeline_config, get_model_download_record, get_predictor_metadata
 from app.core.file_paths import MODEL_REPOSITORY_PATH
 from app.core.naming import get_primary_edge_model_dir
+from app.model_updater.status import get_model_update_status
+from app.model_updater.warmup import get_warm_up_record
 
 logger = logging.getLogger(__name__)
 
@@ -147,7 +149,7 @@ def _pod_is_ready(pod: client.V1Pod) -> bool:
     if not pod or not pod.status or pod.status.phase != "Running":
         return False
 
-    if not any(c.type == "Ready" and c.status == "True" for c in (pod.status.conditions or [])):
+    if not any(c.type == "Ready" and c.status == "True" for c in pod.status.conditions or []):
         return False
 
     for cs in pod.status.container_statuses or []:
@@ -279,6 +281,8 @@ def _enrich_detector_details(
         logger.warning(f"Detector metadata not found for detector {det_id} at version {model_version_int}")
 
     details["pipeline_config"] = pipeline_config_str
+    details["model_download"] = get_model_download_record(model_dir, model_version_int)
+    details["warm_up"] = get_warm_up_record(model_dir, model_version_int)
 
     if ready_pod is not None:
         started = _get_ready_since(ready_pod)
@@ -306,6 +310,7 @@ def get_detector_details() -> str:
             pods_by_detector.setdefault(det_id, []).append(pod)
 
     detector_edge_configs = EdgeConfigManager.detector_configs(EdgeConfigManager.active())
+    model_update_status = get_model_update_status(MODEL_REPOSITORY_PATH)
     detector_details: dict[str, dict] = {}
 
     for dep in deployments.items:
@@ -345,6 +350,15 @@ def get_detector_details() -> str:
         if edge_inference_config:
             details["edge_inference_config"] = edge_inference_config
 
+        update_status = model_update_status.get(det_id)
+        if update_status:
+            details["model_update"] = {
+                "update_lag_s": update_status["update_lag_s"],
+                "consecutive_failures": update_status["consecutive_failures"],
+                "last_error": update_status["last_error"],
+                "footprint": update_status.get("footprint"),
+            }
+
         detector_details[det_id] = details
 
     # Convert to JSON string to prevent opensearch from indexing all detector details
@@ -0,0 +1,166 @@
+"""Memory footprints of inference pods, for deciding how many of them may start at once.
+
+Every inference pod that starts, for a new detector or to roll out a new model next to the old pod, adds its RAM (and
+on GPU nodes, VRAM) footprint to the node for a while. Starting too many at once pushes the node past its kubelet
+eviction threshold, and the evictions or OOM-kills that follow take other detectors down with them.
+
+The footprints come from the same source as the status page's resource metrics (`ResourceMetricsCollector`): each
+detector's current RAM and VRAM use, and the node's capacity, usage and eviction threshold. A pod's footprint is
+predicted from its detector's running pods, or the footprint measured the last time it started, or the largest
+footprint of the other detectors. Predicted and actual footprints are recorded so that predictions can be checked.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+import psutil
+
+from app.metrics.resource_metrics import ResourceMetricsCollector
+
+logger = logging.getLogger(__name__)
+
+# The predicted footprint of a detector's inference pods (primary and OODD) when there is nothing to go by, e.g. on a
+# cold boot before any detector is running
+INFERENCE_POD_RAM_ESTIMATE_BYTES = int(os.environ.get("INFERENCE_POD_RAM_ESTIMATE_BYTES", 2 * 1024**3))
+INFERENCE_POD_VRAM_ESTIMATE_BYTES = int(os.environ.get("INFERENCE_POD_VRAM_ESTIMATE_BYTES", 1024**3))
+# Projected RAM use stays this many percentage points below the kubelet's memory eviction threshold
+ROLLOUT_EVICTION_MARGIN_PERCENT = float(os.environ.get("ROLLOUT_EVICTION_MARGIN_PERCENT", 5))
+# Projected RAM use never exceeds this percentage of the node's RAM, whatever the eviction threshold
+ROLLOUT_MAX_MEMORY_PERCENT = float(os.environ.get("ROLLOUT_MAX_MEMORY_PERCENT", 85))
+ROLLOUT_MAX_VRAM_PERCENT = float(os.environ.get("ROLLOUT_MAX_VRAM_PERCENT", 90))
+# How long after starting a detector's pods their actual footprint is looked for in the resource metrics
+FOOTPRINT_OBSERVATION_WINDOW_S = 60 * 10
+
+
+class Footprint(NamedTuple):
+    ram_bytes: int
+    vram_bytes: int
+
+
+@dataclass(frozen=True)
+class ResourceSnapshot:
+    """The node's memory and the footprint of each detector's serving inference pods, at one point in time."""
+
+    ram_total_bytes: int
+    ram_used_bytes: int
+    vram_total_bytes: int = 0
+    vram_used_bytes: int = 0
+    # The RAM use (as a percentage of the total) at which the kubelet starts evicting pods, if known
+    eviction_threshold_pct: float | None = None
+    detectors: dict[str, Footprint] = field(default_factory=dict)
+
+    @property
+    def ram_limit_bytes(self) -> int:
+        """How much RAM may be in use once the pods that are starting are up."""
+        percent = ROLLOUT_MAX_MEMORY_PERCENT
+        if self.eviction_threshold_pct is not None:
+            percent = min(percent, self.eviction_threshold_pct - ROLLOUT_EVICTION_MARGIN_PERCENT)
+        return int(self.ram_total_bytes * percent / 100)
+
+    @property
+    def vram_limit_bytes(self) -> int:
+        return int(self.vram_total_bytes * ROLLOUT_MAX_VRAM_PERCENT / 100)
+
+
+def take_resource_snapshot() -> ResourceSnapshot:
+    """
+    Take a snapshot from the Kubernetes resource metrics. Without them (e.g. no Metrics Server), fall back to the
+    memory use seen by this container, without per-detector footprints.
+    """
+    payload = ResourceMetricsCollector().collect()
+    ram = payload.get("system", {}).get("ram_bytes", {})
+    if not ram.get("total"):
+        memory = psutil.virtual_memory()
+        return ResourceSnapshot(ram_total_bytes=memory.total, ram_used_bytes=memory.total - memory.available)
+
+    vram = payload["system"]["gpu"]["vram_bytes"]
+    return ResourceSnapshot(
+        ram_total_bytes=ram["total"],
+        ram_used_bytes=ram["used"],
+        vram_total_bytes=vram["total"],
+        vram_used_bytes=vram["used"],
+        eviction_threshold_pct=ram["eviction_threshold_pct"],
+        detectors={
+            detector["detector_id"]: Footprint(detector["ram_bytes"]["total"], detector["gpu"]["vram_bytes"]["total"])
+            for detector in payload["detectors"]
+        },
+    )
+
+
+class FootprintLedger:
+    """Predicts the footprint of a detector's inference pods, and records the predicted and actual footprints of the
+    pods that were started."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # The last measured footprint of each detector whose pods were started
+        self._actual: dict[str, Footprint] = {}
+        self._records: dict[str, dict] = {}
+
+    def predict(self, detector_id: str, snapshot: ResourceSnapshot) -> Footprint:
+        """The footprint that starting the detector's inference pods adds to the node."""
+        running = snapshot.detectors.get(detector_id)
+        if running and running.ram_bytes:
+            # A rollout runs the new pods next to the old ones until they are ready
+            return running
+        with self._lock:
+            if detector_id in self._actual:
+                return self._actual[detector_id]
+            known = [f for f in snapshot.detectors.values() if f.ram_bytes] + list(self._actual.values())
+        if known:
+            # Conservative: a detector we know nothing about is as large as the largest we know
+            return Footprint(max(f.ram_bytes for f in known), max(f.vram_bytes for f in known))
+        return Footprint(
+            INFERENCE_POD_RAM_ESTIMATE_BYTES, INFERENCE_POD_VRAM_ESTIMATE_BYTES if snapshot.vram_total_bytes else 0
+        )
+
+    def record_started(self, detector_id: str, predicted: Footprint) -> None:
+        """Record that the detector's pods started with the predicted footprint. The actual footprint is recorded by a
+        later `observe`, once the pods show up in the resource metrics."""
+        with self._lock:
+            self._records[detector_id] = {
+                "started_at": time.time(),
+                "predicted_ram_bytes": predicted.ram_bytes,
+                "predicted_vram_bytes": predicted.vram_bytes,
+                "actual_ram_bytes": None,
+                "actual_vram_bytes": None,
+            }
+
+    def observe(self, snapshot: ResourceSnapshot) -> None:
+        """Record the actual footprint of detectors whose pods were started and show up in the snapshot."""
+        with self._lock:
+            for detector_id, record in self._records.items():
+                actual = snapshot.detectors.get(detector_id)
+                if record["actual_ram_bytes"] is not None or not actual or not actual.ram_bytes:
+                    continue
+                self._actual[detector_id] = actual
+                record["actual_ram_bytes"] = actual.ram_bytes
+                record["actual_vram_bytes"] = actual.vram_bytes
+                logger.info(
+                    f"Inference pods of {detector_id} use {actual.ram_bytes / 1e6:.0f} MB RAM and "
+                    f"{actual.vram_bytes / 1e6:.0f} MB VRAM, predicted {record['predicted_ram_bytes'] / 1e6:.0f} MB "
+                    f"RAM and {record['predicted_vram_bytes'] / 1e6:.0f} MB VRAM"
+                )
+
+    def awaiting_observation(self) -> bool:
+        """Whether the actual footprint of recently started pods is still unknown."""
+        cutoff = time.time() - FOOTPRINT_OBSERVATION_WINDOW_S
+        with self._lock:
+            return any(
+                record["actual_ram_bytes"] is None and record["started_at"] > cutoff
+                for record in self._records.values()
+            )
+
+    def forget(self, detector_id: str) -> None:
+        with self._lock:
+            self._actual.pop(detector_id, None)
+            self._records.pop(detector_id, None)
+
+    def records(self) -> dict[str, dict]:
+        """The predicted and actual footprint of each detector's last started pods."""
+        with self._lock:
+            return {detector_id: dict(record) for detector_id, record in self._records.items()}
@@ -0,0 +1,335 @@
+"""Independent model-update schedules for each detector.
+
+The model updater used to check detectors one at a time, so one detector's slow model download or long rollout
+delayed the updates of every other detector. Instead, each detector has its own next-check time:
+
+- Checks (fetching model info, downloading new models and creating missing inference deployments) run on a thread pool,
+  at most MODEL_CHECK_CONCURRENCY at a time.
+- Rollouts, which start the inference pods of new detectors and of new models, run on a separate pool, so checks never
+  wait for rollouts. A `RolloutGate` queues rollouts until the node has the memory for their pods (see
+  `app.model_updater.resources`), at most ROLLOUT_MAX_CONCURRENCY at a time. This brings up all detectors as fast as
+  memory allows on a cold boot, without pushing the node into evicting pods.
+- A detector is checked again `refresh_rate` seconds after its last check (and rollout) finished, with some jitter so
+  that detectors don't stay in lockstep. After a failure, it is retried with exponential backoff.
+
+The update state of every detector is written to a JSON file in the model repository, from which the status monitor
+reports each detector's update lag: how long ago its models were last checked successfully (see
+`app.model_updater.status`).
+"""
+
+import contextlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from app.model_updater.resources import Footprint, FootprintLedger, ResourceSnapshot, take_resource_snapshot
+
+logger = logging.getLogger(__name__)
+
+MODEL_CHECK_CONCURRENCY = int(os.environ.get("MODEL_CHECK_CONCURRENCY", 4))
+ROLLOUT_MAX_CONCURRENCY = int(os.environ.get("ROLLOUT_MAX_CONCURRENCY", 4))
+# How often queued rollouts look at the node's memory again, which is also how long a resource snapshot is reused
+ROLLOUT_GATE_POLL_INTERVAL_S = 5.0
+# Each next check is refresh_rate * (1 +/- this fraction) after the previous one
+MODEL_UPDATE_JITTER_FRACTION = 0.1
+MODEL_UPDATE_MAX_BACKOFF_S = float(os.environ.get("MODEL_UPDATE_MAX_BACKOFF_S", 60 * 30))
+
+
+class DetectorRemovedError(Exception):
+    """The detector was removed while its models were being updated."""
+
+
+class _DetectorUpdateState:
+    def __init__(self, now: float) -> None:
+        self.tracked_at = now
+        self.next_check_at = now
+        self.check_started_at: float | None = None
+        self.last_success_at: float | None = None
+        self.consecutive_failures = 0
+        self.last_error: str | None = None
+        # "checking", "waiting_for_rollout" or "rolling_out" while an update is in flight, otherwise None
+        self.phase: str | None = None
+        # Set when the detector is removed, so that its in-flight update stops
+        self.removed = threading.Event()
+
+    def stats(self) -> dict:
+        return {
+            "tracked_at": self.tracked_at,
+            "next_check_at": self.next_check_at,
+            "last_check_started_at": self.check_started_at,
+            "last_success_at": self.last_success_at,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "phase": self.phase,
+        }
+
+
+class RolloutGate:
+    """
+    Decides when a detector's inference pods may start. A rollout starts while the projected memory use stays within
+    the node's limits: the current use, plus the predicted footprint of the pods still starting (which doesn't show up
+    in the current use until they are loaded), plus the footprint of the new pods. The first rollout always starts, so
+    that detectors are updated even when memory is tight.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = ROLLOUT_MAX_CONCURRENCY,
+        resource_snapshot: Callable[[], ResourceSnapshot] = take_resource_snapshot,
+        poll_interval_s: float = ROLLOUT_GATE_POLL_INTERVAL_S,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.footprints = FootprintLedger()
+        self._resource_snapshot = resource_snapshot
+        self._poll_interval_s = poll_interval_s
+        self._condition = threading.Condition()
+        # The predicted footprint of the rollouts in progress
+        self._starting: dict[str, Footprint] = {}
+        self._snapshot: ResourceSnapshot | None = None
+        self._snapshot_taken_at = 0.0
+        self._snapshot_lock = threading.Lock()
+
+    def snapshot(self) -> ResourceSnapshot:
+        """A resource snapshot no older than the poll interval. Each new one records the actual footprints that have
+        become known."""
+        with self._snapshot_lock:
+            if self._snapshot is None or time.monotonic() - self._snapshot_taken_at >= self._poll_interval_s:
+                self._snapshot = self._resource_snapshot()
+                self._snapshot_taken_at = time.monotonic()
+                self.footprints.observe(self._snapshot)
+            return self._snapshot
+
+    def _may_start(self, footprint: Footprint, snapshot: ResourceSnapshot) -> bool:
+        if len(self._starting) >= self.max_concurrency:
+            return False
+        if not self._starting:
+            return True
+        starting_ram = sum(f.ram_bytes for f in self._starting.values())
+        starting_vram = sum(f.vram_bytes for f in self._starting.values())
+        if snapshot.ram_used_bytes + starting_ram + footprint.ram_bytes > snapshot.ram_limit_bytes:
+            return False
+        # Without a GPU (or GPU metrics), only RAM is budgeted
+        return (
+            not snapshot.vram_total_bytes
+            or snapshot.vram_used_bytes + starting_vram + footprint.vram_bytes <= snapshot.vram_limit_bytes
+        )
+
+    @contextlib.contextmanager
+    def slot(self, detector_id: str, removed: threading.Event) -> Iterator[None]:
+        """Wait until the detector's pods may start and reserve their footprint for the duration of the context.
+        Raises DetectorRemovedError if `removed` is set while waiting."""
+        while True:
+            # Taken outside the lock, collecting the resource metrics can take a few seconds
+            snapshot = self.snapshot()
+            with self._condition:
+                footprint = self.footprints.predict(detector_id, snapshot)
+                if self._may_start(footprint, snapshot):
+                    self._starting[detector_id] = footprint
+                    break
+                if removed.is_set():
+                    raise DetectorRemovedError()
+                # Memory use can drop without a rollout finishing, so check again every poll interval
+                self._condition.wait(self._poll_interval_s)
+
+        logger.info(
+            f"Starting inference pods for {detector_id}, predicted to use {footprint.ram_bytes / 1e6:.0f} MB RAM and "
+            f"{footprint.vram_bytes / 1e6:.0f} MB VRAM ({len(self._starting)} rollout(s) in progress)"
+        )
+        try:
+            yield
+            self.footprints.record_started(detector_id, footprint)
+        finally:
+            with self._condition:
+                del self._starting[detector_id]
+                self._condition.notify_all()
+
+
+class ModelUpdateScheduler:
+    """Checks each detector for new models on its own schedule, and rolls out new models."""
+
+    def __init__(
+        self,
+        check_for_new_model: Callable[[str, threading.Event], bool],
+        roll_out: Callable[[str, threading.Event], None],
+        status_path: str | None = None,
+        check_concurrency: int = MODEL_CHECK_CONCURRENCY,
+        rollout_gate: RolloutGate | None = None,
+    ) -> None:
+        """
+        Args:
+            check_for_new_model: Checks a detector for new models, downloading them and creating missing inference
+                deployments. Returns whether the detector's deployments need a rollout. Given an event that is set if
+                the detector is removed meanwhile.
+            roll_out: Rolls out a detector's new models. Given the same event.
+            status_path: Where to write the update state of every detector, or None not to write it.
+            check_concurrency: How many detectors are checked at once.
+            rollout_gate: Limits the rollouts running at once.
+        """
+        self._check_for_new_model = check_for_new_model
+        self._roll_out = roll_out
+        self._status_path = status_path
+        self._rollout_gate = rollout_gate or RolloutGate()
+        self._check_pool = ThreadPoolExecutor(max_workers=check_concurrency, thread_name_prefix="model-check")
+        self._rollout_pool = ThreadPoolExecutor(
+            max_workers=self._rollout_gate.max_concurrency, thread_name_prefix="model-rollout"
+        )
+        self._refresh_rate = 60.0
+        self._states: dict[str, _DetectorUpdateState] = {}
+        # Updates in flight, including those of detectors removed meanwhile
+        self._in_flight: dict[str, _DetectorUpdateState] = {}
+        self._condition = threading.Condition()
+        self._status_lock = threading.Lock()
+
+    def sync_detectors(self, detector_ids: Iterable[str]) -> None:
+        """Schedule detectors that aren't scheduled yet for an immediate check, and stop updating detectors that are
+        not in `detector_ids` anymore."""
+        detector_ids = set(detector_ids)
+        now = time.time()
+        with self._condition:
+            for detector_id in detector_ids - self._states.keys():
+                self._states[detector_id] = _DetectorUpdateState(now)
+            for detector_id in self._states.keys() - detector_ids:
+                logger.info(f"No longer updating models for {detector_id}")
+                self._states.pop(detector_id).removed.set()
+                self._rollout_gate.footprints.forget(detector_id)
+
+    def wait_until_idle(self, detector_ids: Iterable[str], timeout_s: float) -> bool:
+        """Wait for the in-flight updates of the given detectors to finish. Returns False on timeout."""
+        detector_ids = set(detector_ids)
+        with self._condition:
+            return self._condition.wait_for(lambda: not detector_ids & self._in_flight.keys(), timeout=timeout_s)
+
+    def schedule_due(self, refresh_rate: float) -> list[str]:
+        """Start checking every detector whose next check is due and that isn't being updated. Returns their IDs."""
+        now = time.time()
+        started = []
+        with self._condition:
+            self._refresh_rate = refresh_rate
+            for detector_id, state in self._states.items():
+                if state.next_check_at > now or detector_id in self._in_flight:
+                    continue
+                state.phase = "checking"
+                state.check_started_at = now
+                self._in_flight[detector_id] = state
+                started.append((detector_id, state))
+        for detector_id, state in started:
+            self._check_pool.submit(self._check, detector_id, state)
+        if self._rollout_gate.footprints.awaiting_observation():
+            # Look for the actual footprint of recently started pods
+            self._rollout_gate.snapshot()
+        if started:
+            self._write_status()
+        return [detector_id for detector_id, _ in started]
+
+    def seconds_until_next_check(self) -> float | None:
+        """Seconds until the next check of a detector that isn't being updated is due, or None if there is none."""
+        with self._condition:
+            next_checks = [s.next_check_at for d, s in self._states.items() if d not in self._in_flight]
+        if not next_checks:
+            return None
+        return max(0.0, min(next_checks) - time.time())
+
+    def stats(self) -> dict[str, dict]:
+        """The update state of every scheduled detector, with the predicted and actual footprint of its inference
+        pods if they were started."""
+        footprints = self._rollout_gate.footprints.records()
+        with self._condition:
+            return {
+                detector_id: state.stats() | {"footprint": footprints.get(detector_id)}
+                for detector_id, state in self._states.items()
+            }
+
+    def shutdown(self) -> None:
+        """Stop all updates and wait for the in-flight ones to finish."""
+        self.sync_detectors(())
+        self._check_pool.shutdown(wait=True)
+        self._rollout_pool.shutdown(wait=True)
+
+    def _check(self, detector_id: str, state: _DetectorUpdateState) -> None:
+        try:
+            logger.debug(f"Checking new models and inference deployments for detector_id: {detector_id}")
+            needs_rollout = self._check_for_new_model(detector_id, state.removed)
+        except Exception as e:
+            self._finish(detector_id, state, e)
+            return
+        if not needs_rollout:
+            self._finish(detector_id, state, None)
+            return
+        state.phase = "waiting_for_rollout"
+        try:
+            self._rollout_pool.submit(self._run_rollout, detector_id, state)
+        except RuntimeError as e:
+            # Shutting down
+            self._finish(detector_id, state, e)
+
+    def _run_rollout(self, detector_id: str, state: _DetectorUpdateState) -> None:
+        try:
+            with self._rollout_gate.slot(detector_id, state.removed):
+                state.phase = "rolling_out"
+                self._roll_out(detector_id, state.removed)
+        except Exception as e:
+            self._finish(detector_id, state, e)
+            return
+        self._finish(detector_id, state, None)
+
+    def _finish(self, detector_id: str, state: _DetectorUpdateState, error: Exception | None) -> None:
+        now = time.time()
+        with self._condition:
+            if error is None:
+                state.consecutive_failures = 0
+                state.last_error = None
+                # The detector had the newest models as of when its check started
+                state.last_success_at = state.check_started_at
+                delay = self._refresh_rate
+            else:
+                state.consecutive_failures += 1
+                state.last_error = f"{type(error).__name__}: {error}"
+                delay = min(
+                    self._refresh_rate * 2 ** (state.consecutive_failures - 1),
+                    max(self._refresh_rate, MODEL_UPDATE_MAX_BACKOFF_S),
+                )
+            state.next_check_at = now + delay * random.uniform(
+                1 - MODEL_UPDATE_JITTER_FRACTION, 1 + MODEL_UPDATE_JITTER_FRACTION
+            )
+            state.phase = None
+            if self._in_flight.get(detector_id) is state:
+                del self._in_flight[detector_id]
+            self._condition.notify_all()
+
+        if error is None:
+            logger.debug(f"Successfully updated model for detector_id: {detector_id}")
+        elif isinstance(error, DetectorRemovedError):
+            logger.info(f"Stopped updating model for detector_id: {detector_id}, it was removed.")
+        else:
+            logger.info(
+                f"Failed to update model for detector_id: {detector_id} "
+                f"({state.consecutive_failures} time(s) in a row). Error: {error}",
+                exc_info=error,
+            )
+        self._write_status()
+
+    def _write_status(self) -> None:
+        if self._status_path is None:
+            return
+        status = {"updated_at": time.time(), "detectors": self.stats()}
+        directory = os.path.dirname(self._status_path)
+        try:
+            with self._status_lock:
+                os.makedirs(directory, exist_ok=True)
+                # Write to a temporary file and rename it into place, so readers never see a partially written file.
+                fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        json.dump(status, f)
+                    os.replace(temp_path, self._status_path)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+        except Exception as e:
+            logger.warning(f"Could not write the model update status to {self._status_path}: {e}")
@@ -0,0 +1,33 @@
+"""The model updater's status, as written to the model repository by `ModelUpdateScheduler` and read by the status
+monitor. Kept apart from the scheduler so that the metrics modules can read it without importing the scheduler.
+"""
+
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# The per-detector update state, in the root of the model repository
+MODEL_UPDATE_STATUS_FILE = "model_update_status.json"
+
+
+def get_model_update_status(repository_root: str) -> dict[str, dict]:
+    """
+    The update state of every detector as last written by the model updater, with each detector's `update_lag_s`:
+    seconds since its models were last checked successfully (or since it was first scheduled, if they never were).
+    Empty if the model updater hasn't written it yet.
+    """
+    try:
+        with open(os.path.join(repository_root, MODEL_UPDATE_STATUS_FILE)) as f:
+            detectors = json.load(f)["detectors"]
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Could not read the model update status: {e}")
+        return {}
+    now = time.time()
+    for state in detectors.values():
+        state["update_lag_s"] = now - (state["last_success_at"] or state["tracked_at"])
+    return detectors
@@ -1,12 +1,21 @@
 import logging
 import os
+import threading
 import time
 
 from app.core.database import DatabaseManager
 from app.core.edge_config_manager import EdgeConfigManager
-from app.core.edge_inference import EdgeInferenceManager, delete_old_model_versions
+from app.core.edge_inference import (
+    EdgeInferenceManager,
+    delete_old_model_versions,
+    get_current_model_version,
+    record_serving_models,
+)
 from app.core.kubernetes_management import InferenceDeploymentManager
 from app.core.naming import get_edge_inference_deployment_name, get_edge_inference_model_name
+from app.model_updater.scheduler import DetectorRemovedError, ModelUpdateScheduler
+from app.model_updater.status import MODEL_UPDATE_STATUS_FILE
+from app.model_updater.warmup import prefetch_model_files, warm_up_inference_pods
 
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -21,7 +30,10 @@ POD_DELETION_TIMEOUT_SECONDS = 60 * 3
 # slowest link the device must support; otherwise the next outer-loop pass can stack a
 # second rollout on top of the still-loading first one (memory doubles → eviction cascade).
 ROLLOUT_READY_TIMEOUT_S = int(os.environ.get("ROLLOUT_READY_TIMEOUT_S", 60 * 30))
-DETECTOR_CONFIG_CHANGE_POLL_INTERVAL_S = 2.0
+# Seconds between checks for detector changes and refresh_rate changes while waiting for the next cycle. Each check
+# only reads a generation number and stats the config file, detector changes are announced by the edge endpoint (see
+# `detector_changes_version`).
+DETECTOR_CONFIG_CHANGE_CHECK_INTERVAL_S = 0.5
 
 USE_MINIMAL_IMAGE = os.environ.get("USE_MINIMAL_IMAGE", "false") == "true"
 
@@ -32,21 +44,21 @@ def sleep_forever(message: str | None = None):
         time.sleep(TEN_MINUTES)
 
 
-def _detector_config_changed(db_manager: DatabaseManager, baseline: set[str]) -> bool:
-    """Return True if detectors have been added, removed, or marked for deletion since baseline was taken."""
-    return bool(db_manager.get_pending_deletions()) or db_manager.get_active_detector_ids() != baseline
+def _detector_config_changed(db_manager: DatabaseManager, baseline_version: int | None) -> bool:
+    """Return True if detectors have been added, removed, or marked for deletion since baseline_version was taken."""
+    return db_manager.detector_changes_version() != baseline_version
 
 
 def _wait_for_next_cycle(
     db_manager: DatabaseManager,
     wait: float,
     refresh_rate: float,
-    baseline_detectors: set[str],
+    baseline_version: int | None,
 ) -> None:
     """Sleep for up to `wait` seconds, returning early if detector config or refresh_rate changes."""
     deadline = time.time() + wait
     while time.time() < deadline:
-        if _detector_config_changed(db_manager, baseline_detectors):
+        if _detector_config_changed(db_manager, baseline_version):
             logger.info("Detector configuration changed; restarting inference model update loop.")
             return
         current_refresh_rate = EdgeConfigManager.active().global_config.refresh_rate
@@ -56,96 +68,185 @@ def _wait_for_next_cycle(
             )
             return
         time_remaining = deadline - time.time()
-        sleep_duration = min(DETECTOR_CONFIG_CHANGE_POLL_INTERVAL_S, max(0.0, time_remaining))
+        sleep_duration = min(DETECTOR_CONFIG_CHANGE_CHECK_INTERVAL_S, max(0.0, time_remaining))
         time.sleep(sleep_duration)
 
 
-def _check_new_models_and_inference_deployments(
+def _deployments_to_start(
+    detector_id: str,
+    edge_inference_manager: EdgeInferenceManager,
+    deployment_manager: InferenceDeploymentManager,
+    separate_oodd_inference: bool,
+) -> tuple[list[bool], list[bool]]:
+    """
+    Return which of the detector's inference deployments (as `is_oodd` flags) have to be created because they don't
+    exist, and which have to be updated because they don't serve the newest model version in the model repository.
+    """
+    to_create, to_update = [], []
+    for is_oodd in [False, True] if separate_oodd_inference else [False]:
+        deployment_name = get_edge_inference_deployment_name(detector_id, is_oodd=is_oodd)
+        if deployment_manager.get_inference_deployment(deployment_name=deployment_name) is None:
+            to_create.append(is_oodd)
+        elif deployment_manager.get_deployed_model_version(deployment_name) != get_current_model_version(
+            edge_inference_manager.MODEL_REPOSITORY, detector_id, is_oodd=is_oodd
+        ):
+            to_update.append(is_oodd)
+    return to_create, to_update
+
+
+def _check_new_models_and_inference_deployments(  # noqa: PLR0913
     detector_id: str,
     edge_inference_manager: EdgeInferenceManager,
     deployment_manager: InferenceDeploymentManager,
     db_manager: DatabaseManager,
     separate_oodd_inference: bool,
-) -> None:
+    *,
+    removed: threading.Event,
+) -> bool:
     """
-    Check if there are new models available for the detector_id. If so, update the inference deployment
-    to reflect the new state. This is also the entrypoint for creating a new inference deployment
-    and updating the database record for the detector_id (i.e., setting deployment_created to True
-    when we have successfully rolled out the inference deployment).
+    Check if there are new models available for the detector_id, and download them. If the deployments are up to date,
+    update the database record for the detector_id (i.e., setting deployment_created to True when we have successfully
+    rolled out the inference deployment).
 
     :param detector_id: the detector_id for which we are checking for new models and inference deployments.
     :param edge_inference_manager: the edge inference manager object.
     :param deployment_manager: the inference deployment manager object.
     :param db_manager: the database manager object.
     :param separate_oodd_inference: whether or not to run inference separately for an OODD model
+    :param removed: set if the detector is removed meanwhile.
+    :return: whether inference deployments have to be created or updated, see `_roll_out_inference_deployments`.
     """
     # Download and write new model to model repo on disk
-    new_model = edge_inference_manager.update_models_if_available(detector_id=detector_id)
+    edge_inference_manager.update_models_if_available(detector_id=detector_id)
 
-    edge_deployment_name = get_edge_inference_deployment_name(detector_id)
-    oodd_deployment_name = get_edge_inference_deployment_name(detector_id, is_oodd=True)
-    deployment_names = (
-        f"{edge_deployment_name} and {oodd_deployment_name}" if separate_oodd_inference else edge_deployment_name
+    if removed.is_set():
+        raise DetectorRemovedError()
+
+    # Creating deployments is a rollout too: on startup, the inference pods of all detectors are started as fast as
+    # the scheduler's rollout gate finds memory for them, rather than all at once.
+    to_create, to_update = _deployments_to_start(
+        detector_id, edge_inference_manager, deployment_manager, separate_oodd_inference
     )
+    if to_create or to_update:
+        return True
 
-    edge_deployment = deployment_manager.get_inference_deployment(deployment_name=edge_deployment_name)
-    deployment_created = False
-    if edge_deployment is None:
-        logger.info(f"Creating a new edge inference deployment for {detector_id}")
-        deployment_manager.create_inference_deployment(detector_id=detector_id)
-        deployment_created = True
-
-    if separate_oodd_inference:
-        oodd_deployment = deployment_manager.get_inference_deployment(deployment_name=oodd_deployment_name)
-        if oodd_deployment is None:
-            logger.info(f"Creating a new oodd inference deployment for {detector_id}")
-            deployment_manager.create_inference_deployment(detector_id=detector_id, is_oodd=True)
-            deployment_created = True
-
-    # Only need to update the deployment if there is a new model and the deployment wasn't just created.
-    # Attempting to update a recently created deployment can result in a Kubernetes 409 exception, so it's best to avoid this.
-    # During start up this step will be skipped because deployment_created = True, which has the nice effect that inference pods will all
-    # come online right away, thus saving time. Subsequent model updates will become single-threaded in order to manage memory/CPU more wisely.
-    if new_model and not deployment_created:
-        # Update inference deployment and rollout a new pod
-        logger.info(f"Updating inference deployment for {detector_id}")
-        deployment_manager.update_inference_deployment(detector_id=detector_id)
-        if separate_oodd_inference:
-            deployment_manager.update_inference_deployment(detector_id=detector_id, is_oodd=True)
-
-        # Poll until the deployment rollout begins
-        # There is a slight delay between `update_inference_deployment` and Kubernetes actually starting the rollout, so it's important to wait for this
-        logger.info(f"Waiting for inference deployment(s) ({deployment_names}) to start")
-        rollout_start_timeout = 10
-        poll_start = time.time()
-        while deployment_manager.is_inference_deployment_rollout_complete(deployment_name=edge_deployment_name) or (
-            separate_oodd_inference
-            and deployment_manager.is_inference_deployment_rollout_complete(deployment_name=oodd_deployment_name)
-        ):
-            time.sleep(0.5)
-            if time.time() - poll_start > rollout_start_timeout:
-                raise TimeoutError(f"Inference deployment(s) ({deployment_names}) did not start within time limit")
-
-        # Poll until the rollout completes
-        logger.info(f"Waiting for inference deployment(s) ({deployment_names}) to complete")
-        poll_start = time.time()
-        while not deployment_manager.is_inference_deployment_rollout_complete(deployment_name=edge_deployment_name) or (
-            separate_oodd_inference
-            and not deployment_manager.is_inference_deployment_rollout_complete(deployment_name=oodd_deployment_name)
+    # Pods that were started outside of a rollout (e.g. after a node restart, or rescheduled) are gated too
+    for is_oodd in [False, True] if separate_oodd_inference else [False]:
+        warm_up_inference_pods(deployment_manager, edge_inference_manager.MODEL_REPOSITORY, detector_id, is_oodd)
+
+    _record_deployment_state(
+        detector_id, edge_inference_manager, deployment_manager, db_manager, separate_oodd_inference
+    )
+    return False
+
+
+def _prefetch_model_files(repository_root: str, detector_id: str, is_oodds: list[bool]) -> None:
+    """Prefetch the model files of the detector's new inference pods, see `prefetch_model_files`. Never raises."""
+    for is_oodd in is_oodds:
+        try:
+            prefetch_model_files(repository_root, detector_id, is_oodd)
+        except Exception as e:
+            logger.warning(f"Failed to prefetch the model files of {detector_id}: {e}")
+
+
+def _roll_out_inference_deployments(  # noqa: PLR0913
+    detector_id: str,
+    edge_inference_manager: EdgeInferenceManager,
+    deployment_manager: InferenceDeploymentManager,
+    db_manager: DatabaseManager,
+    separate_oodd_inference: bool,
+    *,
+    removed: threading.Event,
+) -> None:
+    """
+    Create the detector_id's missing inference deployments and update those that don't serve the models downloaded by
+    `_check_new_models_and_inference_deployments`, wait for their pods to be ready and update the database record.
+
+    :param removed: set if the detector is removed meanwhile, in which case the rollout is abandoned.
+    """
+    if removed.is_set():
+        raise DetectorRemovedError()
+
+    to_create, to_update = _deployments_to_start(
+        detector_id, edge_inference_manager, deployment_manager, separate_oodd_inference
+    )
+    created_names = [get_edge_inference_deployment_name(detector_id, is_oodd=is_oodd) for is_oodd in to_create]
+    updated_names = [get_edge_inference_deployment_name(detector_id, is_oodd=is_oodd) for is_oodd in to_update]
+    deployment_names = " and ".join(created_names + updated_names)
+
+    for is_oodd in to_create:
+        logger.info(f"Creating a new {'oodd' if is_oodd else 'edge'} inference deployment for {detector_id}")
+        deployment_manager.create_inference_deployment(detector_id=detector_id, is_oodd=is_oodd)
+
+    # Update inference deployment and rollout a new pod
+    for is_oodd in to_update:
+        logger.info(f"Updating {'oodd' if is_oodd else 'edge'} inference deployment for {detector_id}")
+        deployment_manager.update_inference_deployment(detector_id=detector_id, is_oodd=is_oodd)
+
+    # The new pods load the model files as they start, so read the files into the page cache while Kubernetes schedules
+    # the pods, rather than before the deployments are created or updated
+    prefetch = threading.Thread(
+        target=_prefetch_model_files,
+        args=(edge_inference_manager.MODEL_REPOSITORY, detector_id, to_create + to_update),
+        name=f"prefetch-{detector_id}",
+        daemon=True,
+    )
+    prefetch.start()
+
+    # Poll until the deployment rollout begins
+    # There is a slight delay between `update_inference_deployment` and Kubernetes actually starting the rollout, so it's important to wait for this
+    logger.info(f"Waiting for inference deployment(s) ({deployment_names}) to start")
+    rollout_start_timeout = 10
+    poll_start = time.time()
+    while any(deployment_manager.is_inference_deployment_rollout_complete(deployment_name=n) for n in updated_names):
+        if removed.wait(0.5):
+            raise DetectorRemovedError()
+        if time.time() - poll_start > rollout_start_timeout:
+            raise TimeoutError(f"Inference deployment(s) ({deployment_names}) did not start within time limit")
+
+    # Poll until the rollout completes. The new pods only become available once they have been warmed up.
+    logger.info(f"Waiting for inference deployment(s) ({deployment_names}) to complete")
+    poll_start = time.time()
+    while True:
+        for is_oodd in to_create + to_update:
+            warm_up_inference_pods(deployment_manager, edge_inference_manager.MODEL_REPOSITORY, detector_id, is_oodd)
+        if all(
+            deployment_manager.is_inference_deployment_rollout_complete(deployment_name=n)
+            for n in created_names + updated_names
         ):
-            time.sleep(5)
-            if time.time() - poll_start > ROLLOUT_READY_TIMEOUT_S:
-                raise TimeoutError(
-                    f"Inference deployment(s) ({deployment_names}) are not ready within "
-                    f"{ROLLOUT_READY_TIMEOUT_S}s time limit"
-                )
-
-        # Now that we have successfully rolled out new model versions, we can clean up our model repository a bit.
-        # To be a bit conservative, we keep the current model version as well as the version before that. Older
-        # versions of the model for the current detector_id will be removed from disk.
-        logger.info(f"Cleaning up old model versions for {detector_id}")
-        delete_old_model_versions(detector_id, repository_root=edge_inference_manager.MODEL_REPOSITORY, num_to_keep=2)
+            break
+        if removed.wait(5):
+            raise DetectorRemovedError()
+        if time.time() - poll_start > ROLLOUT_READY_TIMEOUT_S:
+            raise TimeoutError(
+                f"Inference deployment(s) ({deployment_names}) are not ready within "
+                f"{ROLLOUT_READY_TIMEOUT_S}s time limit"
+            )
+
+    prefetch.join()
+
+    # Now that we have successfully rolled out new model versions, we can clean up our model repository a bit.
+    # To be a bit conservative, we keep the current model version as well as the version before that. Older
+    # versions of the model for the current detector_id will be removed from disk.
+    logger.info(f"Cleaning up old model versions for {detector_id}")
+    delete_old_model_versions(detector_id, repository_root=edge_inference_manager.MODEL_REPOSITORY, num_to_keep=2)
+
+    _record_deployment_state(
+        detector_id, edge_inference_manager, deployment_manager, db_manager, separate_oodd_inference
+    )
 
+
+def _record_deployment_state(
+    detector_id: str,
+    edge_inference_manager: EdgeInferenceManager,
+    deployment_manager: InferenceDeploymentManager,
+    db_manager: DatabaseManager,
+    separate_oodd_inference: bool,
+) -> None:
+    """Once the detector's inference deployments have rolled out, record them in the database and record the models
+    they serve."""
+    edge_deployment_name = get_edge_inference_deployment_name(detector_id)
+    oodd_deployment_name = get_edge_inference_deployment_name(detector_id, is_oodd=True)
     if deployment_manager.is_inference_deployment_rollout_complete(deployment_name=edge_deployment_name) and (
         not separate_oodd_inference
         or deployment_manager.is_inference_deployment_rollout_complete(deployment_name=oodd_deployment_name)
@@ -165,6 +266,78 @@ def _check_new_models_and_inference_deployments(
                 fields_to_update={"deployment_created": True, "deployment_name": oodd_deployment_name},
             )
 
+        # Let the edge endpoint workers know which model versions the pods now serve, e.g. for keying cached results.
+        record_serving_models(
+            repository_root=edge_inference_manager.MODEL_REPOSITORY,
+            detector_id=detector_id,
+            primary_version=deployment_manager.get_deployed_model_version(edge_deployment_name),
+            oodd_version=(
+                deployment_manager.get_deployed_model_version(oodd_deployment_name) if separate_oodd_inference else None
+            ),
+        )
+
+
+def _delete_pending_detectors(
+    pending_deletions: frozenset[str],
+    deployment_manager: InferenceDeploymentManager,
+    db_manager: DatabaseManager,
+    separate_oodd_inference: bool,
+) -> bool:
+    """Delete the inference deployments and database records of detectors pending deletion. Returns False if their
+    pods didn't terminate in time, in which case the records are kept so that deleting them is retried."""
+    logger.info(f"Processing deletion of {len(pending_deletions)} detector(s): {pending_deletions}")
+    for detector_id in pending_deletions:
+        deployment_manager.delete_inference_deployment(detector_id)
+        if separate_oodd_inference:
+            deployment_manager.delete_inference_deployment(detector_id, is_oodd=True)
+
+    # Poll until all pods are fully terminated
+    poll_start = time.time()
+    all_gone = False
+    while time.time() - poll_start < POD_DELETION_TIMEOUT_SECONDS:
+        all_gone = all(
+            deployment_manager.is_inference_deployment_fully_deleted(did)
+            and (
+                not separate_oodd_inference
+                or deployment_manager.is_inference_deployment_fully_deleted(did, is_oodd=True)
+            )
+            for did in pending_deletions
+        )
+        if all_gone:
+            break
+        time.sleep(5)
+
+    if all_gone:
+        for detector_id in pending_deletions:
+            db_manager.delete_inference_deployment_records(detector_id)
+        logger.info(f"Finished deleting {len(pending_deletions)} detector(s) from DB.")
+    else:
+        logger.error(f"Timed out waiting for detector pods to terminate: {pending_deletions}. ")
+    return all_gone
+
+
+def _update_deployment_status(
+    deployment_manager: InferenceDeploymentManager, db_manager: DatabaseManager, separate_oodd_inference: bool
+) -> None:
+    """Update the status of the inference deployments in the database."""
+    deployment_records = db_manager.get_inference_deployment_records()
+    deployed_detector_ids = set(record.detector_id for record in deployment_records)
+    for detector_id in deployed_detector_ids:
+        primary_deployment_name = get_edge_inference_deployment_name(detector_id)
+        primary_deployment_created = deployment_manager.get_inference_deployment(primary_deployment_name) is not None
+        db_manager.update_inference_deployment_record(
+            model_name=get_edge_inference_model_name(detector_id, is_oodd=False),
+            fields_to_update={"deployment_created": primary_deployment_created},
+        )
+
+        if separate_oodd_inference:
+            oodd_deployment_name = get_edge_inference_deployment_name(detector_id, is_oodd=True)
+            oodd_deployment_created = deployment_manager.get_inference_deployment(oodd_deployment_name) is not None
+            db_manager.update_inference_deployment_record(
+                model_name=get_edge_inference_model_name(detector_id, is_oodd=True),
+                fields_to_update={"deployment_created": oodd_deployment_created},
+            )
+
 
 def manage_update_models(
     edge_inference_manager: EdgeInferenceManager,
@@ -180,11 +353,15 @@ def manage_update_models(
       pod with the new model. If a new model is not available, then we will do nothing.
 
     - We will also look for new detectors that need to be deployed. These are expected to be
-      found in the database. Found detectors will be added to the queue of detectors that need
-      an inference deployment.
+      found in the database. Found detectors are checked right away, and their inference
+      deployments are created.
+
+    Each detector is checked on its own schedule by a `ModelUpdateScheduler`, so that a slow
+    download or rollout for one detector doesn't delay the others. Creating and updating
+    inference deployments waits for the node to have the memory for their pods.
 
-    NOTE: The periodicity of this task is controlled by refresh_rate in the active edge config
-    file. The value is re-read each cycle so it can be changed at runtime.
+    NOTE: The periodicity of each detector's checks is controlled by refresh_rate in the active
+    edge config file. The value is re-read each cycle so it can be changed at runtime.
 
     :param edge_inference_manager: the edge inference manager object.
     :param deployment_manager: the inference deployment manager object.
@@ -196,88 +373,49 @@ def manage_update_models(
         sleep_forever("Edge inference is disabled globally... sleeping forever.")
         return
 
+    managers = (edge_inference_manager, deployment_manager, db_manager, separate_oodd_inference)
+    scheduler = ModelUpdateScheduler(
+        check_for_new_model=lambda detector_id, removed: _check_new_models_and_inference_deployments(
+            detector_id, *managers, removed=removed
+        ),
+        roll_out=lambda detector_id, removed: _roll_out_inference_deployments(detector_id, *managers, removed=removed),
+        status_path=os.path.join(edge_inference_manager.MODEL_REPOSITORY, MODEL_UPDATE_STATUS_FILE),
+    )
+    last_status_update = 0.0
+
     while True:
+        # Taken before reading the database, so that any change made after this point restarts the loop
+        detector_changes_baseline = db_manager.detector_changes_version()
+        refresh_rate = EdgeConfigManager.active().global_config.refresh_rate
+
+        # Stop updating detectors that are pending deletion or gone, and schedule new ones
+        scheduler.sync_detectors(db_manager.get_active_detector_ids())
+
         # Process pending deletions before any creation, freeing up resources before creating new pods
         pending_deletions = frozenset(db_manager.get_pending_deletions())
         if pending_deletions:
-            logger.info(f"Processing deletion of {len(pending_deletions)} detector(s): {pending_deletions}")
-            for detector_id in pending_deletions:
-                deployment_manager.delete_inference_deployment(detector_id)
-                if separate_oodd_inference:
-                    deployment_manager.delete_inference_deployment(detector_id, is_oodd=True)
-
-            # Poll until all pods are fully terminated
-            poll_start = time.time()
-            all_gone = False
-            while time.time() - poll_start < POD_DELETION_TIMEOUT_SECONDS:
-                all_gone = all(
-                    deployment_manager.is_inference_deployment_fully_deleted(did)
-                    and (
-                        not separate_oodd_inference
-                        or deployment_manager.is_inference_deployment_fully_deleted(did, is_oodd=True)
-                    )
-                    for did in pending_deletions
-                )
-                if all_gone:
-                    break
-                time.sleep(5)
-
-            if all_gone:
-                for detector_id in pending_deletions:
-                    db_manager.delete_inference_deployment_records(detector_id)
-                logger.info(f"Finished deleting {len(pending_deletions)} detector(s) from DB.")
-            else:
-                logger.error(f"Timed out waiting for detector pods to terminate: {pending_deletions}. ")
-
-        # Check for model updates and apply model updates
-        start = time.time()
-        detector_config_baseline = db_manager.get_active_detector_ids()
-        deployed_records = db_manager.get_inference_deployment_records(pending_deletion=False)
-        deployed_detector_ids = {r.detector_id for r in deployed_records}
-        logger.debug(f"Starting model update check for {len(deployed_detector_ids)} detector(s).")
-        for detector_id in deployed_detector_ids:
-            try:
-                logger.debug(f"Checking new models and inference deployments for detector_id: {detector_id}")
-                _check_new_models_and_inference_deployments(
-                    detector_id=detector_id,
-                    edge_inference_manager=edge_inference_manager,
-                    deployment_manager=deployment_manager,
-                    db_manager=db_manager,
-                    separate_oodd_inference=separate_oodd_inference,
-                )
-                logger.debug(f"Successfully updated model for detector_id: {detector_id}")
-            except Exception as e:
-                logger.info(f"Failed to update model for detector_id: {detector_id}. Error: {e}", exc_info=True)
-            if _detector_config_changed(db_manager, detector_config_baseline):
-                break
-
-        # Calculate time to wait
-        elapsed_s = time.time() - start
-        refresh_rate = EdgeConfigManager.active().global_config.refresh_rate
-        logger.debug(f"Model update check completed in {elapsed_s:.2f} seconds.")
-        wait = max(0.0, refresh_rate - elapsed_s)
-        _wait_for_next_cycle(db_manager, wait, refresh_rate, detector_config_baseline)
-
-        # Update the status of the inference deployments in the database
-        deployment_records = db_manager.get_inference_deployment_records()
-        deployed_detector_ids = set(record.detector_id for record in deployment_records)
-        for detector_id in deployed_detector_ids:
-            primary_deployment_name = get_edge_inference_deployment_name(detector_id)
-            primary_deployment_created = (
-                deployment_manager.get_inference_deployment(primary_deployment_name) is not None
-            )
-            db_manager.update_inference_deployment_record(
-                model_name=get_edge_inference_model_name(detector_id, is_oodd=False),
-                fields_to_update={"deployment_created": primary_deployment_created},
-            )
-
-            if separate_oodd_inference:
-                oodd_deployment_name = get_edge_inference_deployment_name(detector_id, is_oodd=True)
-                oodd_deployment_created = deployment_manager.get_inference_deployment(oodd_deployment_name) is not None
-                db_manager.update_inference_deployment_record(
-                    model_name=get_edge_inference_model_name(detector_id, is_oodd=True),
-                    fields_to_update={"deployment_created": oodd_deployment_created},
-                )
+            # A rollout in flight would recreate a deleted deployment, so wait for the updates to notice the removal
+            if not scheduler.wait_until_idle(pending_deletions, timeout_s=POD_DELETION_TIMEOUT_SECONDS):
+                logger.warning(f"Model updates of detectors pending deletion are still running: {pending_deletions}")
+            if not _delete_pending_detectors(
+                pending_deletions, deployment_manager, db_manager, separate_oodd_inference
+            ):
+                # Retry the deletion without waiting for the next cycle, as if detectors had changed again
+                detector_changes_baseline = None
+
+        # Check for model updates and apply model updates, for the detectors that are due
+        started = scheduler.schedule_due(refresh_rate)
+        if started:
+            logger.debug(f"Started model update check for {len(started)} detector(s): {started}")
+
+        # Wait until the next detector is due
+        next_check_s = scheduler.seconds_until_next_check()
+        wait = refresh_rate if next_check_s is None else min(refresh_rate, next_check_s)
+        _wait_for_next_cycle(db_manager, wait, refresh_rate, detector_changes_baseline)
+
+        if time.time() - last_status_update >= refresh_rate:
+            _update_deployment_status(deployment_manager, db_manager, separate_oodd_inference)
+            last_status_update = time.time()
 
 
 if __name__ == "__main__":
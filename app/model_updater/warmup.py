@@ -0,0 +1,165 @@
+"""Warm-up of new inference pods, before they receive traffic.
+
+An inference pod whose containers are ready has loaded its model, but its first inferences are still slow: the model
+files may have to be read from disk, and the first calls allocate GPU memory, fill caches and (with edge compilation)
+compile the model. Inference pods are gated on a pod condition (`INFERENCE_POD_WARMED_UP_CONDITION`), so neither the
+edge endpoint nor a rollout counts them as ready until the model updater has sent them a few synthetic inferences and
+set the condition.
+
+While a rollout starts the pods, the model files are read into the page cache. How long each model version took to
+load and warm up is recorded next to its files, see `get_warm_up_record`.
+"""
+
+import functools
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import requests
+from kubernetes.client import V1Pod
+from PIL import Image
+
+from app.core.edge_inference import get_all_model_versions, get_current_model_version
+from app.core.kubernetes_management import InferenceDeploymentManager
+from app.core.naming import get_oodd_model_dir, get_primary_edge_model_dir
+from app.core.utils import pil_image_to_bytes
+
+logger = logging.getLogger(__name__)
+
+# The number of synthetic inferences sent to a new inference pod before it receives traffic
+MODEL_WARMUP_INFERENCES = int(os.environ.get("MODEL_WARMUP_INFERENCES", 3))
+MODEL_WARMUP_INFERENCE_TIMEOUT_S = float(os.environ.get("MODEL_WARMUP_INFERENCE_TIMEOUT_S", 60))
+WARM_UP_RECORD_FILE = "warm_up.json"
+INFERENCE_SERVER_PORT = 8000
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+
+
+def _model_dir(repository_root: str, detector_id: str, is_oodd: bool) -> str:
+    if is_oodd:
+        return get_oodd_model_dir(repository_root, detector_id)
+    return get_primary_edge_model_dir(repository_root, detector_id)
+
+
+def prefetch_model_files(repository_root: str, detector_id: str, is_oodd: bool = False) -> int:
+    """
+    Read the files of the newest model version, so that the inference pods find them in the page cache when they load
+    the model. Returns the number of bytes read.
+    """
+    model_version = get_current_model_version(repository_root, detector_id, is_oodd=is_oodd)
+    if model_version is None:
+        return 0
+    version_dir = os.path.join(_model_dir(repository_root, detector_id, is_oodd), str(model_version))
+    buffer = bytearray(PREFETCH_CHUNK_SIZE)
+    num_bytes = 0
+    start = time.monotonic()
+    for dirpath, _, filenames in os.walk(version_dir):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename), "rb") as f:
+                while num_read := f.readinto(buffer):
+                    num_bytes += num_read
+    logger.debug(
+        f"Prefetched {num_bytes / 1e6:.0f} MB of model files from {version_dir} in {time.monotonic() - start:.1f}s"
+    )
+    return num_bytes
+
+
+@functools.cache
+def _synthetic_image() -> bytes:
+    return pil_image_to_bytes(Image.new("RGB", (640, 480), (128, 128, 128)))
+
+
+def send_warm_up_inferences(pod_ip: str, num_inferences: int) -> list[float]:
+    """
+    Send synthetic inferences to an inference pod. Returns the latency of each inference, stopping at the first one
+    that fails.
+    """
+    url = f"http://{pod_ip}:{INFERENCE_SERVER_PORT}/infer"
+    latencies = []
+    with requests.Session() as session:
+        for _ in range(num_inferences):
+            start = time.monotonic()
+            try:
+                response = session.post(
+                    url,
+                    data=_synthetic_image(),
+                    headers={"Content-Type": "image/jpeg"},
+                    timeout=MODEL_WARMUP_INFERENCE_TIMEOUT_S,
+                )
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Warm-up inference at {url} failed: {e}")
+                break
+            latencies.append(time.monotonic() - start)
+    return latencies
+
+
+def _containers_ready_at(pod: V1Pod) -> datetime | None:
+    for condition in pod.status.conditions or []:
+        if condition.type == "ContainersReady" and condition.status == "True":
+            return condition.last_transition_time
+    return None
+
+
+def warm_up_inference_pods(
+    deployment_manager: InferenceDeploymentManager, repository_root: str, detector_id: str, is_oodd: bool = False
+) -> None:
+    """
+    Warm up the pods of the detector's inference deployment whose containers are ready, then let them receive traffic
+    and record how long their model version took to warm up.
+
+    The warm-up is best effort: a pod whose warm-up inferences fail receives traffic all the same, as it would without
+    warm-up, rather than holding up the rollout until it times out.
+    """
+    for pod in deployment_manager.get_pods_to_warm_up(detector_id, is_oodd):
+        pod_name = pod.metadata.name
+        warm_up_start = datetime.now(timezone.utc)
+        latencies = send_warm_up_inferences(pod.status.pod_ip, MODEL_WARMUP_INFERENCES)
+        deployment_manager.mark_pod_warmed_up(pod_name)
+        warmed_at = datetime.now(timezone.utc)
+
+        created_at = pod.metadata.creation_timestamp
+        containers_ready_at = _containers_ready_at(pod)
+        record = {
+            "pod": pod_name,
+            "load_s": (
+                (containers_ready_at - created_at).total_seconds() if created_at and containers_ready_at else None
+            ),
+            "warm_up_s": (warmed_at - warm_up_start).total_seconds(),
+            "time_to_warm_s": (warmed_at - created_at).total_seconds() if created_at else None,
+            "warm_up_inferences": len(latencies),
+            "first_inference_s": latencies[0] if latencies else None,
+            "last_inference_s": latencies[-1] if latencies else None,
+            "warmed_at": warmed_at.isoformat(),
+        }
+        logger.info(f"Warmed up inference pod {pod_name} for {detector_id}: {record}")
+
+        model_version = (pod.metadata.annotations or {}).get("groundlight.dev/model-version", "")
+        if model_version.isdigit():
+            record_warm_up(_model_dir(repository_root, detector_id, is_oodd), int(model_version), record)
+
+
+def _read_warm_up_records(model_dir: str) -> dict[str, dict]:
+    try:
+        with open(os.path.join(model_dir, WARM_UP_RECORD_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_warm_up(model_dir: str, model_version: int, record: dict) -> None:
+    """Record the warm-up of a model version's inference pod. Records of versions no longer on disk are dropped."""
+    versions = {str(v) for v in get_all_model_versions(model_dir)}
+    records = {v: r for v, r in _read_warm_up_records(model_dir).items() if v in versions}
+    records[str(model_version)] = record
+    # Write to a temporary file and rename it into place, so readers never see a partially written file.
+    temp_path = os.path.join(model_dir, f"{WARM_UP_RECORD_FILE}.tmp")
+    with open(temp_path, "w") as f:
+        json.dump(records, f)
+    os.replace(temp_path, os.path.join(model_dir, WARM_UP_RECORD_FILE))
+
+
+def get_warm_up_record(model_dir: str, model_version: int) -> dict | None:
+    """Return the record of the last warm-up of the model version's inference pod, see `warm_up_inference_pods`."""
+    return _read_warm_up_records(model_dir).get(str(model_version))
@@ -10,7 +10,7 @@ from fastapi.staticfiles import StaticFiles
 
 from app.core.edge_config_manager import EdgeConfigManager
 from app.core.groundlight_client import groundlight_client
-from app.metrics.iq_activity import clear_old_activity_files
+from app.metrics.iq_activity import clear_old_activity_files, migrate_legacy_activity_files
 from app.metrics.metric_reporting import MetricsReporter
 from app.metrics.resource_metrics import ResourceMetricsCollector
 
@@ -49,6 +49,10 @@ async def startup_event():
         level=LOG_LEVEL, format="%(asctime)s.%(msecs)03d %(levelname)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
     )
     logging.info("Starting status-monitor server...")
+    try:
+        migrate_legacy_activity_files()
+    except Exception as e:
+        logging.error(f"Failed to migrate hourly activity files: {e}", exc_info=True)
     logging.info("Will report metrics to the cloud every hour")
     # Every hour, on the hour, collect metrics to send to the cloud.
     scheduler.add_job(reporter.collect_metrics_for_cloud, "cron", hour="*", minute="0")
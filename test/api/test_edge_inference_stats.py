@@ -0,0 +1,16 @@
+import os
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.api.api import EDGE_INFERENCE_STATS
+from app.api.naming import path_prefix
+
+
+def test_edge_inference_stats_endpoint(test_client: TestClient):
+    response = test_client.get(path_prefix(EDGE_INFERENCE_STATS))
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert body["pid"] == os.getpid()
+    assert body["dispatch"]["services"] == {}
+    assert body["dispatch"]["max_concurrency_per_service"] > 0
@@ -126,7 +126,7 @@ def enable_edge_inference(
 
     mock_edge_inference_manager = mock.Mock()
     mock_edge_inference_manager.inference_is_available.return_value = True
-    mock_edge_inference_manager.run_inference.return_value = edge_response
+    mock_edge_inference_manager.run_inference = mock.AsyncMock(return_value=edge_response)
 
     # We need to inject the edge_inference_manager mock via `get_app_state`, so
     # we need to mock AppState as well. It would be nicer if we had more loosely
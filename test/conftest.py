@@ -1,9 +1,22 @@
+import atexit
+import os
+import shutil
+import tempfile
 from unittest.mock import patch
 
 import pytest
 from fastapi.testclient import TestClient
 
-from app.main import app
+# State that the edge-endpoint workers share through the filesystem is kept private to each test process, so that
+# tests (and concurrent test runs) can't see each other's detector metadata, escalation times or inference slots.
+_shared_state_dir = tempfile.mkdtemp(prefix="edge-endpoint-test-")
+atexit.register(shutil.rmtree, _shared_state_dir, ignore_errors=True)
+os.environ.setdefault("DETECTOR_METADATA_CACHE_DIR", os.path.join(_shared_state_dir, "detector-metadata"))
+os.environ.setdefault("ESCALATION_COOLDOWN_TABLE_PATH", os.path.join(_shared_state_dir, "escalation-cooldowns"))
+os.environ.setdefault("ADMISSION_SLOTS_DIR", os.path.join(_shared_state_dir, "admission"))
+os.environ.setdefault("DETECTOR_CHANGES_FILEPATH", os.path.join(_shared_state_dir, "detector-changes"))
+
+from app.main import app  # noqa: E402
 
 
 @pytest.fixture(scope="module")
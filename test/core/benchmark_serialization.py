@@ -0,0 +1,129 @@
+"""Measures the CPU time per image query spent on JSON, before and after `app.core.serialization`.
+
+Not collected by pytest. Run with:
+
+    uv run python -m test.core.benchmark_serialization
+
+Each step is timed on its own, for an edge-answered image query whose result is escalated because it isn't
+confident enough: parsing the inference server's response, encoding the `ImageQuery` response, and encoding the
+escalation queue record.
+"""
+
+import json
+import timeit
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from model import ImageQuery, ModeEnum
+
+from app.core import serialization
+from app.core.utils import create_iq, generate_metadata_dict, prefixed_ksuid
+from app.escalation_queue.models import EscalationInfo, SubmitImageQueryParams
+from app.escalation_queue.queue_writer import convert_escalation_info_to_str
+
+ITERATIONS = 20_000
+
+INFERENCE_RESPONSE = json.dumps(
+    {
+        "multi_predictions": {"labels": [1], "probabilities": [[0.1, 0.62, 0.28]]},
+        "predictions": {"confidences": [0.62], "labels": [1], "probabilities": [[0.1, 0.62, 0.28]]},
+        "rois": (
+            [
+                {
+                    "label": "bird",
+                    "geometry": {"left": 0.4, "top": 0.4, "right": 0.6, "bottom": 0.6, "x": 0.5, "y": 0.5},
+                    "score": 0.8,
+                }
+            ]
+            * 3
+        ),
+        "text": None,
+        "secondary_predictions": None,
+    }
+).encode()
+
+RESULTS = {
+    "confidence": 0.62,
+    "label": 1,
+    "text": None,
+    "rois": json.loads(INFERENCE_RESPONSE)["rois"],
+    "raw_primary_confidence": 0.62,
+    "raw_oodd_prediction": {"confidence": 1.0, "label": 0, "text": None, "rois": None},
+    "mlb_key": "mlb_2zKxQ8h3Cj7bT5nNwYdP4vR9sLm",
+    "oodd_mlb_key": "mlb_2zKxQ9a1Bf6cU4mMvXeO3wS8tKn",
+}
+
+
+def _image_query() -> ImageQuery:
+    return create_iq(
+        detector_id=prefixed_ksuid("det_"),
+        mode=ModeEnum.MULTI_CLASS,
+        mode_configuration={"class_names": ["cat", "dog", "bird"]},
+        result_value=RESULTS["label"],
+        confidence=RESULTS["confidence"],
+        confidence_threshold=0.75,
+        is_done_processing=False,
+        query="Which animal is this?",
+        rois=None,
+        mlb_key=RESULTS["mlb_key"],
+        oodd_mlb_key=RESULTS["oodd_mlb_key"],
+    )
+
+
+def _run_without_awaiting(coroutine):
+    """Run a coroutine that never awaits anything, without the overhead of an event loop."""
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError("The coroutine awaited something")
+
+
+def main():
+    iq = _image_query()
+    response_field = APIRoute("/", _image_query, response_model=ImageQuery).response_field
+    escalation_info = EscalationInfo(
+        timestamp="20250403_120000_000000",
+        detector_id=iq.detector_id,
+        image_path_str="/opt/groundlight/queue/images/det_abc-20250403_120000_000000-2zKxQ8h3Cj7bT5nNwYdP4vR9sLm",
+        submit_iq_params=SubmitImageQueryParams(
+            patience_time=30.0,
+            confidence_threshold=0.75,
+            human_review=None,
+            metadata=generate_metadata_dict(RESULTS),
+            image_query_id=iq.id,
+        ),
+        request_id="req_uu9f4c1a0e6b2d4f7a8c3e5b1d0f2a4c6e",
+    )
+
+    def response_model_encoding():
+        content = _run_without_awaiting(serialize_response(field=response_field, response_content=iq))
+        return JSONResponse(content).body
+
+    steps = [
+        (
+            "parse inference response",
+            lambda: json.loads(INFERENCE_RESPONSE),
+            lambda: serialization.loads(INFERENCE_RESPONSE),
+        ),
+        ("encode ImageQuery response", response_model_encoding, lambda: serialization.image_query_response(iq).body),
+        (
+            "encode queue record",
+            lambda: f"{json.dumps(escalation_info.model_dump())}\n",
+            lambda: convert_escalation_info_to_str(escalation_info),
+        ),
+    ]
+
+    print(f"{'step':<30}{'before (us)':>14}{'after (us)':>14}{'saved (us)':>14}")
+    total_before = total_after = 0.0
+    for name, before, after in steps:
+        before_us = timeit.timeit(before, number=ITERATIONS) / ITERATIONS * 1e6
+        after_us = timeit.timeit(after, number=ITERATIONS) / ITERATIONS * 1e6
+        total_before += before_us
+        total_after += after_us
+        print(f"{name:<30}{before_us:>14.1f}{after_us:>14.1f}{before_us - after_us:>14.1f}")
+    print(f"{'total per image query':<30}{total_before:>14.1f}{total_after:>14.1f}{total_before - total_after:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import multiprocessing
+import tempfile
+import time
+
+import pytest
+from fastapi import status
+
+from app.core.admission import AdmissionController, AdmissionLimits, AdmissionRejectedError
+from app.core.edge_config_schema import ExtendedInferenceConfig
+
+DETECTOR_ID = "det_test"
+
+
+def test_limits_from_inference_config():
+    limits = AdmissionLimits.from_inference_config(ExtendedInferenceConfig(name="limited", max_concurrent_inferences=3))
+    assert limits.max_in_flight == 3  # noqa: PLR2004
+    assert limits.max_queue_depth == 3  # noqa: PLR2004
+
+    assert AdmissionLimits.from_inference_config(ExtendedInferenceConfig(name="default")).max_in_flight is None
+    assert AdmissionLimits.from_inference_config(None).max_in_flight is None
+
+
+def test_unlimited_detector_is_always_admitted():
+    controller = AdmissionController()
+    limits = AdmissionLimits(max_in_flight=None, max_queue_depth=0, max_queue_wait_s=1)
+
+    async def run():
+        for _ in range(100):
+            await controller.acquire(DETECTOR_ID, limits)
+
+    asyncio.run(run())
+    assert controller.stats()[DETECTOR_ID]["in_flight"] == 100  # noqa: PLR2004
+
+
+def test_full_queue_is_rejected_with_429():
+    controller = AdmissionController()
+    limits = AdmissionLimits(max_in_flight=1, max_queue_depth=1, max_queue_wait_s=5)
+
+    async def run():
+        await controller.acquire(DETECTOR_ID, limits)
+        waiter = asyncio.create_task(controller.acquire(DETECTOR_ID, limits))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await controller.acquire(DETECTOR_ID, limits)
+        controller.release(DETECTOR_ID)
+        await waiter  # The queued request gets the released slot
+        return exc_info.value
+
+    rejection = asyncio.run(run())
+    assert rejection.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert rejection.retry_after_s == 5  # noqa: PLR2004
+    stats = controller.stats()[DETECTOR_ID]
+    assert stats == {
+        "in_flight": 1,
+        "queue_depth": 0,
+        "admitted": 2,
+        "rejected_queue_full": 1,
+        "rejected_queue_timeout": 0,
+    }
+
+
+def test_queue_wait_timeout_is_rejected_with_503():
+    controller = AdmissionController()
+    limits = AdmissionLimits(max_in_flight=1, max_queue_depth=5, max_queue_wait_s=0.01)
+
+    async def run():
+        await controller.acquire(DETECTOR_ID, limits)
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await controller.acquire(DETECTOR_ID, limits)
+        return exc_info.value
+
+    rejection = asyncio.run(run())
+    assert rejection.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert rejection.retry_after_s == 1
+    stats = controller.stats()[DETECTOR_ID]
+    assert stats["rejected_queue_timeout"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 1
+
+
+def test_in_flight_cap_is_enforced_under_load():
+    controller = AdmissionController()
+    limits = AdmissionLimits(max_in_flight=2, max_queue_depth=100, max_queue_wait_s=5)
+    running = 0
+    peak = 0
+
+    async def request():
+        nonlocal running, peak
+        async with controller.admit(DETECTOR_ID, limits):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(20)))
+
+    asyncio.run(run())
+    assert peak == 2  # noqa: PLR2004
+    stats = controller.stats()[DETECTOR_ID]
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 20  # noqa: PLR2004
+
+
+def _limited_worker(directory: str, limits: AdmissionLimits, start, counters) -> None:
+    controller = AdmissionController(directory)
+    running, peak, admitted = counters
+
+    async def request():
+        try:
+            async with controller.admit(DETECTOR_ID, limits):
+                with running.get_lock():
+                    running.value += 1
+                    peak.value = max(peak.value, running.value)
+                await asyncio.sleep(0.005)
+                with running.get_lock():
+                    running.value -= 1
+            with admitted.get_lock():
+                admitted.value += 1
+        except AdmissionRejectedError:
+            pass
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    start.wait()
+    asyncio.run(run())
+
+
+def test_in_flight_cap_is_shared_by_all_workers():
+    num_workers = 4
+    limits = AdmissionLimits(max_in_flight=2, max_queue_depth=100, max_queue_wait_s=10)
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(num_workers)
+    running, peak, admitted = context.Value("i", 0), context.Value("i", 0), context.Value("i", 0)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workers = [
+            context.Process(target=_limited_worker, args=(temp_dir, limits, start, (running, peak, admitted)))
+            for _ in range(num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+            assert worker.exitcode == 0
+
+    assert peak.value == 2  # noqa: PLR2004
+    # Every request eventually got one of the two slots, whichever worker released it
+    assert admitted.value == num_workers * 10
+
+
+def _hold_slot_and_exit(directory: str, limits: AdmissionLimits) -> None:
+    asyncio.run(AdmissionController(directory).acquire(DETECTOR_ID, limits))
+
+
+def test_slots_of_an_exited_worker_are_freed():
+    limits = AdmissionLimits(max_in_flight=1, max_queue_depth=1, max_queue_wait_s=2)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        holder = multiprocessing.get_context("fork").Process(target=_hold_slot_and_exit, args=(temp_dir, limits))
+        holder.start()
+        holder.join(timeout=10)
+        assert holder.exitcode == 0
+
+        # The worker exited without releasing its slot
+        controller = AdmissionController(temp_dir)
+        started = time.monotonic()
+        asyncio.run(controller.acquire(DETECTOR_ID, limits))
+        assert time.monotonic() - started < 1
@@ -0,0 +1,68 @@
+import io
+import time
+
+from PIL import Image, ImageDraw
+
+from app.core.change_gate import ChangeGate, ChangeGateSettings, make_thumbnail, thumbnail_difference
+from app.core.edge_config_schema import ExtendedInferenceConfig
+
+DETECTOR_ID = "det_test"
+MODEL_KEYS = ("prim_1", "oodd_1")
+RESULT = {"confidence": 0.9, "label": 1, "text": None, "rois": None}
+SETTINGS = ChangeGateSettings(threshold=0.02, max_reuse_age_s=30)
+
+
+def _jpeg(box_x: int, quality: int = 90) -> bytes:
+    """A synthetic scene with a white box at `box_x`."""
+    image = Image.new("RGB", (640, 480), (40, 60, 80))
+    ImageDraw.Draw(image).rectangle((box_x, 100, box_x + 200, 300), fill=(250, 250, 250))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_settings_from_inference_config():
+    assert ChangeGateSettings.from_inference_config(ExtendedInferenceConfig(name="default")) is None
+    settings = ChangeGateSettings.from_inference_config(
+        ExtendedInferenceConfig(name="gated", change_gate_threshold=0.01, change_gate_max_reuse_age=5)
+    )
+    assert settings.threshold == 0.01  # noqa: PLR2004
+    assert settings.max_reuse_age_s == 5  # noqa: PLR2004
+
+
+def test_thumbnail_difference_separates_noise_from_change():
+    reference = make_thumbnail(_jpeg(100))
+    recompressed = make_thumbnail(_jpeg(100, quality=70))
+    moved = make_thumbnail(_jpeg(300))
+
+    assert reference.size == (64, 64)
+    assert thumbnail_difference(reference, recompressed) < SETTINGS.threshold
+    assert thumbnail_difference(reference, moved) > SETTINGS.threshold
+
+
+def test_unchanged_scene_reuses_result_and_changed_scene_does_not():
+    gate = ChangeGate()
+    assert gate.reusable_result(DETECTOR_ID, make_thumbnail(_jpeg(100)), MODEL_KEYS, SETTINGS) is None
+    gate.record_inference(DETECTOR_ID, make_thumbnail(_jpeg(100)), MODEL_KEYS, RESULT)
+
+    assert gate.reusable_result(DETECTOR_ID, make_thumbnail(_jpeg(100, quality=70)), MODEL_KEYS, SETTINGS) == RESULT
+    assert gate.reusable_result(DETECTOR_ID, make_thumbnail(_jpeg(300)), MODEL_KEYS, SETTINGS) is None
+    # A result from a different model version is never reused
+    assert gate.reusable_result(DETECTOR_ID, make_thumbnail(_jpeg(100)), ("prim_2", "oodd_1"), SETTINGS) is None
+
+    assert gate.stats()[DETECTOR_ID] == {"checked": 4, "skipped": 1, "skip_rate": 0.25}
+
+
+def test_result_is_not_reused_past_max_age():
+    gate = ChangeGate()
+    thumbnail = make_thumbnail(_jpeg(100))
+    gate.record_inference(DETECTOR_ID, thumbnail, MODEL_KEYS, RESULT)
+    time.sleep(0.02)
+    assert gate.reusable_result(DETECTOR_ID, thumbnail, MODEL_KEYS, ChangeGateSettings(0.02, 0.01)) is None
+
+
+def test_undecodable_image_is_never_gated():
+    gate = ChangeGate()
+    assert make_thumbnail(b"not an image") is None
+    gate.record_inference(DETECTOR_ID, None, MODEL_KEYS, RESULT)
+    assert gate.reusable_result(DETECTOR_ID, None, MODEL_KEYS, SETTINGS) is None
@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from model import Detector, DetectorTypeEnum, EscalationTypeEnum, ModeEnum
+
+from app.core import app_state
+from app.core.app_state import STALE_METADATA_THRESHOLD_SEC, get_detector_metadata, refresh_detector_metadata_if_needed
+from app.core.detector_metadata_cache import SharedDetectorMetadataCache
+
+NUM_WORKERS = 6
+FETCH_DURATION_S = 0.2
+
+
+def _detector(detector_id: str, confidence_threshold: float = 0.75) -> Detector:
+    return Detector(
+        id=detector_id,
+        type=DetectorTypeEnum.detector,
+        created_at=datetime(2024, 10, 6, 7, 35, 0),
+        name="test_detector",
+        query="Is the door open?",
+        group_name="test_group",
+        confidence_threshold=confidence_threshold,
+        patience_time=30,
+        metadata=None,
+        mode=ModeEnum.BINARY,
+        mode_configuration=None,
+        escalation_type=EscalationTypeEnum.STANDARD,
+    )
+
+
+def _counting_gl(fetches, confidence_threshold: float) -> MagicMock:
+    """A Groundlight client whose get_detector is slow and counts its calls across processes."""
+
+    def get_detector(id: str, request_timeout: tuple) -> Detector:
+        with fetches.get_lock():
+            fetches.value += 1
+        time.sleep(FETCH_DURATION_S)
+        return _detector(id, confidence_threshold)
+
+    gl = MagicMock()
+    gl.get_detector.side_effect = get_detector
+    return gl
+
+
+def _cold_worker(directory: str, detector_id: str, start, fetches, thresholds) -> None:
+    shared_cache = SharedDetectorMetadataCache(directory)
+    gl = _counting_gl(fetches, confidence_threshold=0.75)
+    start.wait()
+    with patch.object(app_state, "shared_detector_metadata_cache", shared_cache):
+        detector = get_detector_metadata(detector_id=detector_id, gl=gl)
+    thresholds.put(detector.confidence_threshold)
+
+
+def _refresh_worker(directory: str, detector_id: str, start, fetches, thresholds) -> None:
+    shared_cache = SharedDetectorMetadataCache(directory)
+    gl = _counting_gl(fetches, confidence_threshold=0.9)
+    start.wait()
+    with patch.object(app_state, "shared_detector_metadata_cache", shared_cache):
+        refresh_detector_metadata_if_needed(detector_id, gl)
+        # Workers that didn't refresh keep serving their stale copy
+        thresholds.put(get_detector_metadata(detector_id=detector_id, gl=gl).confidence_threshold)
+
+
+def _run_workers(target, directory: str, detector_id: str) -> tuple[int, list[float]]:
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(NUM_WORKERS)
+    fetches = context.Value("i", 0)
+    thresholds = context.Queue()
+    workers = [
+        context.Process(target=target, args=(directory, detector_id, start, fetches, thresholds))
+        for _ in range(NUM_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    results = [thresholds.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+    return fetches.value, results
+
+
+def test_shared_cache_round_trip():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shared_cache = SharedDetectorMetadataCache(temp_dir)
+        assert shared_cache.get("det_round_trip") is None
+        assert shared_cache.age("det_round_trip") is None
+
+        shared_cache.put("det_round_trip", _detector("det_round_trip"))
+        assert shared_cache.get("det_round_trip") == _detector("det_round_trip")
+        assert 0 <= shared_cache.age("det_round_trip") < 5  # noqa: PLR2004
+
+
+def test_lock_is_exclusive():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shared_cache = SharedDetectorMetadataCache(temp_dir)
+        with shared_cache.lock("det_lock") as acquired:
+            assert acquired
+            with shared_cache.lock("det_lock", blocking=False) as acquired_again:
+                assert not acquired_again
+            with shared_cache.lock("det_other", blocking=False) as acquired_other:
+                assert acquired_other
+
+
+def test_new_detector_is_fetched_once_by_all_workers():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fetches, thresholds = _run_workers(_cold_worker, temp_dir, "det_cold")
+
+        assert fetches == 1
+        assert thresholds == [0.75] * NUM_WORKERS
+
+
+def test_stale_detector_is_refreshed_once_by_all_workers():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shared_cache = SharedDetectorMetadataCache(temp_dir)
+        detector_id = "det_stale"
+        shared_cache.put(detector_id, _detector(detector_id))
+        stale_mtime = time.time() - STALE_METADATA_THRESHOLD_SEC - 10
+        os.utime(shared_cache._path(detector_id, ".json"), (stale_mtime, stale_mtime))
+        with patch.object(app_state, "shared_detector_metadata_cache", shared_cache):
+            # Every worker has the stale metadata cached already
+            get_detector_metadata.cache.__setitem__(
+                detector_id, _detector(detector_id), timestamp=time.monotonic() - STALE_METADATA_THRESHOLD_SEC - 10
+            )
+
+        fetches, thresholds = _run_workers(_refresh_worker, temp_dir, detector_id)
+
+        assert fetches == 1
+        assert 0.9 in thresholds  # noqa: PLR2004
+        assert shared_cache.get(detector_id).confidence_threshold == 0.9  # noqa: PLR2004
+
+
+def test_worker_adopts_metadata_refreshed_by_another_worker():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shared_cache = SharedDetectorMetadataCache(temp_dir)
+        detector_id = "det_adopt"
+        gl = MagicMock()
+        with patch.object(app_state, "shared_detector_metadata_cache", shared_cache):
+            get_detector_metadata.cache.__setitem__(
+                detector_id, _detector(detector_id), timestamp=time.monotonic() - STALE_METADATA_THRESHOLD_SEC - 10
+            )
+            # Another worker has just refreshed the detector
+            shared_cache.put(detector_id, _detector(detector_id, confidence_threshold=0.9))
+
+            refresh_detector_metadata_if_needed(detector_id, gl)
+
+            gl.get_detector.assert_not_called()
+            assert get_detector_metadata(detector_id=detector_id, gl=gl).confidence_threshold == 0.9  # noqa: PLR2004
+
+
+def test_first_seen_detector_keeps_the_shared_copy_age():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shared_cache = SharedDetectorMetadataCache(temp_dir)
+        detector_id = "det_first_seen_stale"
+        shared_cache.put(detector_id, _detector(detector_id))
+        stale_mtime = time.time() - STALE_METADATA_THRESHOLD_SEC - 10
+        os.utime(shared_cache._path(detector_id, ".json"), (stale_mtime, stale_mtime))
+        gl = _counting_gl(multiprocessing.Value("i", 0), confidence_threshold=0.9)
+        with patch.object(app_state, "shared_detector_metadata_cache", shared_cache):
+            assert get_detector_metadata(detector_id=detector_id, gl=gl).confidence_threshold == 0.75  # noqa: PLR2004
+            cached_value_age = time.monotonic() - get_detector_metadata.cache.get_timestamp(detector_id)
+            assert cached_value_age > STALE_METADATA_THRESHOLD_SEC
+
+            # So the stale shared copy is refreshed right away instead of a full refresh interval later
+            refresh_detector_metadata_if_needed(detector_id, gl)
+
+            assert get_detector_metadata(detector_id=detector_id, gl=gl).confidence_threshold == 0.9  # noqa: PLR2004
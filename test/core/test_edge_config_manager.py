@@ -1,10 +1,17 @@
+import os
+import time
+from pathlib import Path
+from unittest import mock
+
 import pytest
+import yaml
 from groundlight.edge import DEFAULT, EdgeEndpointConfig, InferenceConfig
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.database import DatabaseManager
 from app.core.edge_config_manager import EdgeConfigManager, apply_detector_changes, compute_detector_diff
+from app.escalation_queue.dir_watcher import DirectoryWatcher
 
 DET_A = "det_AAAAAAAAAAAAAAAAAAAAAAAAAAA"
 DET_B = "det_BBBBBBBBBBBBBBBBBBBBBBBBBBB"
@@ -104,8 +111,9 @@ class TestEdgeConfigManager:
         """Point config paths at temp files and reset class-level cache between tests."""
         self.active_path = str(tmp_path / "active-edge-config.yaml")
         monkeypatch.setattr("app.core.edge_config_manager.ACTIVE_EDGE_CONFIG_PATH", self.active_path)
-        EdgeConfigManager._cached_config = EdgeEndpointConfig()
-        EdgeConfigManager._cached_mtime = 0.0
+        EdgeConfigManager._snapshot = None
+        yield
+        EdgeConfigManager.stop_watching()
 
     def test_save_and_active_roundtrip(self):
         config = _config_with_detectors(DET_A, DET_B)
@@ -127,6 +135,59 @@ class TestEdgeConfigManager:
         second = EdgeConfigManager.active()
         assert first is second
 
+    def test_active_reloads_when_another_process_changes_file(self):
+        EdgeConfigManager.save(_config_with_detectors(DET_A))
+        assert {d.detector_id for d in EdgeConfigManager.active().detectors} == {DET_A}
+
+        # Written by another process, so this process's cached snapshot isn't updated on save
+        with open(self.active_path, "w") as f:
+            yaml.dump(_config_with_detectors(DET_B).to_payload(), f)
+        os.utime(self.active_path, (mtime := os.path.getmtime(self.active_path) + 1, mtime))
+        second = EdgeConfigManager.active()
+        assert {d.detector_id for d in second.detectors} == {DET_B}
+
+    def test_watched_config_is_read_without_checking_file(self):
+        EdgeConfigManager.save(_config_with_detectors(DET_A))
+        EdgeConfigManager.start_watching(interval_s=0.01)
+        first = EdgeConfigManager.active()
+
+        with mock.patch("app.core.edge_config_manager.os.path.getmtime") as getmtime:
+            for _ in range(10):
+                assert EdgeConfigManager.active() is first
+                assert EdgeConfigManager.snapshot().detector_config(DET_A) is not None
+            getmtime.assert_not_called()
+
+        # Changes by other processes are picked up by the watcher
+        with open(self.active_path, "w") as f:
+            yaml.dump(_config_with_detectors(DET_B).to_payload(), f)
+        os.utime(self.active_path, (mtime := os.path.getmtime(self.active_path) + 1, mtime))
+        deadline = time.monotonic() + 2
+        while EdgeConfigManager.active() is first:
+            assert time.monotonic() < deadline, "The watcher didn't pick up the changed config"
+            time.sleep(0.01)
+        assert {d.detector_id for d in EdgeConfigManager.active().detectors} == {DET_B}
+
+    def test_watcher_is_woken_up_by_changes(self):
+        EdgeConfigManager.save(_config_with_detectors(DET_A))
+        directory_watcher = DirectoryWatcher.create(Path(self.active_path).parent)
+        if directory_watcher is None:
+            pytest.skip("inotify is not available")
+        directory_watcher.close()
+        EdgeConfigManager.start_watching(interval_s=1)
+        first = EdgeConfigManager.active()
+
+        # Picked up well before the watcher would check the file again
+        temp_path = f"{self.active_path}.tmp"
+        with open(temp_path, "w") as f:
+            yaml.dump(_config_with_detectors(DET_B).to_payload(), f)
+        os.utime(temp_path, (mtime := os.path.getmtime(self.active_path) + 1, mtime))
+        os.replace(temp_path, self.active_path)
+        deadline = time.monotonic() + 0.5
+        while EdgeConfigManager.active() is first:
+            assert time.monotonic() < deadline, "The watcher wasn't woken up by the changed config"
+            time.sleep(0.01)
+        assert {d.detector_id for d in EdgeConfigManager.active().detectors} == {DET_B}
+
     def test_active_reloads_on_file_change(self):
         EdgeConfigManager.save(_config_with_detectors(DET_A))
         first = EdgeConfigManager.active()
@@ -147,6 +208,12 @@ class TestEdgeConfigManager:
         result = EdgeConfigManager.detector_config(config, DET_A)
         assert isinstance(result, InferenceConfig)
 
+    def test_snapshot_detector_config(self):
+        EdgeConfigManager.save(_config_with_detectors(DET_A, DET_B))
+        snapshot = EdgeConfigManager.snapshot()
+        assert snapshot.detector_config(DET_A) == EdgeConfigManager.detector_config(snapshot.config, DET_A)
+        assert snapshot.detector_config("det_MISSING") is None
+
     def test_detector_config_not_found(self):
         config = _config_with_detectors(DET_A)
         result = EdgeConfigManager.detector_config(config, "det_MISSING")
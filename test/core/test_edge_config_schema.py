@@ -0,0 +1,59 @@
+import pytest
+from groundlight.edge import NO_CLOUD, EdgeEndpointConfig
+from pydantic import ValidationError
+
+from app.core.edge_config_schema import ExtendedEdgeEndpointConfig, ExtendedInferenceConfig
+
+DET_A = "det_" + "a" * 27
+
+CONFIG_YAML = f"""
+edge_inference_configs:
+  limited:
+    max_concurrent_inferences: 2
+    max_inference_queue_depth: 4
+    max_inference_queue_wait: 0.5
+  plain:
+    always_return_edge_prediction: true
+detectors:
+  - detector_id: {DET_A}
+    edge_inference_config: limited
+"""
+
+
+def test_edge_only_fields_are_parsed_and_round_trip():
+    config = ExtendedEdgeEndpointConfig.from_yaml(yaml_str=CONFIG_YAML)
+    limited = config.edge_inference_configs["limited"]
+    assert isinstance(limited, ExtendedInferenceConfig)
+    assert limited.max_concurrent_inferences == 2  # noqa: PLR2004
+    assert limited.max_inference_queue_wait == 0.5  # noqa: PLR2004
+
+    assert ExtendedEdgeEndpointConfig.from_payload(config.to_payload()) == config
+
+
+def test_payload_matches_sdk_when_edge_only_fields_are_unset():
+    yaml_str = CONFIG_YAML.replace("    max_concurrent_inferences: 2\n", "").replace(
+        "    max_inference_queue_depth: 4\n    max_inference_queue_wait: 0.5\n", "    enabled: true\n"
+    )
+    assert (
+        ExtendedEdgeEndpointConfig.from_yaml(yaml_str=yaml_str).to_payload()
+        == EdgeEndpointConfig.from_yaml(yaml_str=yaml_str).to_payload()
+    )
+
+
+def test_invalid_edge_only_field_is_rejected():
+    with pytest.raises(ValidationError):
+        ExtendedEdgeEndpointConfig.from_yaml(
+            yaml_str=CONFIG_YAML.replace("max_concurrent_inferences: 2", "max_concurrent_inferences: 0")
+        )
+
+
+def test_sdk_presets_are_accepted():
+    config = ExtendedEdgeEndpointConfig()
+    config.add_detector(DET_A, NO_CLOUD)
+    inference_config = config.edge_inference_configs["no_cloud"]
+    assert isinstance(inference_config, ExtendedInferenceConfig)
+    assert inference_config.disable_cloud_escalation
+    assert inference_config.max_concurrent_inferences is None
+
+    config = ExtendedEdgeEndpointConfig(edge_inference_configs={"no_cloud": NO_CLOUD})
+    assert isinstance(config.edge_inference_configs["no_cloud"], ExtendedInferenceConfig)
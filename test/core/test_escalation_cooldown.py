@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import mock
+
+from app.core.edge_config_schema import ExtendedInferenceConfig
+from app.core.edge_inference import EdgeInferenceManager
+from app.core.escalation_cooldown import EscalationCooldownTable
+
+DETECTOR_ID = "det_2UOxalD1gegjk4TnyLbtGggiJ8p"
+NUM_WORKERS = 6
+ATTEMPTS_PER_WORKER = 50
+
+
+def _escalate_repeatedly(path: str, start, escalations) -> None:
+    """Stand-in for an edge-endpoint worker: opens the shared table itself and tries to escalate many times."""
+    table = EscalationCooldownTable(path)
+    start.wait()
+    for _ in range(ATTEMPTS_PER_WORKER):
+        if table.try_start_cooldown(DETECTOR_ID, 60):
+            with escalations.get_lock():
+                escalations.value += 1
+    table.close()
+
+
+def _run_workers(path: str) -> int:
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(NUM_WORKERS)
+    escalations = context.Value("i", 0)
+    workers = [
+        context.Process(target=_escalate_repeatedly, args=(path, start, escalations)) for _ in range(NUM_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+    return escalations.value
+
+
+def test_cooldown_semantics():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        table = EscalationCooldownTable(os.path.join(temp_dir, "cooldowns"))
+        assert table.last_escalation_time(DETECTOR_ID) is None
+
+        assert table.try_start_cooldown(DETECTOR_ID, 0.05)
+        assert table.last_escalation_time(DETECTOR_ID) is not None
+        assert not table.try_start_cooldown(DETECTOR_ID, 0.05)
+        assert table.try_start_cooldown("det_other", 0.05)  # Cooldowns are per detector
+
+        time.sleep(0.06)
+        assert table.try_start_cooldown(DETECTOR_ID, 0.05)
+        table.close()
+
+
+def test_only_one_worker_process_escalates_per_cooldown():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "cooldowns")
+        assert _run_workers(path) == 1
+
+        # The escalation is visible to a process that opens the table afterwards
+        table = EscalationCooldownTable(path)
+        assert table.last_escalation_time(DETECTOR_ID) is not None
+        assert not table.try_start_cooldown(DETECTOR_ID, 60)
+        table.close()
+
+
+def test_existing_table_size_is_kept():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "cooldowns")
+        first = EscalationCooldownTable(path, slots=8)
+        assert first.try_start_cooldown(DETECTOR_ID, 60)
+
+        second = EscalationCooldownTable(path, slots=1024)
+        assert second._slots == 8  # noqa: PLR2004
+        assert not second.try_start_cooldown(DETECTOR_ID, 60)
+        first.close()
+        second.close()
+
+
+def test_full_table_falls_back_to_per_process_cooldowns():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        table = EscalationCooldownTable(os.path.join(temp_dir, "cooldowns"), slots=2)
+        detector_ids = ["det_a", "det_b", "det_c"]
+        assert all(table.try_start_cooldown(detector_id, 60) for detector_id in detector_ids)
+        assert not any(table.try_start_cooldown(detector_id, 60) for detector_id in detector_ids)
+        table.close()
+
+
+def test_unusable_path_falls_back_to_per_process_cooldowns():
+    table = EscalationCooldownTable("/nonexistent-dir/cooldowns")
+    assert table.try_start_cooldown(DETECTOR_ID, 60)
+    assert not table.try_start_cooldown(DETECTOR_ID, 60)
+    table.close()
+
+
+def test_escalation_cooldown_complete_is_shared_between_managers():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "cooldowns")
+        inference_config = ExtendedInferenceConfig(name="default", min_time_between_escalations=60)
+        with (
+            mock.patch("app.core.edge_inference.EscalationCooldownTable", lambda: EscalationCooldownTable(path)),
+            mock.patch("app.core.edge_inference.EdgeConfigManager.detector_config", return_value=inference_config),
+        ):
+            first_worker, second_worker = EdgeInferenceManager(), EdgeInferenceManager()
+            assert first_worker.escalation_cooldown_complete(DETECTOR_ID, None)
+            assert not second_worker.escalation_cooldown_complete(DETECTOR_ID, None)
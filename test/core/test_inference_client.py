@@ -0,0 +1,134 @@
+import asyncio
+import socket
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core.edge_inference import submit_image_for_inference
+from app.core.inference_client import InferenceClientPool
+
+SERVICE_URL = "inference-service-det-abc:8000"
+RESOLVED_ADDRESS = "10.0.0.5"
+
+
+def _addrinfo(*args, **kwargs):
+    return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (RESOLVED_ADDRESS, 8000))]
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Answers every request with a canned inference response and records what was sent."""
+
+    def __init__(self, status_code: int = 200, fail_connect: bool = False):
+        self.requests: list[httpx.Request] = []
+        self.status_code = status_code
+        self.fail_connect = fail_connect
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.fail_connect:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(self.status_code, json={"predictions": {"confidences": [0.9], "labels": [1]}})
+
+
+def test_request_uses_resolved_address_and_preserves_host_header():
+    transport = RecordingTransport()
+    pool = InferenceClientPool(transport=transport)
+
+    async def run():
+        with patch("socket.getaddrinfo", side_effect=_addrinfo):
+            response = await pool.post(SERVICE_URL, "/infer", content=b"image", headers={"Content-Type": "image/jpeg"})
+        await pool.aclose()
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 200
+    sent = transport.requests[0]
+    assert sent.url.host == RESOLVED_ADDRESS
+    assert sent.url.path == "/infer"
+    assert sent.headers["Host"] == SERVICE_URL
+    assert sent.content == b"image"
+
+
+def test_ipv6_address_is_bracketed_in_url():
+    transport = RecordingTransport()
+    pool = InferenceClientPool(transport=transport)
+
+    def ipv6_addrinfo(*args, **kwargs):
+        return [(socket.AF_INET6, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", ("fd00::5", 8000, 0, 0))]
+
+    async def run():
+        with patch("socket.getaddrinfo", side_effect=ipv6_addrinfo):
+            await pool.post(SERVICE_URL, "/infer", content=b"image")
+        await pool.aclose()
+
+    asyncio.run(run())
+    sent = transport.requests[0]
+    assert sent.url.host == "fd00::5"
+    assert str(sent.url).startswith("http://[fd00::5]:8000/infer")
+    assert sent.headers["Host"] == SERVICE_URL
+
+
+def test_name_resolution_is_cached_and_client_is_reused():
+    pool = InferenceClientPool(transport=RecordingTransport())
+
+    async def run():
+        with patch("socket.getaddrinfo", side_effect=_addrinfo) as mock_getaddrinfo:
+            for _ in range(5):
+                await pool.post(SERVICE_URL, "/infer", content=b"image")
+            num_clients = len(pool._clients)
+        await pool.aclose()
+        return mock_getaddrinfo.call_count, num_clients
+
+    resolutions, num_clients = asyncio.run(run())
+    assert resolutions == 1
+    assert num_clients == 1
+
+
+def test_connect_error_evicts_cached_address():
+    transport = RecordingTransport(fail_connect=True)
+    pool = InferenceClientPool(transport=transport)
+
+    async def run():
+        with patch("socket.getaddrinfo", side_effect=_addrinfo) as mock_getaddrinfo:
+            for _ in range(2):
+                with pytest.raises(httpx.ConnectError):
+                    await pool.post(SERVICE_URL, "/infer", content=b"image")
+        await pool.aclose()
+        return mock_getaddrinfo.call_count
+
+    # The failed connection forgets the address, so the second attempt resolves the name again
+    assert asyncio.run(run()) == 2
+
+
+def test_dns_cache_can_be_disabled():
+    transport = RecordingTransport()
+    pool = InferenceClientPool(dns_ttl_s=0, transport=transport)
+
+    async def run():
+        with patch("socket.getaddrinfo", side_effect=_addrinfo) as mock_getaddrinfo:
+            await pool.post(SERVICE_URL, "/infer", content=b"image")
+        await pool.aclose()
+        return mock_getaddrinfo.call_count
+
+    assert asyncio.run(run()) == 0
+    assert transport.requests[0].url.host == "inference-service-det-abc"
+
+
+def test_submit_image_for_inference_wraps_errors():
+    async def run(transport):
+        pool = InferenceClientPool(transport=transport)
+        with patch("socket.getaddrinfo", side_effect=_addrinfo):
+            try:
+                return await submit_image_for_inference(pool, SERVICE_URL, b"image", "image/jpeg")
+            finally:
+                await pool.aclose()
+
+    assert asyncio.run(run(RecordingTransport()))["predictions"]["labels"] == [1]
+
+    with pytest.raises(RuntimeError, match="Inference server error: 500"):
+        asyncio.run(run(RecordingTransport(status_code=500)))
+
+    with pytest.raises(RuntimeError, match="Failed to submit image for inference"):
+        asyncio.run(run(RecordingTransport(fail_connect=True)))
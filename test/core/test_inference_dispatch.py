@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from app.core.inference_dispatch import InferenceDispatcher
+from app.profiling.context import _current_span, get_current_span
+
+
+def test_dispatch_bounds_concurrency_per_service():
+    dispatcher = InferenceDispatcher(max_concurrency_per_service=2)
+    peak = {"svc-a": 0, "svc-b": 0}
+    running = {"svc-a": 0, "svc-b": 0}
+
+    async def call(service: str) -> str:
+        running[service] += 1
+        peak[service] = max(peak[service], running[service])
+        await asyncio.sleep(0.01)
+        running[service] -= 1
+        return service
+
+    async def run():
+        calls = [dispatcher.dispatch(svc, call, svc) for svc in ["svc-a"] * 6 + ["svc-b"] * 3]
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(run())
+
+    assert results == ["svc-a"] * 6 + ["svc-b"] * 3
+    assert peak == {"svc-a": 2, "svc-b": 2}
+    stats = dispatcher.stats()["services"]
+    assert stats["svc-a"]["completed"] == 6  # noqa: PLR2004
+    assert stats["svc-a"]["queued"] == 0
+    assert stats["svc-a"]["in_flight"] == 0
+    # Four of the six svc-a calls had to wait for a free slot
+    assert stats["svc-a"]["max_queue_wait_ms"] > 0
+
+
+def test_fan_out_runs_concurrently_and_returns_in_order():
+    dispatcher = InferenceDispatcher()
+
+    async def call(value: str, delay: float) -> str:
+        await asyncio.sleep(delay)
+        return value
+
+    async def run():
+        return await dispatcher.fan_out(
+            dispatcher.dispatch("primary", call, "p", 0.02), dispatcher.dispatch("oodd", call, "o", 0.0)
+        )
+
+    assert asyncio.run(run()) == ["p", "o"]
+
+
+def test_fan_out_waits_for_all_calls_before_raising():
+    dispatcher = InferenceDispatcher()
+    finished = []
+
+    async def fail() -> None:
+        raise RuntimeError("primary failed")
+
+    async def slow() -> str:
+        await asyncio.sleep(0.01)
+        finished.append("oodd")
+        return "ok"
+
+    async def run():
+        await dispatcher.fan_out(dispatcher.dispatch("primary", fail), dispatcher.dispatch("oodd", slow))
+
+    with pytest.raises(RuntimeError, match="primary failed"):
+        asyncio.run(run())
+    assert finished == ["oodd"]
+    stats = dispatcher.stats()["services"]
+    assert stats["primary"]["failed"] == 1
+    assert stats["oodd"]["completed"] == 1
+
+
+def test_fan_out_propagates_context():
+    dispatcher = InferenceDispatcher()
+    sentinel = object()
+
+    async def read_span() -> object:
+        return get_current_span()
+
+    async def run():
+        _current_span.set(sentinel)
+        return await dispatcher.fan_out(
+            dispatcher.dispatch("primary", read_span), dispatcher.dispatch("oodd", read_span)
+        )
+
+    assert asyncio.run(run()) == [sentinel, sentinel]
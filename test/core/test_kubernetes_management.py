@@ -1,11 +1,11 @@
 from unittest.mock import MagicMock, patch
 
+from app.core.kubernetes_management import INFERENCE_POD_WARMED_UP_CONDITION, InferenceDeploymentManager
+
 
 def _make_manager():
     """Create an InferenceDeploymentManager with mocked-out __init__."""
     with patch("app.core.kubernetes_management.InferenceDeploymentManager.__init__", return_value=None):
-        from app.core.kubernetes_management import InferenceDeploymentManager
-
         mgr = InferenceDeploymentManager()
         mgr._core_kube_client = MagicMock()
         mgr._app_kube_client = MagicMock()
@@ -60,3 +60,58 @@ class TestIsInferenceDeploymentRolloutComplete:
         mgr.get_inference_deployment = MagicMock(return_value=_make_deployment())
         mgr._core_kube_client.list_namespaced_pod.return_value = _make_pod_list(2)
         assert mgr.is_inference_deployment_rollout_complete("test-dep") is False
+
+
+class TestGetDeployedModelVersion:
+    def test_reads_model_version_annotation(self):
+        mgr = _make_manager()
+        dep = _make_deployment()
+        dep.spec.template.metadata.annotations = {"groundlight.dev/model-version": "3"}
+        mgr.get_inference_deployment = MagicMock(return_value=dep)
+        assert mgr.get_deployed_model_version("test-dep") == 3  # noqa: PLR2004
+
+    def test_missing_or_unknown_version(self):
+        """Returns None for deployments without a usable annotation, e.g. created before any model was saved."""
+        mgr = _make_manager()
+        dep = _make_deployment()
+        mgr.get_inference_deployment = MagicMock(return_value=dep)
+        for annotations in (None, {}, {"groundlight.dev/model-version": "None"}):
+            dep.spec.template.metadata.annotations = annotations
+            assert mgr.get_deployed_model_version("test-dep") is None
+        mgr.get_inference_deployment = MagicMock(return_value=None)
+        assert mgr.get_deployed_model_version("test-dep") is None
+
+
+class TestPodWarmUp:
+    @staticmethod
+    def _pod(name: str, conditions: dict[str, str], deleting: bool = False):
+        pod = MagicMock()
+        pod.metadata.name = name
+        pod.metadata.deletion_timestamp = "2026-01-01T00:00:00Z" if deleting else None
+        pod.status.pod_ip = "10.42.0.7"
+        pod.status.conditions = [MagicMock(type=t, status=s) for t, s in conditions.items()]
+        return pod
+
+    def test_only_ready_pods_that_are_not_warmed_up_are_warmed_up(self):
+        mgr = _make_manager()
+        pods = [
+            self._pod("loading", {"ContainersReady": "False"}),
+            self._pod("ready", {"ContainersReady": "True", INFERENCE_POD_WARMED_UP_CONDITION: "False"}),
+            self._pod("warm", {"ContainersReady": "True", INFERENCE_POD_WARMED_UP_CONDITION: "True"}),
+            self._pod("terminating", {"ContainersReady": "True"}, deleting=True),
+        ]
+        mgr._core_kube_client.list_namespaced_pod.return_value.items = pods
+
+        assert [p.metadata.name for p in mgr.get_pods_to_warm_up("det_a")] == ["ready"]
+        assert mgr._core_kube_client.list_namespaced_pod.call_args.kwargs["label_selector"] == (
+            "app=inference-server,instance=instance-det_a-primary"
+        )
+
+    def test_marking_a_pod_warmed_up_sets_its_readiness_gate_condition(self):
+        mgr = _make_manager()
+        mgr.mark_pod_warmed_up("inferencemodel-det-a-abc12")
+
+        kwargs = mgr._core_kube_client.patch_namespaced_pod_status.call_args.kwargs
+        assert kwargs["name"] == "inferencemodel-det-a-abc12"
+        (condition,) = kwargs["body"]["status"]["conditions"]
+        assert (condition["type"], condition["status"]) == (INFERENCE_POD_WARMED_UP_CONDITION, "True")
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+
+from app.core.edge_config_schema import ExtendedInferenceConfig
+from app.core.edge_inference import EdgeInferenceManager, record_serving_models
+from app.core.result_cache import InferenceResultCache, image_digest
+
+DETECTOR_ID = "det_test"
+RESULT = {"confidence": 0.9, "label": 1, "text": None, "rois": None}
+CACHING_CONFIG = ExtendedInferenceConfig(name="cached", duplicate_result_cache_ttl=30)
+
+
+def _key(image: bytes, detector_id: str = DETECTOR_ID, mlb_key: str = "prim_1") -> tuple:
+    return (detector_id, image_digest(image), mlb_key, "oodd_1")
+
+
+def _write_model_id(repository: str, detector_id: str, version: int, ksuid: str, is_oodd: bool = False):
+    version_dir = os.path.join(repository, detector_id, "oodd" if is_oodd else "primary", str(version))
+    os.makedirs(version_dir, exist_ok=True)
+    with open(os.path.join(version_dir, "model_id.txt"), "w") as f:
+        f.write(ksuid)
+
+
+def test_hit_and_miss_are_counted():
+    cache = InferenceResultCache()
+    assert cache.get(_key(b"frame")) is None
+    cache.put(_key(b"frame"), RESULT, ttl_s=30)
+
+    cached = cache.get(_key(b"frame"))
+    assert cached == RESULT
+    assert cached is not RESULT  # Callers get their own copy
+    assert cache.get(_key(b"other frame")) is None
+    assert cache.get(_key(b"frame", mlb_key="prim_2")) is None  # A different model version never hits
+
+    assert cache.stats()["detectors"][DETECTOR_ID] == {"hits": 1, "misses": 3}
+
+
+def test_entries_expire_after_ttl():
+    cache = InferenceResultCache()
+    cache.put(_key(b"frame"), RESULT, ttl_s=0.01)
+    time.sleep(0.02)
+    assert cache.get(_key(b"frame")) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = InferenceResultCache(max_entries=2)
+    cache.put(_key(b"a"), RESULT, ttl_s=30)
+    cache.put(_key(b"b"), RESULT, ttl_s=30)
+    cache.get(_key(b"a"))
+    cache.put(_key(b"c"), RESULT, ttl_s=30)
+
+    assert cache.get(_key(b"a")) is not None
+    assert cache.get(_key(b"b")) is None
+    assert cache.get(_key(b"c")) is not None
+
+
+def test_invalidate_detector():
+    cache = InferenceResultCache()
+    cache.put(_key(b"a"), RESULT, ttl_s=30)
+    cache.put(_key(b"a", detector_id="det_other"), RESULT, ttl_s=30)
+    cache.invalidate_detector(DETECTOR_ID)
+
+    assert cache.get(_key(b"a")) is None
+    assert cache.get(_key(b"a", detector_id="det_other")) is not None
+
+
+def test_result_cache_key_tracks_served_models():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        edge_manager = EdgeInferenceManager()
+        edge_manager.MODEL_REPOSITORY = temp_dir  # type: ignore
+        _write_model_id(temp_dir, DETECTOR_ID, 1, "prim_1")
+        _write_model_id(temp_dir, DETECTOR_ID, 1, "oodd_1", is_oodd=True)
+
+        # No rollout recorded yet, so there's no way to tell which model would answer
+        assert edge_manager.result_cache_key(DETECTOR_ID, b"frame", CACHING_CONFIG) is None
+
+        record_serving_models(temp_dir, DETECTOR_ID, primary_version=1, oodd_version=1)
+        edge_manager._serving_model_keys_cache.clear()
+        assert edge_manager.result_cache_key(DETECTOR_ID, b"frame", CACHING_CONFIG) == _key(b"frame")
+
+        # Caching is opt-in per detector
+        assert edge_manager.result_cache_key(DETECTOR_ID, b"frame", ExtendedInferenceConfig(name="default")) is None
+        assert edge_manager.result_cache_key(DETECTOR_ID, b"frame", None) is None
+
+        # A new model version doesn't change the key while the old pods are still serving...
+        edge_manager.result_cache.put(_key(b"frame"), RESULT, ttl_s=30)
+        _write_model_id(temp_dir, DETECTOR_ID, 2, "prim_2")
+        edge_manager._serving_model_keys_cache.clear()
+        assert edge_manager.result_cache_key(DETECTOR_ID, b"frame", CACHING_CONFIG) == _key(b"frame")
+
+        # ...only once its rollout has completed, which also drops the old model's results
+        record_serving_models(temp_dir, DETECTOR_ID, primary_version=2, oodd_version=1)
+        edge_manager._serving_model_keys_cache.clear()
+        assert edge_manager.result_cache_key(DETECTOR_ID, b"frame", CACHING_CONFIG)[2] == "prim_2"
+        assert edge_manager.result_cache.stats()["entries"] == 0
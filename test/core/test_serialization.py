@@ -0,0 +1,52 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from model import ImageQuery, ModeEnum
+
+from app.core.serialization import image_query_response, loads
+from app.core.utils import create_iq, prefixed_ksuid
+
+
+def _edge_iq() -> ImageQuery:
+    return create_iq(
+        detector_id=prefixed_ksuid("det_"),
+        mode=ModeEnum.MULTI_CLASS,
+        mode_configuration={"class_names": ["cat", "dög", "bird"]},
+        result_value=1,
+        confidence=0.8125,
+        confidence_threshold=0.75,
+        is_done_processing=False,
+        query="Which animal is this?",
+        text="some text",
+        mlb_key="mlb_123",
+    )
+
+
+def test_image_query_response_matches_response_model():
+    """Returning the pre-encoded response must look the same to clients as returning the model."""
+    iq = _edge_iq()
+    app = FastAPI()
+
+    @app.get("/model", response_model=ImageQuery)
+    def as_model():
+        return iq
+
+    @app.get("/encoded", response_model=ImageQuery)
+    def as_encoded():
+        return image_query_response(iq)
+
+    client = TestClient(app)
+    via_model = client.get("/model")
+    encoded = client.get("/encoded")
+
+    assert encoded.headers["content-type"] == via_model.headers["content-type"]
+    assert encoded.json() == via_model.json()
+    assert ImageQuery.model_validate_json(encoded.content).model_dump() == iq.model_dump()
+
+
+def test_loads():
+    assert loads(b'{"confidence": 0.5, "label": 1, "rois": null, "text": "\\u00e9"}') == {
+        "confidence": 0.5,
+        "label": 1,
+        "rois": None,
+        "text": "é",
+    }
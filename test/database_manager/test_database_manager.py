@@ -1,3 +1,5 @@
+import os
+
 import pytest
 from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
@@ -183,3 +185,125 @@ def test_create_drop_reset_database_tables(db_manager, database_reset):
     inspector = inspect(db_manager._engine)
     tables = inspector.get_table_names()
     assert set(tables) == set(Base.metadata.tables.keys())
+
+
+def test_create_or_update_resets_flags_of_existing_record(db_manager, database_reset):
+    deployment = {
+        "detector_id": prefixed_ksuid("det_"),
+        "model_name": prefixed_ksuid("det_") + "/primary",
+        "api_token": prefixed_ksuid("api_"),
+        "deployment_created": False,
+    }
+    db_manager.create_or_update_inference_deployment_record(deployment=deployment)
+    db_manager.update_inference_deployment_record(
+        model_name=deployment["model_name"], fields_to_update={"deployment_created": True, "pending_deletion": True}
+    )
+    created_at = db_manager.get_inference_deployment_records(model_name=deployment["model_name"])[0].created_at
+
+    db_manager.create_or_update_inference_deployment_record(deployment={**deployment, "pending_deletion": False})
+
+    detectors = db_manager.get_inference_deployment_records(model_name=deployment["model_name"])
+    assert len(detectors) == 1
+    assert bool(detectors[0].deployment_created) is False
+    assert bool(detectors[0].pending_deletion) is False
+    # Fields that weren't given are left alone
+    assert detectors[0].created_at == created_at
+    assert detectors[0].updated_at >= created_at
+
+
+def test_create_or_update_inference_deployment_records_in_one_call(db_manager, database_reset):
+    detector_id = prefixed_ksuid("det_")
+    deployments = [
+        {"model_name": f"{detector_id}/{suffix}", "detector_id": detector_id, "api_token": "api_token"}
+        for suffix in ["primary", "oodd"]
+    ]
+    db_manager.create_or_update_inference_deployment_records(deployments)
+    db_manager.create_or_update_inference_deployment_records(deployments)
+
+    assert len(db_manager.get_inference_deployment_records(detector_id=detector_id)) == 2
+
+
+def test_ensure_inference_deployment_records_skips_recently_written_records(db_manager, database_reset):
+    deployment = {
+        "detector_id": prefixed_ksuid("det_"),
+        "model_name": prefixed_ksuid("det_") + "/primary",
+        "api_token": prefixed_ksuid("api_"),
+        "deployment_created": False,
+    }
+    db_manager.ensure_inference_deployment_records([deployment])
+    db_manager.update_inference_deployment_record(
+        model_name=deployment["model_name"], fields_to_update={"deployment_created": True}
+    )
+
+    # Registering the same record again is skipped, so the deployment is not reset
+    db_manager.ensure_inference_deployment_records([deployment])
+    assert bool(db_manager.get_inference_deployment_records(model_name=deployment["model_name"])[0].deployment_created)
+
+    # A new API token is written
+    new_api_token = prefixed_ksuid("api_")
+    db_manager.ensure_inference_deployment_records([{**deployment, "api_token": new_api_token}])
+    detectors = db_manager.get_inference_deployment_records(model_name=deployment["model_name"])
+    assert detectors[0].api_token == new_api_token
+    assert bool(detectors[0].deployment_created) is False
+
+
+def test_ensure_inference_deployment_records_after_deletion(db_manager, database_reset):
+    deployment = {
+        "detector_id": prefixed_ksuid("det_"),
+        "model_name": prefixed_ksuid("det_") + "/primary",
+        "api_token": prefixed_ksuid("api_"),
+    }
+    db_manager.ensure_inference_deployment_records([deployment])
+    db_manager.delete_inference_deployment_records(deployment["detector_id"])
+
+    db_manager.ensure_inference_deployment_records([deployment])
+    assert len(db_manager.get_inference_deployment_records(model_name=deployment["model_name"])) == 1
+
+
+def test_mark_detectors_pending_deletion(db_manager, database_reset):
+    detector_ids = [prefixed_ksuid("det_") for _ in range(3)]
+    db_manager.create_or_update_inference_deployment_records(
+        [
+            {"model_name": f"{detector_id}/{suffix}", "detector_id": detector_id, "api_token": "api_token"}
+            for detector_id in detector_ids
+            for suffix in ["primary", "oodd"]
+        ]
+    )
+
+    db_manager.mark_detectors_pending_deletion([*detector_ids[:2], prefixed_ksuid("det_")])
+
+    assert set(db_manager.get_pending_deletions()) == set(detector_ids[:2])
+
+
+def test_detector_changes_version(db_manager, database_reset):
+    detector_id = prefixed_ksuid("det_")
+    deployment = {"model_name": f"{detector_id}/primary", "detector_id": detector_id, "api_token": "api_token"}
+
+    version = db_manager.detector_changes_version()
+    db_manager.create_or_update_inference_deployment_record(deployment=deployment)
+    assert db_manager.detector_changes_version() != version
+
+    # Registering a detector that is already active is not a change
+    version = db_manager.detector_changes_version()
+    db_manager.create_or_update_inference_deployment_record(deployment={**deployment, "api_token": "new_api_token"})
+    db_manager.update_inference_deployment_record(deployment["model_name"], {"deployment_created": True})
+    assert db_manager.detector_changes_version() == version
+
+    db_manager.mark_detector_pending_deletion(detector_id)
+    assert db_manager.detector_changes_version() != version
+
+    # Re-adding a detector pending deletion is a change
+    version = db_manager.detector_changes_version()
+    db_manager.create_or_update_inference_deployment_record(deployment={**deployment, "pending_deletion": False})
+    assert db_manager.detector_changes_version() != version
+
+
+def test_detector_changes_file_does_not_grow(db_manager, tmp_path):
+    db_manager.detector_changes_path = str(tmp_path / "detector-changes")
+    assert db_manager.detector_changes_version() == 0
+
+    for _ in range(100):
+        db_manager._notify_detector_changes()
+
+    assert db_manager.detector_changes_version() == 100
+    assert os.path.getsize(db_manager.detector_changes_path) == 8
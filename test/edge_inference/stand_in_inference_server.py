@@ -0,0 +1,90 @@
+"""A local stand-in for the inference server, for exercising the edge endpoint's inference client code in tests.
+
+Implements `/health/ready`, `/infer` and `/infer-batch` with the request and response shapes the edge endpoint expects
+from the inference server (see `app.core.inference_batching` for `/infer-batch`). Predictions are a deterministic function of the image bytes, so tests can check that every caller
+gets the result for its own image. Use it in-process through `httpx.ASGITransport`:
+
+    server = StandInInferenceServer()
+    pool = InferenceClientPool(dns_ttl_s=0, transport=httpx.ASGITransport(app=server.app))
+"""
+
+import asyncio
+import email.parser
+import email.policy
+import hashlib
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+def predict(image_bytes: bytes) -> tuple[int, float]:
+    """The stand-in model: a label and confidence derived from the image bytes."""
+    digest = hashlib.sha256(image_bytes).digest()
+    return digest[0] % 2, 0.5 + (digest[1] / 255) / 2
+
+
+def binary_response(predictions: list[tuple[int, float]]) -> dict:
+    """A binary-mode inference response with one batch entry per prediction."""
+    return {
+        "multi_predictions": None,
+        "predictions": {
+            "labels": [label for label, _ in predictions],
+            "confidences": [confidence for _, confidence in predictions],
+        },
+        "secondary_predictions": None,
+    }
+
+
+def parse_multipart_images(content_type: str, body: bytes) -> list[bytes]:
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    return [part.get_payload(decode=True) for part in message.iter_parts()]
+
+
+class StandInInferenceServer:
+    def __init__(self, max_batch_size: int | None = 8, latency_s: float = 0.0) -> None:
+        """
+        Args:
+            max_batch_size: The most images `/infer-batch` takes, advertised by `/health/ready`. If None, batched
+                inference isn't advertised and `/infer-batch` returns 404, like an inference server without it.
+            latency_s: Simulated time spent on each call (single image or batch).
+        """
+        self.max_batch_size = max_batch_size
+        self.latency_s = latency_s
+        self.is_ready = True  # Set to False to fail health checks, like a pod that is still loading its model
+        self.ready_checks = 0
+        self.single_calls = 0
+        self.batch_sizes: list[int] = []
+        routes = [
+            Route("/health/ready", self.ready, methods=["GET"]),
+            Route("/infer", self.infer, methods=["POST"]),
+            Route("/infer-batch", self.infer_batch, methods=["POST"]),
+        ]
+        self.app = Starlette(routes=routes)
+
+    async def ready(self, request: Request) -> Response:
+        self.ready_checks += 1
+        if not self.is_ready:
+            return JSONResponse({"status": "not ready"}, status_code=503)
+        if self.max_batch_size is None:
+            return JSONResponse({"status": "ready"})
+        return JSONResponse({"status": "ready", "max_batch_size": self.max_batch_size})
+
+    async def infer(self, request: Request) -> Response:
+        image_bytes = await request.body()
+        self.single_calls += 1
+        await asyncio.sleep(self.latency_s)
+        return JSONResponse(binary_response([predict(image_bytes)]))
+
+    async def infer_batch(self, request: Request) -> Response:
+        if self.max_batch_size is None:
+            return JSONResponse({"detail": "Not Found"}, status_code=404)
+        images = parse_multipart_images(request.headers["content-type"], await request.body())
+        if len(images) > self.max_batch_size:
+            return JSONResponse({"detail": "Too many images"}, status_code=413)
+        self.batch_sizes.append(len(images))
+        await asyncio.sleep(self.latency_s)
+        return JSONResponse({"responses": [binary_response([predict(image_bytes)]) for image_bytes in images]})
@@ -0,0 +1,92 @@
+"""A local stand-in for the object store that serves model binaries, for exercising model downloads in tests.
+
+Serves a single object over real HTTP, like a presigned S3 URL: range requests get a 206 response with a Content-Range
+header, and the ETag is the MD5 of the object. It can also drop connections part-way through a response:
+
+    with StandInObjectStore(content=b"...") as store:
+        store.drop_connection_after = [1000]  # The next response stops after 1000 bytes
+        download_to_file(store.url, path)
+"""
+
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInObjectStore:
+    def __init__(self, content: bytes, supports_ranges: bool = True) -> None:
+        """
+        Args:
+            content: The object.
+            supports_ranges: If False, range requests get the whole object, like a server without range support.
+        """
+        self.content = content
+        self.supports_ranges = supports_ranges
+        self.etag = f'"{hashlib.md5(content).hexdigest()}"'
+        # The number of bytes after which each of the next responses drops the connection
+        self.drop_connection_after: list[int] = []
+        self.status_code: int | None = None  # Set to respond to every request with an error
+        self.range_headers: list[str | None] = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/model.buf?X-Amz-Signature=secret"
+
+    def __enter__(self) -> "StandInObjectStore":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                range_header = self.headers.get("Range")
+                store.range_headers.append(range_header)
+                if store.status_code is not None:
+                    self.send_response(store.status_code)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                size = len(store.content)
+                match = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header or "")
+                if match and store.supports_ranges:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else size - 1
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    body = memoryview(store.content)[start : end + 1]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{start + len(body) - 1}/{size}")
+                else:
+                    body = memoryview(store.content)
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", store.etag)
+                self.end_headers()
+
+                if store.drop_connection_after:
+                    self.wfile.write(body[: store.drop_connection_after.pop(0)])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        return Handler
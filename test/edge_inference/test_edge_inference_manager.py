@@ -1,3 +1,4 @@
+import asyncio
 import os
 import tempfile
 from unittest import mock
@@ -6,7 +7,7 @@ import pytest
 import yaml
 from model import ModeEnum
 
-from app.core.edge_inference import EdgeInferenceManager
+from app.core.edge_inference import EdgeInferenceManager, get_model_download_record
 from app.core.naming import get_edge_inference_service_name
 from app.core.utils import ModelInfoBase, ModelInfoNoBinary, ModelInfoWithBinary
 
@@ -40,6 +41,17 @@ def validate_model_directory(
             assert model_info.model_binary_id == f.read()
 
 
+def _fake_download(content: bytes):
+    """A stand-in for `download_to_file` that writes `content` to the destination."""
+
+    def download_to_file(url: str, path: str) -> dict:
+        with open(path, "wb") as f:
+            f.write(content)
+        return {"size_bytes": len(content), "resumes": 0}
+
+    return download_to_file
+
+
 @pytest.fixture
 def edge_model_info_with_binary() -> ModelInfoWithBinary:
     test_predictor_metadata = """{"text_query":"there is a dog","mode":"BINARY"}"""
@@ -102,8 +114,8 @@ class TestEdgeInferenceManager:
     def test_update_model_with_binary(self, edge_model_info_with_binary, oodd_model_info_with_binary):
         with tempfile.TemporaryDirectory() as temp_dir:
             with mock.patch("app.core.edge_inference.fetch_model_info") as mock_fetch:
-                with mock.patch("app.core.edge_inference.get_object_using_presigned_url") as mock_get_from_s3:
-                    mock_get_from_s3.return_value = b"test_model"
+                with mock.patch("app.core.edge_inference.download_to_file") as mock_get_from_s3:
+                    mock_get_from_s3.side_effect = _fake_download(b"test_model")
                     mock_fetch.return_value = (edge_model_info_with_binary, oodd_model_info_with_binary)
                     edge_manager = EdgeInferenceManager()
                     edge_manager.MODEL_REPOSITORY = temp_dir  # type: ignore
@@ -112,9 +124,11 @@ class TestEdgeInferenceManager:
 
                     validate_model_directory(temp_dir, detector_id, 1, edge_model_info_with_binary)
                     validate_model_directory(temp_dir, detector_id, 1, oodd_model_info_with_binary, is_oodd=True)
+                    primary_model_dir = os.path.join(temp_dir, detector_id, "primary")
+                    assert get_model_download_record(primary_model_dir, 1) == {"size_bytes": 10, "resumes": 0}
 
                     # Should create a new version for new model info
-                    mock_get_from_s3.return_value = b"test_model_2"
+                    mock_get_from_s3.side_effect = _fake_download(b"test_model_2")
                     edge_model_info_with_binary_2 = edge_model_info_with_binary
                     edge_model_info_with_binary_2.model_binary_id = "test_binary_id_2"
                     edge_model_info_with_binary_2.model_binary_url = "test_model_binary_url_2"
@@ -127,7 +141,7 @@ class TestEdgeInferenceManager:
                     validate_model_directory(temp_dir, detector_id, 2, edge_model_info_with_binary_2)
                     validate_model_directory(temp_dir, detector_id, 2, oodd_model_info_with_binary_2, is_oodd=True)
 
-                with mock.patch("app.core.edge_inference.get_object_using_presigned_url") as mock_get_from_s3:
+                with mock.patch("app.core.edge_inference.download_to_file") as mock_get_from_s3:
                     edge_manager.update_models_if_available(detector_id)
                     # Shouldn't pull a model from s3 if there is no new binary available
                     mock_get_from_s3.assert_not_called()
@@ -174,15 +188,15 @@ class TestEdgeInferenceManager:
             mock_submit.return_value = mock_response
             # separate_oodd_inference is True by default
             edge_manager = EdgeInferenceManager()
-            edge_manager.run_inference("test_detector", b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+            asyncio.run(edge_manager.run_inference("test_detector", b"test_image", "image/jpeg", mode=ModeEnum.BINARY))
             primary_inference_client_url = get_edge_inference_service_name("test_detector") + ":8000"
             oodd_inference_client_url = get_edge_inference_service_name("test_detector", is_oodd=True) + ":8000"
 
             # Assert that run inference was called twice, once for primary and once for OODD
             assert mock_submit.call_count == 2
             calls = mock_submit.call_args_list
-            primary_call = mock.call(primary_inference_client_url, b"test_image", "image/jpeg")
-            oodd_call = mock.call(oodd_inference_client_url, b"test_image", "image/jpeg")
+            primary_call = mock.call(mock.ANY, primary_inference_client_url, b"test_image", "image/jpeg")
+            oodd_call = mock.call(mock.ANY, oodd_inference_client_url, b"test_image", "image/jpeg")
 
             assert primary_call in calls
             assert oodd_call in calls
@@ -197,12 +211,12 @@ class TestEdgeInferenceManager:
         with mock.patch("app.core.edge_inference.submit_image_for_inference") as mock_submit:
             mock_submit.return_value = mock_response
             edge_manager = EdgeInferenceManager(separate_oodd_inference=False)
-            edge_manager.run_inference("test_detector", b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+            asyncio.run(edge_manager.run_inference("test_detector", b"test_image", "image/jpeg", mode=ModeEnum.BINARY))
             primary_inference_client_url = get_edge_inference_service_name("test_detector") + ":8000"
 
             # Assert that the mock_submit was called only once for primary inference, never for OODD
             assert mock_submit.call_count == 1
-            mock_submit.assert_called_once_with(primary_inference_client_url, b"test_image", "image/jpeg")
+            mock_submit.assert_called_once_with(mock.ANY, primary_inference_client_url, b"test_image", "image/jpeg")
 
     def _write_model_id(self, repository: str, detector_id: str, version: int, ksuid: str, is_oodd: bool = False):
         sub = "oodd" if is_oodd else "primary"
@@ -228,7 +242,9 @@ class TestEdgeInferenceManager:
                 mock_submit.return_value = mock_response
                 edge_manager = EdgeInferenceManager()
                 edge_manager.MODEL_REPOSITORY = temp_dir  # type: ignore
-                output = edge_manager.run_inference(detector_id, b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+                output = asyncio.run(
+                    edge_manager.run_inference(detector_id, b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+                )
 
                 assert output["mlb_key"] == "prim_ksuid_abc"
                 assert output["oodd_mlb_key"] == "oodd_ksuid_xyz"
@@ -249,7 +265,9 @@ class TestEdgeInferenceManager:
                 mock_submit.return_value = mock_response
                 edge_manager = EdgeInferenceManager(separate_oodd_inference=False)
                 edge_manager.MODEL_REPOSITORY = temp_dir  # type: ignore
-                output = edge_manager.run_inference(detector_id, b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+                output = asyncio.run(
+                    edge_manager.run_inference(detector_id, b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+                )
 
                 assert output["mlb_key"] == "prim_ksuid_only"
                 assert "oodd_mlb_key" not in output
@@ -268,7 +286,9 @@ class TestEdgeInferenceManager:
                 mock_submit.return_value = mock_response
                 edge_manager = EdgeInferenceManager()
                 edge_manager.MODEL_REPOSITORY = temp_dir  # type: ignore
-                output = edge_manager.run_inference("test_detector", b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+                output = asyncio.run(
+                    edge_manager.run_inference("test_detector", b"test_image", "image/jpeg", mode=ModeEnum.BINARY)
+                )
 
                 assert "mlb_key" not in output
                 assert "oodd_mlb_key" not in output
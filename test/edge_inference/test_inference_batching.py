@@ -0,0 +1,152 @@
+import asyncio
+from unittest import mock
+
+import httpx
+from model import ModeEnum
+
+from app.core.edge_config_schema import ExtendedInferenceConfig
+from app.core.edge_inference import EdgeInferenceManager, submit_image_for_inference
+from app.core.inference_batching import BatchSettings, InferenceBatcher
+from app.core.inference_client import InferenceClientPool
+from app.core.inference_dispatch import InferenceDispatcher
+from app.core.naming import get_edge_inference_service_name
+from test.edge_inference.stand_in_inference_server import StandInInferenceServer, predict
+
+SERVICE_URL = "inference-service-det-abc:8000"
+PRIMARY_SERVICE_URL = get_edge_inference_service_name("det_abc") + ":8000"
+IMAGES = [f"image-{i}".encode() for i in range(6)]
+
+
+def _stand_in_pool(server: StandInInferenceServer) -> InferenceClientPool:
+    return InferenceClientPool(dns_ttl_s=0, transport=httpx.ASGITransport(app=server.app))
+
+
+def _batcher(pool: InferenceClientPool, server: StandInInferenceServer) -> InferenceBatcher:
+    """A batcher that knows what the server advertises, as if it had been probed."""
+    return InferenceBatcher(
+        pool, InferenceDispatcher(), submit_image_for_inference, lambda service_url: server.max_batch_size or 1
+    )
+
+
+def _label_and_confidence(response: dict) -> tuple[int, float]:
+    return response["predictions"]["labels"][0], response["predictions"]["confidences"][0]
+
+
+def test_batch_settings_from_inference_config():
+    assert BatchSettings.from_inference_config(None) is None
+    assert BatchSettings.from_inference_config(ExtendedInferenceConfig(name="a", max_inference_batch_size=1)) is None
+    settings = BatchSettings.from_inference_config(
+        ExtendedInferenceConfig(name="a", max_inference_batch_size=8, inference_batch_window_ms=20)
+    )
+    assert settings.max_batch_size == 8  # noqa: PLR2004
+    assert settings.window_ms == 20  # noqa: PLR2004
+
+
+def test_concurrent_requests_are_batched_and_split_back_out():
+    server = StandInInferenceServer(latency_s=0.01)
+    pool = _stand_in_pool(server)
+    batcher = _batcher(pool, server)
+    settings = BatchSettings(max_batch_size=4, window_ms=50)
+
+    async def run():
+        responses = await asyncio.gather(
+            *(batcher.submit(SERVICE_URL, image, "image/jpeg", settings) for image in IMAGES)
+        )
+        await pool.aclose()
+        return responses
+
+    responses = asyncio.run(run())
+
+    # The first batch is sent as soon as it is full, the remainder when the window closes
+    assert server.batch_sizes == [4, 2]
+    assert server.single_calls == 0
+    assert [_label_and_confidence(r) for r in responses] == [predict(image) for image in IMAGES]
+    stats = batcher.stats()["services"][SERVICE_URL]
+    assert stats["batches"] == 2  # noqa: PLR2004
+    assert stats["images"] == len(IMAGES)
+
+
+def test_lone_request_is_sent_as_single_image_call():
+    server = StandInInferenceServer()
+    pool = _stand_in_pool(server)
+    batcher = _batcher(pool, server)
+
+    async def run():
+        response = await batcher.submit(SERVICE_URL, IMAGES[0], "image/jpeg", BatchSettings(4, window_ms=1))
+        await pool.aclose()
+        return response
+
+    assert _label_and_confidence(asyncio.run(run())) == predict(IMAGES[0])
+    assert server.batch_sizes == []
+    assert server.single_calls == 1
+
+
+def test_batches_are_limited_to_the_size_the_server_advertises():
+    server = StandInInferenceServer(max_batch_size=2)
+    pool = _stand_in_pool(server)
+    batcher = _batcher(pool, server)
+    settings = BatchSettings(max_batch_size=4, window_ms=50)
+
+    async def run():
+        responses = await asyncio.gather(
+            *(batcher.submit(SERVICE_URL, image, "image/jpeg", settings) for image in IMAGES)
+        )
+        await pool.aclose()
+        return responses
+
+    responses = asyncio.run(run())
+
+    assert server.batch_sizes == [2, 2, 2]
+    assert [_label_and_confidence(r) for r in responses] == [predict(image) for image in IMAGES]
+
+
+def test_servers_that_do_not_advertise_batching_get_single_image_calls():
+    server = StandInInferenceServer(max_batch_size=None)
+    pool = _stand_in_pool(server)
+    batcher = _batcher(pool, server)
+    settings = BatchSettings(max_batch_size=3, window_ms=50)
+
+    async def run():
+        responses = await asyncio.gather(
+            *(batcher.submit(SERVICE_URL, image, "image/jpeg", settings) for image in IMAGES)
+        )
+        await pool.aclose()
+        return responses
+
+    responses = asyncio.run(run())
+
+    # Never tries /infer-batch
+    assert server.batch_sizes == []
+    assert server.single_calls == len(IMAGES)
+    assert [_label_and_confidence(r) for r in responses] == [predict(image) for image in IMAGES]
+    assert batcher.stats()["services"][SERVICE_URL]["unbatched_images"] == len(IMAGES)
+
+
+def test_run_inference_uses_batching_when_enabled_for_detector():
+    primary_server = StandInInferenceServer()
+    pool = _stand_in_pool(primary_server)
+    inference_config = ExtendedInferenceConfig(name="batched", max_inference_batch_size=4, inference_batch_window_ms=50)
+
+    with (
+        mock.patch("app.core.edge_inference.InferenceClientPool", return_value=pool),
+        mock.patch("app.core.edge_inference.EdgeConfigManager.detector_config", return_value=inference_config),
+    ):
+        edge_manager = EdgeInferenceManager(separate_oodd_inference=False)
+
+        async def run():
+            # The inference server advertises batched inference in its health probe
+            edge_manager.readiness.is_ready(PRIMARY_SERVICE_URL)
+            await edge_manager.readiness.probe_all()
+            results = await asyncio.gather(
+                *(
+                    edge_manager.run_inference("det_abc", image, "image/jpeg", mode=ModeEnum.BINARY)
+                    for image in IMAGES[:4]
+                )
+            )
+            await edge_manager.aclose()
+            return results
+
+        results = asyncio.run(run())
+
+    assert primary_server.batch_sizes == [4]
+    assert [(r["label"], r["confidence"]) for r in results] == [predict(image) for image in IMAGES[:4]]
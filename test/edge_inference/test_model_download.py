@@ -0,0 +1,155 @@
+import os
+import tracemalloc
+
+import pytest
+import requests
+from fastapi import HTTPException
+
+from app.core import model_download
+from app.core.edge_inference import get_model_file
+from app.core.model_download import DownloadVerificationError, download_to_file
+from app.core.utils import parse_model_info
+from test.edge_inference.stand_in_object_store import StandInObjectStore
+
+CHUNK_SIZE = model_download.MODEL_DOWNLOAD_CHUNK_SIZE
+CONTENT = os.urandom(8 * CHUNK_SIZE + 12345)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(model_download, "MODEL_DOWNLOAD_RETRY_DELAY_S", 0)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_to_file(tmp_path):
+    path = str(tmp_path / "model.buf")
+    with StandInObjectStore(CONTENT) as store:
+        download_to_file(store.url, path)
+
+    assert _read(path) == CONTENT
+    assert not os.path.exists(f"{path}.part")
+    assert store.range_headers == [None]
+
+
+def test_download_streams_to_disk(tmp_path):
+    path = str(tmp_path / "model.buf")
+    with StandInObjectStore(CONTENT) as store:
+        tracemalloc.start()
+        try:
+            download_to_file(store.url, path)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    # Only a few chunks are ever held in memory, not the whole object
+    assert peak < 4 * CHUNK_SIZE
+
+
+def test_interrupted_download_resumes_with_a_range_request(tmp_path):
+    path = str(tmp_path / "model.buf")
+    with StandInObjectStore(CONTENT) as store:
+        # Chunks that were cut off are downloaded again
+        store.drop_connection_after = [int(1.5 * CHUNK_SIZE), int(2.5 * CHUNK_SIZE)]
+        record = download_to_file(store.url, path)
+
+    assert _read(path) == CONTENT
+    assert store.range_headers == [None, f"bytes={CHUNK_SIZE}-", f"bytes={3 * CHUNK_SIZE}-"]
+    assert record["size_bytes"] == len(CONTENT)
+    assert record["downloaded_bytes"] == len(CONTENT)
+    assert record["resumes"] == 2
+    assert record["throughput_bytes_per_s"] > 0
+
+
+def test_download_resumes_a_partial_file_from_an_earlier_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_download, "MODEL_DOWNLOAD_MAX_ATTEMPTS", 1)
+    path = str(tmp_path / "model.buf")
+    with StandInObjectStore(CONTENT) as store:
+        store.drop_connection_after = [2 * CHUNK_SIZE + 1000]
+        with pytest.raises(requests.exceptions.RequestException):
+            download_to_file(store.url, path)
+        assert os.path.getsize(f"{path}.part") == 2 * CHUNK_SIZE
+
+        record = download_to_file(store.url, path)
+
+    assert _read(path) == CONTENT
+    assert store.range_headers[-1] == f"bytes={2 * CHUNK_SIZE}-"
+    # Only the rest of the object was downloaded by the second call
+    assert record["downloaded_bytes"] == len(CONTENT) - 2 * CHUNK_SIZE
+    assert record["resumes"] == 1
+
+
+def test_complete_partial_file_is_not_downloaded_again(tmp_path):
+    path = str(tmp_path / "model.buf")
+    with open(f"{path}.part", "wb") as f:
+        f.write(CONTENT)
+    with StandInObjectStore(CONTENT) as store:
+        download_to_file(store.url, path)
+
+    assert _read(path) == CONTENT
+    # The range request after the end of the object, then one for the object's headers
+    assert store.range_headers == [f"bytes={len(CONTENT)}-", "bytes=0-0"]
+
+
+def test_download_without_range_support_starts_over(tmp_path):
+    path = str(tmp_path / "model.buf")
+    with StandInObjectStore(CONTENT, supports_ranges=False) as store:
+        store.drop_connection_after = [2 * CHUNK_SIZE]
+        download_to_file(store.url, path)
+
+    assert _read(path) == CONTENT
+
+
+def test_checksum_mismatch_discards_the_download(tmp_path):
+    path = str(tmp_path / "model.buf")
+    with StandInObjectStore(CONTENT) as store:
+        store.etag = '"00000000000000000000000000000000"'
+        with pytest.raises(DownloadVerificationError):
+            download_to_file(store.url, path)
+
+    assert not os.path.exists(path)
+    assert not os.path.exists(f"{path}.part")
+
+
+def test_multipart_etag_is_not_used_as_a_checksum(tmp_path):
+    path = str(tmp_path / "model.buf")
+    with StandInObjectStore(CONTENT) as store:
+        store.etag = '"9b2cf535f27731c974343645a3985328-3"'
+        download_to_file(store.url, path)
+
+    assert _read(path) == CONTENT
+
+
+def test_error_response_raises_http_exception(tmp_path):
+    with StandInObjectStore(CONTENT) as store:
+        store.status_code = 403
+        with pytest.raises(HTTPException) as exc_info:
+            download_to_file(store.url, str(tmp_path / "model.buf"))
+
+    assert exc_info.value.status_code == 403
+    # The presigned URL's signature is not logged or reported
+    assert "secret" not in exc_info.value.detail
+
+
+def test_get_model_file_downloads_each_binary_once(tmp_path):
+    repository_root = str(tmp_path)
+    with StandInObjectStore(CONTENT) as store:
+        model_info, _ = parse_model_info(
+            {
+                "pipeline_config": "test_pipeline_config",
+                "predictor_metadata": "{}",
+                "model_binary_id": "shared_binary_id",
+                "model_binary_url": store.url,
+                "oodd_pipeline_config": "test_oodd_pipeline_config",
+            }
+        )
+        model_file, download = get_model_file(model_info, repository_root)
+        # The second call finds the binary in the blob store, so there is no download to report
+        assert get_model_file(model_info, repository_root) == (model_file, None)
+
+    assert _read(model_file) == CONTENT
+    assert download["size_bytes"] == len(CONTENT)
+    assert len(store.range_headers) == 1
@@ -2,15 +2,25 @@ import os
 import tempfile
 from test.edge_inference.test_edge_inference_manager import validate_model_directory
 
+from app.core import edge_inference
 from app.core.edge_inference import (
     delete_model_version,
     delete_old_model_versions,
+    get_model_blob_path,
     save_models_to_repository,
     should_update,
 )
 from app.core.utils import parse_model_info
 
 
+def _downloaded_file(directory: str, content: bytes) -> str:
+    """A model binary as downloaded by `get_model_file`."""
+    fd, path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    return path
+
+
 def test_save_model_with_binary_to_repository():
     test_predictor_metadata = """{"text_query":"there is a dog","mode":"BINARY"}"""
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -27,9 +37,9 @@ def test_save_model_with_binary_to_repository():
         edge_model_info, oodd_model_info = parse_model_info(model_info)
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=b"test_model1",
+            edge_model_file=_downloaded_file(temp_dir, b"test_model1"),
             edge_model_info=edge_model_info,
-            oodd_model_buffer=b"test_oodd_model1",
+            oodd_model_file=_downloaded_file(temp_dir, b"test_oodd_model1"),
             oodd_model_info=oodd_model_info,
             repository_root=temp_dir,
         )
@@ -52,9 +62,9 @@ def test_save_model_with_binary_to_repository():
         assert should_update(oodd_model_info, os.path.join(temp_dir, detector_id), 1)
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=b"test_model2",
+            edge_model_file=_downloaded_file(temp_dir, b"test_model2"),
             edge_model_info=edge_model_info,
-            oodd_model_buffer=b"test_oodd_model2",
+            oodd_model_file=_downloaded_file(temp_dir, b"test_oodd_model2"),
             oodd_model_info=oodd_model_info,
             repository_root=temp_dir,
         )
@@ -88,9 +98,9 @@ def test_save_model_with_no_binary_to_repository():
         edge_model_info, oodd_model_info = parse_model_info(model_info)
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=None,
+            edge_model_file=None,
             edge_model_info=edge_model_info,
-            oodd_model_buffer=None,
+            oodd_model_file=None,
             oodd_model_info=oodd_model_info,
             repository_root=temp_dir,
         )
@@ -114,9 +124,9 @@ def test_save_model_with_no_binary_to_repository():
         assert should_update(oodd_model_info, os.path.join(temp_dir, detector_id, "oodd"), 1)
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=None,
+            edge_model_file=None,
             edge_model_info=edge_model_info,
-            oodd_model_buffer=None,
+            oodd_model_file=None,
             oodd_model_info=oodd_model_info,
             repository_root=temp_dir,
         )
@@ -155,9 +165,9 @@ def test_save_model_with_no_oodd_to_repository():
         edge_model_info, _ = parse_model_info(model_info)
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=None,
+            edge_model_file=None,
             edge_model_info=edge_model_info,
-            oodd_model_buffer=None,
+            oodd_model_file=None,
             oodd_model_info=None,
             repository_root=temp_dir,
         )
@@ -180,9 +190,9 @@ def test_save_model_with_no_oodd_to_repository():
         assert should_update(edge_model_info, os.path.join(temp_dir, detector_id, "primary"), 1)
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=None,
+            edge_model_file=None,
             edge_model_info=edge_model_info,
-            oodd_model_buffer=None,
+            oodd_model_file=None,
             oodd_model_info=None,
             repository_root=temp_dir,
         )
@@ -267,6 +277,73 @@ def test_delete_old_model_versions_with_no_oodd_folder():
         assert os.path.exists(os.path.join(primary_model_dir, "3"))
 
 
+def _blob(repository_root: str, model_binary_id: str, content: bytes) -> str:
+    """A model binary in the blob store, as fetched by `get_model_file`."""
+    path = get_model_blob_path(repository_root, model_binary_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def _save_version(repository_root: str, detector_id: str, model_binary_id: str) -> None:
+    edge_model_info, _ = parse_model_info(
+        {
+            "pipeline_config": "test_pipeline_config",
+            "predictor_metadata": "{}",
+            "model_binary_id": model_binary_id,
+            "model_binary_url": "test_binary_url",
+            "oodd_pipeline_config": "test_oodd_pipeline_config",
+        }
+    )
+    save_models_to_repository(
+        detector_id=detector_id,
+        edge_model_file=get_model_blob_path(repository_root, model_binary_id),
+        edge_model_info=edge_model_info,
+        oodd_model_file=None,
+        oodd_model_info=None,
+        repository_root=repository_root,
+    )
+
+
+def test_detectors_share_model_binaries():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        blob_path = _blob(temp_dir, "shared_binary_id", b"test_model")
+
+        _save_version(temp_dir, "test_detector_1", "shared_binary_id")
+        _save_version(temp_dir, "test_detector_2", "shared_binary_id")
+
+        # Both versions are hard links to the one copy in the blob store
+        for detector_id in ["test_detector_1", "test_detector_2"]:
+            model_file = os.path.join(temp_dir, detector_id, "primary", "1", "model.buf")
+            assert os.path.samefile(model_file, blob_path)
+        assert os.stat(blob_path).st_nlink == 3
+
+
+def test_unused_model_binaries_are_garbage_collected(monkeypatch):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        detector_id = "test_detector"
+        old_blob_path = _blob(temp_dir, "old_binary_id", b"old_model")
+        blob_paths = [_blob(temp_dir, f"binary_id_{i}", b"test_model") for i in range(2)]
+        for binary_id in ["old_binary_id", "binary_id_0", "binary_id_1"]:
+            _save_version(temp_dir, detector_id, binary_id)
+        stale_partial_download = _blob(temp_dir, "abandoned_binary_id", b"partial") + ".part"
+        os.rename(stale_partial_download.removesuffix(".part"), stale_partial_download)
+
+        # Unused binaries are kept for a grace period
+        delete_old_model_versions(detector_id=detector_id, repository_root=temp_dir, num_to_keep=2)
+        assert os.path.exists(old_blob_path)
+        assert os.path.exists(stale_partial_download)
+
+        monkeypatch.setattr(edge_inference, "MODEL_BLOB_GC_GRACE_S", 0)
+        delete_old_model_versions(detector_id=detector_id, repository_root=temp_dir, num_to_keep=2)
+
+        assert not os.path.exists(old_blob_path)
+        assert not os.path.exists(stale_partial_download)
+        # Binaries of the versions that are kept stay in the blob store
+        assert all(os.path.exists(path) for path in blob_paths)
+
+
 def test_switch_to_new_model_repository_format():
     with tempfile.TemporaryDirectory() as temp_dir:
         detector_id = "test_detector"
@@ -294,9 +371,9 @@ def test_switch_to_new_model_repository_format():
         edge_model_info, oodd_model_info = parse_model_info(model_info)
         save_models_to_repository(
             detector_id=detector_id,
-            edge_model_buffer=b"test_model1",
+            edge_model_file=_downloaded_file(temp_dir, b"test_model1"),
             edge_model_info=edge_model_info,
-            oodd_model_buffer=b"test_oodd_model1",
+            oodd_model_file=_downloaded_file(temp_dir, b"test_oodd_model1"),
             oodd_model_info=oodd_model_info,
             repository_root=temp_dir,
         )
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from unittest import mock
+
+import httpx
+
+from app.core.edge_inference import EdgeInferenceManager
+from app.core.inference_client import InferenceClientPool
+from app.core.readiness import InferenceReadinessTracker
+from test.edge_inference.stand_in_inference_server import StandInInferenceServer
+
+SERVICE_URL = "inference-service-det-abc:8000"
+
+
+def _stand_in_pool(server: StandInInferenceServer) -> InferenceClientPool:
+    return InferenceClientPool(dns_ttl_s=0, transport=httpx.ASGITransport(app=server.app))
+
+
+async def _wait_until(condition, timeout_s: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for condition"
+        await asyncio.sleep(0.005)
+
+
+def test_unknown_service_is_not_ready_until_probed():
+    server = StandInInferenceServer()
+    tracker = InferenceReadinessTracker(_stand_in_pool(server), lambda: [], probe_interval_s=60)
+
+    async def run():
+        tracker.start()
+        # The first question about a service doesn't wait for a probe...
+        assert not tracker.is_ready(SERVICE_URL)
+        # ...but wakes up the tracker, which probes it right away instead of at the next interval
+        await _wait_until(lambda: tracker.is_ready(SERVICE_URL))
+        await tracker.stop()
+
+    asyncio.run(run())
+    stats = tracker.stats()["services"][SERVICE_URL]
+    assert stats["ready"]
+    assert stats["time_to_first_ready_s"] is not None
+    assert stats["last_probe_latency_ms"] is not None
+
+
+def test_advertised_max_batch_size_is_recorded():
+    batching_server = StandInInferenceServer(max_batch_size=4)
+    tracker = InferenceReadinessTracker(_stand_in_pool(batching_server), lambda: [SERVICE_URL])
+    asyncio.run(tracker.probe_all())
+    assert tracker.max_batch_size(SERVICE_URL) == 4  # noqa: PLR2004
+    assert tracker.max_batch_size("inference-service-det-unknown:8000") == 1
+
+    server = StandInInferenceServer(max_batch_size=None)
+    tracker = InferenceReadinessTracker(_stand_in_pool(server), lambda: [SERVICE_URL])
+    asyncio.run(tracker.probe_all())
+    assert tracker.is_ready(SERVICE_URL)
+    assert tracker.max_batch_size(SERVICE_URL) == 1
+
+
+def test_readiness_transitions_are_recorded():
+    server = StandInInferenceServer()
+    tracker = InferenceReadinessTracker(_stand_in_pool(server), lambda: [SERVICE_URL], probe_interval_s=0.01)
+
+    async def run():
+        tracker.start()
+        await _wait_until(lambda: tracker.is_ready(SERVICE_URL))
+        server.is_ready = False
+        await _wait_until(lambda: not tracker.is_ready(SERVICE_URL))
+        server.is_ready = True
+        await _wait_until(lambda: tracker.is_ready(SERVICE_URL))
+        await tracker.stop()
+
+    asyncio.run(run())
+    stats = tracker.stats()
+    assert [event["ready"] for event in stats["recent_transitions"]] == [True, False, True]
+    assert all(event["previous_state_duration_s"] >= 0 for event in stats["recent_transitions"])
+    assert stats["services"][SERVICE_URL]["transitions"] == 3  # noqa: PLR2004
+
+
+def test_stop_returns_promptly_while_sleeping():
+    server = StandInInferenceServer()
+    tracker = InferenceReadinessTracker(_stand_in_pool(server), lambda: [SERVICE_URL], probe_interval_s=60)
+
+    async def run():
+        tracker.start()
+        await _wait_until(lambda: tracker.is_ready(SERVICE_URL))
+        # A new service wakes the tracker up just before it is stopped
+        tracker.is_ready("inference-service-det-other:8000")
+        await asyncio.wait_for(tracker.stop(), timeout=2)
+
+    asyncio.run(run())
+
+
+def test_unreachable_service_is_not_ready():
+    def refuse(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    pool = InferenceClientPool(dns_ttl_s=0, transport=httpx.MockTransport(refuse))
+    tracker = InferenceReadinessTracker(pool, lambda: [SERVICE_URL])
+
+    asyncio.run(tracker.probe_all())
+    stats = tracker.stats()["services"][SERVICE_URL]
+    assert not stats["ready"]
+    assert "ConnectError" in stats["last_error"]
+    assert stats["transitions"] == 0
+
+
+def test_inference_is_available_reads_readiness_table_without_blocking():
+    server = StandInInferenceServer()
+    with mock.patch("app.core.edge_inference.InferenceClientPool", return_value=_stand_in_pool(server)):
+        edge_manager = EdgeInferenceManager(separate_oodd_inference=True)
+    # No detectors are configured, so only the services asked about get tracked
+    edge_manager.readiness._discover_services = lambda: []
+
+    async def run():
+        edge_manager.readiness.start()
+        assert not edge_manager.inference_is_available("det_abc")
+        await _wait_until(lambda: edge_manager.inference_is_available("det_abc"))
+        checks = server.ready_checks
+        # Asking again is a table lookup, not another health check
+        for _ in range(100):
+            assert edge_manager.inference_is_available("det_abc")
+        assert server.ready_checks == checks
+        await edge_manager.aclose()
+
+    asyncio.run(run())
+    # Both the primary and the OODD service are tracked
+    assert len(edge_manager.readiness.stats()["services"]) == 2  # noqa: PLR2004
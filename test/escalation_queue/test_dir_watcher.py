@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Generator
+
+import pytest
+
+from app.escalation_queue.dir_watcher import IN_ADDED_OR_REMOVED, IN_CLOSE_WRITE, DirectoryWatcher
+
+
+@pytest.fixture
+def watched_dir() -> Generator[Path, None, None]:
+    path = Path(tempfile.mkdtemp(prefix="test-dir-watcher-"))
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture
+def watcher(watched_dir: Path) -> Generator[DirectoryWatcher, None, None]:
+    watcher = DirectoryWatcher.create(watched_dir)
+    if watcher is None:
+        pytest.skip("inotify is not available")
+    yield watcher
+    watcher.close()
+
+
+def test_reports_added_and_removed_files(watched_dir: Path, watcher: DirectoryWatcher):
+    assert not watcher.wait(0)
+    assert watcher.read_events() == []
+
+    (watched_dir / "created").write_bytes(b"")
+    (watched_dir / "created").rename(watched_dir / "moved")
+    (watched_dir / "moved").unlink()
+
+    assert watcher.wait(1)
+    events = watcher.read_events()
+    assert [(event.name, event.added, event.removed) for event in events] == [
+        ("created", True, False),
+        ("created", False, True),
+        ("moved", True, False),
+        ("moved", False, True),
+    ]
+    assert not any(event.overflowed for event in events)
+
+
+def test_reports_written_files(watched_dir: Path):
+    watcher = DirectoryWatcher.create(watched_dir, IN_ADDED_OR_REMOVED | IN_CLOSE_WRITE)
+    if watcher is None:
+        pytest.skip("inotify is not available")
+    try:
+        (watched_dir / "file").write_bytes(b"")
+
+        assert watcher.wait(1)
+        events = watcher.read_events()
+        assert [(event.name, event.added, event.written) for event in events] == [
+            ("file", True, False),
+            ("file", False, True),
+        ]
+    finally:
+        watcher.close()
+
+
+def test_create_returns_none_if_the_directory_cannot_be_watched(watched_dir: Path):
+    assert DirectoryWatcher.create(watched_dir / "missing") is None
@@ -0,0 +1,194 @@
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.core.utils import generate_request_id
+from app.escalation_queue.drain import (
+    AdaptiveConcurrencyLimit,
+    DrainStats,
+    EscalationDrain,
+    read_drain_status,
+    write_drain_status,
+)
+from app.escalation_queue.models import EscalationInfo, EscalationPriority, SubmitImageQueryParams
+from app.escalation_queue.queue_reader import QueuedEscalation
+
+
+def _escalation(
+    detector_id: str, request_id: str | None = None, priority: EscalationPriority = "normal"
+) -> tuple[EscalationInfo, QueuedEscalation]:
+    escalation_info = EscalationInfo(
+        timestamp="20260101_000000_000000",
+        detector_id=detector_id,
+        submit_iq_params=SubmitImageQueryParams(
+            patience_time=None, confidence_threshold=0.9, human_review=None, metadata=None, image_query_id="iq_test"
+        ),
+        request_id=request_id or generate_request_id(),
+        priority=priority,
+    )
+    return escalation_info, QueuedEscalation(escalation_info.model_dump_json(), b"image")
+
+
+class TestAdaptiveConcurrencyLimit:
+    def test_a_round_of_successes_raises_the_limit_by_one(self):
+        limit = AdaptiveConcurrencyLimit(max_limit=16, initial_limit=4)
+        for _ in range(3):
+            limit.on_success()
+        assert limit.limit == 4  # noqa: PLR2004
+        for _ in range(2):
+            limit.on_success()
+        assert limit.limit == 5  # noqa: PLR2004
+
+    def test_the_limit_stays_below_the_maximum(self):
+        limit = AdaptiveConcurrencyLimit(max_limit=2, initial_limit=2)
+        for _ in range(10):
+            limit.on_success()
+        assert limit.limit == 2  # noqa: PLR2004
+
+    def test_overload_halves_the_limit_once_per_round(self):
+        limit = AdaptiveConcurrencyLimit(max_limit=16, initial_limit=8)
+
+        limit.on_overload(attempt_started_at=0)
+        assert limit.limit == 4  # noqa: PLR2004
+        # An attempt that was already in flight when the limit was lowered doesn't lower it again
+        limit.on_overload(attempt_started_at=0)
+        assert limit.limit == 4  # noqa: PLR2004
+
+    def test_the_limit_stays_at_least_one(self):
+        limit = AdaptiveConcurrencyLimit(max_limit=16, initial_limit=1)
+        limit.on_overload(attempt_started_at=float("inf"))
+        assert limit.limit == 1
+
+
+class TestEscalationDrain:
+    def test_escalations_of_different_detectors_are_escalated_concurrently(self):
+        num_detectors = 4
+        # Every escalation waits for all of them to be in flight
+        all_in_flight = threading.Barrier(num_detectors, timeout=5)
+        drain = EscalationDrain(lambda *_: all_in_flight.wait(), AdaptiveConcurrencyLimit(16, initial_limit=4))
+        acknowledgements = [Mock() for _ in range(num_detectors)]
+
+        for i, acknowledge in enumerate(acknowledgements):
+            drain.submit(*_escalation(f"det_{i}"), acknowledge)
+        drain.close()
+
+        assert not all_in_flight.broken
+        for acknowledge in acknowledgements:
+            acknowledge.assert_called_once()
+
+    def test_escalations_of_a_detector_are_escalated_concurrently(self):
+        num_escalations = 4
+        # Every escalation waits for all of them to be in flight
+        all_in_flight = threading.Barrier(num_escalations, timeout=5)
+        drain = EscalationDrain(lambda *_: all_in_flight.wait(), AdaptiveConcurrencyLimit(16, initial_limit=4))
+
+        for _ in range(num_escalations):
+            drain.submit(*_escalation("det_a"), Mock())
+        drain.close()
+
+        assert not all_in_flight.broken
+
+    def test_escalations_of_a_detector_are_escalated_one_at_a_time_in_order(self):
+        escalated = []
+        in_flight = threading.Semaphore(1)
+
+        def escalate(escalation_info: EscalationInfo, _: QueuedEscalation) -> None:
+            assert in_flight.acquire(blocking=False)
+            escalated.append(escalation_info.request_id)
+            in_flight.release()
+
+        drain = EscalationDrain(escalate, AdaptiveConcurrencyLimit(16, initial_limit=16), max_in_flight_per_detector=1)
+        escalations = [_escalation("det_a") for _ in range(10)]
+        for escalation_info, escalation in escalations:
+            drain.submit(escalation_info, escalation, Mock())
+        drain.close()
+
+        assert escalated == [escalation_info.request_id for escalation_info, _ in escalations]
+
+    def _escalate_in_order(self, escalations: list[tuple[EscalationInfo, QueuedEscalation]]) -> list[EscalationInfo]:
+        """Escalates the escalations one at a time, with all but the first waiting. Returns them in escalation order."""
+        escalated = []
+        first_escalation_started = threading.Event()
+        all_submitted = threading.Event()
+
+        def escalate(escalation_info: EscalationInfo, _: QueuedEscalation) -> None:
+            first_escalation_started.set()
+            assert all_submitted.wait(5)
+            escalated.append(escalation_info)
+
+        drain = EscalationDrain(escalate, AdaptiveConcurrencyLimit(16, initial_limit=1))
+        for escalation_info, escalation in escalations:
+            drain.submit(escalation_info, escalation, Mock())
+            assert first_escalation_started.wait(5)
+        all_submitted.set()
+        drain.close()
+        return escalated
+
+    def test_detectors_take_turns(self):
+        escalated = self._escalate_in_order(
+            [_escalation("det_a") for _ in range(3)] + [_escalation("det_b") for _ in range(2)]
+        )
+
+        assert [escalation_info.detector_id for escalation_info in escalated] == [
+            "det_a",
+            "det_a",
+            "det_b",
+            "det_a",
+            "det_b",
+        ]
+
+    def test_critical_escalations_are_started_first(self):
+        escalated = self._escalate_in_order(
+            [_escalation("det_a"), _escalation("det_b"), _escalation("det_c", priority="critical")]
+        )
+
+        assert [escalation_info.detector_id for escalation_info in escalated] == ["det_a", "det_c", "det_b"]
+
+    def test_an_escalation_is_acknowledged_after_it_is_escalated(self):
+        events = []
+        drain = EscalationDrain(lambda *_: events.append("escalated"), AdaptiveConcurrencyLimit(16))
+
+        drain.submit(*_escalation("det_a"), lambda: events.append("acknowledged"))
+        drain.close()
+
+        assert events == ["escalated", "acknowledged"]
+
+    def test_an_escalation_that_raises_is_acknowledged(self):
+        acknowledge = Mock()
+        drain = EscalationDrain(Mock(side_effect=RuntimeError()), AdaptiveConcurrencyLimit(16))
+
+        drain.submit(*_escalation("det_a"), acknowledge)
+        drain.close()
+
+        acknowledge.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "backlog_bytes, expected_eta_s",
+    [(0, 0.0), (1000, None)],
+)
+def test_backlog_eta_without_a_drain_rate(backlog_bytes: int, expected_eta_s: float | None):
+    assert DrainStats().status(backlog_bytes, in_flight=0, concurrency_limit=4)["backlog_eta_s"] == expected_eta_s
+
+
+def test_backlog_eta_at_the_drain_rate():
+    with patch("app.escalation_queue.drain.time.monotonic", return_value=1000.0) as mock_monotonic:
+        stats = DrainStats(window_s=60)
+        for _ in range(10):
+            stats.record(num_bytes=100)
+        mock_monotonic.return_value = 1010.0
+
+        status = stats.status(backlog_bytes=10_000, in_flight=2, concurrency_limit=4)
+
+    assert status["drain_rate_escalations_per_s"] == 1.0
+    assert status["drain_rate_bytes_per_s"] == 100  # noqa: PLR2004
+    assert status["backlog_eta_s"] == 100.0  # noqa: PLR2004
+
+
+def test_drain_status_is_read_back(tmp_path):
+    assert read_drain_status(str(tmp_path)) is None
+
+    write_drain_status(tmp_path, {"backlog_bytes": 100})
+
+    assert read_drain_status(str(tmp_path)) == {"backlog_bytes": 100}
@@ -1,8 +1,13 @@
+import fcntl
 import json
 import os
 import shutil
 import tempfile
+import threading
+import time
+from collections import Counter
 from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
 from typing import Generator, Iterator
 from unittest.mock import Mock, patch
@@ -15,6 +20,7 @@ from urllib3.exceptions import MaxRetryError
 
 from app.core.utils import generate_iq_id, generate_request_id, get_formatted_timestamp_str
 from app.escalation_queue.constants import MAX_QUEUE_FILE_LINES
+from app.escalation_queue.drain import AdaptiveConcurrencyLimit, EscalationDrain, write_drain_status
 from app.escalation_queue.manage_reader import (
     RETRY_WAIT_TIMES,
     _escalate_once,
@@ -22,13 +28,22 @@ from app.escalation_queue.manage_reader import (
     read_from_escalation_queue,
 )
 from app.escalation_queue.models import EscalationInfo, SubmitImageQueryParams
-from app.escalation_queue.queue_reader import QueueReader
+from app.escalation_queue.queue_reader import QUEUE_POLL_INTERVAL_S, QueuedEscalation, QueueReader
 from app.escalation_queue.queue_utils import (
     safe_escalate_with_queue_write,
     write_escalation_to_queue,
 )
-from app.escalation_queue.queue_writer import QueueWriter, convert_escalation_info_to_str
+from app.escalation_queue.queue_writer import (
+    BackgroundQueueWriter,
+    QueueWriter,
+    convert_escalation_info_to_str,
+    convert_escalation_to_record,
+)
 from app.escalation_queue.request_cache import RequestCache
+from app.escalation_queue.segments import read_records
+
+# Image bytes for escalations whose image isn't looked at
+TEST_IMAGE_BYTES = b"test image bytes"
 
 ### Helper functions
 
@@ -68,15 +83,22 @@ def generate_test_escalation_info(
     return EscalationInfo(**data)
 
 
-def assert_expected_reader_output(reader_iter: QueueReader | Iterator[str], expected_values: list[EscalationInfo]):
+def assert_expected_reader_output(
+    reader_iter: QueueReader | Iterator[QueuedEscalation], expected_values: list[EscalationInfo]
+):
     """
     Helper function to assert that the reader produces an expected list of escalations.
 
     The `reader_iter` argument can be either a QueueReader or an Iterator. The latter case allows previous iteration
     progress to be preserved between calls.
     """
-    for value, escalation_str in zip(expected_values, reader_iter):
-        assert EscalationInfo(**json.loads(escalation_str)) == value
+    for value, escalation in zip(expected_values, reader_iter):
+        assert EscalationInfo(**json.loads(escalation.line)) == value
+
+
+def patch_queue_reader(escalations: list[QueuedEscalation]):
+    """Patches the QueueReader to return the escalations, each with a mock acknowledgement function."""
+    return patch.object(QueueReader, "iter_with_acks", return_value=iter([(e, Mock()) for e in escalations]))
 
 
 ### Global fixtures
@@ -119,8 +141,17 @@ def test_writer(test_base_dir: str) -> QueueWriter:
 
 
 @pytest.fixture
-def test_reader(test_base_dir: str) -> QueueReader:
-    return generate_queue_reader(base_dir=test_base_dir)
+def test_background_writer(test_base_dir: str) -> Generator[BackgroundQueueWriter, None, None]:
+    writer = BackgroundQueueWriter(test_base_dir)
+    yield writer
+    writer.close()
+
+
+@pytest.fixture
+def test_reader(test_base_dir: str) -> Generator[QueueReader, None, None]:
+    reader = generate_queue_reader(base_dir=test_base_dir)
+    yield reader
+    reader.close()
 
 
 @pytest.fixture
@@ -134,38 +165,37 @@ def escalation_str() -> str:
 
 
 class TestQueueWriter:
-    def assert_file_length(self, file_path: str, expected_lines: int):
-        """Testing function to assert that the file at the specified file path has the expected number of lines."""
-        with open(file_path, "r") as f:
-            num_lines = len(f.readlines())
-            assert num_lines == expected_lines
+    def assert_file_length(self, file_path: str, expected_escalations: int):
+        """Testing function to assert that the file at the specified path has the expected number of escalations."""
+        num_escalations = len(list(read_records(Path(file_path).read_bytes())))
+        assert num_escalations == expected_escalations
 
     def test_successive_writes_go_to_same_file(self, test_writer: QueueWriter, test_escalation_info: EscalationInfo):
         """Verify that successive escalation writes go to the same file."""
         for i in range(1, 4):
-            assert test_writer.write_escalation(test_escalation_info)
+            assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
             self.assert_file_length(test_writer.last_file_path, i)
-            assert test_writer.num_lines_written_to_file == i
+            assert test_writer.num_escalations_written_to_file == i
 
     def test_write_to_different_file(self, test_writer: QueueWriter, test_escalation_info: EscalationInfo):
         """Verify that the writer uses a new file when the previous one is gone."""
-        assert test_writer.write_escalation(test_escalation_info)
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
         first_file_path = test_writer.last_file_path
         self.assert_file_length(first_file_path, 1)
-        assert test_writer.num_lines_written_to_file == 1
+        assert test_writer.num_escalations_written_to_file == 1
 
         first_file_path.unlink()
-        assert test_writer.write_escalation(test_escalation_info)
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
         self.assert_file_length(test_writer.last_file_path, 1)
         assert first_file_path != test_writer.last_file_path
-        assert test_writer.num_lines_written_to_file == 1
+        assert test_writer.num_escalations_written_to_file == 1
 
     def test_separate_writers_write_to_different_files(self, test_base_dir: str, test_escalation_info: EscalationInfo):
         """Verify that separate writers will write to separate files."""
         first_writer = generate_queue_writer(test_base_dir)
         second_writer = generate_queue_writer(test_base_dir)
-        assert first_writer.write_escalation(test_escalation_info)
-        assert second_writer.write_escalation(test_escalation_info)
+        assert first_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        assert second_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
 
         assert not first_writer.last_file_path.samefile(second_writer.last_file_path)
 
@@ -175,43 +205,164 @@ class TestQueueWriter:
     def test_writer_respects_file_length_limit(self, test_writer: QueueWriter, test_escalation_info: EscalationInfo):
         """Verify that the writer starts writing to a new file when a file reaches the max allowed line length."""
         for i in range(MAX_QUEUE_FILE_LINES):
-            assert test_writer.write_escalation(test_escalation_info)
+            assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
             self.assert_file_length(test_writer.last_file_path, i + 1)
-            assert test_writer.num_lines_written_to_file == i + 1
+            assert test_writer.num_escalations_written_to_file == i + 1
 
         first_file_path = test_writer.last_file_path
-        assert test_writer.write_escalation(test_escalation_info)
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
         self.assert_file_length(test_writer.last_file_path, 1)
-        assert test_writer.num_lines_written_to_file == 1
+        assert test_writer.num_escalations_written_to_file == 1
         assert not first_file_path.samefile(test_writer.last_file_path)
 
-    def test_writer_can_write_image(self, test_writer: QueueWriter, timestamp_str: str, test_image_bytes: bytes):
-        """Verify that basic image writing works properly."""
-        detector_id = "test_id"
-        image_path = test_writer.write_image_bytes(test_image_bytes, detector_id, timestamp_str)
-        assert detector_id in image_path
-        assert timestamp_str in image_path
+    def test_writer_writes_images_with_the_escalations(
+        self,
+        test_base_dir: str,
+        test_writer: QueueWriter,
+        test_escalation_info: EscalationInfo,
+        test_image_bytes: bytes,
+    ):
+        """Verify that images are written to the queue file with their escalation, not to files of their own."""
+        assert test_writer.write_escalation(test_escalation_info, test_image_bytes)
+
+        [record] = read_records(test_writer.last_file_path.read_bytes())
+        assert EscalationInfo(**json.loads(record.metadata)) == test_escalation_info
+        assert record.image_bytes == test_image_bytes
+        assert [path.name for path in Path(test_base_dir).iterdir()] == ["writing"]
+
+    def test_writer_keeps_the_file_open_between_writes(
+        self, test_writer: QueueWriter, test_escalation_info: EscalationInfo
+    ):
+        with patch("app.escalation_queue.queue_writer.os.open", wraps=os.open) as mock_open:
+            for _ in range(3):
+                assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+
+        assert mock_open.call_count == 1
+        self.assert_file_length(test_writer.last_file_path, 3)
+
+    def test_writer_writes_to_a_new_file_after_the_reader_moves_it(
+        self, test_base_dir: str, test_writer: QueueWriter, test_escalation_info: EscalationInfo
+    ):
+        """Verify that nothing is appended to a file that the reader has started reading."""
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        first_file_path = test_writer.last_file_path
+        moved_path = Path(test_base_dir, "moved.txt")
+        first_file_path.rename(moved_path)
+
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        self.assert_file_length(moved_path, 1)
+        self.assert_file_length(test_writer.last_file_path, 1)
+        assert test_writer.last_file_path != first_file_path
+
+    def test_batch_is_split_at_the_file_length_limit(
+        self, test_writer: QueueWriter, test_escalation_info: EscalationInfo
+    ):
+        assert test_writer.write_escalations([(test_escalation_info, TEST_IMAGE_BYTES)] * (MAX_QUEUE_FILE_LINES - 1))
+        first_file_path = test_writer.last_file_path
+
+        assert test_writer.write_escalations([(test_escalation_info, TEST_IMAGE_BYTES)] * 3)
+        self.assert_file_length(first_file_path, MAX_QUEUE_FILE_LINES)
+        self.assert_file_length(test_writer.last_file_path, 2)
+
+    def test_escalations_of_each_priority_class_go_to_their_own_file(
+        self, test_writer: QueueWriter, test_escalation_info: EscalationInfo
+    ):
+        audit_info = test_escalation_info.model_copy(update={"priority": "audit"})
+        assert test_writer.write_escalations([(test_escalation_info, TEST_IMAGE_BYTES), (audit_info, TEST_IMAGE_BYTES)])
+        audit_file_path = test_writer.last_file_path
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        normal_file_path = test_writer.last_file_path
+
+        assert audit_file_path.name.endswith(".audit.seg")
+        assert normal_file_path.name.endswith(".normal.seg")
+        self.assert_file_length(audit_file_path, 1)
+        self.assert_file_length(normal_file_path, 2)
+
+    @pytest.mark.parametrize("durability, expected_fsyncs", [("none", 0), ("batch", 1), ("record", 3)])
+    def test_durability_policy(
+        self, test_base_dir: str, test_escalation_info: EscalationInfo, durability: str, expected_fsyncs: int
+    ):
+        writer = QueueWriter(test_base_dir, durability=durability)
+        with patch("app.escalation_queue.queue_writer.os.fsync") as mock_fsync:
+            assert writer.write_escalations([(test_escalation_info, TEST_IMAGE_BYTES)] * 3)
+
+        assert mock_fsync.call_count == expected_fsyncs
 
-        image_path = Path(image_path)
-        assert image_path.is_file()
+    def test_unknown_durability_policy(self, test_base_dir: str):
+        with pytest.raises(ValueError):
+            QueueWriter(test_base_dir, durability="sometimes")
 
-        saved_bytes = image_path.read_bytes()
-        assert saved_bytes == test_image_bytes
 
-    def test_writer_saves_images_to_unique_paths(
-        self, test_writer: QueueWriter, timestamp_str: str, test_image_bytes: bytes
+class TestBackgroundQueueWriter:
+    def _submit(self, writer: BackgroundQueueWriter, image_bytes: bytes) -> tuple[bool, EscalationInfo]:
+        escalation_info = generate_test_escalation_info()
+        return writer.submit(escalation_info, image_bytes), escalation_info
+
+    def test_submitted_escalations_are_written_in_the_background(
+        self, test_background_writer: BackgroundQueueWriter, test_reader: QueueReader, test_image_bytes: bytes
     ):
-        """Verify that multiple images saved with the same detector ID and timestamp are saved to unique paths."""
-        detector_id = "test_id"
-        first_image_path = test_writer.write_image_bytes(test_image_bytes, detector_id, timestamp_str)
-        first_image_path = Path(first_image_path)
-        assert first_image_path.is_file()
+        submitted, escalation_info = self._submit(test_background_writer, test_image_bytes)
+        assert submitted
+        assert test_background_writer.flush(timeout_s=5)
 
-        second_image_path = test_writer.write_image_bytes(test_image_bytes, detector_id, timestamp_str)
-        second_image_path = Path(second_image_path)
-        assert second_image_path.is_file()
+        escalation = next(iter(test_reader))
+        assert EscalationInfo(**json.loads(escalation.line)) == escalation_info
+        assert escalation.image_bytes == test_image_bytes
 
-        assert not first_image_path.samefile(second_image_path)
+    def test_escalations_that_pile_up_are_written_as_one_batch(
+        self, test_base_dir: str, test_reader: QueueReader, test_image_bytes: bytes
+    ):
+        writer = BackgroundQueueWriter(test_base_dir, durability="batch")
+        first_batch_written = threading.Event()
+        disk_is_slow = threading.Event()
+        write_escalations = writer.queue_writer.write_escalations
+
+        def slow_write_escalations(escalations):
+            write_escalations(escalations)
+            first_batch_written.set()
+            disk_is_slow.wait(5)
+
+        with patch.object(writer.queue_writer, "write_escalations", side_effect=slow_write_escalations) as mock:
+            self._submit(writer, test_image_bytes)
+            assert first_batch_written.wait(5)
+            # These pile up while the first escalation is being written
+            escalation_infos = [self._submit(writer, test_image_bytes)[1] for _ in range(3)]
+            disk_is_slow.set()
+            assert writer.flush(timeout_s=5)
+            writer.close()
+
+        assert [len(call.args[0]) for call in mock.call_args_list] == [1, 3]
+        reader_iter = iter(test_reader)
+        next(reader_iter)
+        assert_expected_reader_output(reader_iter, escalation_infos)
+
+    def test_escalations_are_dropped_when_too_many_are_pending(self, test_base_dir: str, test_image_bytes: bytes):
+        writer = BackgroundQueueWriter(test_base_dir, max_pending=2)
+        disk_is_stuck = threading.Event()
+
+        with patch.object(writer.queue_writer, "write_escalations", side_effect=lambda *args: disk_is_stuck.wait(5)):
+            # The first escalation is taken by the background thread, the next two wait for it
+            results = [self._submit(writer, test_image_bytes)[0]]
+            while writer._pending.qsize() > 0:
+                time.sleep(0.01)
+            results += [self._submit(writer, test_image_bytes)[0] for _ in range(3)]
+            disk_is_stuck.set()
+            writer.close()
+
+        assert results == [True, True, True, False]
+        assert writer.num_dropped == 1
+
+    def test_audits_are_shed_while_the_backlog_is_too_large(self, test_base_dir: str, test_image_bytes: bytes):
+        write_drain_status(Path(test_base_dir), {"backlog_bytes": 2000})
+        writer = BackgroundQueueWriter(test_base_dir, audit_shed_bytes=1000)
+        audit_info = generate_test_escalation_info().model_copy(update={"priority": "audit"})
+
+        assert not writer.submit(audit_info, test_image_bytes)
+        assert writer.submit(generate_test_escalation_info(), test_image_bytes)
+        writer.close()
+
+        assert writer.num_audits_shed == 1
+        assert writer.num_dropped == 0
 
 
 class TestQueueReader:
@@ -226,7 +377,7 @@ class TestQueueReader:
             nonlocal call_count
             call_count += 1
             if call_count >= num_wait_calls:
-                test_writer.write_escalation(test_escalation_info)
+                test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
 
         # To prevent indefinite blocking, patch the wait method to write an escalation after being called a certain
         # number of times.
@@ -234,11 +385,94 @@ class TestQueueReader:
             assert_expected_reader_output(test_reader, [test_escalation_info])
             assert mock_wait.call_count == num_wait_calls  # Verify that the reader waited for the specified # of times
 
+    def test_reader_wakes_up_when_a_file_is_written(
+        self, test_base_dir: str, test_escalation_info: EscalationInfo, test_reader: QueueReader
+    ):
+        """Verify that a reader watching the writing directory reads a new file without waiting for a poll."""
+        assert test_reader._choose_new_file() is None
+        assert test_reader._watcher is not None
+
+        # The file is written elsewhere and moved into the writing directory, so that it appears all at once. A reader
+        # may otherwise move a file that a writer just created before the writer writes to it, and the writer then
+        # writes to a new file, which takes the reader a second wait.
+        staging_writer = generate_queue_writer(os.path.join(test_base_dir, "staging"))
+        assert staging_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        staging_writer.close()
+        staged_path = staging_writer.last_file_path
+        threading.Timer(0.2, staged_path.rename, (test_reader.base_writing_dir / staged_path.name,)).start()
+        start = time.monotonic()
+        with patch.object(test_reader._watcher, "wait", wraps=test_reader._watcher.wait) as mock_wait:
+            assert_expected_reader_output(test_reader, [test_escalation_info])
+        assert time.monotonic() - start < 5  # noqa: PLR2004
+        assert mock_wait.call_count == 1
+
+    def test_reader_polls_without_inotify(
+        self, test_base_dir: str, test_escalation_info: EscalationInfo, test_writer: QueueWriter
+    ):
+        reader = QueueReader(test_base_dir, use_inotify=False)
+        assert reader._choose_new_file() is None
+        assert reader._watcher is None
+
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        with patch("app.escalation_queue.queue_reader.time.sleep", wraps=time.sleep) as mock_sleep:
+            assert_expected_reader_output(reader, [test_escalation_info])
+        mock_sleep.assert_called_with(QUEUE_POLL_INTERVAL_S)
+
+    def test_reader_tracks_files_that_are_deleted_before_it_reads_them(
+        self, test_escalation_info: EscalationInfo, test_writer: QueueWriter, test_reader: QueueReader
+    ):
+        """Verify that files deleted from the writing directory (e.g., by retention) are dropped from the index."""
+        assert test_reader._choose_new_file() is None
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        test_writer.last_file_path.unlink()
+        assert test_reader._choose_new_file() is None
+        assert not any(test_reader._pending_files.values())
+
+    def test_reader_reads_a_write_that_races_the_move(
+        self, test_base_dir: str, test_escalation_info: EscalationInfo, test_writer: QueueWriter
+    ):
+        """Verify that a write that locked the file before the reader moved it is read, without waiting a fixed time."""
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        writer_fd = os.open(test_writer.last_file_path, os.O_WRONLY | os.O_APPEND)
+        fcntl.flock(writer_fd, fcntl.LOCK_EX)
+        late_escalation_info = generate_test_escalation_info(detector_id="late_id")
+
+        def finish_write() -> None:
+            os.write(writer_fd, convert_escalation_to_record(late_escalation_info, TEST_IMAGE_BYTES))
+            fcntl.flock(writer_fd, fcntl.LOCK_UN)
+            os.close(writer_fd)
+
+        threading.Timer(0.2, finish_write).start()
+        reader = QueueReader(test_base_dir)
+        try:
+            assert_expected_reader_output(reader, [test_escalation_info, late_escalation_info])
+        finally:
+            reader.close()
+
+    def test_reader_interleaves_priority_classes_by_weight(self, test_writer: QueueWriter, test_reader: QueueReader):
+        for priority in ["audit", "normal", "critical"]:
+            test_writer.write_escalations(
+                [(generate_test_escalation_info().model_copy(update={"priority": priority}), TEST_IMAGE_BYTES)] * 20
+            )
+
+        priorities = [EscalationInfo(**json.loads(escalation.line)).priority for escalation in islice(test_reader, 13)]
+        assert Counter(priorities) == {"critical": 8, "normal": 4, "audit": 1}
+
+    def test_reader_defers_audits_while_the_backlog_is_too_large(self, test_base_dir: str, test_writer: QueueWriter):
+        audit_info = generate_test_escalation_info().model_copy(update={"priority": "audit"})
+        test_writer.write_escalations([(audit_info, TEST_IMAGE_BYTES)] * 3)
+        test_writer.write_escalations([(generate_test_escalation_info(), TEST_IMAGE_BYTES)] * 3)
+        reader = QueueReader(test_base_dir, audit_defer_bytes=0)
+
+        priorities = [EscalationInfo(**json.loads(escalation.line)).priority for escalation in islice(reader, 6)]
+        assert priorities == ["normal"] * 3 + ["audit"] * 3
+        reader.close()
+
     def test_reader_moves_file(
         self, test_reader: QueueReader, test_writer: QueueWriter, test_escalation_info: EscalationInfo
     ):
         """Verify that the reader moves the file being read."""
-        assert test_writer.write_escalation(test_escalation_info)
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
         written_to_path = test_writer.last_file_path
 
         assert_expected_reader_output(test_reader, [test_escalation_info])
@@ -252,7 +486,7 @@ class TestQueueReader:
         _choose_new_file must treat the resulting FileNotFoundError as "no file available" (return None)
         rather than letting it crash the reader loop.
         """
-        assert test_writer.write_escalation(test_escalation_info)
+        assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
 
         def _raise_not_found(*args, **kwargs):
             raise FileNotFoundError
@@ -267,7 +501,7 @@ class TestQueueReader:
         test_escalation_infos = [generate_test_escalation_info(detector_id=f"test_id_{i}") for i in range(3)]
 
         for escalation_info in test_escalation_infos:
-            assert test_writer.write_escalation(escalation_info)
+            assert test_writer.write_escalation(escalation_info, TEST_IMAGE_BYTES)
 
         assert_expected_reader_output(test_reader, test_escalation_infos)
 
@@ -278,8 +512,8 @@ class TestQueueReader:
 
         first_writer = generate_queue_writer(test_base_dir)
         second_writer = generate_queue_writer(test_base_dir)
-        assert first_writer.write_escalation(test_escalation_info_1)
-        assert second_writer.write_escalation(test_escalation_info_2)
+        assert first_writer.write_escalation(test_escalation_info_1, TEST_IMAGE_BYTES)
+        assert second_writer.write_escalation(test_escalation_info_2, TEST_IMAGE_BYTES)
 
         assert_expected_reader_output(test_reader, [test_escalation_info_1, test_escalation_info_2])
 
@@ -290,8 +524,8 @@ class TestQueueReader:
 
         first_writer = generate_queue_writer(test_base_dir)
         second_writer = generate_queue_writer(test_base_dir)
-        assert first_writer.write_escalation(test_escalation_info_1)
-        assert second_writer.write_escalation(test_escalation_info_2)
+        assert first_writer.write_escalation(test_escalation_info_1, TEST_IMAGE_BYTES)
+        assert second_writer.write_escalation(test_escalation_info_2, TEST_IMAGE_BYTES)
 
         reading_dir = test_reader.base_reading_dir
         assert reading_dir.is_dir() and not any(reading_dir.iterdir())
@@ -312,7 +546,7 @@ class TestQueueReader:
         # Write three unique escalations to a file
         test_escalation_infos = [generate_test_escalation_info(detector_id=f"test_id_{i}") for i in range(3)]
         for escalation_info in test_escalation_infos:
-            assert test_writer.write_escalation(escalation_info)
+            assert test_writer.write_escalation(escalation_info, TEST_IMAGE_BYTES)
 
         # Read two lines from the file
         first_reader = generate_queue_reader(test_base_dir)
@@ -328,7 +562,7 @@ class TestQueueReader:
         # Write six unique escalations to a file
         test_escalation_infos = [generate_test_escalation_info(detector_id=f"test_id_{i}") for i in range(6)]
         for escalation_info in test_escalation_infos:
-            assert test_writer.write_escalation(escalation_info)
+            assert test_writer.write_escalation(escalation_info, TEST_IMAGE_BYTES)
 
         # Read the first two lines from the file
         first_reader = generate_queue_reader(test_base_dir)
@@ -348,7 +582,7 @@ class TestQueueReader:
         test_escalation_info_1 = generate_test_escalation_info(detector_id="test_id_1")
         first_writer = generate_queue_writer(test_base_dir)
         for _ in range(3):
-            assert first_writer.write_escalation(test_escalation_info_1)
+            assert first_writer.write_escalation(test_escalation_info_1, TEST_IMAGE_BYTES)
         # Read two lines from the file
         first_reader = generate_queue_reader(test_base_dir)
         assert_expected_reader_output(first_reader, [test_escalation_info_1] * 2)
@@ -356,7 +590,7 @@ class TestQueueReader:
         # Create a new written file
         test_escalation_info_2 = generate_test_escalation_info(detector_id="test_id_2")
         second_writer = generate_queue_writer(test_base_dir)
-        assert second_writer.write_escalation(test_escalation_info_2)
+        assert second_writer.write_escalation(test_escalation_info_2, TEST_IMAGE_BYTES)
 
         # Ensure a new reader will read from the in progress file before the newly written file
         second_reader = generate_queue_reader(test_base_dir)
@@ -369,7 +603,7 @@ class TestQueueReader:
         info_1 = generate_test_escalation_info(detector_id="test_id_1")
         writer = generate_queue_writer(test_base_dir)
         for _ in range(2):
-            assert writer.write_escalation(info_1)
+            assert writer.write_escalation(info_1, TEST_IMAGE_BYTES)
         first_reader = generate_queue_reader(test_base_dir)
         assert_expected_reader_output(first_reader, [info_1])
 
@@ -383,7 +617,7 @@ class TestQueueReader:
 
         # A fresh escalation that should still be read once the orphaned tracker is skipped.
         info_2 = generate_test_escalation_info(detector_id="test_id_2")
-        assert generate_queue_writer(test_base_dir).write_escalation(info_2)
+        assert generate_queue_writer(test_base_dir).write_escalation(info_2, TEST_IMAGE_BYTES)
 
         second_reader = generate_queue_reader(test_base_dir)
         assert_expected_reader_output(second_reader, [info_2])
@@ -392,16 +626,147 @@ class TestQueueReader:
     def test_reader_selects_empty_tracking_file(self, test_base_dir: str, test_writer: QueueWriter):
         """Verify that the reader will select a tracking file even if it contains no tracked escalations."""
         test_escalation_info_1 = generate_test_escalation_info(detector_id="test_id_1")
-        assert test_writer.write_escalation(test_escalation_info_1)
+        assert test_writer.write_escalation(test_escalation_info_1, TEST_IMAGE_BYTES)
         first_reader = generate_queue_reader(test_base_dir)
         assert_expected_reader_output(first_reader, [test_escalation_info_1])
 
         # Now there should be an empty tracking file created by the first reader, which the second reader should select
         test_escalation_info_2 = generate_test_escalation_info(detector_id="test_id_2")
-        assert test_writer.write_escalation(test_escalation_info_2)
+        assert test_writer.write_escalation(test_escalation_info_2, TEST_IMAGE_BYTES)
         second_reader = generate_queue_reader(test_base_dir)
         assert_expected_reader_output(second_reader, [test_escalation_info_1, test_escalation_info_2])
 
+    def test_reader_only_tracks_escalations_up_to_the_first_unacknowledged_one(
+        self, test_base_dir: str, test_writer: QueueWriter, test_reader: QueueReader
+    ):
+        """Verify that escalations consumed out of order are read again after a restart if an earlier one wasn't."""
+        test_escalation_infos = [generate_test_escalation_info(detector_id=f"test_id_{i}") for i in range(3)]
+        for escalation_info in test_escalation_infos:
+            assert test_writer.write_escalation(escalation_info, TEST_IMAGE_BYTES)
+
+        acknowledgements = [acknowledge for _, acknowledge in islice(test_reader.iter_with_acks(), 3)]
+        acknowledgements[1]()
+        acknowledgements[2]()
+
+        # The first escalation wasn't consumed when the reader stopped, so all of them are read again
+        assert_expected_reader_output(generate_queue_reader(test_base_dir), test_escalation_infos)
+
+    def test_reader_deletes_file_once_all_escalations_are_acknowledged(
+        self, test_base_dir: str, test_writer: QueueWriter, test_reader: QueueReader
+    ):
+        """Verify that the reader reads on to the next file while the escalations of a file are still being consumed."""
+        test_escalation_info_1 = generate_test_escalation_info(detector_id="test_id_1")
+        test_escalation_info_2 = generate_test_escalation_info(detector_id="test_id_2")
+        assert test_writer.write_escalation(test_escalation_info_1, TEST_IMAGE_BYTES)
+        first_file_path = test_reader.base_reading_dir / test_writer.last_file_path.name
+        assert generate_queue_writer(test_base_dir).write_escalation(test_escalation_info_2, TEST_IMAGE_BYTES)
+
+        reader_iter = test_reader.iter_with_acks()
+        _, acknowledge_1 = next(reader_iter)
+        escalation_2, _ = next(reader_iter)
+
+        assert EscalationInfo(**json.loads(escalation_2.line)) == test_escalation_info_2
+        assert first_file_path.exists()
+        acknowledge_1()
+        assert not first_file_path.exists()
+
+    def test_reader_reads_past_escalations_of_detectors_without_room(
+        self, test_base_dir: str, test_writer: QueueWriter, test_reader: QueueReader
+    ):
+        """Verify that the reader returns other detectors' escalations first, and the rest once it can't read on."""
+        infos_1 = [generate_test_escalation_info(detector_id="test_id_1") for _ in range(3)]
+        infos_2 = [generate_test_escalation_info(detector_id="test_id_2") for _ in range(2)]
+        for escalation_info in infos_1 + infos_2:
+            assert test_writer.write_escalation(escalation_info, TEST_IMAGE_BYTES)
+
+        reader_iter = test_reader.iter_with_acks(lambda detector_id: detector_id != "test_id_1")
+        read = list(islice(reader_iter, 5))
+        assert [EscalationInfo(**json.loads(escalation.line)) for escalation, _ in read] == infos_2 + infos_1
+        assert all(escalation.image_bytes == TEST_IMAGE_BYTES for escalation, _ in read)
+
+        # The escalations that were read past weren't consumed, so all of them are read again after a restart
+        for _, acknowledge in read[:2]:
+            acknowledge()
+        assert_expected_reader_output(generate_queue_reader(test_base_dir), infos_1 + infos_2)
+
+    def test_detector_with_backlog_does_not_hold_up_other_detectors(
+        self, test_writer: QueueWriter, test_reader: QueueReader
+    ):
+        """Verify that a detector's escalations queued after another detector's large backlog are escalated promptly."""
+        backlog = [
+            generate_test_escalation_info(detector_id="test_id_1", request_id=generate_request_id()) for _ in range(20)
+        ]
+        other_escalations = [
+            generate_test_escalation_info(detector_id="test_id_2", request_id=generate_request_id()) for _ in range(2)
+        ]
+        for escalation_info in backlog + other_escalations:
+            assert test_writer.write_escalation(escalation_info, TEST_IMAGE_BYTES)
+
+        escalated = []
+        other_detector_escalated = threading.Event()
+
+        def escalate(escalation_info: EscalationInfo, escalation: QueuedEscalation) -> None:
+            if escalation_info.detector_id == "test_id_1":
+                # The backlog stays in flight until the other detector's escalations were escalated
+                other_detector_escalated.wait(5)
+            escalated.append(escalation_info.detector_id)
+            if escalated.count("test_id_2") == len(other_escalations):
+                other_detector_escalated.set()
+
+        drain = EscalationDrain(escalate, AdaptiveConcurrencyLimit(4, initial_limit=4), max_in_flight_per_detector=2)
+        for escalation, acknowledge in islice(test_reader.iter_with_acks(drain.has_room), 22):
+            drain.submit(EscalationInfo(**json.loads(escalation.line)), escalation, acknowledge)
+        drain.close()
+
+        assert escalated[:2] == ["test_id_2", "test_id_2"]
+        assert escalated.count("test_id_1") == len(backlog)
+
+    def test_reader_returns_images(self, test_writer: QueueWriter, test_reader: QueueReader):
+        """Verify that the reader returns each escalation's image along with it."""
+        images = [f"image {i}".encode() * 1000 for i in range(3)]
+        for image_bytes in images:
+            assert test_writer.write_escalation(generate_test_escalation_info(), image_bytes)
+
+        assert [escalation.image_bytes for escalation in islice(test_reader, 3)] == images
+
+    def test_reader_skips_incomplete_escalation_at_end_of_file(
+        self,
+        test_base_dir: str,
+        test_writer: QueueWriter,
+        test_reader: QueueReader,
+        test_escalation_info: EscalationInfo,
+    ):
+        """Verify that an escalation that a crashed writer left half-written is skipped, and the file finished."""
+        for _ in range(2):
+            assert test_writer.write_escalation(test_escalation_info, TEST_IMAGE_BYTES)
+        with test_writer.last_file_path.open("ab") as f:
+            f.write(convert_escalation_to_record(test_escalation_info, TEST_IMAGE_BYTES)[:-3])
+        incomplete_file_path = test_reader.base_reading_dir / test_writer.last_file_path.name
+
+        reader_iter = iter(test_reader)
+        assert_expected_reader_output(reader_iter, [test_escalation_info] * 2)
+
+        # The next escalation, in another file, is read once the incomplete escalation is skipped
+        test_escalation_info_2 = generate_test_escalation_info(detector_id="test_id_2")
+        assert generate_queue_writer(test_base_dir).write_escalation(test_escalation_info_2, TEST_IMAGE_BYTES)
+        with patch("app.escalation_queue.queue_reader.logger") as mock_logger:
+            assert_expected_reader_output(reader_iter, [test_escalation_info_2])
+
+        mock_logger.warning.assert_called_once()
+        assert not incomplete_file_path.exists()
+
+    def test_reader_reads_line_files_written_before_segment_files(
+        self, test_base_dir: str, test_reader: QueueReader, timestamp_str: str
+    ):
+        """Verify that escalations queued before an upgrade to segment files are still read, with their image path."""
+        escalation_infos = [generate_test_escalation_info(detector_id=f"test_id_{i}") for i in range(3)]
+        line_file = Path(test_base_dir, "writing", f"{timestamp_str}-{ksuid.KsuidMs()}.txt")
+        line_file.write_text("".join(convert_escalation_info_to_str(info) for info in escalation_infos))
+
+        escalations = list(islice(test_reader, 3))
+        assert [EscalationInfo(**json.loads(escalation.line)) for escalation in escalations] == escalation_infos
+        assert all(escalation.image_bytes is None for escalation in escalations)
+
 
 class TestEscalateOnce:
     @pytest.fixture
@@ -429,6 +794,14 @@ class TestEscalateOnce:
         with pytest.raises(FileNotFoundError):
             _escalate_once(test_escalation_info, submit_iq_request_timeout_s=5)
 
+    def test_escalates_image_from_queue(self, test_escalation_info: EscalationInfo, mock_gl: Mock):
+        """The image read from the queue is escalated, rather than one read from the escalation's image path."""
+        test_escalation_info.image_path_str = None
+        with patch("app.escalation_queue.manage_reader.safe_call_sdk") as mock_safe_call_sdk:
+            _escalate_once(test_escalation_info, submit_iq_request_timeout_s=5, image_bytes=TEST_IMAGE_BYTES)
+
+        assert mock_safe_call_sdk.call_args.kwargs["image"] == TEST_IMAGE_BYTES
+
     def test_no_connection_during_submit(self, test_escalation_info: EscalationInfo, mock_gl: Mock):
         """If submitting the IQ fails due to connection problems, _escalate_once should raise MaxRetryError."""
         err = MaxRetryError(pool=None, url=None)
@@ -500,6 +873,20 @@ class TestConsumeQueuedEscalation:
         actual_waits = [call_args[0][0] for call_args in mock_sleep.call_args_list]
         assert actual_waits == expected_waits
 
+    def test_attempts_adjust_the_concurrency_limit(self, test_escalation_info: EscalationInfo):
+        """Retryable failures lower the concurrency limit of the drain, and successes raise it."""
+        concurrency_limit = Mock()
+        side_effects = [HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS), Mock()]
+
+        with (
+            patch("app.escalation_queue.manage_reader._escalate_once", side_effect=side_effects),
+            patch("app.escalation_queue.manage_reader.time.sleep"),
+        ):
+            consume_queued_escalation(test_escalation_info, concurrency_limit=concurrency_limit)
+
+        concurrency_limit.on_overload.assert_called_once()
+        concurrency_limit.on_success.assert_called_once()
+
     def test_deletes_image_on_completion(self, test_request_cache: RequestCache, test_escalation_info: EscalationInfo):
         """The image for the escalation should be deleted by read_from_escalation_queue."""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -512,7 +899,7 @@ class TestConsumeQueuedEscalation:
             dummy_result = Mock()
 
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([escalation_str])),
+                patch_queue_reader([QueuedEscalation(escalation_str, None)]),
                 patch("app.escalation_queue.manage_reader._escalate_once", return_value=dummy_result) as mock_escalate,
             ):
                 read_from_escalation_queue(generate_queue_reader(temp_dir), test_request_cache)
@@ -531,7 +918,7 @@ class TestConsumeQueuedEscalation:
             escalation_str = convert_escalation_info_to_str(test_escalation_info)
 
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([escalation_str])),
+                patch_queue_reader([QueuedEscalation(escalation_str, None)]),
                 patch(
                     "app.escalation_queue.manage_reader._escalate_once",
                     side_effect=RuntimeError("permanent failure"),
@@ -558,7 +945,9 @@ class TestConsumeQueuedEscalation:
 
             dummy_iq = Mock(id="test-iq-id")
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([escalation_str_1, escalation_str_2])),
+                patch_queue_reader(
+                    [QueuedEscalation(escalation_str_1, None), QueuedEscalation(escalation_str_2, None)]
+                ),
                 patch("app.escalation_queue.manage_reader._escalate_once", return_value=dummy_iq) as mock_escalate,
             ):
                 read_from_escalation_queue(generate_queue_reader(str(test_request_cache.cache_dir)), test_request_cache)
@@ -578,7 +967,7 @@ class TestReadFromEscalationQueue:
                 temp_image = Path(temp_dir) / f"image{i}.jpeg"
                 shutil.copy("test/assets/cat.jpeg", temp_image)
                 info = generate_test_escalation_info(request_id=generate_request_id(), image_path=str(temp_image))
-                escalation_strs.append(convert_escalation_info_to_str(info))
+                escalation_strs.append(QueuedEscalation(convert_escalation_info_to_str(info), None))
 
             mock_request_cache = Mock()
             mock_request_cache.contains.return_value = False
@@ -588,7 +977,7 @@ class TestReadFromEscalationQueue:
                 patch(
                     "app.escalation_queue.manage_reader.consume_queued_escalation",
                 ) as mock_consume_escalation,
-                patch.object(QueueReader, "__iter__", return_value=iter(escalation_strs)),
+                patch_queue_reader(escalation_strs),
             ):
                 dummy_iq = Mock(id="test-iq-id")
                 mock_consume_escalation.return_value = dummy_iq
@@ -596,6 +985,20 @@ class TestReadFromEscalationQueue:
 
             assert mock_consume_escalation.call_count == num_escalations
 
+    def test_escalates_with_image_from_queue(self, test_reader: QueueReader, test_request_cache: RequestCache):
+        """Verifies that the image read from the queue is escalated, and that no image file is deleted."""
+        escalation_info = generate_test_escalation_info(request_id=generate_request_id())
+        escalation = QueuedEscalation(convert_escalation_info_to_str(escalation_info), TEST_IMAGE_BYTES)
+
+        with (
+            patch_queue_reader([escalation]),
+            patch("app.escalation_queue.manage_reader._escalate_once", return_value=Mock(id="test-iq-id")) as mock,
+        ):
+            read_from_escalation_queue(test_reader, test_request_cache)
+
+        assert mock.call_args.kwargs["image_bytes"] == TEST_IMAGE_BYTES
+        assert Path(escalation_info.image_path_str).exists()
+
     def test_continues_after_corrupted_line(self, test_reader: QueueReader, test_request_cache: RequestCache):
         """Verifies that read_from_escalation_queue continues processing after a corrupted line."""
         corrupted_line = "\x00\x00corrupted\x00\x00"
@@ -615,12 +1018,14 @@ class TestReadFromEscalationQueue:
                 generate_test_escalation_info(request_id=generate_request_id(), image_path=str(temp_image_2))
             )
             # Sequence: valid, corrupted, valid - should process both valid lines
-            escalation_strs = [escalation_str_1, corrupted_line, escalation_str_2]
+            escalation_strs = [
+                QueuedEscalation(line, None) for line in [escalation_str_1, corrupted_line, escalation_str_2]
+            ]
 
             dummy_iq = Mock(id="test-iq-id")
 
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter(escalation_strs)),
+                patch_queue_reader(escalation_strs),
                 patch(
                     "app.escalation_queue.manage_reader._escalate_once",
                     return_value=dummy_iq,
@@ -647,7 +1052,7 @@ class TestReadFromEscalationQueue:
                 )
             )
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([escalation_str])),
+                patch_queue_reader([QueuedEscalation(escalation_str, None)]),
                 patch(
                     "app.escalation_queue.manage_reader.consume_queued_escalation",
                     side_effect=FileNotFoundError("image gone"),
@@ -677,7 +1082,7 @@ class TestQueueUtils:
 
     def test_write_escalation_to_queue_successful(
         self,
-        test_writer: QueueWriter,
+        test_background_writer: BackgroundQueueWriter,
         test_reader: QueueReader,
         test_escalation_info: EscalationInfo,
         test_image_bytes: bytes,
@@ -685,32 +1090,34 @@ class TestQueueUtils:
     ):
         """Verifies that write_escalation_to_queue properly writes all information to the queue."""
         write_escalation_to_queue(
-            test_writer,
+            test_background_writer,
             test_escalation_info.detector_id,
             test_image_bytes,
             test_submit_iq_params,
             test_escalation_info.request_id,
         )
+        assert test_background_writer.flush(timeout_s=5)
 
-        next_escalation_info = EscalationInfo(**json.loads(next(iter(test_reader))))
+        next_escalation = next(iter(test_reader))
+        next_escalation_info = EscalationInfo(**json.loads(next_escalation.line))
         assert next_escalation_info.detector_id == test_escalation_info.detector_id
         assert next_escalation_info.submit_iq_params == test_submit_iq_params
-        assert Path(next_escalation_info.image_path_str).read_bytes() == test_image_bytes
+        assert next_escalation.image_bytes == test_image_bytes
 
     def test_write_escalation_to_queue_catches_exception(
         self,
-        test_writer: QueueWriter,
+        test_background_writer: BackgroundQueueWriter,
         test_escalation_info: EscalationInfo,
         test_image_bytes: bytes,
         test_submit_iq_params: SubmitImageQueryParams,
     ):
         """Verifies that write_escalation_to_queue catches raised exceptions."""
         with (
-            patch.object(test_writer, "write_image_bytes", Mock(side_effect=Exception())),
+            patch.object(test_background_writer, "submit", Mock(side_effect=Exception())),
             patch("app.escalation_queue.queue_utils.logger") as mock_logger,
         ):
             write_escalation_to_queue(
-                test_writer,
+                test_background_writer,
                 test_escalation_info.detector_id,
                 test_image_bytes,
                 test_submit_iq_params,
@@ -771,4 +1178,5 @@ class TestQueueUtils:
                 image_bytes=test_image_bytes,
                 submit_iq_params=test_escalation_info.submit_iq_params,
                 request_id=test_escalation_info.request_id,
+                priority="critical",
             )
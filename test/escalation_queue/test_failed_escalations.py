@@ -18,7 +18,7 @@ from app.escalation_queue.failed_escalations import (
 )
 from app.escalation_queue.manage_reader import read_from_escalation_queue
 from app.escalation_queue.models import EscalationInfo, SubmitImageQueryParams
-from app.escalation_queue.queue_reader import QueueReader
+from app.escalation_queue.queue_reader import QueuedEscalation, QueueReader
 from app.escalation_queue.queue_writer import convert_escalation_info_to_str
 from app.escalation_queue.request_cache import RequestCache
 
@@ -159,6 +159,11 @@ class TestMetricsSummary:
         assert isinstance(summary["failed_last_hour_by_exception"], str)
 
 
+def patch_queue_reader(escalations: list[QueuedEscalation]):
+    """Patches the QueueReader to return the escalations, each with a mock acknowledgement function."""
+    return patch.object(QueueReader, "iter_with_acks", return_value=iter([(e, Mock()) for e in escalations]))
+
+
 class TestFailureRecordingIntegration:
     """Tests that read_from_escalation_queue calls record_failed_escalation correctly."""
 
@@ -188,7 +193,7 @@ class TestFailureRecordingIntegration:
             cache = RequestCache(tmp)
             err = FileNotFoundError("Image file missing.")
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([escalation_str])),
+                patch_queue_reader([QueuedEscalation(escalation_str, None)]),
                 patch("app.escalation_queue.manage_reader._escalate_once", side_effect=err),
                 patch("app.escalation_queue.manage_reader.record_failed_escalation") as mock_record,
             ):
@@ -206,7 +211,7 @@ class TestFailureRecordingIntegration:
             cache = RequestCache(tmp)
             dummy_iq = Mock()
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([escalation_str, escalation_str])),
+                patch_queue_reader([QueuedEscalation(escalation_str, None)] * 2),
                 patch("app.escalation_queue.manage_reader._escalate_once", return_value=dummy_iq),
                 patch("app.escalation_queue.manage_reader.record_failed_escalation") as mock_record,
             ):
@@ -221,7 +226,7 @@ class TestFailureRecordingIntegration:
             cache = RequestCache(tmp)
             side_effects = [MaxRetryError(pool=None, url=None), Mock()]
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([escalation_str])),
+                patch_queue_reader([QueuedEscalation(escalation_str, None)]),
                 patch("app.escalation_queue.manage_reader._escalate_once", side_effect=side_effects),
                 patch("app.escalation_queue.manage_reader.time.sleep"),
                 patch("app.escalation_queue.manage_reader.record_failed_escalation") as mock_record,
@@ -237,7 +242,7 @@ class TestFailureRecordingIntegration:
             cache = RequestCache(tmp)
             malformed = "not valid json {{{"
             with (
-                patch.object(QueueReader, "__iter__", return_value=iter([malformed])),
+                patch_queue_reader([QueuedEscalation(malformed, None)]),
                 patch("app.escalation_queue.manage_reader.record_failed_escalation") as mock_record,
             ):
                 read_from_escalation_queue(reader, cache)
@@ -0,0 +1,20 @@
+from app.escalation_queue.priorities import WeightedRoundRobin
+
+
+def test_classes_are_chosen_in_proportion_to_their_weights():
+    scheduler = WeightedRoundRobin({"critical": 8, "normal": 4, "audit": 1})
+
+    choices = [scheduler.choose(["critical", "normal", "audit"]) for _ in range(13)]
+
+    assert choices.count("critical") == 8  # noqa: PLR2004
+    assert choices.count("normal") == 4  # noqa: PLR2004
+    assert choices.count("audit") == 1
+    # The choices of a class are spread out rather than bunched together
+    assert choices[:3] == ["critical", "normal", "critical"]
+
+
+def test_only_candidates_are_chosen():
+    scheduler = WeightedRoundRobin({"critical": 8, "normal": 4, "audit": 1})
+
+    assert [scheduler.choose(["audit"]) for _ in range(3)] == ["audit"] * 3
+    assert scheduler.choose(["normal", "audit"]) == "normal"
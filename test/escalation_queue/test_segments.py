@@ -0,0 +1,46 @@
+from app.escalation_queue.segments import (
+    encode_record,
+    encode_tracked_offset,
+    read_records,
+    read_tracked_offset,
+)
+
+
+def test_records_are_read_back():
+    records = [(b'{"detector_id": "det_a"}\n', b"image a"), (b'{"detector_id": "det_b"}\n', b"")]
+    segment = b"".join(encode_record(metadata, image_bytes) for metadata, image_bytes in records)
+
+    read_back = list(read_records(segment))
+
+    assert [(record.metadata, record.image_bytes) for record in read_back] == records
+    assert read_back[-1].end_offset == len(segment)
+    assert list(read_records(segment, read_back[0].end_offset)) == read_back[1:]
+
+
+def test_reading_stops_at_a_corrupt_record():
+    first_record = encode_record(b"{}\n", b"image a")
+    corrupt_record = bytearray(encode_record(b"{}\n", b"image b"))
+    corrupt_record[-1] ^= 0xFF
+    segment = first_record + bytes(corrupt_record) + encode_record(b"{}\n", b"image c")
+
+    assert [record.image_bytes for record in read_records(segment)] == [b"image a"]
+
+
+def test_reading_stops_at_an_incomplete_record():
+    record = encode_record(b"{}\n", b"image a")
+
+    for length in [1, 10, len(record) - 1]:
+        assert list(read_records(record + record[:length])) == list(read_records(record))
+
+
+def test_tracked_offset_is_the_last_complete_one(tmp_path):
+    tracking_path = tmp_path / "tracking-segment.seg"
+    assert read_tracked_offset(tracking_path) == 0
+
+    tracking_path.write_bytes(encode_tracked_offset(100) + encode_tracked_offset(250))
+    assert read_tracked_offset(tracking_path) == 250
+
+    # An offset that was cut off while being written
+    with tracking_path.open("ab") as tracker:
+        tracker.write(encode_tracked_offset(400)[:3])
+    assert read_tracked_offset(tracking_path) == 250
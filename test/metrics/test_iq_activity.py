@@ -6,11 +6,14 @@ from unittest.mock import patch
 
 import pytest
 
+from app.metrics.activity_store import HourlyActivityStore
 from app.metrics.iq_activity import (
     ActivityRetriever,
     ConfidenceHistogramConfig,
     FilesystemActivityTrackingHelper,
     clear_old_activity_files,
+    flush_activity_metrics,
+    migrate_legacy_activity_files,
     record_activity_for_metrics,
     record_confidence_for_metrics,
 )
@@ -36,62 +39,83 @@ def test_initial_directories(tmp_base_dir, _test_tracker):
 def test_activity_tracking(monkeypatch, tmp_base_dir, _test_tracker):
     monkeypatch.setattr("app.metrics.iq_activity._tracker", lambda: _test_tracker)
     monkeypatch.setattr(os, "getpid", lambda: 12345)
+    det = "det_recordactivitytest"
+    hour = "2025-04-03_12"
 
-    # Record an IQ, check that the last_iq file, iqs file, and detector-specific iqs file are all
+    # Record an IQ, check that the last_iq file, iqs counter, and detector-specific iqs counter are all
     # created and have the correct values
     with patch("app.metrics.iq_activity.datetime") as mock_datetime:
         mock_datetime.now.return_value = datetime(2025, 4, 3, 12, 0, 0)
 
-        # Record an IQ, make sure that an hourly file is created with the right PID for this detector
-        record_activity_for_metrics("det_recordactivitytest", "iqs")
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "iqs_12345_2025-04-03_12").exists()
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "iqs_12345_2025-04-03_12").read_text() == "1"
+        # Record an IQ, make sure that it is counted in the hourly database for this detector
+        record_activity_for_metrics(det, "iqs")
+        flush_activity_metrics()
+        assert Path(tmp_base_dir, "hourly", f"activity_{hour}.sqlite").exists()
+        assert _test_tracker.hourly_counts(hour, det)["iqs"] == 1
         # Also make sure that the last_iqs file is created and updated correctly for the edge endpoint and the individual detector
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "last_iqs").exists()
+        assert Path(tmp_base_dir, "detectors", det, "last_iqs").exists()
         assert Path(tmp_base_dir, "last_iqs").exists()
 
-        # Record another IQ, it updates the hourly file for the same PID
-        record_activity_for_metrics("det_recordactivitytest", "iqs")
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "iqs_12345_2025-04-03_12").read_text() == "2"
+        # Record another IQ, it adds to the same counter
+        record_activity_for_metrics(det, "iqs")
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["iqs"] == 2
 
-        # Switch PIDs, and then make sure a new hourly file is created and the one for the other PID remains the same
+        # Switch PIDs, the counts of every process end up in the same counter
         monkeypatch.setattr(os, "getpid", lambda: 67890)
 
-        record_activity_for_metrics("det_recordactivitytest", "iqs")
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "iqs_67890_2025-04-03_12").exists()
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "iqs_67890_2025-04-03_12").read_text() == "1"
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "iqs_12345_2025-04-03_12").read_text() == "2"
+        record_activity_for_metrics(det, "iqs")
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["iqs"] == 3
+        assert not list(Path(tmp_base_dir, "detectors", det).glob(f"*_{hour}"))
 
-        # Record an escalation and an audit, make sure the detector-specific files are created and have
-        # the correct values
-        record_activity_for_metrics("det_recordactivitytest", "escalations")
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "escalations_67890_2025-04-03_12").exists()
-        assert (
-            Path(tmp_base_dir, "detectors", "det_recordactivitytest", "escalations_67890_2025-04-03_12").read_text()
-            == "1"
-        )
+        # Record an escalation and an audit, make sure the detector-specific counters have the correct values
+        record_activity_for_metrics(det, "escalations")
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["escalations"] == 1
         assert Path(tmp_base_dir, "last_escalations").exists()
-        record_activity_for_metrics("det_recordactivitytest", "audits")
-        assert Path(tmp_base_dir, "detectors", "det_recordactivitytest", "audits_67890_2025-04-03_12").exists()
-        assert (
-            Path(tmp_base_dir, "detectors", "det_recordactivitytest", "audits_67890_2025-04-03_12").read_text() == "1"
-        )
+        record_activity_for_metrics(det, "audits")
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["audits"] == 1
         assert Path(tmp_base_dir, "last_audits").exists()
 
-        # Record below_threshold_iqs, make sure the detector-specific files are created and have the correct values
-        record_activity_for_metrics("det_recordactivitytest", "below_threshold_iqs")
-        assert Path(
-            tmp_base_dir, "detectors", "det_recordactivitytest", "below_threshold_iqs_67890_2025-04-03_12"
-        ).exists()
-        assert (
-            Path(
-                tmp_base_dir, "detectors", "det_recordactivitytest", "below_threshold_iqs_67890_2025-04-03_12"
-            ).read_text()
-            == "1"
-        )
+        # Record below_threshold_iqs, make sure the detector-specific counter has the correct value
+        record_activity_for_metrics(det, "below_threshold_iqs")
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["below_threshold_iqs"] == 1
         assert Path(tmp_base_dir, "last_below_threshold_iqs").exists()
 
 
+def test_activity_is_buffered_until_flushed(monkeypatch, tmp_base_dir, _test_tracker):
+    monkeypatch.setattr("app.metrics.iq_activity._tracker", lambda: _test_tracker)
+    det_dir = Path(tmp_base_dir, "detectors", "det_buffered")
+    hour = "2025-04-03_14"
+    activity_time = datetime(2025, 4, 3, 14, 30, 0)
+
+    with patch("app.metrics.iq_activity.datetime") as mock_datetime:
+        mock_datetime.now.return_value = activity_time
+        for _ in range(3):
+            record_activity_for_metrics("det_buffered", "iqs")
+            record_confidence_for_metrics("det_buffered", 0.73)
+
+        # Nothing is written on the request path
+        assert "iqs" not in _test_tracker.hourly_counts(hour, "det_buffered")
+        assert not Path(det_dir, "last_iqs").exists()
+
+        flush_activity_metrics()
+        counts = _test_tracker.hourly_counts(hour, "det_buffered")
+        assert counts["iqs"] == 3
+        assert counts["confidence_v2_70-75"] == 3
+        # The last activity time is when the activity happened, not when it was flushed
+        assert Path(det_dir, "last_iqs").stat().st_mtime == activity_time.timestamp()
+
+        # Later flushes add to the counts already on disk
+        record_activity_for_metrics("det_buffered", "iqs")
+        flush_activity_metrics()
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, "det_buffered")["iqs"] == 4
+
+
 def test_wrong_activity_type():
     with pytest.raises(ValueError):
         record_activity_for_metrics("det_123", "wrong_activity_type")
@@ -350,61 +374,32 @@ def test_bucket_name_to_index():
 def test_record_confidence_for_metrics(monkeypatch, tmp_base_dir, _test_tracker):
     """Test recording confidence values for histogram tracking."""
     monkeypatch.setattr("app.metrics.iq_activity._tracker", lambda: _test_tracker)
-    monkeypatch.setattr(os, "getpid", lambda: 11111)
+    det = "det_confidence_test"
+    hour = "2025-04-03_14"
 
     with patch("app.metrics.iq_activity.datetime") as mock_datetime:
         mock_datetime.now.return_value = datetime(2025, 4, 3, 14, 0, 0)
 
         # Record some confidence values (without class_index for backwards compat)
-        record_confidence_for_metrics("det_confidence_test", 0.73)
-        assert Path(
-            tmp_base_dir, "detectors", "det_confidence_test", "confidence_v2_70-75_11111_2025-04-03_14"
-        ).exists()
-        assert (
-            Path(
-                tmp_base_dir, "detectors", "det_confidence_test", "confidence_v2_70-75_11111_2025-04-03_14"
-            ).read_text()
-            == "1"
-        )
+        record_confidence_for_metrics(det, 0.73)
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["confidence_v2_70-75"] == 1
 
         # Record another value in the same bucket
-        record_confidence_for_metrics("det_confidence_test", 0.71)
-        assert (
-            Path(
-                tmp_base_dir, "detectors", "det_confidence_test", "confidence_v2_70-75_11111_2025-04-03_14"
-            ).read_text()
-            == "2"
-        )
+        record_confidence_for_metrics(det, 0.71)
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["confidence_v2_70-75"] == 2
 
         # Record in a different bucket
-        record_confidence_for_metrics("det_confidence_test", 0.95)
-        assert Path(
-            tmp_base_dir, "detectors", "det_confidence_test", "confidence_v2_95-100_11111_2025-04-03_14"
-        ).exists()
-        assert (
-            Path(
-                tmp_base_dir, "detectors", "det_confidence_test", "confidence_v2_95-100_11111_2025-04-03_14"
-            ).read_text()
-            == "1"
-        )
+        record_confidence_for_metrics(det, 0.95)
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["confidence_v2_95-100"] == 1
 
-        # Record from a different PID
-        monkeypatch.setattr(os, "getpid", lambda: 22222)
-        record_confidence_for_metrics("det_confidence_test", 0.72)
-        assert Path(
-            tmp_base_dir, "detectors", "det_confidence_test", "confidence_v2_70-75_22222_2025-04-03_14"
-        ).exists()
+        # Verify no per-class counters were recorded when class_index was omitted
+        per_class_counters = [name for name in _test_tracker.hourly_counts(hour, det) if "_class_" in name]
         assert (
-            Path(
-                tmp_base_dir, "detectors", "det_confidence_test", "confidence_v2_70-75_22222_2025-04-03_14"
-            ).read_text()
-            == "1"
-        )
-
-        # Verify no per-class files were created when class_index was omitted
-        det_dir = Path(tmp_base_dir, "detectors", "det_confidence_test")
-        per_class_files = list(det_dir.glob("confidence_v2_class_*"))
-        assert per_class_files == [], f"Per-class files should not exist without class_index: {per_class_files}"
+            per_class_counters == []
+        ), f"Per-class counters should not exist without class_index: {per_class_counters}"
 
 
 def test_get_detector_confidence_histogram(monkeypatch, tmp_base_dir, _test_tracker):
@@ -602,79 +597,64 @@ def test_detector_activity_metrics_includes_histogram(monkeypatch, tmp_base_dir,
 
 
 def test_record_confidence_with_class_index(monkeypatch, tmp_base_dir, _test_tracker):
-    """Test recording confidence values with class_index creates per-class files."""
+    """Test recording confidence values with class_index records per-class counters."""
     monkeypatch.setattr("app.metrics.iq_activity._tracker", lambda: _test_tracker)
-    monkeypatch.setattr(os, "getpid", lambda: 33333)
+    det = "det_per_class_conf"
+    hour = "2025-04-03_22"
 
     with patch("app.metrics.iq_activity.datetime") as mock_datetime:
         mock_datetime.now.return_value = datetime(2025, 4, 3, 22, 0, 0)
 
         # Record confidence with class_index=0
-        record_confidence_for_metrics("det_per_class_conf", 0.75, class_index=0)
+        record_confidence_for_metrics(det, 0.75, class_index=0)
+        flush_activity_metrics()
 
-        # Check aggregate file exists
-        assert Path(tmp_base_dir, "detectors", "det_per_class_conf", "confidence_v2_75-80_33333_2025-04-03_22").exists()
-        assert (
-            Path(tmp_base_dir, "detectors", "det_per_class_conf", "confidence_v2_75-80_33333_2025-04-03_22").read_text()
-            == "1"
-        )
-
-        # Check per-class file exists
-        assert Path(
-            tmp_base_dir, "detectors", "det_per_class_conf", "confidence_v2_class_0_75-80_33333_2025-04-03_22"
-        ).exists()
-        assert (
-            Path(
-                tmp_base_dir, "detectors", "det_per_class_conf", "confidence_v2_class_0_75-80_33333_2025-04-03_22"
-            ).read_text()
-            == "1"
-        )
+        # Check both the aggregate and the per-class counter
+        counts = _test_tracker.hourly_counts(hour, det)
+        assert counts["confidence_v2_75-80"] == 1
+        assert counts["confidence_v2_class_0_75-80"] == 1
 
         # Record with class_index=1
-        record_confidence_for_metrics("det_per_class_conf", 0.85, class_index=1)
-
-        assert Path(
-            tmp_base_dir, "detectors", "det_per_class_conf", "confidence_v2_class_1_85-90_33333_2025-04-03_22"
-        ).exists()
+        record_confidence_for_metrics(det, 0.85, class_index=1)
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["confidence_v2_class_1_85-90"] == 1
 
         # Record another value for class_index=0
-        record_confidence_for_metrics("det_per_class_conf", 0.78, class_index=0)
-        assert (
-            Path(
-                tmp_base_dir, "detectors", "det_per_class_conf", "confidence_v2_class_0_75-80_33333_2025-04-03_22"
-            ).read_text()
-            == "2"
-        )
+        record_confidence_for_metrics(det, 0.78, class_index=0)
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["confidence_v2_class_0_75-80"] == 2
 
 
 def test_record_activity_with_class_index(monkeypatch, tmp_base_dir, _test_tracker):
-    """Test recording activity with class_index creates per-class files."""
+    """Test recording activity with class_index records per-class counters."""
     monkeypatch.setattr("app.metrics.iq_activity._tracker", lambda: _test_tracker)
-    monkeypatch.setattr(os, "getpid", lambda: 44444)
+    det = "det_per_class_act"
+    hour = "2025-04-03_23"
 
     with patch("app.metrics.iq_activity.datetime") as mock_datetime:
         mock_datetime.now.return_value = datetime(2025, 4, 3, 23, 0, 0)
 
         # Record below_threshold_iqs with class_index
-        record_activity_for_metrics("det_per_class_act", "below_threshold_iqs", class_index=0)
-
-        # Check aggregate file exists
-        assert Path(tmp_base_dir, "detectors", "det_per_class_act", "below_threshold_iqs_44444_2025-04-03_23").exists()
+        record_activity_for_metrics(det, "below_threshold_iqs", class_index=0)
+        flush_activity_metrics()
 
-        # Check per-class file exists
-        assert Path(
-            tmp_base_dir, "detectors", "det_per_class_act", "below_threshold_iqs_class_0_44444_2025-04-03_23"
-        ).exists()
+        # Check both the aggregate and the per-class counter
+        counts = _test_tracker.hourly_counts(hour, det)
+        assert counts["below_threshold_iqs"] == 1
+        assert counts["below_threshold_iqs_class_0"] == 1
 
         # Record escalations with class_index
-        record_activity_for_metrics("det_per_class_act", "escalations", class_index=1)
-        assert Path(tmp_base_dir, "detectors", "det_per_class_act", "escalations_class_1_44444_2025-04-03_23").exists()
+        record_activity_for_metrics(det, "escalations", class_index=1)
+        flush_activity_metrics()
+        assert _test_tracker.hourly_counts(hour, det)["escalations_class_1"] == 1
 
-        # Record iqs with class_index (should NOT create per-class file - iqs doesn't support per-class)
-        record_activity_for_metrics("det_per_class_act", "iqs", class_index=0)
-        assert Path(tmp_base_dir, "detectors", "det_per_class_act", "iqs_44444_2025-04-03_23").exists()
-        # No per-class file for iqs
-        assert not Path(tmp_base_dir, "detectors", "det_per_class_act", "iqs_class_0_44444_2025-04-03_23").exists()
+        # Record iqs with class_index (should NOT record a per-class counter - iqs doesn't support per-class)
+        record_activity_for_metrics(det, "iqs", class_index=0)
+        flush_activity_metrics()
+        counts = _test_tracker.hourly_counts(hour, det)
+        assert counts["iqs"] == 1
+        # No per-class counter for iqs
+        assert "iqs_class_0" not in counts
 
 
 def test_get_confidence_histogram_with_per_class(monkeypatch, tmp_base_dir, _test_tracker):
@@ -736,13 +716,13 @@ def test_get_per_class_activity(monkeypatch, tmp_base_dir, _test_tracker):
     Path(det_dir, f"below_threshold_iqs_class_0_11111_{hour}").write_text("10")
     Path(det_dir, f"below_threshold_iqs_class_1_11111_{hour}").write_text("15")
 
-    hourly_files = list(det_dir.glob(f"*_{hour}"))
+    hourly_counts = _test_tracker.hourly_counts(hour, det)
 
-    escalations_by_class = retriever.get_per_class_activity(det, "escalations", hourly_files)
+    escalations_by_class = retriever.get_per_class_activity(det, "escalations", hourly_counts)
     assert escalations_by_class["0"] == 8  # 5 + 3
     assert escalations_by_class["1"] == 7
 
-    below_threshold_by_class = retriever.get_per_class_activity(det, "below_threshold_iqs", hourly_files)
+    below_threshold_by_class = retriever.get_per_class_activity(det, "below_threshold_iqs", hourly_counts)
     assert below_threshold_by_class["0"] == 10
     assert below_threshold_by_class["1"] == 15
 
@@ -799,3 +779,54 @@ def test_get_detector_activity_metrics_with_per_class(monkeypatch, tmp_base_dir,
         assert histogram["counts"][14] == 50
         assert histogram["by_class"]["0"][14] == 30
         assert histogram["by_class"]["1"][14] == 20
+
+
+# ============== Hourly Store Tests ==============
+
+
+def test_hourly_activity_store(tmp_path):
+    """Test that counts from several writers are added up per hour and that old hours are deleted."""
+    store = HourlyActivityStore(tmp_path)
+
+    store.add("2025-04-05_10", {("det_a", "iqs"): 3, ("det_b", "iqs"): 1, ("", "iqs"): 4})
+    store.add("2025-04-05_10", {("det_a", "iqs"): 2, ("det_a", "escalations_class_0"): 1})
+    store.add("2025-04-05_11", {("det_a", "iqs"): 7})
+
+    assert store.counts("2025-04-05_10", "det_a") == {"iqs": 5, "escalations_class_0": 1}
+    assert store.counts("2025-04-05_10", "det_b") == {"iqs": 1}
+    assert store.counts("2025-04-05_10") == {"iqs": 4}
+    assert store.counts("2025-04-05_12", "det_a") == {}
+
+    store.delete_hours_except(["2025-04-05_11"])
+    assert store.hours() == ["2025-04-05_11"]
+    assert store.counts("2025-04-05_10", "det_a") == {}
+    assert store.counts("2025-04-05_11", "det_a") == {"iqs": 7}
+
+
+def test_migrate_legacy_activity_files(monkeypatch, tmp_path):
+    """Test that files of the old per-process layout are moved into the hourly databases."""
+    tracker = FilesystemActivityTrackingHelper(tmp_path)
+    monkeypatch.setattr("app.metrics.iq_activity._tracker", lambda: tracker)
+    det_dir = tracker.detector_folder("det_legacy")
+
+    Path(det_dir, "iqs_11111_2025-04-05_09").write_text("4")
+    Path(det_dir, "iqs_22222_2025-04-05_09").write_text("3")
+    Path(det_dir, "confidence_v2_class_1_70-75_11111_2025-04-05_10").write_text("2")
+    Path(det_dir, "iqs_11111_2025-04-05_01").write_text("9")  # Too old to keep
+    Path(det_dir, "last_iqs").touch()
+    Path(tmp_path, "iqs_11111_2025-04-05_09").write_text("7")
+
+    with patch("app.metrics.iq_activity.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime(2025, 4, 5, 10, 30, 0)
+        migrate_legacy_activity_files()
+
+        assert not tracker.legacy_files_may_exist()
+        assert list(det_dir.iterdir()) == [Path(det_dir, "last_iqs")]
+        assert tracker.hourly_counts("2025-04-05_09", "det_legacy") == {"iqs": 7}
+        assert tracker.hourly_counts("2025-04-05_10", "det_legacy") == {"confidence_v2_class_1_70-75": 2}
+        assert tracker.hourly_counts("2025-04-05_09") == {"iqs": 7}
+        assert tracker.store.hours().count("2025-04-05_01") == 0
+
+        # Migrating again changes nothing
+        migrate_legacy_activity_files()
+        assert tracker.hourly_counts("2025-04-05_09", "det_legacy") == {"iqs": 7}
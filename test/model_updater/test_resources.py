@@ -0,0 +1,92 @@
+from unittest import mock
+
+from app.model_updater import resources
+from app.model_updater.resources import Footprint, FootprintLedger, ResourceSnapshot, take_resource_snapshot
+
+GB = 10**9
+
+
+def _collected_metrics() -> dict:
+    """A `ResourceMetricsCollector.collect` payload, with only the fields that resource snapshots use."""
+
+    def _detector(detector_id: str, ram_bytes: int, vram_bytes: int) -> dict:
+        return {
+            "detector_id": detector_id,
+            "ram_bytes": {"total": ram_bytes},
+            "gpu": {"vram_bytes": {"total": vram_bytes}},
+        }
+
+    return {
+        "system": {
+            "ram_bytes": {"total": 16 * GB, "used": 6 * GB, "eviction_threshold_pct": 90},
+            "gpu": {"vram_bytes": {"total": 8 * GB, "used": 3 * GB}},
+        },
+        "detectors": [_detector("det_a", 2 * GB, GB), _detector("det_b", 3 * GB, 2 * GB)],
+    }
+
+
+def test_snapshot_from_resource_metrics():
+    with mock.patch("app.metrics.resource_metrics.ResourceMetricsCollector.collect", return_value=_collected_metrics()):
+        snapshot = take_resource_snapshot()
+
+    assert snapshot.ram_total_bytes == 16 * GB
+    assert snapshot.ram_used_bytes == 6 * GB
+    assert snapshot.vram_total_bytes == 8 * GB
+    assert snapshot.detectors == {"det_a": Footprint(2 * GB, GB), "det_b": Footprint(3 * GB, 2 * GB)}
+    # Stays below the eviction threshold (90%) by the margin
+    assert snapshot.ram_limit_bytes == int(16 * GB * 0.85)
+
+
+def test_snapshot_without_resource_metrics_uses_this_containers_view():
+    with mock.patch(
+        "app.metrics.resource_metrics.ResourceMetricsCollector.collect",
+        return_value={"error": "Not running in a Kubernetes cluster"},
+    ):
+        snapshot = take_resource_snapshot()
+
+    assert snapshot.ram_total_bytes > 0
+    assert snapshot.detectors == {}
+    assert snapshot.vram_total_bytes == 0
+
+
+def test_ram_limit_follows_a_low_eviction_threshold(monkeypatch):
+    monkeypatch.setattr(resources, "ROLLOUT_EVICTION_MARGIN_PERCENT", 5)
+    monkeypatch.setattr(resources, "ROLLOUT_MAX_MEMORY_PERCENT", 85)
+
+    assert ResourceSnapshot(100 * GB, 0, eviction_threshold_pct=70).ram_limit_bytes == 65 * GB
+    assert ResourceSnapshot(100 * GB, 0, eviction_threshold_pct=None).ram_limit_bytes == 85 * GB
+
+
+class TestFootprintLedger:
+    def test_a_rollout_is_predicted_to_take_as_much_as_the_running_pods(self):
+        snapshot = ResourceSnapshot(16 * GB, 6 * GB, detectors={"det_a": Footprint(2 * GB, GB)})
+        assert FootprintLedger().predict("det_a", snapshot) == Footprint(2 * GB, GB)
+
+    def test_an_unknown_detector_is_predicted_to_take_as_much_as_the_largest_known_one(self):
+        snapshot = ResourceSnapshot(
+            16 * GB, 6 * GB, detectors={"det_a": Footprint(2 * GB, 2 * GB), "det_b": Footprint(3 * GB, GB)}
+        )
+        assert FootprintLedger().predict("det_new", snapshot) == Footprint(3 * GB, 2 * GB)
+
+    def test_without_running_detectors_the_estimate_is_used(self):
+        ledger = FootprintLedger()
+
+        assert ledger.predict("det_new", ResourceSnapshot(16 * GB, 0)) == Footprint(
+            resources.INFERENCE_POD_RAM_ESTIMATE_BYTES, 0
+        )
+        assert ledger.predict("det_new", ResourceSnapshot(16 * GB, 0, vram_total_bytes=8 * GB)) == Footprint(
+            resources.INFERENCE_POD_RAM_ESTIMATE_BYTES, resources.INFERENCE_POD_VRAM_ESTIMATE_BYTES
+        )
+
+    def test_a_detector_is_predicted_to_take_what_it_took_the_last_time_it_started(self):
+        ledger = FootprintLedger()
+        ledger.record_started("det_a", Footprint(2 * GB, 0))
+        ledger.observe(ResourceSnapshot(16 * GB, 6 * GB, detectors={"det_a": Footprint(5 * GB, 0)}))
+
+        # E.g. when its deployments were deleted and are created again
+        assert ledger.predict("det_a", ResourceSnapshot(16 * GB, 0)) == Footprint(5 * GB, 0)
+        assert ledger.records()["det_a"]["predicted_ram_bytes"] == 2 * GB
+        assert ledger.records()["det_a"]["actual_ram_bytes"] == 5 * GB
+
+        ledger.forget("det_a")
+        assert ledger.records() == {}
@@ -0,0 +1,270 @@
+import threading
+import time
+
+import pytest
+
+from app.model_updater import scheduler as scheduler_module
+from app.model_updater.resources import Footprint, ResourceSnapshot
+from app.model_updater.scheduler import (
+    DetectorRemovedError,
+    ModelUpdateScheduler,
+    RolloutGate,
+)
+from app.model_updater.status import MODEL_UPDATE_STATUS_FILE, get_model_update_status
+
+REFRESH_RATE = 60.0
+TIMEOUT_S = 5
+GB = 10**9
+PLENTY_OF_MEMORY = ResourceSnapshot(ram_total_bytes=100 * GB, ram_used_bytes=0)
+
+
+def _wait_for(condition, timeout_s: float = TIMEOUT_S) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for condition"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(check=lambda detector_id, removed: False, roll_out=lambda detector_id, removed: None, **kwargs):
+        kwargs.setdefault("rollout_gate", RolloutGate(resource_snapshot=lambda: PLENTY_OF_MEMORY))
+        scheduler = ModelUpdateScheduler(check_for_new_model=check, roll_out=roll_out, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+
+
+def test_new_detectors_are_checked_right_away(make_scheduler):
+    checked = []
+    scheduler = make_scheduler(check=lambda detector_id, removed: checked.append(detector_id) or False)
+
+    scheduler.sync_detectors({"det_a", "det_b"})
+    assert sorted(scheduler.schedule_due(REFRESH_RATE)) == ["det_a", "det_b"]
+    assert scheduler.wait_until_idle({"det_a", "det_b"}, timeout_s=TIMEOUT_S)
+
+    assert sorted(checked) == ["det_a", "det_b"]
+    # Not due again until about refresh_rate later
+    assert scheduler.schedule_due(REFRESH_RATE) == []
+    next_check_s = scheduler.seconds_until_next_check()
+    assert REFRESH_RATE * 0.85 < next_check_s <= REFRESH_RATE * 1.1
+
+
+def test_a_slow_check_does_not_delay_other_detectors(make_scheduler):
+    release = threading.Event()
+    checked = []
+
+    def check(detector_id, removed):
+        if detector_id == "det_slow":
+            release.wait(TIMEOUT_S)
+        checked.append(detector_id)
+        return False
+
+    scheduler = make_scheduler(check=check, check_concurrency=2)
+    scheduler.sync_detectors({"det_slow", "det_a", "det_b", "det_c"})
+    scheduler.schedule_due(REFRESH_RATE)
+
+    assert scheduler.wait_until_idle({"det_a", "det_b", "det_c"}, timeout_s=TIMEOUT_S)
+    assert "det_slow" not in checked
+    # The slow detector is still in flight, so it isn't started again
+    assert scheduler.schedule_due(REFRESH_RATE) == []
+    release.set()
+    assert scheduler.wait_until_idle({"det_slow"}, timeout_s=TIMEOUT_S)
+
+
+def test_checks_run_with_bounded_concurrency(make_scheduler):
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def check(detector_id, removed):
+        with lock:
+            running.append(detector_id)
+            max_running.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(detector_id)
+        return False
+
+    scheduler = make_scheduler(check=check, check_concurrency=2)
+    detector_ids = {f"det_{i}" for i in range(6)}
+    scheduler.sync_detectors(detector_ids)
+    scheduler.schedule_due(REFRESH_RATE)
+
+    assert scheduler.wait_until_idle(detector_ids, timeout_s=TIMEOUT_S)
+    assert max(max_running) == 2
+
+
+def test_failures_back_off_exponentially(make_scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "MODEL_UPDATE_JITTER_FRACTION", 0.0)
+    scheduler = make_scheduler(check=lambda detector_id, removed: 1 / 0)
+    scheduler.sync_detectors({"det_a"})
+
+    delays = []
+    for _ in range(3):
+        scheduler._states["det_a"].next_check_at = 0
+        scheduler.schedule_due(REFRESH_RATE)
+        assert scheduler.wait_until_idle({"det_a"}, timeout_s=TIMEOUT_S)
+        delays.append(scheduler.seconds_until_next_check())
+
+    assert delays[0] == pytest.approx(REFRESH_RATE, abs=1)
+    assert delays[1] == pytest.approx(2 * REFRESH_RATE, abs=1)
+    assert delays[2] == pytest.approx(4 * REFRESH_RATE, abs=1)
+    stats = scheduler.stats()["det_a"]
+    assert stats["consecutive_failures"] == 3
+    assert stats["last_error"].startswith("ZeroDivisionError")
+    assert stats["last_success_at"] is None
+
+
+def test_rollouts_do_not_block_checks(make_scheduler):
+    release_rollout = threading.Event()
+    rolled_out = []
+
+    def roll_out(detector_id, removed):
+        release_rollout.wait(TIMEOUT_S)
+        rolled_out.append(detector_id)
+
+    scheduler = make_scheduler(
+        check=lambda detector_id, removed: detector_id == "det_new_model",
+        roll_out=roll_out,
+        check_concurrency=1,
+        rollout_gate=RolloutGate(max_concurrency=1, resource_snapshot=lambda: PLENTY_OF_MEMORY),
+    )
+    scheduler.sync_detectors({"det_new_model", "det_a", "det_b"})
+    scheduler.schedule_due(REFRESH_RATE)
+
+    assert scheduler.wait_until_idle({"det_a", "det_b"}, timeout_s=TIMEOUT_S)
+    _wait_for(lambda: scheduler.stats()["det_new_model"]["phase"] == "rolling_out")
+    release_rollout.set()
+    assert scheduler.wait_until_idle({"det_new_model"}, timeout_s=TIMEOUT_S)
+    assert rolled_out == ["det_new_model"]
+    assert scheduler.stats()["det_new_model"]["last_success_at"] is not None
+
+
+def test_removed_detectors_stop_and_are_not_rescheduled(make_scheduler):
+    def roll_out(detector_id, removed):
+        if removed.wait(TIMEOUT_S):
+            raise DetectorRemovedError()
+
+    scheduler = make_scheduler(check=lambda detector_id, removed: True, roll_out=roll_out)
+    scheduler.sync_detectors({"det_a"})
+    scheduler.schedule_due(REFRESH_RATE)
+    _wait_for(lambda: scheduler.stats()["det_a"]["phase"] == "rolling_out")
+
+    scheduler.sync_detectors(set())
+
+    assert scheduler.wait_until_idle({"det_a"}, timeout_s=1)
+    assert scheduler.stats() == {}
+    assert scheduler.seconds_until_next_check() is None
+
+
+class TestRolloutGate:
+    @staticmethod
+    def _start_in_background(gate: RolloutGate, detector_id: str, release: threading.Event) -> threading.Event:
+        started = threading.Event()
+
+        def roll_out():
+            with gate.slot(detector_id, threading.Event()):
+                started.set()
+                release.wait(TIMEOUT_S)
+
+        threading.Thread(target=roll_out, daemon=True).start()
+        return started
+
+    def test_first_rollout_starts_whatever_the_memory_use(self):
+        gate = RolloutGate(resource_snapshot=lambda: ResourceSnapshot(ram_total_bytes=10 * GB, ram_used_bytes=10 * GB))
+        with gate.slot("det_a", threading.Event()):
+            pass
+
+    def test_rollouts_start_while_their_predicted_footprint_fits(self):
+        # 4 GB in use, with a limit of 8.5 GB: room for two more detectors of 2 GB
+        snapshot = ResourceSnapshot(
+            ram_total_bytes=10 * GB, ram_used_bytes=4 * GB, detectors={"det_running": Footprint(2 * GB, 0)}
+        )
+        gate = RolloutGate(resource_snapshot=lambda: snapshot, poll_interval_s=0.01)
+        release = threading.Event()
+
+        first = self._start_in_background(gate, "det_new_1", release)
+        second = self._start_in_background(gate, "det_new_2", release)
+        assert first.wait(TIMEOUT_S) and second.wait(TIMEOUT_S)
+        third = self._start_in_background(gate, "det_new_3", release)
+        assert not third.wait(0.1)
+
+        release.set()
+        assert third.wait(TIMEOUT_S)
+
+    def test_the_number_of_rollouts_is_bounded(self):
+        gate = RolloutGate(max_concurrency=1, resource_snapshot=lambda: PLENTY_OF_MEMORY, poll_interval_s=0.01)
+        release = threading.Event()
+
+        assert self._start_in_background(gate, "det_a", release).wait(TIMEOUT_S)
+        second = self._start_in_background(gate, "det_b", release)
+        assert not second.wait(0.1)
+        release.set()
+        assert second.wait(TIMEOUT_S)
+
+    def test_rollouts_wait_for_vram(self):
+        snapshot = ResourceSnapshot(
+            ram_total_bytes=100 * GB,
+            ram_used_bytes=0,
+            vram_total_bytes=10 * GB,
+            vram_used_bytes=6 * GB,
+            detectors={"det_a": Footprint(GB, 3 * GB), "det_b": Footprint(GB, 3 * GB)},
+        )
+        gate = RolloutGate(resource_snapshot=lambda: snapshot, poll_interval_s=0.01)
+        release = threading.Event()
+
+        assert self._start_in_background(gate, "det_a", release).wait(TIMEOUT_S)
+        # 6 GB in use plus 3 GB starting leaves no room for another 3 GB under the limit of 9 GB
+        second = self._start_in_background(gate, "det_b", release)
+        assert not second.wait(0.1)
+        release.set()
+        assert second.wait(TIMEOUT_S)
+
+    def test_removed_detector_stops_waiting_for_a_slot(self):
+        gate = RolloutGate(max_concurrency=1, resource_snapshot=lambda: PLENTY_OF_MEMORY, poll_interval_s=0.01)
+        removed = threading.Event()
+        removed.set()
+        with gate.slot("det_a", threading.Event()):
+            with pytest.raises(DetectorRemovedError):
+                with gate.slot("det_b", removed):
+                    pass
+
+    def test_predicted_and_actual_footprints_are_recorded(self):
+        snapshots = [ResourceSnapshot(ram_total_bytes=100 * GB, ram_used_bytes=0)]
+        gate = RolloutGate(resource_snapshot=lambda: snapshots[-1], poll_interval_s=0)
+        with gate.slot("det_a", threading.Event()):
+            pass
+        assert gate.footprints.awaiting_observation()
+
+        snapshots.append(
+            ResourceSnapshot(ram_total_bytes=100 * GB, ram_used_bytes=0, detectors={"det_a": Footprint(3 * GB, 0)})
+        )
+        gate.snapshot()
+
+        record = gate.footprints.records()["det_a"]
+        assert record["actual_ram_bytes"] == 3 * GB
+        assert record["predicted_ram_bytes"] > 0
+        assert not gate.footprints.awaiting_observation()
+
+
+def test_model_update_status_reports_update_lag(make_scheduler, tmp_path):
+    scheduler = make_scheduler(status_path=str(tmp_path / MODEL_UPDATE_STATUS_FILE))
+    scheduler.sync_detectors({"det_a"})
+    scheduler.schedule_due(REFRESH_RATE)
+    assert scheduler.wait_until_idle({"det_a"}, timeout_s=TIMEOUT_S)
+
+    status = get_model_update_status(str(tmp_path))
+
+    assert set(status) == {"det_a"}
+    assert 0 <= status["det_a"]["update_lag_s"] < TIMEOUT_S
+    assert status["det_a"]["consecutive_failures"] == 0
+
+
+def test_model_update_status_is_empty_without_a_file(tmp_path):
+    assert get_model_update_status(str(tmp_path)) == {}
@@ -0,0 +1,206 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from app.model_updater import update_models
+from app.model_updater.scheduler import DetectorRemovedError
+from app.model_updater.update_models import _wait_for_next_cycle
+
+REFRESH_RATE = 60.0
+
+
+@pytest.fixture(autouse=True)
+def fast_checks(monkeypatch):
+    monkeypatch.setattr(update_models, "DETECTOR_CONFIG_CHANGE_CHECK_INTERVAL_S", 0.01)
+    active_config = mock.Mock()
+    active_config.global_config.refresh_rate = REFRESH_RATE
+    with mock.patch.object(update_models.EdgeConfigManager, "active", return_value=active_config):
+        yield active_config
+
+
+def test_wait_for_next_cycle_sleeps_until_the_deadline_without_changes():
+    db_manager = mock.Mock()
+    db_manager.detector_changes_version.return_value = 3
+
+    start = time.monotonic()
+    _wait_for_next_cycle(db_manager, wait=0.1, refresh_rate=REFRESH_RATE, baseline_version=3)
+
+    assert time.monotonic() - start >= 0.09
+    # Waiting never queries the database
+    db_manager.get_active_detector_ids.assert_not_called()
+    db_manager.get_pending_deletions.assert_not_called()
+
+
+def test_wait_for_next_cycle_returns_when_detectors_change():
+    db_manager = mock.Mock()
+    db_manager.detector_changes_version.side_effect = [3, 3, 4]
+
+    start = time.monotonic()
+    _wait_for_next_cycle(db_manager, wait=10, refresh_rate=REFRESH_RATE, baseline_version=3)
+
+    assert time.monotonic() - start < 1
+    assert db_manager.detector_changes_version.call_count == 3
+
+
+def test_wait_for_next_cycle_returns_when_refresh_rate_changes(fast_checks):
+    db_manager = mock.Mock()
+    db_manager.detector_changes_version.return_value = 3
+    fast_checks.global_config.refresh_rate = REFRESH_RATE / 2
+
+    start = time.monotonic()
+    _wait_for_next_cycle(db_manager, wait=10, refresh_rate=REFRESH_RATE, baseline_version=3)
+
+    assert time.monotonic() - start < 1
+
+
+REPOSITORY_MODEL_VERSION = 2
+
+
+@pytest.fixture(autouse=True)
+def model_repository():
+    with (
+        mock.patch.object(update_models, "get_current_model_version", return_value=REPOSITORY_MODEL_VERSION),
+        mock.patch.object(update_models, "prefetch_model_files"),
+    ):
+        yield
+
+
+def _managers(new_model: bool, deployment_exists: bool):
+    edge_inference_manager = mock.Mock()
+    edge_inference_manager.update_models_if_available.return_value = new_model
+    deployment_manager = mock.Mock()
+    deployment_manager.get_inference_deployment.return_value = mock.Mock() if deployment_exists else None
+    # A new model is a newer version in the model repository than the deployments serve
+    deployment_manager.get_deployed_model_version.return_value = REPOSITORY_MODEL_VERSION - int(new_model)
+    # Newly created deployments haven't rolled out yet
+    deployment_manager.is_inference_deployment_rollout_complete.return_value = False
+    deployment_manager.get_pods_to_warm_up.return_value = []
+    return edge_inference_manager, deployment_manager, mock.Mock()
+
+
+def test_check_returns_whether_a_rollout_is_needed():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=True, deployment_exists=True)
+
+    needs_rollout = update_models._check_new_models_and_inference_deployments(
+        "det_a", edge_inference_manager, deployment_manager, db_manager, True, removed=threading.Event()
+    )
+
+    assert needs_rollout
+    # Rolling out is left to the scheduler
+    deployment_manager.update_inference_deployment.assert_not_called()
+
+
+def test_check_leaves_creating_missing_deployments_to_a_rollout():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=True, deployment_exists=False)
+
+    needs_rollout = update_models._check_new_models_and_inference_deployments(
+        "det_a", edge_inference_manager, deployment_manager, db_manager, True, removed=threading.Event()
+    )
+
+    # Creating deployments starts pods, so it waits for the scheduler's rollout gate like any rollout
+    assert needs_rollout
+    deployment_manager.create_inference_deployment.assert_not_called()
+
+
+def test_check_of_up_to_date_deployments_needs_no_rollout():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=False, deployment_exists=True)
+
+    needs_rollout = update_models._check_new_models_and_inference_deployments(
+        "det_a", edge_inference_manager, deployment_manager, db_manager, True, removed=threading.Event()
+    )
+
+    assert not needs_rollout
+
+
+def test_rollout_creates_missing_deployments_and_updates_outdated_ones():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=False, deployment_exists=True)
+    primary_name = update_models.get_edge_inference_deployment_name("det_a")
+    # The primary deployment serves an old model version, the OODD deployment doesn't exist
+    deployment_manager.get_inference_deployment.side_effect = lambda deployment_name: (
+        mock.Mock() if deployment_name == primary_name else None
+    )
+    deployment_manager.get_deployed_model_version.return_value = REPOSITORY_MODEL_VERSION - 1
+    # The update has started rolling out, then both deployments become ready
+    deployment_manager.is_inference_deployment_rollout_complete.side_effect = [False] + [True] * 10
+
+    with (
+        mock.patch.object(update_models, "delete_old_model_versions"),
+        mock.patch.object(update_models, "record_serving_models"),
+    ):
+        update_models._roll_out_inference_deployments(
+            "det_a", edge_inference_manager, deployment_manager, db_manager, True, removed=threading.Event()
+        )
+
+    deployment_manager.update_inference_deployment.assert_called_once_with(detector_id="det_a", is_oodd=False)
+    deployment_manager.create_inference_deployment.assert_called_once_with(detector_id="det_a", is_oodd=True)
+    assert db_manager.update_inference_deployment_record.call_count == 2
+
+
+def test_rollout_warms_up_new_pods_until_it_completes():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=True, deployment_exists=True)
+    # The update has started rolling out, then the new pod is warmed up and becomes available
+    deployment_manager.is_inference_deployment_rollout_complete.side_effect = [False, False] + [True] * 10
+    removed = mock.Mock()
+    removed.is_set.return_value = removed.wait.return_value = False
+
+    with (
+        mock.patch.object(update_models, "delete_old_model_versions"),
+        mock.patch.object(update_models, "record_serving_models"),
+        mock.patch.object(update_models, "warm_up_inference_pods") as warm_up,
+    ):
+        update_models._roll_out_inference_deployments(
+            "det_a", edge_inference_manager, deployment_manager, db_manager, False, removed=removed
+        )
+
+    update_models.prefetch_model_files.assert_called_once_with(edge_inference_manager.MODEL_REPOSITORY, "det_a", False)
+    assert warm_up.call_count == 2
+    db_manager.update_inference_deployment_record.assert_called_once()
+
+
+def test_rollout_does_not_wait_for_the_model_files_to_be_prefetched():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=True, deployment_exists=True)
+    deployment_manager.is_inference_deployment_rollout_complete.side_effect = [False] + [True] * 10
+    removed = mock.Mock()
+    removed.is_set.return_value = removed.wait.return_value = False
+    deployment_updated_before_prefetch = []
+    update_models.prefetch_model_files.side_effect = lambda *_: deployment_updated_before_prefetch.append(
+        deployment_manager.update_inference_deployment.called
+    )
+
+    with (
+        mock.patch.object(update_models, "delete_old_model_versions"),
+        mock.patch.object(update_models, "record_serving_models"),
+        mock.patch.object(update_models, "warm_up_inference_pods"),
+    ):
+        update_models._roll_out_inference_deployments(
+            "det_a", edge_inference_manager, deployment_manager, db_manager, False, removed=removed
+        )
+
+    assert deployment_updated_before_prefetch == [True]
+
+
+def test_check_warms_up_pods_of_up_to_date_deployments():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=False, deployment_exists=True)
+
+    with mock.patch.object(update_models, "warm_up_inference_pods") as warm_up:
+        update_models._check_new_models_and_inference_deployments(
+            "det_a", edge_inference_manager, deployment_manager, db_manager, True, removed=threading.Event()
+        )
+
+    # E.g. pods that were restarted with the node
+    assert [c.args[3] for c in warm_up.call_args_list] == [False, True]
+
+
+def test_check_of_a_removed_detector_creates_no_deployments():
+    edge_inference_manager, deployment_manager, db_manager = _managers(new_model=False, deployment_exists=False)
+    removed = threading.Event()
+    removed.set()
+
+    with pytest.raises(DetectorRemovedError):
+        update_models._check_new_models_and_inference_deployments(
+            "det_a", edge_inference_manager, deployment_manager, db_manager, True, removed=removed
+        )
+
+    deployment_manager.create_inference_deployment.assert_not_called()
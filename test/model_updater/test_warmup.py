@@ -0,0 +1,123 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+from kubernetes.client import V1ObjectMeta, V1Pod, V1PodCondition, V1PodStatus
+
+from app.core.naming import get_primary_edge_model_dir
+from app.model_updater import warmup
+from app.model_updater.warmup import (
+    get_warm_up_record,
+    prefetch_model_files,
+    record_warm_up,
+    warm_up_inference_pods,
+)
+
+CREATED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def inference_server(monkeypatch):
+    """A stand-in for an inference pod's server, which records the requests it gets."""
+    server_state = {"status_code": 200, "requests": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            server_state["requests"].append((self.path, self.headers["Content-Type"], body))
+            self.send_response(server_state["status_code"])
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(warmup, "INFERENCE_SERVER_PORT", server.server_port)
+    yield server_state
+    server.shutdown()
+    server.server_close()
+
+
+def _save_version(repository_root: str, version: int, size: int = 1000) -> str:
+    model_dir = get_primary_edge_model_dir(repository_root, "det_a")
+    os.makedirs(os.path.join(model_dir, str(version)))
+    with open(os.path.join(model_dir, str(version), "model.buf"), "wb") as f:
+        f.write(os.urandom(size))
+    return model_dir
+
+
+def _ready_pod(model_version: int) -> V1Pod:
+    return V1Pod(
+        metadata=V1ObjectMeta(
+            name="inferencemodel-det-a-abc12",
+            creation_timestamp=CREATED_AT,
+            annotations={"groundlight.dev/model-version": str(model_version)},
+        ),
+        status=V1PodStatus(
+            pod_ip="127.0.0.1",
+            conditions=[
+                V1PodCondition(
+                    type="ContainersReady", status="True", last_transition_time=CREATED_AT + timedelta(seconds=30)
+                )
+            ],
+        ),
+    )
+
+
+def test_prefetch_reads_the_newest_model_version(tmp_path):
+    _save_version(str(tmp_path), 1, size=1000)
+    _save_version(str(tmp_path), 2, size=3 * warmup.PREFETCH_CHUNK_SIZE + 10)
+
+    assert prefetch_model_files(str(tmp_path), "det_a") == 3 * warmup.PREFETCH_CHUNK_SIZE + 10
+    assert prefetch_model_files(str(tmp_path), "det_b") == 0
+
+
+def test_pods_are_warmed_up_before_they_receive_traffic(tmp_path, inference_server):
+    model_dir = _save_version(str(tmp_path), 2)
+    deployment_manager = mock.Mock()
+    deployment_manager.get_pods_to_warm_up.return_value = [_ready_pod(2)]
+
+    warm_up_inference_pods(deployment_manager, str(tmp_path), "det_a")
+
+    assert len(inference_server["requests"]) == warmup.MODEL_WARMUP_INFERENCES
+    path, content_type, body = inference_server["requests"][0]
+    assert (path, content_type) == ("/infer", "image/jpeg")
+    assert body.startswith(b"\xff\xd8")  # A JPEG
+    deployment_manager.mark_pod_warmed_up.assert_called_once_with("inferencemodel-det-a-abc12")
+
+    record = get_warm_up_record(model_dir, 2)
+    assert record["load_s"] == 30  # noqa: PLR2004
+    assert record["warm_up_inferences"] == warmup.MODEL_WARMUP_INFERENCES
+    assert record["time_to_warm_s"] >= record["load_s"] + record["warm_up_s"]
+
+
+def test_pod_whose_warm_up_fails_receives_traffic_all_the_same(tmp_path, inference_server):
+    model_dir = _save_version(str(tmp_path), 2)
+    inference_server["status_code"] = 500
+    deployment_manager = mock.Mock()
+    deployment_manager.get_pods_to_warm_up.return_value = [_ready_pod(2)]
+
+    warm_up_inference_pods(deployment_manager, str(tmp_path), "det_a")
+
+    # Warming up stops at the first failure
+    assert len(inference_server["requests"]) == 1
+    deployment_manager.mark_pod_warmed_up.assert_called_once()
+    assert get_warm_up_record(model_dir, 2)["warm_up_inferences"] == 0
+
+
+def test_warm_up_records_of_deleted_versions_are_dropped(tmp_path):
+    model_dir = _save_version(str(tmp_path), 1)
+    record_warm_up(model_dir, 1, {"time_to_warm_s": 40})
+    _save_version(str(tmp_path), 2)
+    os.rename(os.path.join(model_dir, "1"), os.path.join(tmp_path, "deleted"))
+
+    record_warm_up(model_dir, 2, {"time_to_warm_s": 50})
+
+    assert get_warm_up_record(model_dir, 1) is None
+    assert get_warm_up_record(model_dir, 2) == {"time_to_warm_s": 50}